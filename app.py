@@ -27,7 +27,7 @@ from src.utils.chunking import create_all_chunks
 from src.utils.llm_config import is_model_available, get_model_info
 from src.utils.email_sender import send_daily_report, send_email, is_email_configured
 from src.graph.reporting import run_quick_analysis
-from src.agents.rag_agent import chat
+from src.agents.rag_agent import chat, chat_stream
 from src.ui.styles import get_custom_css
 
 # ============================================
@@ -372,9 +372,18 @@ def chatbot_tab():
         try:
             history = st.session_state['messages'][:-1]
             
-            # SPINNER: Aquí es donde debe ocurrir la espera visible
+            # STREAMING: tokens en pantalla según llegan; validación y confianza al final
+            placeholder = st.empty()
+            streamed = ""
+            result = {}
             with st.spinner("🧠 Procesando inteligencia táctica..."):
-                result = chat(query, history=history)
+                for event in chat_stream(query, history=history):
+                    if event["type"] == "token":
+                        streamed += event["text"]
+                        placeholder.markdown(streamed + "▌")
+                    elif event["type"] == "final":
+                        result = event["result"]
+            placeholder.empty()
                 
             # Extraer campos estructurados del resultado (que es un dict)
             msg = {
@@ -13,7 +13,10 @@ import sys
 # Añadir root path para importar módulos correctamente si se corre desde pages/
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.utils.observability import get_observer
+from src.utils.observability import get_observer, get_stage_metrics
+from src.utils.retrieval_cache import get_retrieval_cache
+from src.utils.response_cache import get_response_cache
+from src.utils.rerank_cache import get_rerank_cache
 
 st.set_page_config(page_title="RAG Metrics", page_icon="📊", layout="wide")
 
@@ -89,6 +92,104 @@ with col4:
         f"{metrics.get('validation_pass_rate', 0):.1f}%"
     )
 
+# ========== CACHÉ DE RETRIEVAL ==========
+st.subheader("⚡ Caché de Retrieval")
+cache_stats = get_retrieval_cache().stats()
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.metric(
+        "Hit Rate (queries logueadas)",
+        f"{metrics.get('retrieval_cache_hit_rate', 0):.1f}%"
+    )
+
+with col2:
+    st.metric(
+        "Hits / Misses (proceso)",
+        f"{cache_stats['hits']} / {cache_stats['misses']}"
+    )
+
+with col3:
+    st.metric(
+        "Entradas en caché",
+        f"{cache_stats['entries']} ({cache_stats['bytes'] / 1024:.0f} KB)"
+    )
+
+# ========== CACHÉ DE RESPUESTAS LLM ==========
+st.subheader("🧠 Caché de Respuestas LLM (temperature=0)")
+llm_cache_stats = get_response_cache().stats()
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.metric(
+        "Hit Rate (proceso)",
+        f"{llm_cache_stats['hit_rate'] * 100:.1f}%"
+    )
+
+with col2:
+    st.metric(
+        "Hits / Misses (proceso)",
+        f"{llm_cache_stats['hits']} / {llm_cache_stats['misses']}"
+    )
+
+with col3:
+    st.metric(
+        "Entradas en caché",
+        f"{llm_cache_stats['entries']} ({llm_cache_stats['bytes'] / 1024:.0f} KB)"
+    )
+
+# ========== CACHÉ DE SCORES DEL RE-RANKER ==========
+st.subheader("🎯 Caché del Re-ranker (pares query-chunk)")
+rerank_cache_stats = get_rerank_cache().stats()
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.metric(
+        "Hit Rate (proceso)",
+        f"{rerank_cache_stats['hit_rate'] * 100:.1f}%"
+    )
+
+with col2:
+    st.metric(
+        "Pares cacheados / puntuados",
+        f"{rerank_cache_stats['hits']} / {rerank_cache_stats['misses']}"
+    )
+
+with col3:
+    st.metric(
+        "Entradas en caché",
+        f"{rerank_cache_stats['entries']} / {rerank_cache_stats['max_entries']}"
+    )
+
+# ========== PRE-CHEQUEO DE SUFICIENCIA ==========
+st.subheader("🧮 Evaluador: Pre-chequeo Determinista vs LLM")
+decisions = get_stage_metrics().summary().get("evaluator.decision", {}).get("status", {})
+total_decisions = sum(decisions.values())
+rule_decisions = sum(n for path, n in decisions.items() if path.startswith("rules_") or path == "kept_previous")
+
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.metric(
+        "Llamadas LLM ahorradas (proceso)",
+        f"{rule_decisions} / {total_decisions}"
+    )
+
+with col2:
+    st.metric(
+        "Resueltas por reglas",
+        f"{(rule_decisions / total_decisions * 100) if total_decisions else 0:.1f}%"
+    )
+
+with col3:
+    st.metric(
+        "Auditor LLM (completo / delta)",
+        f"{decisions.get('llm', 0)} / {decisions.get('llm_delta', 0)}"
+    )
+
 st.divider()
 
 # ========== GRÁFICOS ==========
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Exporta el cross-encoder de re-ranking a ONNX (y a int8 dinámico) para CPU.
+
+Solo para exportar se necesitan optimum[onnxruntime], transformers y torch; en
+runtime el re-ranker ONNX (src/utils/onnx_reranker.py) usa únicamente
+onnxruntime + tokenizers.
+
+Uso:
+    python scripts/export_reranker_onnx.py
+    python scripts/export_reranker_onnx.py --model BAAI/bge-reranker-v2-m3 --out data/models/bge-reranker-v2-m3-onnx
+    python scripts/export_reranker_onnx.py --no-quantize
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.config import RERANKER_ONNX_DIR
+from src.utils.onnx_reranker import MODEL_FILE, QUANTIZED_MODEL_FILE, TOKENIZER_FILE
+
+
+def export(model_name: str, out_dir: Path) -> None:
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+    except ImportError:
+        print("❌ Exportar requiere: pip install 'optimum[onnxruntime]' transformers torch")
+        sys.exit(1)
+
+    print(f"📦 Exportando {model_name} a ONNX...")
+    start = time.time()
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+    model.save_pretrained(out_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    if not (out_dir / TOKENIZER_FILE).exists():
+        print(f"❌ {model_name} no tiene tokenizer rápido ({TOKENIZER_FILE}); no se puede usar sin transformers")
+        sys.exit(1)
+    print(f"✅ {out_dir / MODEL_FILE} ({time.time() - start:.1f}s)")
+
+
+def quantize(out_dir: Path) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print("🗜️  Cuantizando a int8 dinámico (pesos de MatMul/Gemm)...")
+    start = time.time()
+    quantize_dynamic(
+        str(out_dir / MODEL_FILE),
+        str(out_dir / QUANTIZED_MODEL_FILE),
+        weight_type=QuantType.QInt8
+    )
+    size_fp32 = sum(p.stat().st_size for p in out_dir.glob("model.onnx*")) / 1e6
+    size_int8 = (out_dir / QUANTIZED_MODEL_FILE).stat().st_size / 1e6
+    print(f"✅ {out_dir / QUANTIZED_MODEL_FILE}: {size_fp32:.0f} MB -> {size_int8:.0f} MB ({time.time() - start:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el re-ranker a ONNX (+ int8) para CPU")
+    parser.add_argument("--model", default="BAAI/bge-reranker-v2-m3", help="Modelo de Hugging Face")
+    parser.add_argument("--out", default=str(RERANKER_ONNX_DIR), help="Directorio de salida")
+    parser.add_argument("--no-quantize", action="store_true", help="Solo exportar fp32")
+    args = parser.parse_args()
+
+    out_dir = Path(args.out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    export(args.model, out_dir)
+    if not args.no_quantize:
+        quantize(out_dir)
+    print("\n🎯 Listo. Compara latencia y ranking con: python tests/benchmark_reranker_cpu.py")
+
+
+if __name__ == "__main__":
+    main()
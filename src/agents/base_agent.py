@@ -9,14 +9,6 @@ from typing import Dict
 
 from src.graph.state import WorkflowState
 
-from openai import RateLimitError
-from tenacity import (
-    retry,
-    stop_after_attempt,
-    wait_exponential,
-    retry_if_exception_type,
-    before_sleep_log
-)
 from src.utils.llm_config import generate_response
 
 logger = logging.getLogger(__name__)
@@ -53,26 +45,17 @@ class BaseAgent(ABC):
         """
         pass
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=1, max=10),
-        retry=retry_if_exception_type(RateLimitError),
-        before_sleep=before_sleep_log(logger, logging.WARNING)
-    )
     def call_llm(self, prompt: str, max_tokens: int = 2000, temperature: float = 0.0, model: str = None) -> str:
         """
-        Llamada segura al LLM con Exponential Backoff para manejar Rate Limits (429).
-        Wrappeado con Tenacity:
-        - Wait: Exponential (1s a 10s)
-        - Stop: 3 intentos
-        - Log: Warning antes de dormir
+        Llamada al LLM. Los reintentos con Exponential Backoff (429, timeouts, red)
+        los hace el gateway (llm_gateway.chat: 3 intentos, 1s a 10s); si se agotan,
+        se propaga la excepción original de OpenAI.
         """
         try:
             # Model=None usa el default de llm_config (MODEL_CHATBOT)
             return generate_response(prompt, max_tokens, temperature, model=model) if model else generate_response(prompt, max_tokens, temperature)
         except Exception as e:
-            # Re-raise para que Tenacity lo capture si es RateLimitError (o si queremos atrapar todo)
-            # generate_response ya no atrapa excepciones, así que 'e' será la excepción raw de OpenAI
+            # generate_response no atrapa excepciones: 'e' es la excepción raw de OpenAI
             self.logger.warning(f"Intento LLM fallido: {e}")
             raise e
 
@@ -6,29 +6,22 @@ Usa el historial de chat para resolver correferencias (ej: "su importe" -> "impo
 """
 
 import logging
-import os
-from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 
 from src.graph.state import WorkflowState
+from src.utils.llm_gateway import get_llm_gateway
 
-# Cargar variables de entorno
-load_dotenv()
 logger = logging.getLogger(__name__)
 
 # Configuración del Modelo Ligero (Requisito: gpt-4o-mini)
 MODEL_REWRITER = "gpt-4o-mini"
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+# Tipos de BaseMessage (LangChain) -> roles de la API de OpenAI
+_MESSAGE_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
 
 class ContextRewriter:
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model=MODEL_REWRITER,
-            temperature=0,
-            api_key=OPENAI_API_KEY
-        )
+        # Cliente compartido del gateway (sin ChatOpenAI propio por instancia)
+        self.gateway = get_llm_gateway()
         
         # System Prompt con ejemplos Few-Shot de dominio de contratos
         self.system_prompt = """Eres un experto en lingüística y contratos de defensa. Tu única tarea es reescribir preguntas de seguimiento para que sean TOTALMENTE INDEPENDIENTES (Standalone), basándote en el historial de chat.
@@ -75,7 +68,7 @@ Output: Gracias, eso es todo. (Intacta)
         
         # Construir mensajes para el LLM
         messages = [
-            SystemMessage(content=self.system_prompt),
+            {"role": "system", "content": self.system_prompt},
         ]
         
         # Añadir historial reciente (últimos 5 mensajes para contexto inmediato)
@@ -85,21 +78,20 @@ Output: Gracias, eso es todo. (Intacta)
             if isinstance(msg, dict):
                 role = msg.get("role")
                 content = msg.get("content")
-                if role == "user":
-                    messages.append(HumanMessage(content=content))
-                elif role == "assistant":
-                    messages.append(AIMessage(content=content))
+                if role in ("user", "assistant"):
+                    messages.append({"role": role, "content": content})
             else:
                 # Soporte para BaseMessage objects
-                messages.append(msg)
+                role = _MESSAGE_ROLES.get(getattr(msg, "type", ""), "user")
+                messages.append({"role": role, "content": msg.content})
                 
         # Añadir la query actual
-        messages.append(HumanMessage(content=f"Input: {current_query}"))
+        messages.append({"role": "user", "content": f"Input: {current_query}"})
         
         try:
             # Invocar modelo
-            response = self.llm.invoke(messages)
-            rewritten_query = response.content.strip()
+            response = self.gateway.chat(messages, model=MODEL_REWRITER, temperature=0)
+            rewritten_query = response.choices[0].message.content.strip()
             
             # Log si hubo cambios significativos
             if rewritten_query != current_query:
@@ -5,19 +5,23 @@ Juzga si la información recuperada es suficiente para responder la query.
 """
 
 import json
+import time
 from typing import List, Dict
 
 from src.agents.base_agent import BaseAgent
 from src.graph.state import WorkflowState, EvaluationReport
 from src.utils.llm_config import generate_response
+from src.utils.observability import get_stage_metrics
+from src.utils.sufficiency_check import precheck_sufficiency
 
 
 class EvaluationAgent(BaseAgent):
     """
     Agent auditor que:
-    1. Analiza los chunks recuperados vs las sub-queries requeridas
-    2. Determina si falta información crítica
-    3. Emite un veredicto (SUFFICIENT/PARTIAL/INSUFFICIENT)
+    1. Resuelve por reglas los casos claros (pre-chequeo determinista, sin LLM)
+    2. Analiza los chunks recuperados vs las sub-queries requeridas
+    3. Determina si falta información crítica
+    4. Emite un veredicto (SUFFICIENT/PARTIAL/INSUFFICIENT)
     """
     
     def __init__(self):
@@ -45,15 +49,51 @@ class EvaluationAgent(BaseAgent):
                 }
                 state["evaluation_report"] = report
                 state["is_sufficient"] = False
+                state["retrieval_metadata"] = {
+                    **(state.get("retrieval_metadata") or {}),
+                    "sufficiency_check": {"decision": "rules_empty", "checks": []}
+                }
+                get_stage_metrics().record("evaluator.decision", 0.0, "rules_empty")
                 state["next_agent"] = "corrective"  # O replanner
                 return state
             
-            # Preparar contexto para el LLM
-            # Resumir chunks para evitar context limit excesivo (solo contenido clave)
-            context_summary = self._summarize_context(chunks)
+            finding_reports = (state.get("retrieval_metadata") or {}).get("finding_reports", {})
+            previous_report = state.get("evaluation_report")
+            start = time.time()
+            
+            # Pre-chequeo determinista: casos claramente suficientes o vacíos no pasan por el LLM
+            rules_report, checks = precheck_sufficiency(sub_queries, chunks)
+            
+            if rules_report is not None:
+                decision = "rules_sufficient" if rules_report["status"] == "SUFFICIENT" else "rules_insufficient"
+                report = rules_report
+            elif previous_report and state.get("corrective_iteration", 0) > 0:
+                # Loop correctivo incremental: solo se evalúa el delta contra el veredicto previo
+                new_chunks = state.get("new_chunks") or []
+                if not new_chunks:
+                    self.logger.info("Reintento sin chunks nuevos: se mantiene el veredicto previo (sin LLM)")
+                    decision = "kept_previous"
+                    report = previous_report
+                else:
+                    decision = "llm_delta"
+                    delta_summary = self._summarize_context(new_chunks, offset=len(chunks) - len(new_chunks))
+                    report = self._evaluate_delta(query, sub_queries, previous_report, delta_summary, finding_reports)
+            else:
+                decision = "llm"
+                # Preparar contexto para el LLM
+                # Resumir chunks para evitar context limit excesivo (solo contenido clave)
+                context_summary = self._summarize_context(chunks)
+                
+                # Ejecutar evaluación con GPT-4o (con los hallazgos de cada paso del DAG)
+                report = self._evaluate_sufficiency(query, sub_queries, context_summary, finding_reports)
             
-            # Ejecutar evaluación con GPT-4o
-            report = self._evaluate_sufficiency(query, sub_queries, context_summary)
+            # Camino de decisión (para medir cuántas llamadas al auditor LLM se ahorran)
+            get_stage_metrics().record("evaluator.decision", time.time() - start, decision)
+            state["retrieval_metadata"] = {
+                **(state.get("retrieval_metadata") or {}),
+                "sufficiency_check": {"decision": decision, "checks": checks}
+            }
+            self.logger.info(f"Camino de evaluación: {decision}")
             
             # Actualizar estado
             state["evaluation_report"] = report
@@ -86,13 +126,14 @@ class EvaluationAgent(BaseAgent):
         
         return state
     
-    def _summarize_context(self, chunks: List[Dict]) -> str:
+    def _summarize_context(self, chunks: List[Dict], offset: int = 0) -> str:
         """
         Genera un resumen ligero del contexto recuperado para el prompt.
         Solo incluye los primeros 200 caracteres de cada chunk para identificar de qué hablan.
+        offset: numeración inicial (el delta de un reintento continúa la del contexto previo).
         """
         summary = []
-        for i, chunk in enumerate(chunks):
+        for i, chunk in enumerate(chunks, start=offset):
             content = chunk.get("contenido", "")[:200].replace("\n", " ")
             meta = chunk.get("metadata", {})
             source = meta.get("archivo", "unknown")
@@ -100,12 +141,22 @@ class EvaluationAgent(BaseAgent):
             summary.append(f"[{i+1}] {source} ({section}): {content}...")
         return "\n".join(summary)
 
-    def _evaluate_sufficiency(self, query: str, sub_queries: List[Dict], context_str: str) -> EvaluationReport:
+    def _describe_sub_query(self, sub_query: Dict, finding: Dict = None) -> str:
+        """Línea del requisito con la query resuelta (entidades de sus dependencias) y su hallazgo."""
+        if not finding:
+            return f"- {sub_query['query']} ({sub_query['rationale']})"
+        return (f"- {finding.get('query', sub_query['query'])} ({sub_query['rationale']}) "
+                f"[{finding.get('status')}: {finding.get('chunks_found', 0)} chunks]")
+
+    def _evaluate_sufficiency(self, query: str, sub_queries: List[Dict], context_str: str,
+                              finding_reports: Dict = None) -> EvaluationReport:
         """
         Usa GPT-4o para juzgar suficiencia.
         """
         
-        sub_queries_text = "\n".join([f"- {sq['query']} ({sq['rationale']})" for sq in sub_queries])
+        sub_queries_text = "\n".join([
+            self._describe_sub_query(sq, (finding_reports or {}).get(sq["id"])) for sq in sub_queries
+        ])
         
         prompt = f"""Actúa como Auditor de Información para un sistema RAG de contratos de defensa.
 
@@ -143,7 +194,58 @@ Responde SOLO con el JSON válido."""
         # AHORA VIA call_llm para Rate Limit Protection
         # [MODIFICACIÓN ESCUDO FINANCIERO]: Usamos gpt-4o-mini para evaluación (30x más barato)
         response = self.call_llm(prompt, max_tokens=4096, temperature=0.0, model="gpt-4o-mini")
+        return self._parse_report(response)
+
+    def _evaluate_delta(self, query: str, sub_queries: List[Dict], previous_report: EvaluationReport,
+                        delta_str: str, finding_reports: Dict = None) -> EvaluationReport:
+        """
+        Re-evaluación incremental tras un reintento: el auditor recibe su veredicto previo
+        y SOLO los chunks nuevos, no vuelve a leer el contexto completo.
+        """
+        sub_queries_text = "\n".join([
+            self._describe_sub_query(sq, (finding_reports or {}).get(sq["id"])) for sq in sub_queries
+        ])
+        missing_text = "\n".join(f"- {m}" for m in previous_report.get("missing_info", [])) or "- (no especificado)"
         
+        prompt = f"""Actúa como Auditor de Información para un sistema RAG de contratos de defensa.
+
+Ya evaluaste el contexto recuperado para esta consulta. Se ha hecho una búsqueda adicional
+para cubrir lo que faltaba y tienes SOLO la evidencia NUEVA (el contexto previo sigue disponible).
+
+CONSULTA ORIGINAL: "{query}"
+
+TU VEREDICTO PREVIO: {previous_report.get("status")} (Score: {previous_report.get("score")})
+Razonamiento previo: {previous_report.get("reasoning")}
+Información que faltaba:
+{missing_text}
+
+BÚSQUEDAS ADICIONALES:
+{sub_queries_text}
+
+EVIDENCIA NUEVA (Resumen):
+{delta_str}
+
+TU TAREA:
+Actualizar el veredicto: ¿la evidencia nueva cubre la información que faltaba?
+- Mantén como cubierto lo que ya lo estaba en el veredicto previo.
+- missing_info debe listar SOLO lo que sigue faltando.
+- Mismos criterios: SUFFICIENT (todo cubierto), PARTIAL (falta algo crítico), INSUFFICIENT (falta la mayoría).
+
+FORMATO JSON ESPERADO:
+{{
+  "status": "SUFFICIENT" | "PARTIAL" | "INSUFFICIENT",
+  "reasoning": "Explicación breve de por qué...",
+  "missing_info": ["lista", "de", "datos", "faltantes"],
+  "score": 0.0 a 100.0
+}}
+
+Responde SOLO con el JSON válido."""
+
+        response = self.call_llm(prompt, max_tokens=1024, temperature=0.0, model="gpt-4o-mini")
+        return self._parse_report(response)
+
+    def _parse_report(self, response: str) -> EvaluationReport:
+        """Parsea el JSON del auditor (veredicto INSUFFICIENT si no es válido)."""
         try:
             clean_resp = response.replace("```json", "").replace("```", "").strip()
             data = json.loads(clean_resp)
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Query Understanding - Etapa única de entendimiento de la query.
+
+Sustituye la cadena Router -> QueryAnalyzer (LLM) y la doble llamada del
+Planner (clasificar + descomponer) por una sola pasada:
+1. Clasificador determinista (regex de entidades, IDs de contrato y reglas de keywords).
+2. Solo si es ambiguo, UNA llamada LLM estructurada (JSON) que devuelve todo el plan.
+
+El plan (routing, filtros, top_k y sub-queries) se memoiza por query normalizada.
+"""
+
+import copy
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from src.config import MODEL_FAST
+from src.agents.query_router import QueryRouter
+from src.graph.state import SubQuery
+from src.utils.deterministic_extractor import extract_cifs, extract_dates
+from src.utils.retrieval_cache import normalize_query
+from src.utils.text_analysis import CONTRACT_ID_RE, normalize_contract_id, fold
+
+logger = logging.getLogger(__name__)
+
+# Vocabulario de reglas (palabras plegadas: sin acentos, minúsculas; incluye stop-words como "todos")
+LIST_WORDS = frozenset("lista listado listar enumera enumerar todos todas cuales cuantos cuantas".split())
+AGGREGATION_WORDS = frozenset("suma sumar sumando total totales media promedio".split())
+COMPARISON_WORDS = frozenset("compara comparar comparacion comparativa diferencia diferencias versus vs mayor menor".split())
+MULTI_HOP_WORDS = frozenset("relacion relaciona ademas tambien luego despues segun".split())
+
+EXHAUSTIVE_TOP_K = 50
+PLAN_CACHE_SIZE = 1024
+
+_CONTRACT_LIST_RE = re.compile(
+    rf'{CONTRACT_ID_RE.pattern}(?:\s*(?:,|\by\b|\be\b)\s*{CONTRACT_ID_RE.pattern})*', re.IGNORECASE
+)
+
+_router = QueryRouter()
+_plan_cache: "OrderedDict[str, Dict]" = OrderedDict()
+_plan_lock = threading.Lock()
+
+
+def _ordered_contract_ids(query: str) -> List[str]:
+    """IDs de contrato en orden de aparición (sin duplicados)."""
+    ids = []
+    for match in CONTRACT_ID_RE.finditer(query):
+        contract_id = normalize_contract_id(match.group(0))
+        if contract_id not in ids:
+            ids.append(contract_id)
+    return ids
+
+
+def _subquery(sq_id: int, query: str, rationale: str, dependency: Optional[List[int]] = None) -> SubQuery:
+    return {"id": sq_id, "query": query, "rationale": rationale, "dependency": dependency or []}
+
+
+def _per_contract_subqueries(query: str, contract_ids: List[str]) -> List[SubQuery]:
+    """'Suma los importes de CON_A, CON_B y CON_C' -> una sub-query por contrato."""
+    # La enumeración de IDs (con comas / y / e) se sustituye por cada ID en su sitio
+    template = _CONTRACT_LIST_RE.sub("\x00", query, count=1)
+    template = CONTRACT_ID_RE.sub(" ", template)
+    template = " ".join(re.sub(r'[¿?¡!.;:]', ' ', template).split())
+    if "\x00" not in template:
+        template += " contrato \x00"
+    return [
+        _subquery(i, template.replace("\x00", cid), f"Obtener dato para {cid}")
+        for i, cid in enumerate(contract_ids, start=1)
+    ]
+
+
+def _finalize(plan: Dict, query: str) -> Dict:
+    """Completa routing y top_k a partir de la clasificación."""
+    router_complexity = _router.classify(query)
+    config = _router.get_config(router_complexity)
+    top_k = config["top_k"]
+    if plan["query_type"] in ("LIST", "AGGREGATION") or plan["search_strategy"] == "EXHAUSTIVE_SCAN":
+        top_k = max(top_k, EXHAUSTIVE_TOP_K)
+
+    plan["router_complexity"] = router_complexity
+    plan["top_k"] = top_k
+    plan["use_reranker"] = config["use_reranker"]
+    plan["is_complex"] = plan["complexity"] != "simple"
+    if not plan.get("sub_queries"):
+        plan["sub_queries"] = [_subquery(1, query, "Consulta directa")]
+    return plan
+
+
+def classify_deterministic(query: str) -> Optional[Dict]:
+    """
+    Clasificador por reglas. Devuelve el plan completo o None si la query es ambigua
+    (entonces decide el LLM).
+    """
+    words = set(re.findall(r'[^\W_]+', fold(query)))
+    contract_ids = _ordered_contract_ids(query)
+    entities = {"cifs": extract_cifs(query), "contract_ids": contract_ids, "fechas": extract_dates(query)}
+
+    wants_list = bool(words & LIST_WORDS)
+    wants_aggregation = bool(words & AGGREGATION_WORDS)
+    wants_comparison = bool(words & COMPARISON_WORDS)
+
+    plan = {"entities": entities, "filters": {"contract_id": None}, "source": "rules"}
+
+    # 1. Varios contratos explícitos: agregación/comparación con una sub-query por contrato
+    if len(contract_ids) >= 2:
+        plan.update(
+            query_type="COMPARISON" if wants_comparison else "AGGREGATION",
+            intent="multi_contract",
+            complexity="aggregation",
+            search_strategy="MULTI_DOC",
+            sub_queries=_per_contract_subqueries(query, contract_ids),
+        )
+        return _finalize(plan, query)
+
+    # 2. Un contrato explícito sin agregación: dato puntual filtrado
+    if len(contract_ids) == 1 and not (wants_list or wants_aggregation or wants_comparison):
+        plan.update(
+            query_type="FACTUAL",
+            intent="single_contract_lookup",
+            complexity="simple",
+            search_strategy="SINGLE_DOC",
+        )
+        plan["filters"]["contract_id"] = contract_ids[0]
+        return _finalize(plan, query)
+
+    # 3. Listados exhaustivos sin entidades concretas
+    if not contract_ids and wants_list and not wants_comparison:
+        plan.update(
+            query_type="LIST",
+            intent="list_contracts",
+            complexity="aggregation",
+            search_strategy="EXHAUSTIVE_SCAN",
+        )
+        return _finalize(plan, query)
+
+    # 4. Búsqueda directa corta (CIF, fecha, importe, proveedor...)
+    if (not contract_ids and not (wants_aggregation or wants_comparison)
+            and not (words & MULTI_HOP_WORDS) and _router.classify(query) == "SIMPLE"):
+        plan.update(
+            query_type="FACTUAL",
+            intent="direct_lookup",
+            complexity="simple",
+            search_strategy="MULTI_DOC",
+        )
+        return _finalize(plan, query)
+
+    return None
+
+
+def _build_prompt(query: str) -> str:
+    return f"""Analiza la consulta para un sistema RAG de contratos de defensa y genera el plan completo en UNA respuesta.
+
+CONSULTA: "{query}"
+
+REGLAS:
+- contract_ids: solo códigos con formato XXX_YYYY_NNN (ej: CON_2024_001). Temas genéricos van en conceptos_clave.
+- complexity:
+  simple = dato específico de un solo contrato o entidad;
+  aggregation = sumar, comparar, listar o buscar datos de MÚLTIPLES entidades/contratos;
+  multi-hop = relacionar información de varias secciones o pasos encadenados.
+- sub_queries: si la consulta pide datos de MÚLTIPLES empresas o contratos, genera UNA SUB-QUERY ATÓMICA
+  Y ESPECÍFICA POR ENTIDAD (nunca genéricas como "dame info de contratos"). Para simple, una sola sub-query
+  con la consulta original. Usa "dependency" con los ids de los pasos previos si un paso necesita su resultado,
+  y el marcador {{N}} en su query donde vaya la entidad resuelta por el paso N (ej: "penalizaciones del contrato {{1}}").
+
+Ejemplo: "Suma los importes de Thales e Indra" ->
+  sub_queries: [{{"id": 1, "query": "importe total contrato adjudicado a Thales", "rationale": "Dato para Thales", "dependency": []}},
+                {{"id": 2, "query": "importe total contrato adjudicado a Indra", "rationale": "Dato para Indra", "dependency": []}}]
+
+FORMATO JSON:
+{{
+  "query_type": "FACTUAL" | "AGGREGATION" | "COMPARISON" | "TEMPORAL" | "LIST",
+  "intent": "descripción breve (ej: extract_amount)",
+  "complexity": "simple" | "aggregation" | "multi-hop",
+  "search_strategy": "SINGLE_DOC" | "MULTI_DOC" | "EXHAUSTIVE_SCAN",
+  "entities": {{"cifs": [], "contract_ids": [], "fechas": [], "normativas": [], "conceptos_clave": []}},
+  "filters": {{"contract_id": string o null, "year": numérico o null, "entidad": string o null}},
+  "sub_queries": [{{"id": 1, "query": "...", "rationale": "...", "dependency": []}}]
+}}"""
+
+
+def classify_llm(query: str) -> Dict:
+    """Una sola llamada LLM estructurada para queries ambiguas (con fallback seguro)."""
+    from src.utils.llm_gateway import get_llm_gateway
+
+    contract_ids = _ordered_contract_ids(query)
+    try:
+        response = get_llm_gateway().chat(
+            [
+                {"role": "system", "content": "Eres un experto en análisis de consultas para un sistema RAG de contratos de defensa. Tu salida es JSON puro."},
+                {"role": "user", "content": _build_prompt(query)}
+            ],
+            model=MODEL_FAST,
+            temperature=0.0,
+            response_format={"type": "json_object"}
+        )
+        data = json.loads(response.choices[0].message.content)
+    except Exception as e:
+        logger.error(f"Error en Query Understanding (LLM): {e}")
+        data = {}
+
+    complexity = str(data.get("complexity", "multi-hop")).lower()
+    if complexity not in ("simple", "aggregation", "multi-hop"):
+        complexity = "multi-hop"
+
+    entities = data.get("entities") or {}
+    # Prioridad regex para exactitud en entidades
+    entities["cifs"] = sorted(set(entities.get("cifs") or []) | set(extract_cifs(query)))
+    llm_ids = [normalize_contract_id(c) for c in entities.get("contract_ids") or []]
+    entities["contract_ids"] = list(dict.fromkeys(contract_ids + [c for c in llm_ids if c]))
+
+    filters = data.get("filters") or {}
+    filter_id = normalize_contract_id(str(filters.get("contract_id") or ""))
+    filters["contract_id"] = filter_id
+
+    query_type = data.get("query_type", "GENERAL")
+    if query_type == "COMPARISON":
+        # Evitar filtro único si la intención es comparar
+        filters["contract_id"] = None
+
+    sub_queries = [
+        _subquery(step.get("id", i), step.get("query") or query, step.get("rationale", ""), step.get("dependency"))
+        for i, step in enumerate(data.get("sub_queries") or [], start=1)
+        if isinstance(step, dict)
+    ]
+    if complexity == "simple":
+        sub_queries = [_subquery(1, query, "Consulta directa")]
+
+    plan = {
+        "query_type": query_type,
+        "intent": data.get("intent", "search"),
+        "complexity": complexity,
+        "search_strategy": data.get("search_strategy", "MULTI_DOC"),
+        "entities": entities,
+        "filters": filters,
+        "sub_queries": sub_queries,
+        "source": "llm" if data else "fallback",
+    }
+    return _finalize(plan, query)
+
+
+def understand_query(query: str) -> Dict:
+    """
+    Plan de la query (memoizado por query normalizada).
+
+    Returns:
+        Dict con query_type, intent, complexity (simple | aggregation | multi-hop),
+        router_complexity (SIMPLE | MEDIUM | COMPLEX), search_strategy, entities,
+        filters, top_k, use_reranker, is_complex, sub_queries y source (rules | llm | fallback).
+    """
+    key = normalize_query(query)
+    with _plan_lock:
+        cached = _plan_cache.get(key)
+        if cached is not None:
+            _plan_cache.move_to_end(key)
+            return copy.deepcopy(cached)
+
+    plan = classify_deterministic(query) or classify_llm(query)
+    logger.info(
+        f"🧠 Query Understanding ({plan['source']}): {plan['query_type']} | {plan['complexity']} | "
+        f"top_k={plan['top_k']} | {len(plan['sub_queries'])} sub-queries"
+    )
+
+    # Los fallbacks por error del LLM no se memoizan (se reintentará en la próxima llamada)
+    if plan["source"] != "fallback":
+        with _plan_lock:
+            _plan_cache[key] = plan
+            while len(_plan_cache) > PLAN_CACHE_SIZE:
+                _plan_cache.popitem(last=False)
+    return copy.deepcopy(plan)
@@ -17,9 +17,12 @@ import sys
 
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
-from src.config import EXTRACTOR_PROMPT, RESPONDER_PROMPT, CONDENSED_QUESTION_PROMPT, MODEL_CHATBOT
+from src.config import (
+    EXTRACTOR_PROMPT, RESPONDER_PROMPT, CONDENSED_QUESTION_PROMPT, MODEL_CHATBOT, RETRIEVAL_CACHE_ENABLED,
+    CONTEXT_EXPANSION_ENABLED, CONTEXT_EXPANSION_TOP_N, CONTRACT_FACTS_ENABLED, MODEL_FAST
+)
 from src.utils.vectorstore import is_vectorstore_initialized
-from src.utils.hybrid_search import hybrid_search  # ÚNICO MOTOR DE BÚSQUEDA
+from src.utils.hybrid_search import hybrid_search, hybrid_search_with_mode  # ÚNICO MOTOR DE BÚSQUEDA
 from src.utils.reranker import rerank_chunks
 from src.utils.llm_config import generate_response, is_model_available, generate_response_stream
 from src.utils.deterministic_extractor import (
@@ -28,10 +31,15 @@ from src.utils.deterministic_extractor import (
     contains_exact_amount, extract_final_execution_date
 )
 from src.agents.query_router import QueryRouter
-from src.utils.answer_validator import validate_answer
+from src.agents.query_understanding import understand_query
+from src.utils.answer_validator import validate_answer, StreamingValidator
 from src.utils.confidence_scorer import calculate_confidence
-from src.utils.citation_engine import generate_cited_answer
+from src.utils.citation_engine import generate_cited_answer, CitationEngine, CITATION_MODEL, CITATION_RE
 from src.utils.observability import get_observer
+from src.utils.context_expansion import expand_context
+from src.utils.context_packer import pack_context
+from src.utils.retrieval_cache import get_retrieval_cache, make_retrieval_key
+from src.utils.contract_facts import answer_fact_query, answer_field_lookup
 
 logger = logging.getLogger(__name__)
 
@@ -98,35 +106,6 @@ def dynamic_top_k(query: str, query_type: str) -> int:
     """
     query_lower = query.lower()
     
-    # [Fase 3: Query Understanding Layer]
-    # Analizamos la query para determinar estrategia
-    from src.agents.query_analyzer import QueryAnalyzer
-    
-    analyzer = QueryAnalyzer()
-    logger.info(f"🧠 Analizando query: '{query}'...")
-    query_plan = analyzer.analyze(query)
-    
-    # 1. Ajuste de Top-K basado en Plan
-    k = 30 # Default
-    if query_plan.get("search_strategy") == "EXHAUSTIVE_SCAN" or query_plan.get("query_type") == "LIST":
-         k = 50
-         logger.info(f"🚀 Modo Exhaustivo Activado (k={k}) por Query Plan")
-    elif query_plan.get("search_strategy") == "SINGLE_DOC":
-         k = 15 # Optimización para dato puntual
-         logger.info(f"⚡ Modo Single Doc Activado (k={k})")
-
-    # 2. Extracción de filtros de metadatos del plan
-    filter_metadata = None  # Ensure it is initialized
-    plan_contracts = query_plan.get("entities", {}).get("contract_ids", [])
-    
-    if plan_contracts:
-        # Si hay un contrato explícito, filtramos
-        # Priorizamos el primero si hay varios y es SINGLE_DOC, o usamos lógica OR si soportada
-        contract_id = plan_contracts[0] 
-        filter_metadata = {"num_contrato": contract_id}
-        logger.info(f"🎯 Filtro Metadata Activado: {contract_id}")
-
-    
     # Detectar queries de precisión
     if any(kw in query_lower for kw in ["exacto", "específico", "preciso", "cuál es el"]):
         return 10
@@ -194,64 +173,6 @@ def load_metadata_context() -> str:
         return "Error cargando información de contratos."
 
 
-def expand_context(chunks: List[Dict]) -> List[Dict]:
-    """
-    CONTEXT EXPANSION: Recupera chunks adyacentes (anterior/posterior) para más contexto.
-    Esto ayuda a capturar información que pueda estar fragmentada entre chunks.
-    """
-    from src.utils.vectorstore import search
-    
-    expanded = []
-    seen_indices = set()
-    
-    for chunk in chunks:
-        metadata = chunk.get("metadata", {})
-        archivo = metadata.get("archivo") or metadata.get("source")
-        chunk_idx = metadata.get("chunk_index", 0)
-        
-        # Añadir chunk original
-        key = f"{archivo}_{chunk_idx}"
-        if key not in seen_indices:
-            seen_indices.add(key)
-            expanded.append(chunk)
-        
-        # Intentar recuperar chunk anterior (chunk_index - 1)
-        if chunk_idx > 0:
-            try:
-                prev_results = search(
-                    query="",  # No importa, buscaremos por metadata
-                    top_k=50,
-                    filter_metadata={"archivo": archivo, "chunk_index": chunk_idx - 1}
-                )
-                if prev_results:
-                    prev_chunk = prev_results[0]
-                    prev_key = f"{archivo}_{chunk_idx - 1}"
-                    if prev_key not in seen_indices:
-                        seen_indices.add(prev_key)
-                        # Insertar ANTES del chunk actual
-                        expanded.insert(len(expanded) - 1, prev_chunk)
-            except:
-                pass  # Silently fail, no es crítico
-        
-        # Intentar recuperar chunk posterior (chunk_index + 1)
-        try:
-            next_results = search(
-                query="",
-                top_k=50,
-                filter_metadata={"archivo": archivo, "chunk_index": chunk_idx + 1}
-            )
-            if next_results:
-                next_chunk = next_results[0]
-                next_key = f"{archivo}_{chunk_idx + 1}"
-                if next_key not in seen_indices:
-                    seen_indices.add(next_key)
-                    expanded.append(next_chunk)
-        except:
-            pass
-    
-    return expanded if expanded else chunks  # Fallback al original si falla
-
-
 def format_context_from_chunks(chunks: List[Dict]) -> Tuple[str, Dict[str, str]]:
     """Formatea chunks recuperados como contexto para el LLM con mapeo de fuentes."""
     if not chunks:
@@ -283,9 +204,8 @@ def format_context_from_chunks(chunks: List[Dict]) -> Tuple[str, Dict[str, str]]
         if metadata.get("seccion"):
             header += f" | Sección: {metadata['seccion']}"
         
-        # Contenido limitado
-        contenido = chunk['contenido'][:1200] + "..." if len(chunk['contenido']) > 1200 else chunk['contenido']
-        context_parts.append(f"{header}\n{contenido}")
+        # Contenido completo: el tamaño total lo acota pack_context (presupuesto de tokens)
+        context_parts.append(f"{header}\n{chunk['contenido']}")
     
     return "\n\n---\n\n".join(context_parts), source_map
 
@@ -447,25 +367,111 @@ def contextualize_query(query: str, history: List[Dict]) -> str:
 
 
 
-def retrieve_and_generate(query: str, history: List[Dict] = None, use_citations: bool = True) -> Dict:
+def _hybrid_and_rerank(query: str, top_k: int, filter_metadata: Optional[Dict],
+                       use_reranker: bool) -> Tuple[List[Dict], bool]:
     """
-    Ejecuta el flujo RAG completo con BÚSQUEDA HÍBRIDA FORZADA.
+    Búsqueda híbrida + re-ranking condicional (sin caché).
     
-    Args:
-        query: Pregunta del usuario.
-        history: Historial de conversación (opcional).
+    Returns:
+        (chunks, degraded): degraded si una rama de la híbrida cayó o el re-ranking falló
+    """
+    chunks, mode = hybrid_search_with_mode(query, top_k=top_k, filter_metadata=filter_metadata)
+    degraded = mode != "ok"
+    
+    # 3. Smart Re-ranking Depth (Condicional por Router)
+    if use_reranker:
+        rerank_limit = top_k # Re-rankeamos todo lo traído si el router dice que es complejo
+        
+        # Optimización extra si es muy masivo
+        if rerank_limit > 30:
+            rerank_limit = 30 # Cap safety
+            
+        chunks_to_rank = chunks[:rerank_limit]
+        logger.info(f"🎯 Re-ranking ACTIVADO por Router ({len(chunks_to_rank)} chunks)...")
+        
+        try:
+            chunks = rerank_chunks(query, chunks_to_rank, top_k=min(30, len(chunks_to_rank)), strict=True)
+        except Exception as e:
+            logger.error(f"Re-ranking falló: {e}, usando orden original")
+            chunks = chunks[:30]
+            degraded = True
+    else:
+        logger.info("⏩ Re-ranking DESACTIVADO por Router (Modo Rápido)")
+        chunks = chunks[:top_k]
+    
+    return chunks, degraded
+
+
+def retrieve_ranked_chunks(query: str, top_k: int, filter_metadata: Optional[Dict] = None,
+                           use_reranker: bool = True) -> Tuple[List[Dict], bool]:
+    """
+    Etapa de retrieval completa (híbrida + rerank) con caché de resultados.
     
     Returns:
-        Dict: Respuesta con metadatos.
+        (chunks, cache_hit)
     """
-    result = {
-        "query": query,
-        "response": "",
-        "sources": [],
-        "warnings": [],
-        "success": True
-    }
+    if not RETRIEVAL_CACHE_ENABLED:
+        return _hybrid_and_rerank(query, top_k, filter_metadata, use_reranker)[0], False
+    
+    cache = get_retrieval_cache()
+    key = make_retrieval_key(query, filter_metadata, top_k, use_reranker=use_reranker)
+    
+    cached = cache.get(key)
+    if cached is not None:
+        logger.info(f"⚡ Retrieval cache HIT ({len(cached)} chunks) - sin embedding, ChromaDB, BM25 ni reranker")
+        return cached, True
+    
+    chunks, degraded = _hybrid_and_rerank(query, top_k, filter_metadata, use_reranker)
+    # Un ranking degradado (rama caída o sin re-ranking) no se sirve durante todo el TTL
+    if chunks and not degraded:
+        cache.set(key, chunks)
+    elif degraded:
+        logger.warning("⚠️ Retrieval degradado: resultado no cacheado")
+    return chunks, False
+
+
+def answer_from_facts(query: str, facts: Dict, history: List[Dict] = None) -> Tuple[str, List[Dict]]:
+    """
+    Respuesta a partir de la tabla de hechos por contrato: los valores (orden, sumas,
+    conteos, fechas) ya están calculados de forma exacta; el LLM solo redacta.
     
+    Returns:
+        (respuesta, fuentes)
+    """
+    historial_str = format_conversation_history(history or [], max_messages=4)
+    prompt = f"""Actúas como PERITO JUDICIAL que redacta la respuesta a una consulta sobre contratos de defensa.
+
+PREGUNTA: {query}
+
+HECHOS EXACTOS (tabla de contratos; sumas, conteos y orden YA CALCULADOS):
+{facts["text"]}
+
+HISTORIAL DE CONVERSACIÓN:
+{historial_str}
+
+INSTRUCCIONES:
+1. Usa SOLO estos hechos. NO recalcules sumas ni reordenes: cópialos literalmente.
+2. Presenta los datos relevantes en TABLA MARKDOWN (omite columnas que no aporten a la pregunta).
+3. Si la tabla está vacía, indica que ningún contrato cumple la condición.
+4. Sé directo y profesional.
+
+RESPUESTA:"""
+    answer = generate_response(prompt, max_tokens=2048, temperature=0.0, model=MODEL_FAST)
+    sources = [
+        {"contrato": row["num_contrato"], "seccion": "Metadata Global", "archivo": row.get("archivo") or "N/A"}
+        for row in facts["rows"]
+    ]
+    return answer, sources
+
+
+def _answer_without_retrieval(query: str, history: List[Dict], result: Dict) -> bool:
+    """
+    Respuestas que no pasan por retrieval + generación: saludo, ayuda, lookup
+    directo de un campo, comprobaciones de disponibilidad y tabla de hechos.
+    
+    Returns:
+        True si `result` ya contiene la respuesta final (o el error).
+    """
     # Clasificar query
     query_type = classify_query(query)
     logger.info(f"Tipo de query: {query_type}")
@@ -473,7 +479,7 @@ def retrieve_and_generate(query: str, history: List[Dict] = None, use_citations:
     # Respuestas rápidas
     if query_type == 'GREETING':
         result["response"] = "¡Hola! 👋 Soy DefenseBot, tu asistente para consultas de contratos de defensa. ¿En qué puedo ayudarte hoy?"
-        return result
+        return True
     
     if query_type == 'HELP':
         result["response"] = ("¡Por supuesto! Puedo ayudarte con:\n\n"
@@ -486,149 +492,351 @@ def retrieve_and_generate(query: str, history: List[Dict] = None, use_citations:
                               "- ¿Cuál es el contrato de mayor importe?\n"
                               "- ¿Qué contratos vencen pronto?\n"
                               "- ¿Qué avales tiene el contrato CON_2024_001?")
-        return result
+        return True
+    
+    # ============================================
+    # LOOKUP DIRECTO: un campo de un contrato (sin LLM ni retrieval, cita determinista)
+    # ============================================
+    if CONTRACT_FACTS_ENABLED:
+        import time
+        start_lookup = time.time()
+        lookup = answer_field_lookup(query)
+        if lookup:
+            result["response"] = lookup["text"]
+            result["sources"] = [{
+                "contrato": lookup["contract"],
+                "seccion": lookup["seccion"] or "General",
+                "archivo": lookup["archivo"] or "N/A",
+                "pagina": lookup["pagina"],
+                "chunk_id": lookup["chunk_id"]
+            }]
+            result["fast_path"] = {"field": lookup["field"], "chunk_id": lookup["chunk_id"]}
+            result["confidence"] = {"confidence": 100, "recommendation": "Dato extraído en ingesta (lookup directo)"}
+            try:
+                latency_total = time.time() - start_lookup
+                get_observer().log_query(
+                    query=query,
+                    answer=result["response"],
+                    metadata={
+                        "latency_total": latency_total,
+                        "latency_retrieval": latency_total,
+                        "latency_generation": 0.0,
+                        "latency_validation": 0.0,
+                        "chunks_retrieved": 1,
+                        "confidence": 100,
+                        "validation_passed": True,
+                        "model_used": "none",
+                        "fast_path_field": lookup["field"]
+                    }
+                )
+            except Exception as obs_e:
+                logger.error(f"Error logging observability: {obs_e}")
+            return True
     
     # Validaciones
     if not is_vectorstore_initialized():
         result["response"] = "No hay documentos cargados. Ejecuta: python src/ingest_contracts.py"
         result["success"] = False
-        return result
+        return True
     
     if not is_model_available():
         result["response"] = "El modelo de IA no está disponible."
         result["success"] = False
-        return result
+        return True
     
     try:
         import time
-        start_retrieval = time.time()
+        start_facts = time.time()
         
         # ============================================
-        # BÚSQUEDA HÍBRIDA FORZADA (BM25 + Vector)
+        # TABLA DE HECHOS: orden, sumas, conteos y vencimientos exactos (sin retrieval)
         # ============================================
-        logger.info("🔍 Ejecutando BÚSQUEDA HÍBRIDA (BM25 + Vector)...")
-        
-        # [Fase 2: Smart Routing]
-        # Clasificar y obtener configuración
-        router = QueryRouter()
-        complexity = router.classify(query)
-        config = router.get_config(complexity)
-        
-        logger.info(f"🧠 Smart Routing: Query clasificada como '{complexity}'")
-        logger.info(f"⚙️ Configuración: {config}")
-
-        # 1. Ajuste de Top-K basado en Router
-        top_k = config["top_k"]
-
-        # [Fase 3: Query Understanding Layer - Compatibility]
-        # Mantener QueryAnalyzer para intenciones específicas (como LIST/EXHAUSTIVE/SINGLE_DOC)
-        # Si QueryAnalyzer pide más chunks que el Router, respetamos el mayor (safety fallback)
-        from src.agents.query_analyzer import QueryAnalyzer
-        analyzer = QueryAnalyzer()
-        query_plan = analyzer.analyze(query)
-        
-        if query_plan.get("search_strategy") == "EXHAUSTIVE_SCAN" or query_plan.get("query_type") == "LIST":
-             if top_k < 50:
-                 top_k = 50
-                 logger.info(f"🚀 Override: Modo Exhaustivo Activado (k={top_k}) por Query Plan")
-        elif query_plan.get("search_strategy") == "SINGLE_DOC":
-             # Si es Single Doc, el Router probablemente ya dijo SIMPLE/MEDIUM (5-15), así que está bien.
-             pass
-
-        logger.info(f"📊 Top-K final: {top_k} chunks")
-        
-        # 2. Extracción de filtros de metadatos del plan
-        
-        # 2. Extracción de filtros de metadatos del plan
-        filter_metadata = None
-        plan_contracts = query_plan.get("entities", {}).get("contract_ids", [])
-        
-        if plan_contracts:
-            contract_id = plan_contracts[0] 
-            filter_metadata = {"num_contrato": contract_id}
-            logger.info(f"🎯 Filtro Metadata Activado (Analyzer): {contract_id}")
-        
-        # Metadata Filtering ya se determinó arriba con el Query Analyzer
-        # Si falló el Analyzer, fallback a extracción regex simple (ya integrado en Analyzer pero por seguridad)
-        if not filter_metadata:
-             contract_id = extract_contract_id(query)
-             if contract_id:
-                 filter_metadata = {"num_contrato": contract_id}
-                 logger.info(f"🎯 Filtrando por contrato: {contract_id}")
-
-        # [CUSTOM LOGIC: Aggregative Queries (User Request)]
-        # Detectar queries agregativas (que piden "todos", "lista completa", etc)
-        is_aggregative = any(keyword in query.lower() for keyword in [
-            "todos", "todas", "completa", "total", "suma", "lista"
-        ])
-        
-        if is_aggregative:
-            # Ajustar k dinámicamente si es menor (para no reducir si ya era alto por alguna razón)
-            if top_k < 50:
-                top_k = 50
-            logger.info(f"🚀 Query tipo: AGREGATIVA (k={top_k}) - Override activado")
-        else:
-            logger.info(f"ℹ️ Query tipo: ESPECÍFICA (k={top_k})")
+        facts = answer_fact_query(query) if CONTRACT_FACTS_ENABLED else None
+        if facts:
+            result["response"], result["sources"] = answer_from_facts(query, facts, history)
+            result["facts"] = {"intent": facts["intent"], "field": facts["field"], "contracts": len(facts["rows"])}
+            try:
+                latency_total = time.time() - start_facts
+                get_observer().log_query(
+                    query=query,
+                    answer=result["response"],
+                    metadata={
+                        "latency_total": latency_total,
+                        "latency_retrieval": 0.0,
+                        "latency_generation": latency_total,
+                        "latency_validation": 0.0,
+                        "chunks_retrieved": 0,
+                        "confidence": 100,
+                        "validation_passed": True,
+                        "model_used": MODEL_FAST,
+                        "facts_intent": facts["intent"]
+                    }
+                )
+            except Exception as obs_e:
+                logger.error(f"Error logging observability: {obs_e}")
+            return True
+    except Exception as e:
+        logger.error(f"Error en RAG: {e}")
+        result["response"] = f"Error procesando la consulta: {str(e)}"
+        result["success"] = False
+        return True
+    
+    return False
 
+
+def _retrieve_for_answer(query: str, start: float) -> Dict:
+    """
+    Retrieval completo (query understanding, híbrida + rerank, expansión de contexto)
+    y contexto formateado. Común a retrieve_and_generate y a su variante streaming.
+    
+    Returns:
+        Dict con chunks, sources, cache_hit, retrieval_time, config, contract_id,
+        context y source_map.
+    """
+    import time
+    sources = []
+    
+    # ============================================
+    # BÚSQUEDA HÍBRIDA FORZADA (BM25 + Vector)
+    # ============================================
+    logger.info("🔍 Ejecutando BÚSQUEDA HÍBRIDA (BM25 + Vector)...")
+    
+    # [Fase 2+3: Query Understanding en una sola pasada]
+    # Reglas deterministas (IDs, entidades, keywords) y LLM solo si es ambiguo; memoizado por query
+    query_plan = understand_query(query)
+    complexity = query_plan["router_complexity"]
+    config = QueryRouter().get_config(complexity)
+    
+    logger.info(f"🧠 Smart Routing: Query clasificada como '{complexity}' ({query_plan['source']})")
+    logger.info(f"⚙️ Configuración: {config}")
+
+    # 1. Top-K del plan (ya incluye el override exhaustivo para LIST/AGGREGATION)
+    top_k = query_plan["top_k"]
+    logger.info(f"📊 Top-K final: {top_k} chunks")
+    
+    # 2. Filtro de metadatos del plan (solo con un único contrato identificado)
+    filter_metadata = None
+    plan_contracts = query_plan["entities"].get("contract_ids", [])
+    contract_id = query_plan["filters"].get("contract_id") or (plan_contracts[0] if len(plan_contracts) == 1 else None)
+    
+    if contract_id:
+        filter_metadata = {"num_contrato": contract_id}
+        logger.info(f"🎯 Filtro Metadata Activado (Query Understanding): {contract_id}")
+
+    # [CUSTOM LOGIC: Aggregative Queries (User Request)]
+    # Detectar queries agregativas (que piden "todos", "lista completa", etc)
+    is_aggregative = any(keyword in query.lower() for keyword in [
+        "todos", "todas", "completa", "total", "suma", "lista"
+    ])
+    
+    if is_aggregative:
+        # Ajustar k dinámicamente si es menor (para no reducir si ya era alto por alguna razón)
+        if top_k < 50:
+            top_k = 50
+        logger.info(f"🚀 Query tipo: AGREGATIVA (k={top_k}) - Override activado")
+    else:
+        logger.info(f"ℹ️ Query tipo: ESPECÍFICA (k={top_k})")
+
+    
+    chunks, cache_hit = retrieve_ranked_chunks(query, top_k, filter_metadata, use_reranker=config["use_reranker"])
+    
+    retrieval_time = time.time() - start
+    logger.info(f"⏱️ Retrieval completado en {retrieval_time:.2f}s - {len(chunks)} chunks")
+    
+    # Extraer fuentes
+    for chunk in chunks:
+        meta = chunk.get("metadata", {})
+        source = {
+            "contrato": meta.get("num_contrato", "N/A"),
+            "seccion": meta.get("seccion", "General"),
+            "archivo": meta.get("archivo", "N/A")
+        }
+        if source not in sources:
+            sources.append(source)
+    
+    # Context expansion: vecinos de los top-N en una sola lectura + ventanas contiguas
+    if chunks and CONTEXT_EXPANSION_ENABLED:
+        chunks = expand_context(chunks, expand_top_n=CONTEXT_EXPANSION_TOP_N)
+    
+    # Presupuesto de tokens del prompt: relevancia por token con tope por documento
+    # (el análisis de densidad de fechas sigue viendo todos los candidatos)
+    candidates = chunks
+    chunks = pack_context(candidates)
+    
+    # Formatear contexto
+    if chunks:
+        context, source_map = format_context_from_chunks(chunks)
         
-        chunks = hybrid_search(query, top_k=top_k, filter_metadata=filter_metadata)
-        
-        # 3. Smart Re-ranking Depth (Condicional por Router)
-        chunks_to_rank = []
-        if config["use_reranker"]:
-            rerank_limit = top_k # Re-rankeamos todo lo traído si el router dice que es complejo
-            
-            # Optimización extra si es muy masivo
-            if rerank_limit > 30:
-                rerank_limit = 30 # Cap safety
-                
-            chunks_to_rank = chunks[:rerank_limit]
-            logger.info(f"🎯 Re-ranking ACTIVADO por Router ({len(chunks_to_rank)} chunks)...")
-            
+        # --- FIX EDGE_04: Análisis de Densidad de Fechas ---
+        # Si la query pregunta por densidad o cantidad de fechas, hacemos análisis exhaustivo
+        density_keywords = ["densidad", "mayor número de fechas", "más fechas", "más hitos", "cantidad de fechas", "cuántas fechas"]
+        if any(k in query.lower() for k in density_keywords):
+            logger.info("📅 Detectada query de densidad de fechas. Ejecutando análisis exhaustivo (EDGE_04)...")
             try:
-                chunks = rerank_chunks(query, chunks_to_rank, top_k=min(30, len(chunks_to_rank)))
+                density_report = analyze_date_density(candidates)
+                if density_report:
+                    context += f"\n\n{density_report}"
+                    logger.info("✅ Reporte de densidad inyectado en contexto.")
             except Exception as e:
-                logger.error(f"Re-ranking falló: {e}, usando orden original")
-                chunks = chunks[:30]
-        else:
-            logger.info("⏩ Re-ranking DESACTIVADO por Router (Modo Rápido)")
-            chunks = chunks[:top_k]
-        
-        retrieval_time = time.time() - start_retrieval
-        logger.info(f"⏱️ Retrieval completado en {retrieval_time:.2f}s - {len(chunks)} chunks")
-        
-        # Extraer fuentes
-        for chunk in chunks:
-            meta = chunk.get("metadata", {})
-            source = {
-                "contrato": meta.get("num_contrato", "N/A"),
-                "seccion": meta.get("seccion", "General"),
-                "archivo": meta.get("archivo", "N/A")
-            }
-            if source not in result["sources"]:
-                result["sources"].append(source)
+                logger.error(f"Error en análisis de densidad: {e}")
+        # ---------------------------------------------------
         
-        # Formatear contexto (SIN context expansion por ahora, tiene bugs)
-        if chunks:
-            context, source_map = format_context_from_chunks(chunks)
+    else:
+        context = "No se encontraron documentos relevantes."
+        source_map = {}
+    
+    return {
+        "chunks": chunks,
+        "sources": sources,
+        "cache_hit": cache_hit,
+        "retrieval_time": retrieval_time,
+        "config": config,
+        "contract_id": contract_id,
+        "context": context,
+        "source_map": source_map
+    }
+
+
+def _validate_and_score(query: str, final_response: str, chunks: List[Dict], result: Dict,
+                        validation: Optional[Dict] = None) -> None:
+    """
+    Validación multi-capa, confidence score y validación básica sobre la respuesta
+    final. Rellena validation, confidence, response y warnings de `result`.
+    Si `validation` llega ya calculada (streaming) no se repite.
+    """
+    # [Fase 3.2: Verificador Post-Generación]
+    # Cross-Check respuesta vs chunks
+    warnings = []
+    
+    # ⭐ VALIDACIÓN MULTI-CAPA ⭐
+    try:
+        if validation is None:
+            validation = validate_answer(final_response, query, chunks)
+        result["validation"] = validation
+        
+        if not validation["overall_valid"]:
+            logger.warning(f"🚨 Respuesta falló validación: {validation['recommendation']}")
+            warnings.append(f"⚠️ CALIDAD: {validation['recommendation']}")
             
-            # --- FIX EDGE_04: Análisis de Densidad de Fechas ---
-            # Si la query pregunta por densidad o cantidad de fechas, hacemos análisis exhaustivo
-            density_keywords = ["densidad", "mayor número de fechas", "más fechas", "más hitos", "cantidad de fechas", "cuántas fechas"]
-            if any(k in query.lower() for k in density_keywords):
-                logger.info("📅 Detectada query de densidad de fechas. Ejecutando análisis exhaustivo (EDGE_04)...")
-                try:
-                    density_report = analyze_date_density(chunks)
-                    if density_report:
-                        context += f"\n\n{density_report}"
-                        logger.info("✅ Reporte de densidad inyectado en contexto.")
-                except Exception as e:
-                    logger.error(f"Error en análisis de densidad: {e}")
-            # ---------------------------------------------------
+            if not validation["numerical"]["valid"]:
+                warnings.append("🚨 ERROR CRÍTICO: La respuesta contiene números no encontrados en los documentos originales.")
+    except Exception as v_e:
+        logger.error(f"Error en validador: {v_e}")
+        result["validation"] = {"valid": True, "error": str(v_e)} # Fallback safe
+        validation = result["validation"]
+
+    # ⭐ CONFIDENCE SCORING ⭐
+    try:
+        # Preparar tuplas (chunk, score)
+        # Como hybrid_search devuelve dicts, simulamos score 0.8 si viene de vector, 0.6 de BM25 o 0.5 default
+        chunks_with_scores = []
+        for c in chunks:
+            # Intenta sacar score de metadatos (final_score es el bueno de hybrid search)
+            meta = c.get("metadata", {})
+            s = meta.get("final_score") or meta.get("score") or 0.7
+            chunks_with_scores.append((c, s))
+        
+        confidence = calculate_confidence(
+            answer=final_response,
+            query=query,
+            chunks_with_scores=chunks_with_scores,
+            validation_result=validation
+        )
+        result["confidence"] = confidence
+        logger.info(f"📊 Confidence Score: {confidence['confidence']}%")
+    except Exception as c_e:
+        logger.error(f"Error en confidence scorer: {c_e}")
+        result["confidence"] = {"confidence": 0, "recommendation": "Error cálculo"}
+
+
+    # Validación básica antigua (mantener por compatibilidad)
+    validated_response, old_warnings = validate_response(final_response, chunks)
+    warnings.extend(old_warnings)
+    
+    result["response"] = validated_response
+    result["warnings"] = warnings
+
+
+def _log_answer_metrics(query: str, final_response: str, chunks: List[Dict], result: Dict, selected_model: str,
+                        start_retrieval: float, retrieval_time: float, cache_hit: bool, **extra) -> None:
+    """Registra latencias, coste estimado y calidad de la respuesta en observabilidad."""
+    import time
+    # --- OBSERVABILITY METRICS ---
+    try:
+        latency_total = time.time() - start_retrieval
+        
+        # Estimación simple de latencias parciales (Mejora: usar timers específicos arriba)
+        # Asumimos que la retrieval tomó 'retrieval_time' calculado antes
+        # Generation + Validation es el resto
+        
+        # Calcular coste aproximado
+        def _estimate_cost(txt_in, txt_out, model):
+            # Precios aprox GPT-4o
+            # Input: $2.50 / 1M tokens
+            # Output: $10.00 / 1M tokens
+            # 1 word ~= 1.3 tokens
+            in_tok = len(txt_in.split()) * 1.3
+            out_tok = len(txt_out.split()) * 1.3
             
-        else:
-            context = "No se encontraron documentos relevantes."
-            source_map = {}
+            c_in = (in_tok / 1_000_000) * 2.50
+            c_out = (out_tok / 1_000_000) * 10.00
+            return c_in + c_out
+
+        context_text = " ".join([c.get("contenido", "") for c in chunks])
+        cost_usd = _estimate_cost(context_text + query, final_response, selected_model)
+        
+        observer = get_observer()
+        observer.log_query(
+            query=query,
+            answer=final_response,
+            metadata={
+                "latency_total": latency_total,
+                "latency_retrieval": retrieval_time, 
+                "latency_generation": latency_total - retrieval_time - 0.5, # Approx
+                "latency_validation": 0.5, # Approx fijo por ahora
+                "chunks_retrieved": len(chunks),
+                "confidence": result.get("confidence", {}).get("confidence", 0),
+                "validation_passed": result.get("validation", {}).get("overall_valid", False),
+                "model_used": selected_model,
+                "retrieval_cache_hit": cache_hit,
+                "cost_usd": cost_usd,
+                **extra
+            }
+        )
+    except Exception as obs_e:
+        logger.error(f"Error logging observability: {obs_e}")
+
+
+def retrieve_and_generate(query: str, history: List[Dict] = None, use_citations: bool = True) -> Dict:
+    """
+    Ejecuta el flujo RAG completo con BÚSQUEDA HÍBRIDA FORZADA.
+    
+    Args:
+        query: Pregunta del usuario.
+        history: Historial de conversación (opcional).
+    
+    Returns:
+        Dict: Respuesta con metadatos.
+    """
+    result = {
+        "query": query,
+        "response": "",
+        "sources": [],
+        "warnings": [],
+        "success": True
+    }
+    
+    if _answer_without_retrieval(query, history, result):
+        return result
+    
+    try:
+        import time
+        start_retrieval = time.time()
+        
+        ctx = _retrieve_for_answer(query, start_retrieval)
+        chunks, context, source_map = ctx["chunks"], ctx["context"], ctx["source_map"]
+        config, contract_id = ctx["config"], ctx["contract_id"]
+        result["sources"] = ctx["sources"]
         
         # Generación con LLM
         from datetime import datetime
@@ -773,107 +981,103 @@ def retrieve_and_generate(query: str, history: List[Dict] = None, use_citations:
             final_response = response
 
         
-        # [Fase 3.2: Verificador Post-Generación]
-        # Cross-Check respuesta vs chunks
-        warnings = []
-        
-        # ⭐ VALIDACIÓN MULTI-CAPA ⭐
-        try:
-            validation = validate_answer(final_response, query, chunks)
-            result["validation"] = validation
-            
-            if not validation["overall_valid"]:
-                logger.warning(f"🚨 Respuesta falló validación: {validation['recommendation']}")
-                warnings.append(f"⚠️ CALIDAD: {validation['recommendation']}")
-                
-                if not validation["numerical"]["valid"]:
-                    warnings.append("🚨 ERROR CRÍTICO: La respuesta contiene números no encontrados en los documentos originales.")
-        except Exception as v_e:
-            logger.error(f"Error en validador: {v_e}")
-            result["validation"] = {"valid": True, "error": str(v_e)} # Fallback safe
-            validation = result["validation"]
-
-        # ⭐ CONFIDENCE SCORING ⭐
-        try:
-            # Preparar tuplas (chunk, score)
-            # Como hybrid_search devuelve dicts, simulamos score 0.8 si viene de vector, 0.6 de BM25 o 0.5 default
-            chunks_with_scores = []
-            for c in chunks:
-                # Intenta sacar score de metadatos (final_score es el bueno de hybrid search)
-                meta = c.get("metadata", {})
-                s = meta.get("final_score") or meta.get("score") or 0.7
-                chunks_with_scores.append((c, s))
-            
-            confidence = calculate_confidence(
-                answer=final_response,
-                query=query,
-                chunks_with_scores=chunks_with_scores,
-                validation_result=validation
-            )
-            result["confidence"] = confidence
-            logger.info(f"📊 Confidence Score: {confidence['confidence']}%")
-        except Exception as c_e:
-            logger.error(f"Error en confidence scorer: {c_e}")
-            result["confidence"] = {"confidence": 0, "recommendation": "Error cálculo"}
+        _validate_and_score(query, final_response, chunks, result)
+        _log_answer_metrics(query, final_response, chunks, result, selected_model,
+                            start_retrieval, ctx["retrieval_time"], ctx["cache_hit"])
 
+    except Exception as e:
+        logger.error(f"Error en RAG: {e}")
+        result["response"] = f"Error procesando la consulta: {str(e)}"
+        result["success"] = False
+    
+    return result
 
-        # Validación básica antigua (mantener por compatibilidad)
-        validated_response, old_warnings = validate_response(final_response, chunks)
-        warnings.extend(old_warnings)
-        
-        result["response"] = validated_response
-        result["warnings"] = warnings
 
-        # --- OBSERVABILITY METRICS ---
-        try:
-            latency_total = time.time() - start_retrieval
-            
-            # Estimación simple de latencias parciales (Mejora: usar timers específicos arriba)
-            # Asumimos que la retrieval tomó 'retrieval_time' calculado antes
-            # Generation + Validation es el resto
-            
-            # Calcular coste aproximado
-            def _estimate_cost(txt_in, txt_out, model):
-                # Precios aprox GPT-4o
-                # Input: $2.50 / 1M tokens
-                # Output: $10.00 / 1M tokens
-                # 1 word ~= 1.3 tokens
-                in_tok = len(txt_in.split()) * 1.3
-                out_tok = len(txt_out.split()) * 1.3
-                
-                c_in = (in_tok / 1_000_000) * 2.50
-                c_out = (out_tok / 1_000_000) * 10.00
-                return c_in + c_out
 
-            context_text = " ".join([c.get("contenido", "") for c in chunks])
-            cost_usd = _estimate_cost(context_text + query, final_response, selected_model)
-            
-            observer = get_observer()
-            observer.log_query(
-                query=query,
-                answer=final_response,
-                metadata={
-                    "latency_total": latency_total,
-                    "latency_retrieval": retrieval_time, 
-                    "latency_generation": latency_total - retrieval_time - 0.5, # Approx
-                    "latency_validation": 0.5, # Approx fijo por ahora
-                    "chunks_retrieved": len(chunks),
-                    "confidence": result.get("confidence", {}).get("confidence", 0),
-                    "validation_passed": result.get("validation", {}).get("overall_valid", False),
-                    "model_used": selected_model,
-                    "cost_usd": cost_usd
-                }
-            )
-        except Exception as obs_e:
-            logger.error(f"Error logging observability: {obs_e}")
+def _segment_events(checks: List[Dict], engine: CitationEngine, chunks_for_citation: List[Dict],
+                    cited: set) -> List[Dict]:
+    """Eventos de los segmentos ya cerrados del stream: cifras no verificadas y citas resueltas."""
+    events = []
+    for check in checks:
+        if check["violations"]:
+            events.append({"type": "violation", "segment": check["segment"], "violations": check["violations"]})
+        for name in CITATION_RE.findall(check["segment"]):
+            name = name.strip()
+            if name not in cited:
+                cited.add(name)
+                source = engine.resolve_source(name, chunks_for_citation) or {"archivo": name}
+                events.append({"type": "citation", "source": source})
+    return events
 
+
+def retrieve_and_generate_stream(query: str, history: List[Dict] = None) -> Iterator[Dict]:
+    """
+    Variante streaming de retrieve_and_generate con la misma calidad: query
+    understanding, filtro de metadata, rerank, expansión de contexto y prompt de
+    citación. Los tokens salen en cuanto el contexto está empaquetado; la
+    integridad numérica y la resolución de citas se hacen frase a frase sobre el
+    texto que llega, y la validación/confianza final llega como último evento.
+    
+    Yields:
+        {"type": "sources", "sources"}: fuentes recuperadas (antes del primer token)
+        {"type": "token", "text"}: fragmento de la respuesta
+        {"type": "citation", "source"}: documento citado, con los chunk_id que lo respaldan
+        {"type": "violation", "segment", "violations"}: cifra que no está en las fuentes
+        {"type": "final", "result"}: mismo dict que retrieve_and_generate
+    """
+    result = {
+        "query": query,
+        "response": "",
+        "sources": [],
+        "warnings": [],
+        "success": True
+    }
+    
+    if _answer_without_retrieval(query, history, result):
+        if result["response"]:
+            yield {"type": "token", "text": result["response"]}
+        yield {"type": "final", "result": result}
+        return
+    
+    try:
+        import time
+        start_retrieval = time.time()
+        
+        ctx = _retrieve_for_answer(query, start_retrieval)
+        chunks = ctx["chunks"]
+        result["sources"] = ctx["sources"]
+        yield {"type": "sources", "sources": ctx["sources"]}
+        
+        chunks_for_citation = [{"text": c.get("contenido", ""), "metadata": c.get("metadata", {})} for c in chunks]
+        engine = CitationEngine()
+        checker = StreamingValidator(query, chunks)
+        cited = set()
+        ttft = None
+        
+        for delta in engine.stream_with_citations(query, chunks_for_citation):
+            if ttft is None:
+                ttft = time.time() - start_retrieval
+                logger.info(f"⚡ TTFT (pipeline completo): {ttft:.2f}s")
+            yield {"type": "token", "text": delta}
+            yield from _segment_events(checker.feed(delta), engine, chunks_for_citation, cited)
+        yield from _segment_events(checker.flush(), engine, chunks_for_citation, cited)
+        
+        citation_result = engine.finalize(checker.text, chunks_for_citation)
+        final_response = citation_result["answer"]
+        result["sources"] = citation_result["sources"]
+        result["contradictions"] = citation_result["contradictions"]
+        
+        _validate_and_score(query, final_response, chunks, result, validation=checker.finalize())
+        _log_answer_metrics(query, final_response, chunks, result, CITATION_MODEL,
+                            start_retrieval, ctx["retrieval_time"], ctx["cache_hit"],
+                            streamed=True, ttft=ttft)
+    
     except Exception as e:
-        logger.error(f"Error en RAG: {e}")
+        logger.error(f"Error en RAG (streaming): {e}")
         result["response"] = f"Error procesando la consulta: {str(e)}"
         result["success"] = False
     
-    return result
-
+    yield {"type": "final", "result": result}
 
 
 def query_stream(query: str, history: List[Dict] = None) -> Iterator[str]:
@@ -881,11 +1085,12 @@ def query_stream(query: str, history: List[Dict] = None) -> Iterator[str]:
     Versión streaming del query.
     Yields tokens en tiempo real para UX instantánea.
     Optimizado para TTFT < 2s (Sin Reranking, Single-Step LLM).
+    Para streaming con rerank, validación y citas usar retrieve_and_generate_stream.
     """
     try:
         # 1. Hybrid Search (Rápido, sin Reranker pesado)
         # Optimizamos a top_k=10 para reducir TTFT (Search + Context Upload)
-        chunks = hybrid_search(query, top_k=10)
+        chunks = pack_context(hybrid_search(query, top_k=10))
         
         # 2. Build Prompt (Single Step para velocidad)
         if chunks:
@@ -945,6 +1150,22 @@ def chat(query: str, history: List[Dict] = None) -> Dict:
     elapsed_time = time.time() - start_time
     logger.info(f"⏱️ TIEMPO TOTAL RESPUESTA: {elapsed_time:.2f}s para query: '{query[:50]}...'")
     
+    return _finish_chat(result)
+
+
+def chat_stream(query: str, history: List[Dict] = None) -> Iterator[Dict]:
+    """
+    Como chat() pero en streaming (eventos de retrieve_and_generate_stream);
+    el evento final lleva el result ya con fuentes y warnings como chat().
+    """
+    for event in retrieve_and_generate_stream(query, history):
+        if event["type"] == "final":
+            event = {"type": "final", "result": _finish_chat(event["result"])}
+        yield event
+
+
+def _finish_chat(result: Dict) -> Dict:
+    """Warnings al log y lista de contratos fuente al pie de la respuesta."""
     response = result["response"]
     
     # Warnings solo en log
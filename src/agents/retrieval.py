@@ -1,33 +1,34 @@
 # -*- coding: utf-8 -*-
 """
-Retrieval Agent - Ejecuta sub-queries en paralelo y reporta hallazgos.
+Retrieval Agent - Ejecuta el DAG de sub-queries (por niveles, en lote) y reporta hallazgos.
 """
 
-import concurrent.futures
-from typing import List, Dict, Any
-from collections import defaultdict
+from typing import List, Dict, Set, Union
 
 from src.agents.base_agent import BaseAgent
-from src.graph.state import WorkflowState, SubQuery
-from src.utils.smart_retrieval import smart_hierarchical_retrieval
+from src.graph.state import WorkflowState
+from src.utils.smart_retrieval import smart_hierarchical_retrieval_batch
+from src.utils.chunk_identity import dedup_chunks, get_chunk_id
+from src.utils.speculative_retrieval import take_speculative, cancel_if_unused
+from src.utils.subquery_dag import run_subquery_dag
 
 
 class RetrievalAgent(BaseAgent):
     """
     Agent de recuperación que:
     1. Recibe lista de sub-queries del planner
-    2. Ejecuta búsquedas en paralelo (ThreadPool)
+    2. Las ejecuta por niveles de dependencia, cada nivel en lote
+       (embeddings, ChromaDB y BM25 compartidos)
     3. Genera reporte de hallazgos (Finding Report)
-    4. Acumula chunks en el estado
+    4. Acumula chunks en el estado (en los reintentos solo busca y añade chunks no vistos)
     """
     
-    def __init__(self, max_workers: int = 5):
+    def __init__(self):
         super().__init__(name="retrieval")
-        self.max_workers = max_workers
     
     def run(self, state: WorkflowState) -> WorkflowState:
         """
-        Ejecuta retrieval paralelo.
+        Ejecuta retrieval por niveles de dependencia (cada nivel en lote).
         """
         self.log_start(state)
         
@@ -42,64 +43,56 @@ class RetrievalAgent(BaseAgent):
                     "dependency": []
                 }]
             
-            self.logger.info(f"Iniciando retrieval paralelo para {len(sub_queries)} sub-queries...")
+            self.logger.info(f"Iniciando retrieval en lote para {len(sub_queries)} sub-queries...")
             
-            # Ejecutar en paralelo
+            # Retrieval especulativo: si ninguna sub-query lo aprovecha, se cancela ya
+            speculation_id = state.get("speculation_id")
+            cancel_if_unused(speculation_id, [sq["query"] for sq in sub_queries])
+            
+            # chunk_ids ya recuperados en iteraciones previas: se excluyen en el retrieval
+            seen_ids = set(state.get("seen_chunk_ids") or [])
             all_chunks = []
             finding_reports = {}
+            levels = []
             
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                # Mapear sub-query a futuro
-                future_to_sq = {
-                    executor.submit(self._execute_single_retrieval, sq): sq 
-                    for sq in sub_queries
-                }
-                
-                for future in concurrent.futures.as_completed(future_to_sq):
-                    sq = future_to_sq[future]
-                    try:
-                        chunks, report = future.result()
-                        all_chunks.extend(chunks)
-                        finding_reports[sq["id"]] = report
-                    except Exception as e:
-                        self.log_error(f"Error en sub-query {sq['id']}: {e}")
-                        finding_reports[sq["id"]] = {
-                            "status": "Error",
-                            "chunks_found": 0,
-                            "message": str(e)
-                        }
-            
-            # Deduplicar chunks (por contenido hash o ID si tuviéramos)
-            # Usamos contenido para deduplicar simple
-            unique_chunks = []
-            seen_content = set()
+            def on_level(level_idx: int, level_results: List[Dict]) -> None:
+                # Resultados parciales del nivel: se publican en cuanto están (stream "custom")
+                for result in level_results:
+                    sq = result["sub_query"]
+                    all_chunks.extend(result["chunks"])
+                    finding_reports[sq["id"]] = self._build_report(result["query"], result["chunks"], result["error"])
+                levels.append([result["sub_query"]["id"] for result in level_results])
+                self._emit_partial(level_idx, {r["sub_query"]["id"]: finding_reports[r["sub_query"]["id"]] for r in level_results})
             
-            for chunk in all_chunks:
-                content_hash = hash(chunk["contenido"])
-                if content_hash not in seen_content:
-                    seen_content.add(content_hash)
-                    unique_chunks.append(chunk)
+            # Niveles topológicos del DAG: cada nivel en UNA llamada en lote (un request
+            # de embeddings, una consulta multi-vector y una pasada de BM25), inyectando
+            # las entidades resueltas en los pasos dependientes
+            run_subquery_dag(
+                sub_queries,
+                lambda queries: self._retrieve_level(queries, speculation_id, seen_ids),
+                on_level=on_level
+            )
             
-            self.logger.info(f"Recuperados {len(unique_chunks)} chunks únicos totales")
+            # Deduplicar chunks por su ID estable (chunk_id de la ingesta)
+            new_chunks = [c for c in dedup_chunks(all_chunks) if get_chunk_id(c) not in seen_ids]
             
-            # Actualizar estado
-            # Nota: retrieved_chunks es Annotated[List, add], así que extendemos
-            # Pero para evitar duplicados con ejecuciones previas (si las hubiera), 
-            # podríamos querer reemplazar o filtrar.
-            # Dado el diseño de LangGraph state, retornamos la *diferencia* o el valor completo si es overwrite.
-            # En este caso state.py define 'retrieved_chunks: Annotated[List[Dict], add]'
-            # Si retornamos la lista, se agrega a la existente.
-            # Como este agent corre una vez por iteración (o en corrective), está bien agregar.
+            # Evidencia acumulada entre iteraciones del loop correctivo: lo ya visto se
+            # conserva y solo se añade el delta (que es lo que re-evalúa el auditor)
+            retrieved_chunks = list(state.get("retrieved_chunks") or []) + new_chunks
+            seen_ids.update(get_chunk_id(c) for c in new_chunks)
             
-            # REVISION: Si el grafo cicla, retrieved_chunks crecerá indefinidamente.
-            # Para Día 3, asumimos flujo lineal o controlado.
+            self.logger.info(f"Recuperados {len(new_chunks)} chunks nuevos ({len(retrieved_chunks)} acumulados)")
             
-            state["retrieved_chunks"] = unique_chunks
+            state["retrieved_chunks"] = retrieved_chunks
+            state["new_chunks"] = new_chunks
+            state["seen_chunk_ids"] = sorted(seen_ids)
             
             # Actualizar metadata de retrieval
             state["retrieval_metadata"] = {
                 "finding_reports": finding_reports,
-                "total_chunks": len(unique_chunks)
+                "levels": levels,
+                "new_chunks": len(new_chunks),
+                "total_chunks": len(retrieved_chunks)
             }
             
             # Siguiente paso
@@ -113,22 +106,67 @@ class RetrievalAgent(BaseAgent):
         
         return state
 
-    def _execute_single_retrieval(self, sub_query: SubQuery) -> tuple[List[Dict], Dict]:
+    def _retrieve_level(self, queries: List[str], speculation_id: str = None,
+                        exclude_ids: Set[str] = None) -> List[Union[List[Dict], Exception]]:
         """
-        Ejecuta una única sub-query y genera su reporte.
+        Retrieval de un nivel del DAG: las queries cubiertas por el retrieval especulativo
+        de la query cruda lo reutilizan; el resto va en una única llamada en lote.
+        Si el lote falla, se reintenta query a query: una sub-query que vuelve a fallar
+        devuelve su excepción (error solo de ese paso) y no arrastra al resto.
+        Los chunks de exclude_ids (ya vistos en esta petición) no se devuelven; por eso la
+        especulación solo se usa en la primera pasada (en los reintentos todos sus chunks
+        ya están vistos y dejaría la sub-query sin evidencia nueva).
         """
-        query_text = sub_query["query"]
-        sq_id = sub_query["id"]
+        results: List[Union[List[Dict], Exception]] = [None] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            chunks = None if exclude_ids else take_speculative(speculation_id, query)
+            if chunks is None:
+                pending.append(i)
+            else:
+                results[i] = chunks
         
-        self.logger.debug(f"Ejecutando SQ-{sq_id}: {query_text}")
+        if not pending:
+            return results
         
-        # Usar smart retrieval
-        # Ajustar parámetros según el tipo de query si fuera posible, por ahora defaults
-        chunks = smart_hierarchical_retrieval(
-            query=query_text,
-            top_docs=10,  # Un poco menos restrictivo por sub-query
-            chunks_per_doc=3
-        )
+        def retrieve(batch: List[str]) -> List[List[Dict]]:
+            return smart_hierarchical_retrieval_batch(
+                batch,
+                top_docs=10,  # Un poco menos restrictivo por sub-query
+                chunks_per_doc=3,
+                exclude_ids=exclude_ids
+            )
+        
+        try:
+            for i, chunks in zip(pending, retrieve([queries[i] for i in pending])):
+                results[i] = chunks
+        except Exception as e:
+            self.logger.warning(f"⚠️ Retrieval en lote falló ({e}); reintentando {len(pending)} sub-queries por separado")
+            for i in pending:
+                try:
+                    results[i] = retrieve([queries[i]])[0]
+                except Exception as item_error:
+                    self.logger.error(f"Error en retrieval de '{queries[i]}': {item_error}")
+                    results[i] = item_error
+        return results
+
+    def _emit_partial(self, level_idx: int, reports: Dict[int, Dict]) -> None:
+        """Publica los hallazgos de un nivel en el stream del grafo (no-op fuera de LangGraph)."""
+        try:
+            from langgraph.config import get_stream_writer
+            get_stream_writer()({"retrieval_level": level_idx, "finding_reports": reports})
+        except Exception:
+            pass
+
+    def _build_report(self, query_text: str, chunks: List[Dict], error: str = None) -> Dict:
+        """Genera el reporte de hallazgo (Finding Report) de una sub-query."""
+        if error:
+            return {
+                "query": query_text,
+                "status": "Error",
+                "chunks_found": 0,
+                "message": error
+            }
         
         # Generar Reporte de Hallazgo
         status = "No Encontrado"
@@ -154,4 +192,4 @@ class RetrievalAgent(BaseAgent):
             "message": msg
         }
         
-        return chunks, report
+        return report
@@ -8,6 +8,7 @@ from typing import List, Dict, Tuple
 from src.agents.base_agent import BaseAgent
 from src.graph.state import WorkflowState
 from src.utils.llm_config import generate_response
+from src.utils.context_packer import pack_context
 
 
 class SynthesisAgent(BaseAgent):
@@ -32,9 +33,8 @@ class SynthesisAgent(BaseAgent):
             chunks = state.get("retrieved_chunks", [])
             eval_report = state.get("evaluation_report", {})
             
-            # 1. Token Budgeting: Recortar contexto si excede límite
-            from src.utils.token_counter import trim_context
-            chunks_processed = trim_context(chunks, max_tokens=20000)
+            # 1. Token Budgeting: relevancia por token dentro del presupuesto del prompt
+            chunks_processed = pack_context(chunks)
             
             if len(chunks_processed) < len(chunks):
                 self.logger.warning(f"Contexto recortado: {len(chunks)} -> {len(chunks_processed)} chunks")
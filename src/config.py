@@ -26,8 +26,22 @@ MODEL_CHATBOT = os.getenv("MODEL_CHATBOT", "gpt-4o")  # Upgraded from gpt-4o-min
 MODEL_FAST = os.getenv("MODEL_FAST", "gpt-4o-mini")  # For simple queries
 MODEL_EMBEDDINGS = os.getenv("MODEL_EMBEDDINGS", "text-embedding-3-large")
 
-from openai import OpenAI
-CLIENT = OpenAI(api_key=OPENAI_API_KEY)
+# Gateway LLM compartido: pool HTTP keep-alive + limitador global (token bucket) por proceso
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))  # 0 = sin límite
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "300000"))
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "3000"))
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "1000000"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "32"))
+LLM_HTTP_KEEPALIVE = int(os.getenv("LLM_HTTP_KEEPALIVE", "16"))
+LLM_TIMEOUT_S = float(os.getenv("LLM_TIMEOUT_S", "120"))
+
+
+def __getattr__(name):
+    # CLIENT se mantiene por compatibilidad: es el cliente del gateway (lazy, sin crear otro pool)
+    if name == "CLIENT":
+        from src.utils.llm_gateway import get_llm_gateway
+        return get_llm_gateway().client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # ============================================
 # CONFIGURACIÓN DE CHROMADB
@@ -38,6 +52,59 @@ COLLECTION_NAME = os.getenv("COLLECTION_NAME", "contratos_defensa")
 # Dimensiones de embeddings según modelo
 EMBEDDING_DIMENSIONS = 3072  # text-embedding-3-large
 
+# Generación de embeddings (batching por tokens + concurrencia)
+EMBEDDINGS_BACKEND = os.getenv("EMBEDDINGS_BACKEND", "openai")  # openai | fake (benchmarks offline)
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "100000"))  # Límite API: 300k/request
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "256"))  # Límite API: 2048 inputs
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+
+# Búsqueda híbrida: vector y BM25 en paralelo con timeout por rama
+HYBRID_VECTOR_TIMEOUT_S = float(os.getenv("HYBRID_VECTOR_TIMEOUT_S", "10"))  # Incluye el embedding de la query
+HYBRID_BM25_TIMEOUT_S = float(os.getenv("HYBRID_BM25_TIMEOUT_S", "3"))
+
+# Expansión de contexto: vecinos (chunk_seq ± 1) de los N mejores chunks, fusionados en ventanas
+CONTEXT_EXPANSION_ENABLED = os.getenv("CONTEXT_EXPANSION_ENABLED", "true").lower() == "true"
+CONTEXT_EXPANSION_TOP_N = int(os.getenv("CONTEXT_EXPANSION_TOP_N", "5"))
+
+# Empaquetado de contexto: presupuesto de tokens del prompt (relevancia por token)
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "12000"))
+CONTEXT_MAX_DOC_SHARE = float(os.getenv("CONTEXT_MAX_DOC_SHARE", "0.6"))  # Tope por documento (si hay varios)
+
+# Retrieval especulativo: la query cruda se busca en paralelo con rewriter/planner
+SPECULATIVE_RETRIEVAL_ENABLED = os.getenv("SPECULATIVE_RETRIEVAL_ENABLED", "true").lower() == "true"
+SPECULATIVE_MIN_COVERAGE = float(os.getenv("SPECULATIVE_MIN_COVERAGE", "0.8"))  # Fracción de términos para reutilizar
+
+# Re-ranker en CPU: cross-encoder exportado a ONNX (int8) con scripts/export_reranker_onnx.py
+RERANKER_CPU_BACKEND = os.getenv("RERANKER_CPU_BACKEND", "auto")  # auto (onnx si está exportado) | onnx | torch
+RERANKER_ONNX_DIR = Path(os.getenv("RERANKER_ONNX_DIR", str(BASE_DIR / "data" / "models" / "bge-reranker-v2-m3-onnx")))
+RERANKER_ONNX_QUANTIZED = os.getenv("RERANKER_ONNX_QUANTIZED", "true").lower() == "true"
+RERANKER_MAX_LENGTH = int(os.getenv("RERANKER_MAX_LENGTH", "384"))  # Tokens query + chunk (chunks de ~1200 caracteres)
+RERANKER_BATCH_SIZE = int(os.getenv("RERANKER_BATCH_SIZE", "16"))
+RERANKER_BATCH_MAX_TOKENS = int(os.getenv("RERANKER_BATCH_MAX_TOKENS", "4096"))  # Pares x longitud por lote
+RERANKER_INTRA_OP_THREADS = int(os.getenv("RERANKER_INTRA_OP_THREADS", "0"))  # 0 = decide onnxruntime
+
+# Caché en memoria de scores del re-ranker por (modelo, query normalizada, chunk_id)
+RERANK_CACHE_ENABLED = os.getenv("RERANK_CACHE_ENABLED", "true").lower() == "true"
+RERANK_CACHE_MAX_ENTRIES = int(os.getenv("RERANK_CACHE_MAX_ENTRIES", "100000"))  # ~100 B por entrada
+
+# Micro-batching: pares de llamadas concurrentes al re-ranker en un solo forward pass
+RERANK_MICROBATCH_ENABLED = os.getenv("RERANK_MICROBATCH_ENABLED", "true").lower() == "true"
+RERANK_MICROBATCH_WAIT_MS = float(os.getenv("RERANK_MICROBATCH_WAIT_MS", "5"))  # Ventana tras la 1ª petición
+RERANK_MICROBATCH_MAX_PAIRS = int(os.getenv("RERANK_MICROBATCH_MAX_PAIRS", "128"))
+
+# ============================================
+# CONFIGURACIÓN DE CACHÉS EN DISCO
+# ============================================
+CACHE_PATH = Path(os.getenv("CACHE_PATH", str(BASE_DIR / "data" / "cache")))
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "1024"))  # ~85k vectores de 3072 dims
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_CACHE_TTL_S = float(os.getenv("RETRIEVAL_CACHE_TTL_S", "86400"))  # Se invalida además al cambiar el corpus
+RETRIEVAL_CACHE_MAX_MB = int(os.getenv("RETRIEVAL_CACHE_MAX_MB", "128"))
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"  # Solo llamadas con temperature=0
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "604800"))  # 7 días; namespace por versión del corpus
+RESPONSE_CACHE_MAX_MB = int(os.getenv("RESPONSE_CACHE_MAX_MB", "256"))
+
 # ============================================
 # CONFIGURACIÓN DE EMAIL (Gmail SMTP)
 # ============================================
@@ -54,6 +121,15 @@ CONTRACTS_PATH = Path(os.getenv("CONTRACTS_PATH", str(BASE_DIR / "data" / "contr
 NORMALIZED_PATH = BASE_DIR / "data" / "normalized"  # Documentos normalizados con GPT-4o
 LOGS_PATH = Path(os.getenv("LOGS_PATH", str(BASE_DIR / "data" / "logs")))
 LOGS_FILE = LOGS_PATH / "app.log"
+INGEST_MANIFEST_PATH = BASE_DIR / "data" / "ingest_manifest.json"  # Hashes por archivo (ingesta incremental)
+
+# Memoria conversacional del workflow (checkpoints por thread_id)
+CHECKPOINTER_BACKEND = os.getenv("CHECKPOINTER_BACKEND", "sqlite")  # sqlite (persistente) | memory
+CHECKPOINT_DB_PATH = Path(os.getenv("CHECKPOINT_DB_PATH", str(BASE_DIR / "data" / "checkpoints.sqlite")))
+
+# Tabla tipada de hechos por contrato (importes, fechas, avales) para preguntas agregativas
+CONTRACT_FACTS_ENABLED = os.getenv("CONTRACT_FACTS_ENABLED", "true").lower() == "true"
+CONTRACT_FACTS_DB_PATH = Path(os.getenv("CONTRACT_FACTS_DB_PATH", str(BASE_DIR / "data" / "contract_facts.sqlite")))
 
 # ============================================
 # CONFIGURACIÓN DE ALERTAS
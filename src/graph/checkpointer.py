@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Checkpointer del workflow (memoria conversacional por thread_id).
+
+Backends (CHECKPOINTER_BACKEND):
+- sqlite: persistente en disco (sobrevive a reinicios y se comparte entre
+  procesos worker). Requiere el paquete opcional langgraph-checkpoint-sqlite.
+- memory: MemorySaver en RAM, solo válido para la vida del proceso.
+"""
+
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Optional
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import MemorySaver
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import CHECKPOINTER_BACKEND, CHECKPOINT_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def create_checkpointer(backend: str = CHECKPOINTER_BACKEND,
+                        db_path: Path = CHECKPOINT_DB_PATH) -> BaseCheckpointSaver:
+    """
+    Crea un checkpointer según el backend pedido.
+    Si SQLite no está disponible se degrada a MemorySaver con un warning.
+    """
+    if backend == "memory":
+        return MemorySaver()
+
+    if backend != "sqlite":
+        raise ValueError(f"CHECKPOINTER_BACKEND desconocido: {backend!r} (sqlite | memory)")
+
+    try:
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        logger.warning("⚠️ langgraph-checkpoint-sqlite no instalado: memoria conversacional solo en RAM")
+        return MemorySaver()
+
+    db_path = Path(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    # Una conexión compartida por los hilos del proceso (SqliteSaver serializa con su propio lock);
+    # WAL + busy_timeout permiten que varios procesos worker usen el mismo fichero.
+    conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    saver = SqliteSaver(conn)
+    saver.setup()
+    logger.info(f"💾 Checkpointer SQLite: {db_path}")
+    return saver
+
+
+# Instancia global (lazy)
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    """Obtiene el checkpointer global del proceso."""
+    global _checkpointer
+    if _checkpointer is None:
+        with _checkpointer_lock:
+            if _checkpointer is None:
+                _checkpointer = create_checkpointer()
+    return _checkpointer
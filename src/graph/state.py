@@ -40,6 +40,9 @@ class WorkflowState(TypedDict):
     # Retrieval
     retrieved_chunks: List[Dict]
     retrieval_metadata: Dict
+    speculation_id: Optional[str]       # Retrieval especulativo de la query cruda (si está activo)
+    seen_chunk_ids: List[str]           # chunk_ids ya recuperados en esta petición (se excluyen en los reintentos)
+    new_chunks: List[Dict]              # Delta de la última pasada de retrieval (lo que evalúa el auditor)
     
     # Evaluation
     evaluation_report: Optional[EvaluationReport]
@@ -5,13 +5,16 @@ Agentic RAG Workflow - Orquestación con LangGraph
 
 
 import logging
-from typing import Literal, Dict
+import threading
+from typing import Literal, Dict, Optional
 
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 from langchain_core.runnables import RunnableConfig
 
 from src.graph.state import WorkflowState
+from src.graph.checkpointer import get_checkpointer
+from src.config import SPECULATIVE_RETRIEVAL_ENABLED
+from src.utils.speculative_retrieval import start_speculation, finish_speculation
 from src.agents.context_rewriter import ContextRewriter
 from src.agents.orchestrator import OrchestratorAgent
 
@@ -100,15 +103,12 @@ def create_workflow() -> StateGraph:
 
 
 
-# Singleton MemorySaver para persistencia en memoria durante la vida del proceso
-_shared_memory = MemorySaver()
-
 def compile_workflow(checkpointer=None) -> any:
     """
     Compila el workflow en un ejecutable.
     
     Args:
-        checkpointer: Objeto de persistencia (MemorySaver, etc)
+        checkpointer: Objeto de persistencia (MemorySaver, SqliteSaver, etc)
         
     Returns:
         Compiled graph listo para ejecutar
@@ -121,6 +121,31 @@ def compile_workflow(checkpointer=None) -> any:
     return compiled
 
 
+# Grafos compilados una vez por proceso (los agentes no guardan estado por request,
+# así que el mismo ejecutable se comparte entre peticiones concurrentes).
+# Se mantienen dos variantes: con memoria (thread_id) y stateless.
+_workflow_graph: Optional[StateGraph] = None
+_compiled_apps: Dict[bool, any] = {}
+_compiled_lock = threading.Lock()
+
+
+def get_compiled_workflow(with_memory: bool = True) -> any:
+    """Obtiene el grafo compilado global (con o sin checkpointer)."""
+    global _workflow_graph
+    app = _compiled_apps.get(with_memory)
+    if app is None:
+        with _compiled_lock:
+            app = _compiled_apps.get(with_memory)
+            if app is None:
+                if _workflow_graph is None:
+                    _workflow_graph = create_workflow()
+                checkpointer = get_checkpointer() if with_memory else None
+                app = _workflow_graph.compile(checkpointer=checkpointer)
+                _compiled_apps[with_memory] = app
+                logger.info(f"✅ Workflow compilado una vez por proceso (Checkpointer: {type(checkpointer).__name__ if checkpointer else None})")
+    return app
+
+
 # Función helper para invocar el workflow
 def run_agentic_rag(query: str, chat_history: list = None, thread_id: str = None) -> Dict:
     """
@@ -135,10 +160,6 @@ def run_agentic_rag(query: str, chat_history: list = None, thread_id: str = None
         Dict con resultado final
     """
     
-    # Configurar memoria si hay thread_id
-    # USAMOS LA MEMORIA COMPARTIDA PARA QUE PERSISTA ENTRE LLAMADAS
-    checkpointer = _shared_memory if thread_id else None
-    
     # Inicializar inputs para el grafo
     inputs = {
         "query": query,
@@ -147,6 +168,9 @@ def run_agentic_rag(query: str, chat_history: list = None, thread_id: str = None
         "corrective_iteration": 0,
         "is_sufficient": False,
         "evaluation_report": None,
+        "retrieved_chunks": [],
+        "seen_chunk_ids": [],
+        "new_chunks": [],
         "final_answer": "",
         "error": None
     }
@@ -156,8 +180,11 @@ def run_agentic_rag(query: str, chat_history: list = None, thread_id: str = None
     if chat_history is not None or not thread_id:
         inputs["chat_history"] = chat_history or []
 
-    # Compilar y ejecutar
-    app = compile_workflow(checkpointer=checkpointer)
+    # Retrieval especulativo de la query cruda en paralelo con rewriter/planner
+    inputs["speculation_id"] = start_speculation(query) if SPECULATIVE_RETRIEVAL_ENABLED else None
+
+    # Grafo compilado compartido; con thread_id usa el checkpointer persistente
+    app = get_compiled_workflow(with_memory=bool(thread_id))
     
     config = {"configurable": {"thread_id": thread_id}} if thread_id else None
     
@@ -190,3 +217,6 @@ def run_agentic_rag(query: str, chat_history: list = None, thread_id: str = None
             "confidence": 0.0,
             "metadata": {"error": str(e)}
         }
+    
+    finally:
+        finish_speculation(inputs["speculation_id"])
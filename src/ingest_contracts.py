@@ -1,28 +1,42 @@
 # -*- coding: utf-8 -*-
 """
 Script de Ingestión MAESTRA.
-Ejecutar ESTRICTAMENTE cuando se añadan nuevos contratos.
-Realiza:
+Ejecutar cuando se añadan, modifiquen o eliminen contratos.
+
+Modo incremental (por defecto si existe manifiesto):
+1. Diff de hashes de archivo contra data/ingest_manifest.json.
+2. Upsert en ChromaDB solo de archivos nuevos/modificados; borrado de chunks obsoletos.
+3. Actualización in situ del índice BM25, del Metadata Cache y de la tabla de hechos.
+
+Modo completo (--full, o primera ejecución):
 1. Limpieza de VectorStore (ChromaDB).
 2. Procesamiento de PDFs con PyMuPDFLoader (Tablas + Anexos).
 3. Generación de Embeddings (OpenAI) y almacenamiento en ChromaDB.
 4. Construcción y guardado de índice BM25.
 5. Generación de Metadata Cache para contexto rápido.
+6. Tabla tipada de hechos por contrato (SQLite) para preguntas agregativas.
 """
 
+import argparse
+import concurrent.futures
+import itertools
 import json
 import logging
 import time
+from collections import deque
 from pathlib import Path
-from typing import List, Dict
+from typing import Dict, Iterator, List, Tuple
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
 from src.utils.pdf_processor import get_all_contracts
 from src.utils.chunking import create_chunks_from_pdf
-from src.utils.vectorstore import clear_collection, add_documents
+from src.utils.vectorstore import clear_collection, add_documents, delete_documents
 from src.utils.bm25_index import BM25Index
+from src.utils.ingest_manifest import IngestManifest, file_sha256
+from src.utils.retrieval_cache import get_retrieval_cache
+from src.utils.contract_facts import ContractFactsStore, contract_record
 
 # Configuración de Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -79,7 +93,47 @@ def generate_metadata_context_cache(metadatas: List[Dict]) -> None:
     logger.info(f"✅ Metadata Cache guardado en: {METADATA_CACHE_PATH}")
 
 
-def main():
+def iter_chunked_files(paths: List[Path], prefetch: int = 2) -> Iterator[Tuple[Path, List[Dict]]]:
+    """
+    Pipeline de ingesta: parsea y chunkea los siguientes archivos en segundo plano
+    mientras el llamador embebe/guarda el actual. Devuelve (ruta, chunks) en orden.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="chunker") as executor:
+        pending = deque()
+        path_iter = iter(paths)
+        
+        for path in itertools.islice(path_iter, prefetch + 1):
+            pending.append((path, executor.submit(create_chunks_from_pdf, path)))
+        
+        while pending:
+            path, future = pending.popleft()
+            next_path = next(path_iter, None)
+            if next_path is not None:
+                pending.append((next_path, executor.submit(create_chunks_from_pdf, next_path)))
+            
+            try:
+                chunks = future.result()
+            except Exception as e:
+                logger.error(f"❌ Error crítico procesando {path.name}: {e}")
+                continue
+            yield path, chunks
+
+
+def _report_throughput(n_chunks: int, elapsed: float) -> None:
+    """Imprime el throughput real de la fase de embedding + guardado."""
+    print(f"⚡ Throughput ingesta: {n_chunks} chunks en {elapsed:.1f}s ({n_chunks / max(elapsed, 1e-6):.1f} chunks/s)")
+
+
+def _representative_metadata(chunks: List[Dict]) -> Dict:
+    """
+    Metadata del primer chunk (el chunking ya propaga global_meta a todos) más
+    el CIF y el chunk fuente de cada campo puntual (lookup directo con cita).
+    """
+    return contract_record(chunks)
+
+
+def run_full_ingest() -> None:
+    """Reconstrucción completa: vacía la colección y re-ingiere todo el corpus."""
     start_global = time.time()
     print("\n🚀 INICIANDO PROCESO DE INGESTIÓN MASIVA (OFFLINE)\n")
     print("⚠️  Esto borrará la base de datos actual y la reconstruirá.")
@@ -96,14 +150,15 @@ def main():
         return
 
     all_chunks = []
-    unique_metadatas = {} # Para el caché, un metadata por contrato
+    manifest = IngestManifest.load()
+    manifest.files = {}
     
     # 3. Procesar cada PDF
     print(f"\n📄 Procesando {len(pdf_files)} documentos con PyMuPDF...")
     
-    for pdf_path in pdf_files:
+    start_embed = time.time()
+    for pdf_path, chunks in iter_chunked_files(pdf_files):
         try:
-            chunks = create_chunks_from_pdf(pdf_path)
             if not chunks:
                 logger.warning(f"⚠️ {pdf_path.name} no generó chunks.")
                 continue
@@ -111,20 +166,20 @@ def main():
             # Añadir a la lista global para BM25
             all_chunks.extend(chunks)
             
-            # Guardar metadata representativa (usamos la del primer chunk que suele tener todo)
-            # Mejor aún: Combinar lo mejor de los chunks si fuera necesario, pero el chunking ya propaga global_meta
-            if chunks[0]["metadata"].get("num_contrato"): 
-                key = chunks[0]["metadata"]["num_contrato"]
-                unique_metadatas[key] = chunks[0]["metadata"]
-            else:
-                unique_metadatas[pdf_path.name] = chunks[0]["metadata"]
-            
             # Añadir a ChromaDB (Vectorial)
             # Lo hacemos archivo por archivo para gestión de memoria y progreso visual
             add_documents(chunks)
             
+            manifest.record(
+                pdf_path.name,
+                file_sha256(pdf_path),
+                [c["metadata"]["chunk_id"] for c in chunks],
+                _representative_metadata(chunks)
+            )
+            
         except Exception as e:
             logger.error(f"❌ Error crítico procesando {pdf_path.name}: {e}")
+    _report_throughput(len(all_chunks), time.time() - start_embed)
 
     # 4. Construir índice BM25
     print(f"\n📚 Construyendo Índice Invertido BM25 con {len(all_chunks)} chunks...")
@@ -133,7 +188,16 @@ def main():
     
     # 5. Generar Caché de Contexto
     print("\n💾 Generando Caché de Metadatos...")
-    generate_metadata_context_cache(list(unique_metadatas.values()))
+    unique_metadatas = manifest.representative_metadatas()
+    generate_metadata_context_cache(unique_metadatas)
+    
+    # 6. Tabla tipada de hechos por contrato (SQLite)
+    print("\n📇 Construyendo tabla de hechos por contrato...")
+    ContractFactsStore().rebuild(unique_metadatas)
+    
+    manifest.bump_version()
+    manifest.save()
+    get_retrieval_cache().invalidate()  # Resultados cacheados del corpus anterior
     
     total_time = time.time() - start_global
     print(f"\n✨ INGESTIÓN COMPLETADA EN {total_time:.1f} SEGUNDOS")
@@ -141,5 +205,95 @@ def main():
     print(f"📂 Contratos Procesados: {len(unique_metadatas)}")
     print("✅ El sistema está listo para 'rag_agent.py' en modo FAST-PATH.")
 
+
+def run_incremental_ingest() -> None:
+    """
+    Ingesta incremental: solo procesa archivos nuevos o modificados
+    y retira los chunks de archivos eliminados. La colección nunca queda vacía.
+    """
+    start_global = time.time()
+    print("\n🔁 INICIANDO INGESTIÓN INCREMENTAL\n")
+    
+    manifest = IngestManifest.load()
+    bm25 = BM25Index()
+    if not manifest.files or not bm25.is_built():
+        print("ℹ️  Sin manifiesto o índice BM25 previo. Ejecutando ingesta completa.")
+        run_full_ingest()
+        return
+    
+    pdf_files = get_all_contracts()
+    diff = manifest.diff(pdf_files)
+    
+    print(f"   Nuevos: {len(diff['new'])} | Modificados: {len(diff['changed'])} | "
+          f"Sin cambios: {len(diff['unchanged'])} | Eliminados: {len(diff['removed'])}")
+    
+    if not diff["new"] and not diff["changed"] and not diff["removed"]:
+        facts = ContractFactsStore()
+        if not facts.is_built():
+            # Despliegues anteriores a la tabla de hechos: se construye desde el manifiesto
+            facts.rebuild(manifest.representative_metadatas())
+        print("✅ Corpus sin cambios. Nada que ingerir.")
+        return
+    
+    new_chunks = []
+    processed_files = set()
+    
+    # 1. Upsert de archivos nuevos/modificados (sus IDs estables se sobrescriben in situ)
+    start_embed = time.time()
+    for pdf_path, chunks in iter_chunked_files(diff["new"] + diff["changed"]):
+        try:
+            if not chunks:
+                logger.warning(f"⚠️ {pdf_path.name} no generó chunks.")
+                continue
+            
+            add_documents(chunks)
+            
+            # Borrar chunks que existían antes pero ya no (el archivo encogió)
+            new_ids = [c["metadata"]["chunk_id"] for c in chunks]
+            stale_ids = set(manifest.chunk_ids(pdf_path.name)) - set(new_ids)
+            delete_documents(sorted(stale_ids))
+            
+            manifest.record(pdf_path.name, diff["hashes"][pdf_path.name], new_ids, _representative_metadata(chunks))
+            new_chunks.extend(chunks)
+            processed_files.add(pdf_path.name)
+            
+        except Exception as e:
+            logger.error(f"❌ Error crítico procesando {pdf_path.name}: {e}")
+    _report_throughput(len(new_chunks), time.time() - start_embed)
+    
+    # 2. Retirar archivos eliminados
+    for name in diff["removed"]:
+        delete_documents(manifest.chunk_ids(name))
+        manifest.remove(name)
+    
+    # 3. Actualizar BM25 in situ
+    print(f"\n📚 Actualizando Índice BM25 ({len(new_chunks)} chunks nuevos)...")
+    bm25.update(new_chunks, removed_files=diff["removed"])
+    
+    # 4. Regenerar caché de contexto y tabla de hechos desde el manifiesto (sin re-chunkear)
+    print("\n💾 Actualizando Caché de Metadatos...")
+    unique_metadatas = manifest.representative_metadatas()
+    generate_metadata_context_cache(unique_metadatas)
+    ContractFactsStore().rebuild(unique_metadatas)
+    
+    manifest.bump_version()
+    manifest.save()
+    get_retrieval_cache().invalidate()  # Resultados cacheados del corpus anterior
+    
+    total_time = time.time() - start_global
+    print(f"\n✨ INGESTIÓN INCREMENTAL COMPLETADA EN {total_time:.1f} SEGUNDOS")
+    print(f"📂 Archivos re-ingeridos: {len(processed_files)} | Retirados: {len(diff['removed'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestión de contratos en ChromaDB + BM25")
+    parser.add_argument("--full", action="store_true", help="Reconstruir todo desde cero (borra la colección)")
+    args = parser.parse_args()
+    
+    if args.full:
+        run_full_ingest()
+    else:
+        run_incremental_ingest()
+
 if __name__ == "__main__":
     main()
@@ -5,7 +5,7 @@ Previene alucinaciones y asegura trazabilidad.
 
 import re
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -228,6 +228,10 @@ INVÁLIDO - [razón específica de la contradicción]
         # Capa 3: Citación
         citation = self.validate_citation_coverage(answer)
         
+        return self.summarize(numerical, logical, citation)
+    
+    def summarize(self, numerical: Dict, logical: Dict, citation: Dict) -> Dict[str, Any]:
+        """Resultado global y recomendación a partir de las tres capas."""
         # Resultado global
         overall_valid = numerical["valid"] and logical["valid"] and citation["valid"]
         
@@ -380,6 +384,77 @@ INVÁLIDO - [razón específica de la contradicción]
         return False
 
 
+class StreamingValidator:
+    """
+    Validación incremental de una respuesta que llega en streaming.
+    
+    Cada frase/línea completa se valida al cerrarse (integridad numérica contra
+    las fuentes), de modo que una cifra inventada se detecta mientras el usuario
+    aún está leyendo. Al terminar, finalize() añade la cobertura de citación
+    (sobre el texto completo) y la coherencia lógica (LLM juez, necesita la
+    respuesta entera) y devuelve el mismo formato que validate_answer.
+    """
+    
+    # Fin de frase (misma regla que _extract_critical_statements) o de línea (tablas, listas)
+    SEGMENT_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=[A-Z])|\n')
+    
+    def __init__(self, query: str, source_chunks: List, validator: Optional[AnswerValidator] = None):
+        self.query = query
+        self.validator = validator or AnswerValidator()
+        self.chunk_texts = [
+            chunk.get("contenido", "") if isinstance(chunk, dict) else str(chunk)
+            for chunk in source_chunks
+        ]
+        self.text = ""
+        self._pending = ""
+        self.violations: List[Dict] = []
+        self.numbers_checked = 0
+        self.calculated_skipped = 0
+    
+    def feed(self, delta: str) -> List[Dict]:
+        """
+        Añade un fragmento del stream y valida los segmentos que quedan cerrados.
+        
+        Returns:
+            Un dict por segmento cerrado: {"segment", "violations"}
+        """
+        self.text += delta
+        parts = self.SEGMENT_BOUNDARY.split(self._pending + delta)
+        self._pending = parts.pop()
+        return [self._check(part) for part in parts if part.strip()]
+    
+    def _check(self, segment: str) -> Dict:
+        numerical = self.validator.validate_numerical_integrity(segment, self.chunk_texts)
+        self.violations.extend(numerical["violations"])
+        self.numbers_checked += numerical["numbers_checked"]
+        self.calculated_skipped += numerical["calculated_numbers_skipped"]
+        return {"segment": segment, "violations": numerical["violations"]}
+    
+    def flush(self) -> List[Dict]:
+        """Valida el último segmento (sin cierre) al terminar el stream."""
+        tail = [self._check(self._pending)] if self._pending.strip() else []
+        self._pending = ""
+        return tail
+    
+    def finalize(self) -> Dict[str, Any]:
+        """
+        Cierra las capas que necesitan el texto completo (citación y coherencia).
+        
+        Returns:
+            Mismo formato que AnswerValidator.validate_all
+        """
+        self.flush()
+        numerical = {
+            "valid": not self.violations,
+            "violations": self.violations,
+            "numbers_checked": self.numbers_checked,
+            "calculated_numbers_skipped": self.calculated_skipped
+        }
+        logical = self.validator.validate_logical_coherence(self.text, self.query, self.chunk_texts)
+        citation = self.validator.validate_citation_coverage(self.text)
+        return self.validator.summarize(numerical, logical, citation)
+
+
 # ========== FUNCIÓN HELPER PARA USO RÁPIDO ==========
 
 def validate_answer(answer: str, query: str, source_chunks: List) -> Dict:
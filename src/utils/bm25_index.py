@@ -1,116 +1,452 @@
 # -*- coding: utf-8 -*-
 """
 Índice BM25 para búsqueda léxica.
+
+Motor nativo sobre índice invertido disperso (CSR):
+- indptr[t]:indptr[t+1] delimita la lista de postings del término t.
+- Cada posting guarda el doc y su peso BM25 ya calculado (IDF * TF normalizado por longitud).
+- Una query solo recorre los postings de sus términos y rankea con argpartition.
+- Indexado y consulta comparten el analizador español de text_analysis.
+
+Formato en disco (versionado, sin pickle, memory-mappable):
+    data/bm25_index/
+        CURRENT                  -> nombre de la generación activa
+        gen-000001/
+            meta.json            -> formato, versión, analizador, parámetros, vocabulario
+            indptr.npy, postings_docs.npy, postings_weights.npy, idf.npy, doc_len.npy
+            doc_indptr.npy, doc_terms.npy + chunk_ids.json -> términos de cada chunk (índice directo)
+            docs.jsonl + doc_offsets.npy  -> contenido y metadata (lectura por offset)
 """
 
+import json
+import mmap
 import pickle
+import shutil
 import logging
+from collections import Counter
 from pathlib import Path
-from typing import List, Dict
-from rank_bm25 import BM25Okapi
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+
+from src.utils.chunk_identity import get_chunk_id
+from src.utils.text_analysis import analyze, analyze_batch, ANALYZER_VERSION
 
 logger = logging.getLogger(__name__)
 
+INDEX_FORMAT = "bm25-csr"
+INDEX_FORMAT_VERSION = 1
+
+
+class _DocStore:
+    """Contenido + metadata de los chunks en JSONL, leídos por offset vía mmap."""
+
+    def __init__(self, path: Path, offsets: np.ndarray):
+        self.offsets = offsets
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if len(offsets) > 1 else None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def get(self, i: int) -> Dict:
+        start, end = int(self.offsets[i]), int(self.offsets[i + 1])
+        return json.loads(self._mmap[start:end])
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
 
 class BM25Index:
     """Índice BM25 para búsqueda por keywords."""
-    
-    def __init__(self, index_path: str = "data/bm25_index.pkl"):
+
+    def __init__(self, index_path: str = "data/bm25_index", k1: float = 1.5, b: float = 0.75):
         self.index_path = Path(index_path)
-        self.bm25 = None
-        self.documents = []
-        self.metadatas = []
-    
+        self.k1 = k1
+        self.b = b
+
+        self.vocab: Dict[str, int] = {}
+        self.indptr: Optional[np.ndarray] = None
+        self.postings_docs: Optional[np.ndarray] = None
+        self.postings_weights: Optional[np.ndarray] = None
+        self.idf: Optional[np.ndarray] = None
+        self.doc_len: Optional[np.ndarray] = None
+        self.avgdl = 0.0
+        # Índice directo: términos distintos de cada doc (doc_terms[doc_indptr[d]:doc_indptr[d+1]])
+        self.doc_indptr: Optional[np.ndarray] = None
+        self.doc_terms: Optional[np.ndarray] = None
+        self._chunk_rows: Dict[str, int] = {}
+        self._terms_by_id: Optional[List[str]] = None
+
+        self._documents: Optional[List[str]] = None
+        self._metadatas: Optional[List[Dict]] = None
+        self._store: Optional[_DocStore] = None
+        # Generación de disco que refleja este objeto (None: no guardado / heredado)
+        self.generation: Optional[str] = None
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+
     def build(self, chunks: List[Dict]) -> None:
         """
         Construye el índice BM25 desde chunks.
-        
+
         Args:
             chunks: Lista de chunks con 'contenido' y 'metadata'
         """
         logger.info(f"Construyendo índice BM25 con {len(chunks)} documentos...")
-        
-        # Tokenizar documentos (simple split por espacios)
-        tokenized_docs = [
-            doc['contenido'].lower().split()
-            for doc in chunks
-        ]
-        
-        self.documents = [doc['contenido'] for doc in chunks]
-        self.metadatas = [doc['metadata'] for doc in chunks]
-        
-        # Crear índice BM25
-        self.bm25 = BM25Okapi(tokenized_docs)
-        
-        logger.info("Índice BM25 construido exitosamente")
-        
+
+        n_docs = len(chunks)
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, tfs = [], [], []
+        doc_len = np.zeros(n_docs, dtype=np.int32)
+
+        for d, tokens in enumerate(analyze_batch(chunk['contenido'] for chunk in chunks)):
+            doc_len[d] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(d)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+
+        # Índice directo (los postings salen ya agrupados por doc, antes de reordenar)
+        doc_indptr = np.zeros(n_docs + 1, dtype=np.int64)
+        np.cumsum(np.bincount(doc_ids, minlength=n_docs), out=doc_indptr[1:])
+        doc_terms = term_ids.copy()
+
+        # Ordenar postings por (término, doc) -> layout CSR
+        order = np.lexsort((doc_ids, term_ids))
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+
+        # IDF (variante siempre positiva) y normalización por longitud precomputadas
+        df = np.diff(indptr).astype(np.float32)
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_len / max(avgdl, 1e-9))
+        weights = idf[term_ids] * tfs * (self.k1 + 1) / (tfs + length_norm[doc_ids])
+
+        self._close_store()
+        self.vocab = vocab
+        self.indptr = indptr
+        self.postings_docs = doc_ids
+        self.postings_weights = weights.astype(np.float32)
+        self.idf = idf
+        self.doc_len = doc_len
+        self.avgdl = avgdl
+        self.doc_indptr = doc_indptr
+        self.doc_terms = doc_terms
+        self._chunk_rows = {get_chunk_id(chunk): d for d, chunk in enumerate(chunks)}
+        self._terms_by_id = None
+        self._documents = [doc['contenido'] for doc in chunks]
+        self._metadatas = [doc['metadata'] for doc in chunks]
+
+        logger.info(f"Índice BM25 construido exitosamente ({len(vocab)} términos, {len(doc_ids)} postings)")
+
         # Guardar
         self.save()
-    
+
+    def update(self, new_chunks: List[Dict], removed_files: Iterable[str] = ()) -> None:
+        """
+        Actualiza el índice con los cambios de una ingesta incremental.
+
+        Args:
+            new_chunks: Chunks nuevos o re-generados (reemplazan a los de su archivo)
+            removed_files: Archivos cuyos chunks deben desaparecer del índice
+        """
+        if not self.is_loaded():
+            self.load()
+
+        # Archivos a purgar: eliminados + los que traen chunks nuevos (re-ingestados)
+        stale = set(removed_files) | {c['metadata'].get('archivo') for c in new_chunks}
+
+        kept = [
+            {'contenido': doc, 'metadata': meta}
+            for doc, meta in zip(self.documents, self.metadatas)
+            if meta.get('archivo') not in stale
+        ]
+
+        logger.info(f"Actualizando índice BM25: {len(self.documents) - len(kept)} chunks retirados, {len(new_chunks)} añadidos")
+        self.build(kept + list(new_chunks))
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
     def search(self, query: str, top_k: int = 20) -> List[Dict]:
         """
         Busca documentos relevantes usando BM25.
-        
+
         Args:
             query: Query de búsqueda
             top_k: Número de resultados a retornar
-        
+
         Returns:
             Lista de chunks con scores BM25
         """
-        if self.bm25 is None:
+        return self.search_many([query], top_k=top_k)[0]
+
+    def search_many(self, queries: List[str], top_k: int = 20) -> List[List[Dict]]:
+        """
+        Busca varias queries en una sola pasada vectorizada sobre los postings.
+
+        Los pares (query, documento) se codifican como q * n_docs + doc y se
+        acumulan con un único bincount; después se hace top-K por query.
+
+        Returns:
+            Una lista de resultados (como search()) por query, en el mismo orden
+        """
+        if not self.is_loaded():
             raise ValueError("Índice BM25 no está cargado. Usa load() primero.")
-        
-        # Tokenizar query
-        tokenized_query = query.lower().split()
-        
-        # Obtener scores
-        scores = self.bm25.get_scores(tokenized_query)
-        
-        # Top-K índices
-        top_indices = scores.argsort()[-top_k:][::-1]
-        
-        # Retornar resultados
-        results = []
-        for i in top_indices:
-            if scores[i] > 0:  # Solo documentos con score positivo
-                results.append({
-                    'contenido': self.documents[i],
-                    'metadata': self.metadatas[i],
-                    'score_bm25': float(scores[i])
-                })
-        
+
+        n_docs = len(self.doc_len)
+        results: List[List[Dict]] = [[] for _ in queries]
+        if top_k <= 0 or n_docs == 0:
+            return results
+
+        # Postings de los términos de cada query (frecuencia en la query como multiplicador)
+        key_parts, weight_parts = [], []
+        for q_idx, query in enumerate(queries):
+            query_terms = Counter(t for t in analyze(query) if t in self.vocab)
+            for term, qtf in query_terms.items():
+                tid = self.vocab[term]
+                start, end = self.indptr[tid], self.indptr[tid + 1]
+                key_parts.append(self.postings_docs[start:end].astype(np.int64) + q_idx * n_docs)
+                weight_parts.append(self.postings_weights[start:end] * qtf)
+
+        if not key_parts:
+            return results
+
+        # Acumular scores solo sobre los pares (query, documento) candidatos
+        keys, inverse = np.unique(np.concatenate(key_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weight_parts))
+        owners = keys // n_docs  # keys ordenadas: cada query ocupa un tramo contiguo
+        bounds = np.searchsorted(owners, np.arange(len(queries) + 1))
+
+        for q_idx in range(len(queries)):
+            lo, hi = bounds[q_idx], bounds[q_idx + 1]
+            if lo == hi:
+                continue
+            q_scores = scores[lo:hi]
+
+            # Top-K sin ordenar todo el corpus
+            k = min(top_k, hi - lo)
+            if k < hi - lo:
+                top = np.argpartition(-q_scores, k - 1)[:k]
+            else:
+                top = np.arange(hi - lo)
+            top = top[np.argsort(-q_scores[top], kind="stable")]
+
+            for i in top:
+                if q_scores[i] > 0:  # Solo documentos con score positivo
+                    doc = self._get_doc(int(keys[lo + i] - q_idx * n_docs))
+                    results[q_idx].append({
+                        'contenido': doc['contenido'],
+                        'metadata': doc['metadata'],
+                        'score_bm25': float(q_scores[i])
+                    })
+
         return results
-    
+
+    def chunk_terms(self, chunk_id: str) -> Optional[Set[str]]:
+        """
+        Términos analizados de un chunk indexado (los mismos que terms(contenido)),
+        leídos del índice directo sin volver a analizar el texto. None si no está.
+        """
+        row = self._chunk_rows.get(chunk_id)
+        if row is None or self.doc_indptr is None:
+            return None
+        if self._terms_by_id is None:
+            terms_by_id = [""] * len(self.vocab)
+            for term, tid in self.vocab.items():
+                terms_by_id[tid] = term
+            self._terms_by_id = terms_by_id
+        start, end = self.doc_indptr[row], self.doc_indptr[row + 1]
+        return {self._terms_by_id[tid] for tid in self.doc_terms[start:end]}
+
+    @property
+    def documents(self) -> List[str]:
+        if self._documents is None:
+            self._materialize()
+        return self._documents
+
+    @property
+    def metadatas(self) -> List[Dict]:
+        if self._metadatas is None:
+            self._materialize()
+        return self._metadatas
+
+    def _get_doc(self, i: int) -> Dict:
+        if self._documents is not None:
+            return {'contenido': self._documents[i], 'metadata': self._metadatas[i]}
+        return self._store.get(i)
+
+    def _materialize(self) -> None:
+        """Carga en memoria todos los documentos (solo lo necesita update())."""
+        if self._store is None:
+            self._documents, self._metadatas = [], []
+            return
+        docs = [self._store.get(i) for i in range(len(self._store))]
+        self._documents = [d['contenido'] for d in docs]
+        self._metadatas = [d['metadata'] for d in docs]
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def _current_generation(self) -> Optional[Path]:
+        pointer = self.index_path / "CURRENT"
+        if not pointer.exists():
+            return None
+        gen_dir = self.index_path / pointer.read_text(encoding="utf-8").strip()
+        return gen_dir if gen_dir.is_dir() else None
+
     def save(self) -> None:
-        """Guarda el índice en disco."""
-        self.index_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        data = {
-            'bm25': self.bm25,
-            'documents': self.documents,
-            'metadatas': self.metadatas
-        }
-        
-        with open(self.index_path, 'wb') as f:
-            pickle.dump(data, f)
-        
-        logger.info(f"Índice BM25 guardado en: {self.index_path}")
-    
+        """
+        Guarda el índice en disco como una nueva generación y la activa
+        de forma atómica (los lectores con mmap abiertos no se ven afectados).
+        """
+        self.index_path.mkdir(parents=True, exist_ok=True)
+
+        current = self._current_generation()
+        gen_number = int(current.name.split("-")[1]) + 1 if current else 1
+        gen_dir = self.index_path / f"gen-{gen_number:06d}"
+        if gen_dir.exists():
+            shutil.rmtree(gen_dir)
+        gen_dir.mkdir()
+
+        np.save(gen_dir / "indptr.npy", self.indptr)
+        np.save(gen_dir / "postings_docs.npy", self.postings_docs)
+        np.save(gen_dir / "postings_weights.npy", self.postings_weights)
+        np.save(gen_dir / "idf.npy", self.idf)
+        np.save(gen_dir / "doc_len.npy", self.doc_len)
+        np.save(gen_dir / "doc_indptr.npy", self.doc_indptr)
+        np.save(gen_dir / "doc_terms.npy", self.doc_terms)
+        chunk_ids = sorted(self._chunk_rows, key=self._chunk_rows.get)
+        (gen_dir / "chunk_ids.json").write_text(json.dumps(chunk_ids, ensure_ascii=False), encoding="utf-8")
+
+        offsets = [0]
+        with open(gen_dir / "docs.jsonl", "wb") as f:
+            for doc, meta in zip(self.documents, self.metadatas):
+                line = (json.dumps({'contenido': doc, 'metadata': meta}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+        np.save(gen_dir / "doc_offsets.npy", np.asarray(offsets, dtype=np.int64))
+
+        (gen_dir / "meta.json").write_text(json.dumps({
+            'format': INDEX_FORMAT,
+            'version': INDEX_FORMAT_VERSION,
+            'analyzer': ANALYZER_VERSION,
+            'k1': self.k1,
+            'b': self.b,
+            'n_docs': len(self.doc_len),
+            'avgdl': self.avgdl,
+            'vocab': self.vocab
+        }, ensure_ascii=False), encoding="utf-8")
+
+        # Activar la generación nueva (rename atómico del puntero)
+        tmp_pointer = self.index_path / "CURRENT.tmp"
+        tmp_pointer.write_text(gen_dir.name, encoding="utf-8")
+        tmp_pointer.replace(self.index_path / "CURRENT")
+        self.generation = gen_dir.name
+
+        # Limpieza best-effort de generaciones antiguas (en Windows pueden seguir mapeadas)
+        for old in self.index_path.glob("gen-*"):
+            if old != gen_dir:
+                shutil.rmtree(old, ignore_errors=True)
+
+        logger.info(f"Índice BM25 guardado en: {gen_dir}")
+
     def load(self) -> None:
-        """Carga el índice desde disco."""
-        if not self.index_path.exists():
+        """Carga el índice desde disco (arrays memory-mapped, documentos bajo demanda)."""
+        gen_dir = self._current_generation()
+        if gen_dir is None:
+            if self._migrate_legacy_pickle():
+                return
             raise FileNotFoundError(f"Índice BM25 no encontrado en: {self.index_path}")
-        
-        with open(self.index_path, 'rb') as f:
-            data = pickle.load(f)
-        
-        self.bm25 = data['bm25']
-        self.documents = data['documents']
-        self.metadatas = data['metadatas']
-        
-        logger.info(f"Índice BM25 cargado: {len(self.documents)} documentos")
-    
+
+        meta = json.loads((gen_dir / "meta.json").read_text(encoding="utf-8"))
+        if meta.get('format') != INDEX_FORMAT or meta.get('version') != INDEX_FORMAT_VERSION:
+            raise ValueError(
+                f"Formato de índice BM25 no soportado ({meta.get('format')} v{meta.get('version')}). "
+                "Regenera con: python src/ingest_contracts.py --full"
+            )
+
+        self._close_store()
+        self.k1, self.b, self.avgdl = meta['k1'], meta['b'], meta['avgdl']
+        self.vocab = meta['vocab']
+        self.indptr = np.load(gen_dir / "indptr.npy", mmap_mode='r')
+        self.postings_docs = np.load(gen_dir / "postings_docs.npy", mmap_mode='r')
+        self.postings_weights = np.load(gen_dir / "postings_weights.npy", mmap_mode='r')
+        self.idf = np.load(gen_dir / "idf.npy", mmap_mode='r')
+        self.doc_len = np.load(gen_dir / "doc_len.npy", mmap_mode='r')
+        self._store = _DocStore(gen_dir / "docs.jsonl", np.load(gen_dir / "doc_offsets.npy", mmap_mode='r'))
+        self._documents = None
+        self._metadatas = None
+        self.generation = gen_dir.name
+
+        # Generaciones anteriores al índice directo: chunk_terms() devuelve None
+        self._terms_by_id = None
+        if (gen_dir / "chunk_ids.json").exists():
+            self.doc_indptr = np.load(gen_dir / "doc_indptr.npy", mmap_mode='r')
+            self.doc_terms = np.load(gen_dir / "doc_terms.npy", mmap_mode='r')
+            chunk_ids = json.loads((gen_dir / "chunk_ids.json").read_text(encoding="utf-8"))
+            self._chunk_rows = {chunk_id: d for d, chunk_id in enumerate(chunk_ids)}
+        else:
+            self.doc_indptr, self.doc_terms, self._chunk_rows = None, None, {}
+
+        logger.info(f"Índice BM25 cargado: {meta['n_docs']} documentos, {len(self.vocab)} términos")
+
+        # Índice tokenizado con otro analizador: re-indexar desde el propio almacén de documentos
+        if meta.get('analyzer') != ANALYZER_VERSION:
+            logger.warning(f"⚠️ Índice BM25 con analizador '{meta.get('analyzer')}'. Re-indexando con '{ANALYZER_VERSION}'...")
+            self.build([
+                {'contenido': doc, 'metadata': metadata}
+                for doc, metadata in zip(self.documents, self.metadatas)
+            ])
+
+    def _migrate_legacy_pickle(self) -> bool:
+        """Convierte un índice .pkl (rank_bm25) heredado al formato nativo."""
+        legacy = self.index_path.with_suffix(".pkl")
+        if not legacy.exists():
+            return False
+
+        logger.warning(f"⚠️ Migrando índice BM25 heredado {legacy} al formato {INDEX_FORMAT} v{INDEX_FORMAT_VERSION}...")
+        try:
+            with open(legacy, 'rb') as f:
+                data = pickle.load(f)
+        except (ImportError, ModuleNotFoundError, pickle.UnpicklingError) as e:
+            logger.error(f"❌ No se pudo leer el índice heredado ({e}). Ejecuta: python src/ingest_contracts.py --full")
+            return False
+
+        self.build([
+            {'contenido': doc, 'metadata': meta}
+            for doc, meta in zip(data['documents'], data['metadatas'])
+        ])
+        return True
+
+    def _close_store(self) -> None:
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def is_stale(self) -> bool:
+        """True si otro proceso (o instancia) ha activado una generación más nueva en disco."""
+        current = self._current_generation()
+        return current is not None and current.name != self.generation
+
+    def is_loaded(self) -> bool:
+        """Verifica si el índice está en memoria."""
+        return self.indptr is not None
+
     def is_built(self) -> bool:
         """Verifica si el índice existe."""
-        return self.index_path.exists()
+        return self._current_generation() is not None or self.index_path.with_suffix(".pkl").exists()
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Identidad estable de chunks.
+El chunk_id se asigna en la ingesta (archivo + posición) y viaja en la metadata
+por ChromaDB y BM25. RRF, dedup, re-ranking, expansión de contexto, citas y
+cachés usan esta misma clave.
+"""
+
+import hashlib
+from pathlib import Path
+from typing import Dict, List
+
+
+def make_chunk_id(archivo: str, chunk_seq: int) -> str:
+    """
+    ID estable de chunk: archivo de origen + posición secuencial dentro del archivo.
+    Es idéntico entre ingestas mientras el archivo no cambie, y permite
+    derivar los IDs de los chunks vecinos (chunk_seq ± 1) sin consultar la BD.
+    """
+    return f"{Path(archivo).stem}::{chunk_seq:04d}"
+
+
+def get_chunk_id(chunk: Dict) -> str:
+    """
+    ID del chunk a partir de su metadata.
+    Chunks de índices anteriores a los IDs estables reciben un ID por hash de
+    contenido, que se memoriza en su metadata para no volver a calcularlo.
+    """
+    metadata = chunk.setdefault("metadata", {})
+    chunk_id = metadata.get("chunk_id")
+    if chunk_id:
+        return chunk_id
+
+    archivo = metadata.get("archivo") or metadata.get("source")
+    if archivo and metadata.get("chunk_seq") is not None:
+        chunk_id = make_chunk_id(archivo, int(metadata["chunk_seq"]))
+    else:
+        digest = hashlib.blake2b(chunk.get("contenido", "").encode("utf-8"), digest_size=8).hexdigest()
+        chunk_id = f"legacy::{digest}"
+
+    metadata["chunk_id"] = chunk_id
+    return chunk_id
+
+
+def neighbour_chunk_ids(chunk: Dict) -> List[str]:
+    """IDs del chunk anterior y posterior dentro del mismo archivo (si hay posición)."""
+    metadata = chunk.get("metadata", {})
+    archivo = metadata.get("archivo") or metadata.get("source")
+    if not archivo or metadata.get("chunk_seq") is None:
+        return []
+
+    seq = int(metadata["chunk_seq"])
+    ids = [make_chunk_id(archivo, seq - 1)] if seq > 0 else []
+    ids.append(make_chunk_id(archivo, seq + 1))
+    return ids
+
+
+def dedup_chunks(chunks: List[Dict]) -> List[Dict]:
+    """Elimina chunks repetidos (mismo chunk_id) conservando el primero."""
+    seen = set()
+    unique = []
+    for chunk in chunks:
+        chunk_id = get_chunk_id(chunk)
+        if chunk_id not in seen:
+            seen.add(chunk_id)
+            unique.append(chunk)
+    return unique
@@ -12,6 +12,8 @@ from typing import List, Dict
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from src.utils.pdf_processor import load_pdf_documents
+from src.utils.chunk_identity import make_chunk_id
+from src.utils.token_counter import count_tokens_batch
 
 logger = logging.getLogger(__name__)
 
@@ -109,7 +111,7 @@ def extract_metadata_from_text(text: str, filename: str) -> Dict:
 
     # --- 2. IMPORTE ---
     # Markdown
-    imp_md = re.search(r"\*\*Importe [Tt]otal.*?\*\*:\s*([\d\.,]+\s*EUR)", text)
+    imp_md = re.search(r"\*\*Importe [Tt]otal[^*\n]*?(?::\*\*|\*\*:)\s*([\d\.,]+\s*EUR)", text)
     if imp_md:
         metadata["importe"] = imp_md.group(1).strip()
     else:
@@ -127,7 +129,18 @@ def extract_metadata_from_text(text: str, filename: str) -> Dict:
                     metadata["importe"] = val + " EUR"
                     break
 
+    # --- 2b. CONTRATISTA ---
+    contratista_md = re.search(r"\*\*(?:Contratista|Adjudicatario):\*\*\s*(.+)", text)
+    if contratista_md:
+        metadata["contratista"] = contratista_md.group(1).strip()
+
     # --- 3. FECHAS CLAVE ---
+    # Fecha Inicio (Markdown)
+    inicio_md = re.search(r"\*\*Fecha Inicio:\*\*\s*(\d{1,2}/\d{1,2}/\d{4})", text)
+    if inicio_md:
+        metadata["fecha_inicio"] = inicio_md.group(1)
+    
+
     # Fecha Fin (Markdown)
     fin_md = re.search(r"\*\*Fecha Fin:\*\*\s*(\d{1,2}/\d{1,2}/\d{4})", text)
     if fin_md:
@@ -236,6 +249,7 @@ def create_chunks_from_pdf(file_path: Path) -> List[Dict]:
     global_meta = extract_metadata_from_text(full_text, file_path.name)
     
     processed_chunks = []
+    chunk_seq = 0  # Posición global del chunk dentro del archivo (no se reinicia por página)
     
     # Procesar iterativamente con contexto de página/sección
     for doc in raw_docs:
@@ -262,14 +276,21 @@ def create_chunks_from_pdf(file_path: Path) -> List[Dict]:
                 "source": file_path.name,
                 "pagina": doc.metadata.get("page", 1),
                 "seccion": section_label,
-                "chunk_index": i
+                "chunk_index": i,
+                "chunk_seq": chunk_seq,
+                "chunk_id": make_chunk_id(file_path.name, chunk_seq)
             })
+            chunk_seq += 1
             
             processed_chunks.append({
                 "contenido": chunk_text,
                 "metadata": chunk_meta
             })
             
+    # Tokens por chunk calculados una vez aquí: el empaquetado de contexto no re-tokeniza en consulta
+    for chunk, n_tokens in zip(processed_chunks, count_tokens_batch([c["contenido"] for c in processed_chunks])):
+        chunk["metadata"]["n_tokens"] = n_tokens
+    
     logger.info(f"Procesado {file_path.name}: {len(processed_chunks)} chunks.")
     return processed_chunks
 
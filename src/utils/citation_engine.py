@@ -5,10 +5,18 @@ Asegura trazabilidad total de cada afirmación crítica.
 
 import re
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
+
+from src.utils.chunk_identity import get_chunk_id
+from src.utils.context_packer import pack_context
 
 logger = logging.getLogger(__name__)
 
+CITATION_MODEL = "gpt-4o"
+
+# [Fuente: ARCHIVO, Pág: X, Sección: Y] -> ARCHIVO
+CITATION_RE = re.compile(r'\[Fuente:\s*([^,\]]+)[^\]]*\]')
+
 class CitationEngine:
     """Genera y valida citaciones granulares"""
     
@@ -52,8 +60,27 @@ class CitationEngine:
         
         # Generar con LLM
         # Usamos gpt-4o explícitamente para asegurar calidad en seguimiento de instrucciones
-        response = generate_response(prompt, model="gpt-4o")
+        response = generate_response(prompt, model=CITATION_MODEL)
         
+        return self.finalize(response, chunks_with_metadata)
+    
+    def stream_with_citations(
+        self,
+        query: str,
+        chunks_with_metadata: List[Dict]
+    ) -> Iterator[str]:
+        """
+        Igual que generate_with_citations (mismo prompt y modelo) pero emitiendo
+        los tokens según llegan. El texto completo se cierra con finalize().
+        """
+        from src.utils.llm_config import generate_response_stream
+        
+        logger.info("📚 Generando respuesta con citaciones (streaming)...")
+        prompt = self._build_citation_prompt(query, chunks_with_metadata)
+        yield from generate_response_stream(prompt, model=CITATION_MODEL)
+    
+    def finalize(self, response: str, chunks_with_metadata: List[Dict]) -> Dict[str, Any]:
+        """Post-procesado, contradicciones y fuentes de una respuesta ya generada."""
         # Post-procesamiento
         processed = self._post_process_citations(response, chunks_with_metadata)
         
@@ -72,6 +99,9 @@ class CitationEngine:
     def _build_citation_prompt(self, query: str, chunks: List[Dict]) -> str:
         """Construye prompt que FUERZA citación granular"""
         
+        # Presupuesto de tokens: los chunks llegan ordenados por relevancia
+        chunks = pack_context(chunks)
+        
         # Formatear chunks con IDs y metadata visible
         formatted_chunks = []
         for i, chunk in enumerate(chunks, 1):
@@ -252,19 +282,9 @@ Procede con la respuesta. Recuerda: 0% tolerancia a claims sin citar.
         # Enriquecer con metadata si está disponible
         enriched_sources = []
         for source_name in sources:
-            # Buscar metadata completa en chunks
-            for chunk in chunks:
-                meta = chunk.get('metadata', {})
-                # Normalizar nombres para comparación (por si acaso viene .md o no)
-                chunk_file = meta.get('archivo') or meta.get('source') or ''
-                
-                if source_name in chunk_file or chunk_file in source_name:
-                    enriched_sources.append({
-                        "archivo": source_name,
-                        "num_contrato": meta.get('num_contrato'),
-                        "nivel_seguridad": meta.get('nivel_seguridad')
-                    })
-                    break
+            source_entry = self.resolve_source(source_name, chunks)
+            if source_entry:
+                enriched_sources.append(source_entry)
         
         # Si no encontró metadata pero la fuente está, añadir simple
         found_names = {s['archivo'] for s in enriched_sources}
@@ -273,6 +293,28 @@ Procede con la respuesta. Recuerda: 0% tolerancia a claims sin citar.
                 enriched_sources.append({"archivo": source_name})
         
         return enriched_sources
+    
+    def resolve_source(self, source_name: str, chunks: List[Dict]) -> Optional[Dict]:
+        """
+        Metadata de un documento citado y los chunk_id que respaldan la cita.
+        None si ningún chunk del contexto es de ese documento.
+        """
+        source_entry = None
+        for chunk in chunks:
+            meta = chunk.get('metadata', {})
+            # Normalizar nombres para comparación (por si acaso viene .md o no)
+            chunk_file = meta.get('archivo') or meta.get('source') or ''
+            
+            if chunk_file and (source_name in chunk_file or chunk_file in source_name):
+                if source_entry is None:
+                    source_entry = {
+                        "archivo": source_name,
+                        "num_contrato": meta.get('num_contrato'),
+                        "nivel_seguridad": meta.get('nivel_seguridad'),
+                        "chunk_ids": []
+                    }
+                source_entry["chunk_ids"].append(get_chunk_id(chunk))
+        return source_entry
 
 
 # ========== FUNCIÓN HELPER ==========
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Expansión de contexto por vecindad de chunks.
+Los vecinos de cada chunk (chunk_seq ± 1 en el mismo archivo) se derivan de su
+chunk_id estable y se leen de ChromaDB en una sola llamada por ID; después los
+chunks contiguos se fusionan en ventanas.
+"""
+
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+from src.utils.chunk_identity import get_chunk_id, neighbour_chunk_ids
+from src.utils.vectorstore import get_documents_by_ids
+
+logger = logging.getLogger(__name__)
+
+
+def _merge_overlapping(text_a: str, text_b: str, max_overlap: int = 400) -> str:
+    """Concatena dos chunks consecutivos eliminando el solape del splitter (chunk_overlap)."""
+    limit = min(max_overlap, len(text_a), len(text_b))
+    for size in range(limit, 20, -1):
+        if text_a.endswith(text_b[:size]):
+            return text_a + text_b[size:]
+    return f"{text_a}\n{text_b}"
+
+
+def _build_window(members: List[Dict], primary: Dict) -> Dict:
+    """Fusiona chunks contiguos de un archivo en una única ventana de contexto."""
+    if len(members) == 1:
+        return members[0]
+    
+    contenido = members[0].get("contenido", "")
+    for member in members[1:]:
+        contenido = _merge_overlapping(contenido, member.get("contenido", ""))
+    
+    metadata = dict(primary.get("metadata", {}))
+    metadata["window_chunk_ids"] = [get_chunk_id(m) for m in members]
+    metadata["window_seq_range"] = [members[0]["metadata"]["chunk_seq"], members[-1]["metadata"]["chunk_seq"]]
+    # Tokens de la ventana: suma de los miembros (cota superior, incluye el solape eliminado)
+    member_tokens = [m.get("metadata", {}).get("n_tokens") for m in members]
+    if all(n is not None for n in member_tokens):
+        metadata["n_tokens"] = sum(member_tokens)
+    else:
+        metadata.pop("n_tokens", None)
+    return {**primary, "contenido": contenido, "metadata": metadata}
+
+
+def expand_context(chunks: List[Dict], expand_top_n: Optional[int] = None) -> List[Dict]:
+    """
+    CONTEXT EXPANSION: Recupera chunks adyacentes (anterior/posterior) para más contexto.
+    Esto ayuda a capturar información que pueda estar fragmentada entre chunks.
+    
+    - Los vecinos se derivan del chunk_id estable (archivo + chunk_seq ± 1) y se
+      resuelven en UNA sola lectura por ID a ChromaDB (sin embeddings), sea cual sea k.
+    - Chunks contiguos del mismo archivo se fusionan en ventanas (sin duplicar el solape).
+    - Las ventanas conservan el orden de relevancia de su mejor chunk recuperado.
+    
+    Args:
+        chunks: Chunks rankeados
+        expand_top_n: Solo se buscan vecinos de los N primeros (None = todos)
+    """
+    if not chunks:
+        return chunks
+    
+    by_id: Dict[str, Dict] = {}
+    rank: Dict[str, int] = {}
+    for position, chunk in enumerate(chunks):
+        chunk_id = get_chunk_id(chunk)
+        if chunk_id not in by_id:
+            by_id[chunk_id] = chunk
+            rank[chunk_id] = position
+    
+    originals = set(by_id)
+    
+    # 1. IDs vecinos de todo el result set
+    wanted = {}
+    limit = len(chunks) if expand_top_n is None else expand_top_n
+    for chunk_id, chunk in list(by_id.items())[:limit]:
+        for neighbour_id in neighbour_chunk_ids(chunk):
+            if neighbour_id not in by_id and neighbour_id not in wanted:
+                wanted[neighbour_id] = rank[chunk_id]
+    
+    # 2. Una única lectura por ID
+    if wanted:
+        try:
+            for neighbour in get_documents_by_ids(list(wanted)):
+                neighbour_id = get_chunk_id(neighbour)
+                by_id[neighbour_id] = neighbour
+                rank.setdefault(neighbour_id, wanted[neighbour_id])
+        except Exception as e:
+            logger.warning(f"⚠️ Expansión de contexto omitida: {e}")  # No es crítico
+    
+    # 3. Agrupar por archivo y fusionar secuencias contiguas en ventanas
+    by_file = defaultdict(list)
+    windows = []  # (rank, ventana)
+    for chunk_id, chunk in by_id.items():
+        metadata = chunk.get("metadata", {})
+        archivo = metadata.get("archivo") or metadata.get("source")
+        if archivo is None or metadata.get("chunk_seq") is None:
+            windows.append((rank[chunk_id], chunk))
+        else:
+            by_file[archivo].append((int(metadata["chunk_seq"]), chunk_id))
+    
+    for items in by_file.values():
+        items.sort()
+        run = [items[0]]
+        for item in items[1:] + [None]:
+            if item is not None and item[0] == run[-1][0] + 1:
+                run.append(item)
+                continue
+            members = [by_id[cid] for _, cid in run]
+            # La ventana hereda la metadata de su chunk recuperado mejor rankeado
+            best_id = min((cid for _, cid in run), key=lambda cid: (rank[cid], cid not in originals))
+            windows.append((rank[best_id], _build_window(members, by_id[best_id])))
+            run = [item]
+    
+    windows.sort(key=lambda w: w[0])
+    expanded = [window for _, window in windows]
+    logger.info(f"🧩 Context expansion: {len(originals)} chunks + {len(by_id) - len(originals)} vecinos -> {len(expanded)} ventanas")
+    return expanded
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Empaquetado de contexto para los prompts de generación.
+
+Todas las rutas de generación (rag_agent, SynthesisAgent, CitationEngine,
+query_stream) eligen sus chunks aquí, con un presupuesto de tokens fijo:
+- Coste de cada chunk: `n_tokens` precalculado en la ingesta + cabecera fija
+- Valor: rerank_score si todos los chunks lo tienen; si no, 1 / (60 + posición)
+  (misma forma que RRF: la lista de entrada ya viene ordenada por relevancia)
+- Selección tipo mochila: voraz por valor/coste, con el chunk más relevante
+  siempre dentro si cabe (evita que muchos chunks pequeños desplacen al mejor)
+- Tope por documento (fracción del presupuesto) solo cuando compiten varios
+  documentos, para que uno largo no acapare el contexto de una comparativa
+
+El resultado conserva el orden de relevancia de la entrada, así que la
+numeración "Documento N" y el reordenado en U no cambian de semántica.
+"""
+
+import logging
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import CONTEXT_MAX_TOKENS, CONTEXT_MAX_DOC_SHARE
+from src.utils.token_counter import chunk_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens de la cabecera que cada prompt añade por chunk (archivo, página, sección...)
+CHUNK_OVERHEAD_TOKENS = 40
+RANK_K = 60
+
+
+def _relevance(chunks: List[Dict]) -> List[float]:
+    scores = [c.get("metadata", {}).get("rerank_score") for c in chunks]
+    if all(score is not None for score in scores):
+        # Sigmoide del cross-encoder en [0, 1]; el mínimo evita valor 0 para chunks muy flojos
+        return [max(float(score), 1e-6) for score in scores]
+    return [1.0 / (RANK_K + position) for position in range(len(chunks))]
+
+
+def _document(chunk: Dict) -> str:
+    metadata = chunk.get("metadata", {})
+    return metadata.get("archivo") or metadata.get("source") or "?"
+
+
+def pack_context(chunks: List[Dict], max_tokens: int = CONTEXT_MAX_TOKENS,
+                 max_doc_share: float = CONTEXT_MAX_DOC_SHARE) -> List[Dict]:
+    """
+    Selecciona los chunks que caben en `max_tokens` maximizando relevancia.
+
+    Args:
+        chunks: Chunks ordenados por relevancia ('contenido' o 'text' + 'metadata')
+        max_tokens: Presupuesto de tokens del contexto (cabeceras incluidas)
+        max_doc_share: Fracción máxima del presupuesto para un mismo documento
+
+    Returns:
+        Subconjunto de `chunks`, en su orden original
+    """
+    if not chunks:
+        return []
+
+    costs = [chunk_tokens(c) + CHUNK_OVERHEAD_TOKENS for c in chunks]
+    if sum(costs) <= max_tokens:
+        return list(chunks)
+
+    relevance = _relevance(chunks)
+    documents = [_document(c) for c in chunks]
+    doc_cap = max_tokens * max_doc_share if len(set(documents)) > 1 else max_tokens
+
+    used = 0
+    per_doc = defaultdict(int)
+    selected = set()
+
+    def take(i: int) -> None:
+        nonlocal used
+        if used + costs[i] <= max_tokens and per_doc[documents[i]] + costs[i] <= doc_cap:
+            selected.add(i)
+            used += costs[i]
+            per_doc[documents[i]] += costs[i]
+
+    take(max(range(len(chunks)), key=lambda i: relevance[i]))
+    for i in sorted(range(len(chunks)), key=lambda i: relevance[i] / costs[i], reverse=True):
+        if i not in selected:
+            take(i)
+
+    packed = [chunk for i, chunk in enumerate(chunks) if i in selected]
+    logger.info(f"📦 Contexto empaquetado: {len(chunks)} -> {len(packed)} chunks, "
+                f"{used}/{max_tokens} tokens ({len(per_doc)} documentos)")
+    return packed
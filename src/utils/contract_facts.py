@@ -0,0 +1,660 @@
+# -*- coding: utf-8 -*-
+"""
+Contract Facts Store - Tabla tipada de hechos por contrato (SQLite embebido).
+
+La ingesta ya extrae por contrato importe, fechas, avales y normas
+(chunking.extract_metadata_from_text). Aquí se guardan tipados e indexados:
+- Importes como céntimos enteros (aritmética exacta, se leen como Decimal)
+- Fechas como ISO (YYYY-MM-DD, ordenables y comparables)
+
+Sobre la tabla, answer_fact_query resuelve directamente preguntas de
+ordenación, filtro por fechas, suma y conteo ("¿contrato de mayor importe?",
+"suma de avales", "¿qué contratos vencen este mes?"). El LLM solo redacta.
+
+Además, cada campo puntual (CIF, importe, fechas, aval...) se guarda con el chunk
+del que sale (contract_fields), y answer_field_lookup responde "campo X del
+contrato Y" sin LLM ni retrieval, con cita determinista al chunk fuente.
+"""
+
+import calendar
+import logging
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import CONTRACT_FACTS_DB_PATH, ALERT_DAYS_MEDIUM
+from src.utils.deterministic_extractor import extract_cif, extract_cifs, extract_contract_ids
+from src.utils.text_analysis import fold, normalize_contract_id
+
+logger = logging.getLogger(__name__)
+
+AMOUNT_FIELDS = ("importe", "aval_importe")
+DATE_FIELDS = ("fecha_inicio", "fecha_fin", "aval_vencimiento")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contracts (
+    num_contrato TEXT PRIMARY KEY,
+    archivo TEXT,
+    tipo_contrato TEXT,
+    contratista TEXT,
+    importe_cents INTEGER,
+    importe_raw TEXT,
+    fecha_inicio TEXT,
+    fecha_fin TEXT,
+    aval_importe_cents INTEGER,
+    aval_importe_raw TEXT,
+    aval_entidad TEXT,
+    aval_vencimiento TEXT,
+    nivel_seguridad TEXT,
+    requiere_confidencialidad INTEGER,
+    normas TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_contracts_importe ON contracts(importe_cents);
+CREATE INDEX IF NOT EXISTS idx_contracts_aval_importe ON contracts(aval_importe_cents);
+CREATE INDEX IF NOT EXISTS idx_contracts_fecha_fin ON contracts(fecha_fin);
+CREATE INDEX IF NOT EXISTS idx_contracts_aval_vencimiento ON contracts(aval_vencimiento);
+CREATE TABLE IF NOT EXISTS contract_fields (
+    num_contrato TEXT NOT NULL,
+    field TEXT NOT NULL,
+    value TEXT NOT NULL,
+    archivo TEXT,
+    chunk_id TEXT NOT NULL,
+    pagina INTEGER,
+    seccion TEXT,
+    PRIMARY KEY (num_contrato, field)
+);
+"""
+
+_COLUMNS = (
+    "num_contrato", "archivo", "tipo_contrato", "contratista", "importe_cents", "importe_raw",
+    "fecha_inicio", "fecha_fin", "aval_importe_cents", "aval_importe_raw", "aval_entidad",
+    "aval_vencimiento", "nivel_seguridad", "requiere_confidencialidad", "normas"
+)
+
+# Campos puntuales que se sirven por lookup directo -> etiqueta en la respuesta
+LOOKUP_FIELDS = {
+    "cif": "CIF del contratista",
+    "contratista": "contratista",
+    "importe": "importe total",
+    "fecha_inicio": "fecha de inicio",
+    "fecha_fin": "fecha de finalización",
+    "aval_importe": "importe del aval",
+    "aval_entidad": "entidad avalista",
+    "aval_vencimiento": "vencimiento del aval",
+}
+
+MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12
+}
+
+
+# ============================================
+# PARSEO TIPADO
+# ============================================
+
+def parse_amount(raw) -> Optional[Decimal]:
+    """'2.450.000,00 EUR' / '1.250.000 €' -> Decimal('2450000.00'). None si no es un importe."""
+    if raw is None:
+        return None
+    match = re.search(r'\d[\d.]*(?:,\d+)?', str(raw))
+    if not match:
+        return None
+    try:
+        return Decimal(match.group(0).replace(".", "").replace(",", "."))
+    except InvalidOperation:
+        return None
+
+
+def parse_date(raw) -> Optional[date]:
+    """'29/01/2026' -> date(2026, 1, 29). None si no es una fecha válida."""
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(str(raw).strip(), "%d/%m/%Y").date()
+    except ValueError:
+        return None
+
+
+def format_amount(value: Decimal) -> str:
+    """Decimal('2450000') -> '2.450.000,00 EUR' (formato español)."""
+    text = f"{value:,.2f}"
+    return text.replace(",", "\x00").replace(".", ",").replace("\x00", ".") + " EUR"
+
+
+def _to_cents(value: Optional[Decimal]) -> Optional[int]:
+    return int((value * 100).to_integral_value()) if value is not None else None
+
+
+def _to_iso(value: Optional[date]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+# ============================================
+# PROCEDENCIA DE CAMPOS (INGESTA)
+# ============================================
+
+def _find_cif(chunks: List[Dict]) -> Tuple[Optional[str], Optional[Dict]]:
+    """CIF del contrato: el primero con etiqueta 'CIF' en su línea; si no, el único CIF del documento."""
+    for chunk in chunks:
+        for line in re.finditer(r'\bCIF\b[^\n]*', chunk["contenido"], re.IGNORECASE):
+            cif = extract_cif(line.group(0))
+            if cif:
+                return cif, chunk
+    found = {cif: chunk for chunk in reversed(chunks) for cif in extract_cifs(chunk["contenido"])}
+    if len(found) == 1:
+        return next(iter(found.items()))
+    return None, None
+
+
+def _needle(field: str, value) -> Optional[str]:
+    """Texto a localizar en los chunks para un valor (en importes, solo la cifra)."""
+    if not value:
+        return None
+    if field in AMOUNT_FIELDS:
+        match = re.search(r'\d[\d.]*(?:,\d+)?', str(value))
+        return match.group(0) if match else None
+    return str(value)
+
+
+def contract_record(chunks: List[Dict]) -> Dict:
+    """
+    Metadata representativa de un contrato (la del primer chunk) más el CIF y
+    'field_sources': para cada campo de LOOKUP_FIELDS, el primer chunk cuyo
+    texto contiene el valor (chunk_id, página y sección para la cita).
+    """
+    record = dict(chunks[0]["metadata"])
+    cif, cif_chunk = _find_cif(chunks)
+    record["cif"] = cif
+
+    sources = {}
+    for field in LOOKUP_FIELDS:
+        if field == "cif":
+            source = cif_chunk
+        else:
+            needle = _needle(field, record.get(field))
+            source = next((c for c in chunks if needle and needle in c["contenido"]), None)
+        if source:
+            meta = source["metadata"]
+            sources[field] = {"chunk_id": meta.get("chunk_id"), "pagina": meta.get("pagina"),
+                              "seccion": meta.get("seccion")}
+    record["field_sources"] = sources
+    return record
+
+
+# ============================================
+# STORE
+# ============================================
+
+class ContractFactsStore:
+    """Tabla de hechos por contrato en SQLite (una fila por contrato)."""
+
+    def __init__(self, db_path: Path = CONTRACT_FACTS_DB_PATH):
+        self.db_path = Path(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def rebuild(self, metadatas: List[Dict]) -> int:
+        """Reemplaza la tabla con los hechos de las metadatas de ingesta (una por contrato)."""
+        rows, field_rows = {}, {}
+        for meta in metadatas:
+            num = meta.get("num_contrato")
+            if not num:
+                continue
+            for field, source in (meta.get("field_sources") or {}).items():
+                value = meta.get(field)
+                if field in LOOKUP_FIELDS and value and source.get("chunk_id"):
+                    key = normalize_contract_id(num) or num
+                    field_rows[(key, field)] = (key, field, str(value), meta.get("archivo"), source["chunk_id"],
+                                                source.get("pagina"), source.get("seccion"))
+            rows[num] = (
+                num,
+                meta.get("archivo"),
+                meta.get("tipo_contrato"),
+                meta.get("contratista"),
+                _to_cents(parse_amount(meta.get("importe"))),
+                meta.get("importe"),
+                _to_iso(parse_date(meta.get("fecha_inicio"))),
+                _to_iso(parse_date(meta.get("fecha_fin"))),
+                _to_cents(parse_amount(meta.get("aval_importe"))),
+                meta.get("aval_importe"),
+                meta.get("aval_entidad"),
+                _to_iso(parse_date(meta.get("aval_vencimiento"))),
+                meta.get("nivel_seguridad"),
+                int(bool(meta.get("requiere_confidencialidad"))),
+                meta.get("normas"),
+            )
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executescript(_SCHEMA)
+                conn.execute("DELETE FROM contracts")
+                conn.executemany(
+                    f"INSERT INTO contracts ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    list(rows.values())
+                )
+                conn.execute("DELETE FROM contract_fields")
+                conn.executemany("INSERT INTO contract_fields VALUES (?, ?, ?, ?, ?, ?, ?)", list(field_rows.values()))
+        finally:
+            conn.close()
+        logger.info(f"✅ Contract facts: {len(rows)} contratos y {len(field_rows)} campos con fuente en {self.db_path}")
+        return len(rows)
+
+    def is_built(self) -> bool:
+        if not self.db_path.exists():
+            return False
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM contracts").fetchone()[0] > 0
+        except sqlite3.Error:
+            return False
+        finally:
+            conn.close()
+
+    def field(self, num_contrato: str, field: str) -> Optional[Dict]:
+        """Valor de un campo puntual de un contrato con su chunk fuente, o None."""
+        if not self.db_path.exists():
+            return None
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM contract_fields WHERE num_contrato = ? AND field = ?", (num_contrato, field)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    def contractors(self) -> List[str]:
+        """Contratistas distintos de la tabla (para reconocerlos como filtro en la query)."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT DISTINCT contratista FROM contracts WHERE contratista IS NOT NULL")
+            return [row[0] for row in rows]
+        except sqlite3.Error:
+            return []
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _where(date_field: Optional[str], start: Optional[date], end: Optional[date],
+               require: Optional[str], contractors: Optional[List[str]] = None) -> Tuple[str, list]:
+        clauses, params = [], []
+        if require:
+            clauses.append(f"{require} IS NOT NULL")
+        if contractors:
+            clauses.append(f"contratista IN ({', '.join('?' * len(contractors))})")
+            params.extend(contractors)
+        if date_field:
+            clauses.append(f"{date_field} IS NOT NULL")
+            if start:
+                clauses.append(f"{date_field} >= ?")
+                params.append(start.isoformat())
+            if end:
+                clauses.append(f"{date_field} <= ?")
+                params.append(end.isoformat())
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def select(self, order_by: Optional[str] = None, descending: bool = True, limit: Optional[int] = None,
+               date_field: Optional[str] = None, start: Optional[date] = None, end: Optional[date] = None,
+               contractors: Optional[List[str]] = None) -> List[Dict]:
+        """
+        Contratos filtrados por rango de fechas (y contratista) y ordenados por un
+        campo (importe o fecha). Los campos son de la lista blanca AMOUNT_FIELDS / DATE_FIELDS.
+        """
+        column = self._column(order_by) if order_by else None
+        where, params = self._where(self._column(date_field) if date_field else None, start, end, column, contractors)
+        sql = f"SELECT * FROM contracts{where}"
+        if column:
+            sql += f" ORDER BY {column} {'DESC' if descending else 'ASC'}, num_contrato"
+        else:
+            sql += " ORDER BY num_contrato"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        conn = self._connect()
+        try:
+            return [self._row_to_facts(row) for row in conn.execute(sql, params)]
+        finally:
+            conn.close()
+
+    def total(self, field: str, date_field: Optional[str] = None, start: Optional[date] = None,
+              end: Optional[date] = None, contractors: Optional[List[str]] = None) -> Tuple[Decimal, int]:
+        """Suma exacta de un campo de importe y número de contratos que lo tienen."""
+        column = self._column(field)
+        where, params = self._where(self._column(date_field) if date_field else None, start, end, column, contractors)
+        conn = self._connect()
+        try:
+            cents, count = conn.execute(f"SELECT COALESCE(SUM({column}), 0), COUNT(*) FROM contracts{where}", params).fetchone()
+        finally:
+            conn.close()
+        return Decimal(cents) / 100, count
+
+    @staticmethod
+    def _column(field: str) -> str:
+        if field in AMOUNT_FIELDS:
+            return f"{field}_cents"
+        if field in DATE_FIELDS:
+            return field
+        raise ValueError(f"Campo no soportado en contract facts: {field}")
+
+    @staticmethod
+    def _row_to_facts(row: sqlite3.Row) -> Dict:
+        facts = dict(row)
+        for field in AMOUNT_FIELDS:
+            cents = facts.pop(f"{field}_cents")
+            facts[field] = Decimal(cents) / 100 if cents is not None else None
+        for field in DATE_FIELDS:
+            facts[field] = date.fromisoformat(facts[field]) if facts[field] else None
+        facts["requiere_confidencialidad"] = bool(facts["requiere_confidencialidad"])
+        return facts
+
+
+_facts_store = None
+_facts_store_lock = threading.Lock()
+
+
+def get_contract_facts_store() -> ContractFactsStore:
+    """Obtiene el store global de hechos por contrato."""
+    global _facts_store
+    if _facts_store is None:
+        with _facts_store_lock:
+            if _facts_store is None:
+                _facts_store = ContractFactsStore()
+    return _facts_store
+
+
+# ============================================
+# MOTOR DE CONSULTAS
+# ============================================
+
+_SUPERLATIVE_MAX = ("mayor", "maximo", "mas alto", "mas alta", "mas caro", "mas elevado")
+_SUPERLATIVE_MIN = ("menor", "minimo", "mas bajo", "mas baja", "mas barato")
+_EXPIRY_WORDS = frozenset("vence vencen vencimiento caduca caducan expira expiran finaliza finalizan termina terminan".split())
+_START_WORDS = frozenset("empieza empiezan comienza comienzan inicia inician".split())
+_SUM_WORDS = frozenset("suma sumar sumando".split())
+_ALL_WORDS = frozenset("todos todas avales contratos garantias".split())
+
+
+def _period(folded: str, today: date) -> Optional[Tuple[Optional[date], Optional[date], str, str]]:
+    """Rango de fechas pedido en la query (inicio, fin, descripción, texto consumido) o None."""
+    if "este mes" in folded:
+        last = calendar.monthrange(today.year, today.month)[1]
+        return today.replace(day=1), today.replace(day=last), "este mes", "este mes"
+    if "este ano" in folded:
+        return date(today.year, 1, 1), date(today.year, 12, 31), "este año", "este ano"
+    match = re.search(r'proxim[oa]s\s+(\d+)\s+(dias|semanas|meses)', folded)
+    if match:
+        n, unit = int(match.group(1)), match.group(2)
+        days = n * {"dias": 1, "semanas": 7, "meses": 30}[unit]
+        return today, today + timedelta(days=days), f"próximos {n} {unit}", match.group(0)
+    match = re.search(r'antes del?\s+(\d{1,2}/\d{1,2}/\d{4})', folded)
+    if match and parse_date(match.group(1)):
+        return None, parse_date(match.group(1)), f"antes del {match.group(1)}", match.group(0)
+    match = re.search(r'\b(?:en|de)\s+(' + "|".join(MONTHS) + r')\b(?:\s+de)?(?:\s+(\d{4}))?', folded)
+    if match:
+        month = MONTHS[match.group(1)]
+        year = int(match.group(2)) if match.group(2) else today.year
+        last = calendar.monthrange(year, month)[1]
+        return date(year, month, 1), date(year, month, last), f"{match.group(1)} de {year}", match.group(0)
+    match = re.search(r'\b(?:en|de|del|durante)\s+(?:el\s+)?(?:ano\s+)?(\d{4})\b', folded)
+    if match:
+        year = int(match.group(1))
+        return date(year, 1, 1), date(year, 12, 31), str(year), match.group(0)
+    if "pronto" in folded:
+        return today, today + timedelta(days=ALERT_DAYS_MEDIUM), f"próximos {ALERT_DAYS_MEDIUM} días", "pronto"
+    return None
+
+
+# Años, meses y fechas: si quedan en la query tras extraer el periodo, la tabla no
+# sabe aplicarlos y la respuesta no sería exacta
+_DATE_TOKEN_RE = re.compile(r'\b(?:\d{1,2}/\d{1,2}/\d{2,4}|(?:19|20)\d{2}|' + "|".join(MONTHS) + r')\b')
+
+
+# Palabras que el motor entiende (intención, campos, periodos y relleno). Cualquier otra
+# palabra es un calificador (tipo de contrato, contratista, ámbito...): solo se aplica si
+# nombra a un contratista de la tabla; si no, la query sigue por retrieval.
+_FACT_VOCABULARY = frozenset(
+    "que cual cuales es son ser el la lo los las de del en a al hay y o con por para un una unos unas "
+    "se su sus me nos dame dime lista listar listado muestra muestrame mostrar indica indicame ver "
+    "tiene tienen tengan tenga cuanto cuanta existen existe actuales vigentes registrados "
+    "este esta ano año mes dia dias semana semanas meses proximo proxima proximos proximas antes pronto durante "
+    "total todos todas contrato contratos importe importes presupuesto valor cuantia caro barato "
+    "aval avales garantia garantias avalista suma sumar sumando cuantos cuantas "
+    "mayor menor maximo minimo mas alto alta elevado bajo baja".split()
+) | _EXPIRY_WORDS | _START_WORDS | frozenset(MONTHS)
+
+
+def _contractor_filter(words: set, store: ContractFactsStore) -> Optional[List[str]]:
+    """
+    Contratistas a los que se refiere la query, [] si no hay calificadores, o
+    None si hay calificadores que la tabla no puede aplicar.
+    """
+    qualifiers = {w for w in words - _FACT_VOCABULARY if not w.isdigit()}
+    if not qualifiers:
+        return []
+    matched = []
+    for name in store.contractors():
+        tokens = set(re.findall(r'[^\W_]+', fold(name)))
+        if qualifiers <= tokens:
+            matched.append(name)
+    return matched or None
+
+
+def _limit(folded: str) -> int:
+    match = re.search(r'\b(\d{1,2})\s+contratos\b', folded)
+    return int(match.group(1)) if match else 1
+
+
+def answer_fact_query(query: str, today: Optional[date] = None,
+                      store: Optional[ContractFactsStore] = None) -> Optional[Dict]:
+    """
+    Resuelve la query sobre la tabla de hechos si es una pregunta de ordenación,
+    suma, conteo o vencimientos. None si no aplica (se sigue por retrieval).
+    Si la query nombra a un contratista de la tabla se filtra por él; con
+    cualquier otro calificador (tipo de contrato, ámbito...) también es None.
+    El periodo pedido se aplica a todas las intenciones; un año, mes o fecha
+    que no forme un periodo reconocido también devuelve None.
+
+    Returns:
+        Dict con intent (top | sum | count | expiring), field, rows, value (Decimal/int
+        para sum/count), period (descripción) y text (hechos en Markdown para el LLM)
+    """
+    folded = fold(query)
+    words = set(re.findall(r'[^\W_]+', folded))
+    # Preguntas sobre un contrato concreto: las resuelve el retrieval filtrado
+    if extract_contract_ids(query):
+        return None
+
+    store = store or get_contract_facts_store()
+    if not store.is_built():
+        return None
+    today = today or date.today()
+    contractors = _contractor_filter(words, store)
+    if contractors is None:
+        logger.info("📇 Contract facts: calificador no aplicable en la tabla, se sigue por retrieval")
+        return None
+
+    is_aval = bool(words & {"aval", "avales", "garantia", "garantias", "avalista"})
+    amount_field = "aval_importe" if is_aval else "importe"
+    wants_count = bool(words & {"cuantos", "cuantas"})
+    wants_expiry = bool(words & (_EXPIRY_WORDS | _START_WORDS))
+    wants_amount = bool(words & {"importe", "importes", "presupuesto", "valor", "caro", "barato", "cuantia"}) or is_aval
+    # El periodo se aplica a cualquier intención: sin verbo de vencimiento,
+    # "contratos de 2025" se refiere a la fecha de inicio del contrato
+    if words & _START_WORDS or not wants_expiry:
+        date_field = "fecha_inicio"
+    else:
+        date_field = "aval_vencimiento" if is_aval else "fecha_fin"
+
+    period = _period(folded, today)
+    if _DATE_TOKEN_RE.search(folded.replace(period[3], " ", 1) if period else folded):
+        logger.info("📇 Contract facts: fecha no reconocida como periodo, se sigue por retrieval")
+        return None
+    start, end, label = period[:3] if period else (None, None, None)
+    period_field = date_field if period else None
+
+    result = None
+    if wants_count and (period or not wants_expiry):
+        rows = store.select(date_field=period_field, start=start, end=end, contractors=contractors)
+        result = {"intent": "count", "field": period_field, "rows": rows, "value": len(rows), "period": label}
+    elif words & _SUM_WORDS or ("total" in words and words & _ALL_WORDS):
+        if wants_amount or words & _ALL_WORDS:
+            value, _ = store.total(amount_field, date_field=period_field, start=start, end=end,
+                                   contractors=contractors)
+            rows = store.select(order_by=amount_field, date_field=period_field, start=start, end=end,
+                                contractors=contractors)
+            result = {"intent": "sum", "field": amount_field, "rows": rows, "value": value, "period": label}
+    elif wants_amount and any(s in folded for s in _SUPERLATIVE_MAX + _SUPERLATIVE_MIN):
+        descending = any(s in folded for s in _SUPERLATIVE_MAX)
+        rows = store.select(order_by=amount_field, descending=descending, limit=_limit(folded),
+                            date_field=period_field, start=start, end=end, contractors=contractors)
+        result = {"intent": "top", "field": amount_field, "rows": rows, "value": None,
+                  "period": label, "descending": descending}
+    elif wants_expiry and period:
+        rows = store.select(order_by=date_field, descending=False, date_field=date_field, start=start, end=end,
+                            contractors=contractors)
+        result = {"intent": "expiring", "field": date_field, "rows": rows, "value": len(rows), "period": label}
+
+    if result is None:
+        return None
+    result["contractors"] = contractors
+    result["text"] = render_facts(result)
+    logger.info(f"📇 Contract facts: intent={result['intent']} field={result['field']} ({len(result['rows'])} contratos)")
+    return result
+
+
+def render_facts(result: Dict) -> str:
+    """Hechos exactos del resultado en Markdown (lo que recibe el LLM para redactar)."""
+    lines = []
+    if result["intent"] == "sum":
+        lines.append(f"SUMA EXACTA de {result['field']}: {format_amount(result['value'])} "
+                     f"({len(result['rows'])} contratos)")
+    elif result["intent"] in ("count", "expiring"):
+        lines.append(f"NÚMERO DE CONTRATOS: {result['value']}")
+    if result.get("period"):
+        lines.append(f"PERIODO: {result['period']}")
+    if result.get("contractors"):
+        lines.append(f"CONTRATISTA: {', '.join(result['contractors'])}")
+
+    lines.append("")
+    lines.append("| Contrato | Contratista | Importe | Fecha fin | Aval | Entidad avalista | Vencimiento aval |")
+    lines.append("|---|---|---|---|---|---|---|")
+    for row in result["rows"]:
+        lines.append("| " + " | ".join([
+            row["num_contrato"],
+            row.get("contratista") or "NO CONSTA",
+            format_amount(row["importe"]) if row.get("importe") is not None else "NO CONSTA",
+            row["fecha_fin"].strftime("%d/%m/%Y") if row.get("fecha_fin") else "NO CONSTA",
+            format_amount(row["aval_importe"]) if row.get("aval_importe") is not None else "NO CONSTA",
+            row.get("aval_entidad") or "NO CONSTA",
+            row["aval_vencimiento"].strftime("%d/%m/%Y") if row.get("aval_vencimiento") else "NO CONSTA",
+        ]) + " |")
+    return "\n".join(lines)
+
+
+# ============================================
+# LOOKUP DE CAMPO PUNTUAL (SIN LLM)
+# ============================================
+
+_AVAL_WORDS = frozenset("aval avales garantia garantias avalista".split())
+_FIELD_WORDS = {
+    "cif": frozenset("cif nif".split()),
+    "contratista": frozenset("contratista adjudicatario adjudicataria empresa proveedor".split()),
+    "importe": frozenset("importe presupuesto precio coste cuantia valor".split()),
+    "fecha_inicio": frozenset("inicio empieza comienza comienzo inicia".split()),
+    "fecha_fin": frozenset("fin finaliza finalizacion vence vencimiento termina terminacion expira".split()),
+}
+_AVAL_FIELD_WORDS = {
+    "aval_entidad": frozenset("entidad banco avalista emisor emite".split()),
+    "aval_importe": frozenset("importe cuantia valor".split()),
+    "aval_vencimiento": frozenset("vencimiento vence caduca expira fecha fin".split()),
+}
+# Preguntas que piden algo más que un dato (varios campos, comparaciones, explicaciones)
+_COMPOUND_WORDS = frozenset(
+    "y ademas tambien compara comparar diferencia porque explica resume resumen "
+    "penalizacion penalizaciones hitos condiciones clausula clausulas".split()
+)
+# Calificadores de sub-campo: piden una parte del dato (un lote, un precio unitario,
+# una anualidad...), no el valor total del contrato que guarda contract_fields
+_SUBFIELD_WORDS = frozenset(
+    "lote lotes unitario unitaria unitarios unitarias unidad unidades mensual mensuales mensualidad "
+    "anual anuales anualidad anualidades trimestral semestral hito hitos fase fases partida partidas "
+    "parcial parciales cuota cuotas plazo plazos entrega entregas iva base adicional adicionales "
+    "prorroga prorrogas modificado modificacion revision revisado estimado licitacion "
+    "primer primero primera segundo segunda tercer tercero tercera ultimo ultima".split()
+)
+
+
+def resolve_field_lookup(query: str) -> Optional[Tuple[str, str]]:
+    """
+    (contrato, campo) si la query pide exactamente un campo de LOOKUP_FIELDS de
+    exactamente un contrato; None en cualquier otro caso.
+    """
+    contract_ids = extract_contract_ids(query)
+    if len(contract_ids) != 1:
+        return None
+    folded = fold(query)
+    words = set(re.findall(r'[^\W_]+', folded))
+    if words & _COMPOUND_WORDS or "por que" in folded:
+        return None
+    if words & _SUBFIELD_WORDS or re.search(r'\bpor\s+(?:cada\s+)?[a-zñ]+', folded):
+        return None
+
+    if words & _AVAL_WORDS:
+        fields = {field for field, vocabulary in _AVAL_FIELD_WORDS.items() if words & vocabulary}
+        if not fields and "avalista" in words:
+            fields = {"aval_entidad"}
+    else:
+        fields = {field for field, vocabulary in _FIELD_WORDS.items() if words & vocabulary}
+        if "cif" in fields:
+            fields.discard("contratista")  # "CIF del contratista"
+    if len(fields) != 1:
+        return None
+    return contract_ids[0], fields.pop()
+
+
+def answer_field_lookup(query: str, store: Optional[ContractFactsStore] = None) -> Optional[Dict]:
+    """
+    Respuesta directa a "campo X del contrato Y" desde contract_fields, con cita
+    al chunk del que se extrajo el valor. None si no aplica o el campo no consta
+    (se sigue por el pipeline completo).
+
+    Returns:
+        Dict con contract, field, value, archivo, chunk_id, pagina, seccion y
+        text (respuesta final con cita [Fuente: ...])
+    """
+    resolved = resolve_field_lookup(query)
+    if not resolved:
+        return None
+    contract_id, field = resolved
+    row = (store or get_contract_facts_store()).field(contract_id, field)
+    if not row:
+        logger.info(f"📇 Lookup de campo MISS: {contract_id}.{field}")
+        return None
+
+    citation = f"[Fuente: {row['archivo']}, Pág: {row['pagina']}, Sección: {row['seccion']}]"
+    text = f"El {LOOKUP_FIELDS[field]} del contrato **{contract_id}** es **{row['value']}** {citation}"
+    logger.info(f"⚡ Lookup de campo HIT: {contract_id}.{field} <- {row['chunk_id']}")
+    return {
+        "contract": contract_id,
+        "field": field,
+        "value": row["value"],
+        "archivo": row["archivo"],
+        "chunk_id": row["chunk_id"],
+        "pagina": row["pagina"],
+        "seccion": row["seccion"],
+        "text": text,
+    }
@@ -7,14 +7,18 @@ Utiliza regex para extraer CIFs, fechas, importes y normativas de forma precisa.
 import re
 from typing import Dict, Optional, List
 
+from src.utils.text_analysis import CIF_PATTERN, CONTRACT_ID_RE, normalize_contract_id
+
+# Patrones compartidos con el analizador léxico (BM25 / boosting)
+CIF_RE = re.compile(rf'\b{CIF_PATTERN}\b')
+
 
 def extract_cif(text: str) -> Optional[str]:
     """
     Extrae CIF/NIF español del texto.
     Formato: [A-Z]-XXXXXXXX o [A-Z]XXXXXXXX
     """
-    pattern = r'\b([A-Z])-?(\d{8})\b'
-    match = re.search(pattern, text)
+    match = CIF_RE.search(text)
     if match:
         return f"{match.group(1)}-{match.group(2)}"
     return None
@@ -24,8 +28,7 @@ def extract_cifs(text: str) -> List[str]:
     """
     Extrae TODOS los CIFs encontrados en el texto.
     """
-    pattern = r'\b([A-Z])-?(\d{8})\b'
-    matches = re.finditer(pattern, text)
+    matches = CIF_RE.finditer(text)
     
     cifs = []
     for match in matches:
@@ -122,29 +125,19 @@ def extract_penalties(text: str) -> List[Dict[str, str]]:
 def extract_contract_id(text: str) -> Optional[str]:
     """
     Extrae ID de contrato mencionado en query.
-    Formato: CON_2024_012, SER_2024_015, etc.
+    Formato: CON_2024_012, SER_2024_015, etc. (también CON-2024-012 / CON 2024 012)
     """
-    pattern = r'\b(CON|SER|SUM|LIC)_\d{4}_\d{3}\b'
-    match = re.search(pattern, text, re.IGNORECASE)
+    match = CONTRACT_ID_RE.search(text)
     if match:
-        return match.group(0).upper()
+        return normalize_contract_id(match.group(0))
     return None
 
 
 def extract_contract_ids(text: str) -> List[str]:
     """
-    Extrae TODOS los IDs de contrato mencionados.
+    Extrae TODOS los IDs de contrato mencionados (normalizados a CON_2024_012).
     """
-    pattern = r'\b(CON|SER|SUM|LIC)_\d{4}_\d{3}\b'
-    matches = re.findall(pattern, text, re.IGNORECASE)
-    
-    # re.findall con grupos retorna tuplas si hay grupos, pero aqui el grupo es (CON|SER...)
-    # Mejor usar finditer para consistencia o ajustar regex
-    # Ajustando regex para capturar todo
-    pattern_full = r'\b(?:CON|SER|SUM|LIC)_\d{4}_\d{3}\b'
-    matches = re.findall(pattern_full, text, re.IGNORECASE)
-    
-    return list(set([m.upper() for m in matches]))
+    return list(set(normalize_contract_id(m.group(0)) for m in CONTRACT_ID_RE.finditer(text)))
 
 
 def is_generic_iso_9001(text: str) -> bool:
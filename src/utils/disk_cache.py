@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Caché persistente clave-valor sobre SQLite.
+Base común para cachés en disco (embeddings, respuestas LLM...).
+Expulsión LRU acotada por tamaño total en bytes y TTL opcional.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Máximo de parámetros por sentencia SQL (límite conservador de SQLite)
+_SQL_BATCH = 500
+
+
+class DiskCache:
+    """
+    Caché clave-valor persistente (SQLite) con expulsión LRU por tamaño.
+
+    - Las claves se agrupan por 'namespace' (ej: nombre de modelo).
+    - Cuando el tamaño total supera max_bytes, se eliminan las entradas
+      menos usadas recientemente hasta bajar al 90% del límite.
+    - Si ttl_seconds está definido, las entradas más antiguas se ignoran y purgan.
+    - Thread-safe: una única conexión protegida por lock.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 512 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at)")
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        """Obtiene un valor o None si no existe / ha expirado."""
+        return self.get_many(namespace, [key]).get(key)
+
+    def get_many(self, namespace: str, keys: Iterable[str]) -> Dict[str, bytes]:
+        """
+        Obtiene varios valores en bloque.
+
+        Returns:
+            Dict {key: value} solo con las claves encontradas.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+
+        now = time.time()
+        min_created = now - self.ttl_seconds if self.ttl_seconds else 0.0
+        found: Dict[str, bytes] = {}
+
+        with self._lock:
+            for start in range(0, len(keys), _SQL_BATCH):
+                batch = keys[start:start + _SQL_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM cache WHERE namespace = ? AND created_at >= ? AND key IN ({placeholders})",
+                    [namespace, min_created, *batch]
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                # Refrescar LRU
+                self._conn.executemany(
+                    "UPDATE cache SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    [(now, namespace, k) for k in found]
+                )
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set(self, namespace: str, key: str, value: bytes) -> None:
+        """Guarda un valor."""
+        self.set_many(namespace, [(key, value)])
+
+    def set_many(self, namespace: str, items: List[Tuple[str, bytes]]) -> None:
+        """Guarda varios valores en una única transacción y aplica la expulsión."""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO cache (namespace, key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    [(namespace, k, sqlite3.Binary(v), len(v), now, now) for k, v in items]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._evict()
+
+    def delete_namespace(self, namespace: str) -> None:
+        """Elimina todas las entradas de un namespace."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def clear(self) -> None:
+        """Vacía la caché completa."""
+        with self._lock:
+            self._conn.execute("DELETE FROM cache")
+
+    def total_bytes(self) -> int:
+        """Tamaño total de los valores almacenados."""
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Estadísticas de uso (hits/misses de este proceso + tamaño en disco)."""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def _evict(self) -> None:
+        """Purga expirados y expulsa LRU si se supera max_bytes. Requiere lock tomado."""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)
+        to_free = total - target
+        freed = 0
+        victims = []
+        for namespace, key, size in self._conn.execute(
+            "SELECT namespace, key, size FROM cache ORDER BY accessed_at ASC"
+        ):
+            victims.append((namespace, key))
+            freed += size
+            if freed >= to_free:
+                break
+
+        self._conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", victims)
+        logger.info(f"🧹 DiskCache {self.path.name}: expulsadas {len(victims)} entradas ({freed / 1024:.0f} KB)")
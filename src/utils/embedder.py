@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Embedder con batching por tokens y peticiones concurrentes.
+- Divide la entrada en batches acotados por tokens y nº de textos.
+- Ejecuta los batches en un pool acotado (rate limit y retry en el gateway LLM).
+- Backend 'fake' determinista para benchmarks offline (sin API).
+"""
+
+import hashlib
+import logging
+import threading
+import time
+import concurrent.futures
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import (
+    MODEL_EMBEDDINGS, EMBEDDING_DIMENSIONS, EMBEDDINGS_BACKEND,
+    EMBEDDING_BATCH_MAX_TOKENS, EMBEDDING_BATCH_MAX_ITEMS, EMBEDDING_MAX_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _get_embedding_encoder():
+    """Encoder de tiktoken usado por los modelos text-embedding-3 (cargado una vez)."""
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_embedding_tokens(texts: List[str]) -> List[int]:
+    """Cuenta tokens de cada texto (encode en lote, multihilo en tiktoken)."""
+    try:
+        encoder = _get_embedding_encoder()
+        return [len(tokens) for tokens in encoder.encode_ordinary_batch(texts)]
+    except Exception as e:
+        # Sin tiktoken (o sin red para descargar el BPE): estimación conservadora
+        logger.debug(f"Conteo de tokens aproximado ({e})")
+        return [len(t) // 3 + 1 for t in texts]
+
+
+def make_batches(texts: List[str],
+                 max_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+                 max_items: int = EMBEDDING_BATCH_MAX_ITEMS) -> List[List[int]]:
+    """
+    Agrupa los textos en batches que respetan los límites de la API.
+
+    Returns:
+        Lista de batches, cada uno con los índices de sus textos (orden preservado).
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+
+    for i, n_tokens in enumerate(count_embedding_tokens(texts)):
+        if current and (current_tokens + n_tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n_tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class OpenAIEmbedder:
+    """Embedder real contra la API de OpenAI (vía gateway: limitador RPM/TPM + retry)."""
+
+    def __init__(self, model: str = MODEL_EMBEDDINGS):
+        self.model = model
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        from src.utils.llm_gateway import get_llm_gateway
+        return get_llm_gateway().embed(texts, model=self.model)
+
+
+class FakeEmbedder:
+    """
+    Embedder local determinista (hash del texto -> vector unitario).
+    Simula la latencia de red para poder medir throughput del pipeline sin API.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, latency_s: float = 0.0, per_token_s: float = 0.0):
+        self.model = f"fake-embedder-{dimensions}"
+        self.dimensions = dimensions
+        self.latency_s = latency_s
+        self.per_token_s = per_token_s
+
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.latency_s or self.per_token_s:
+            time.sleep(self.latency_s + self.per_token_s * sum(count_embedding_tokens(texts)))
+
+        vectors = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            vec = np.random.default_rng(seed).standard_normal(self.dimensions).astype(np.float32)
+            vec /= np.linalg.norm(vec)
+            vectors.append(vec.tolist())
+        return vectors
+
+
+class BatchEmbedder:
+    """
+    Orquesta el embedding de muchos textos: batches por tokens + pool concurrente.
+    El pool es compartido y acotado (max_concurrency peticiones en vuelo por proceso).
+    """
+
+    def __init__(self, backend=None, max_concurrency: int = EMBEDDING_MAX_CONCURRENCY):
+        self.backend = backend or OpenAIEmbedder()
+        self.max_concurrency = max_concurrency
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency, thread_name_prefix="embedder"
+        )
+        # Métricas acumuladas (throughput real)
+        self._stats_lock = threading.Lock()
+        self.total_texts = 0
+        self.total_batches = 0
+        self.total_seconds = 0.0
+
+    @property
+    def model(self) -> str:
+        return self.backend.model
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """Genera embeddings para todos los textos preservando el orden."""
+        if not texts:
+            return []
+
+        start = time.time()
+        batches = make_batches(texts)
+
+        if len(batches) == 1:
+            results = [self.backend.embed_batch(texts)]
+        else:
+            futures = [
+                self._executor.submit(self.backend.embed_batch, [texts[i] for i in batch])
+                for batch in batches
+            ]
+            results = [f.result() for f in futures]
+
+        embeddings: List[Optional[List[float]]] = [None] * len(texts)
+        for batch, vectors in zip(batches, results):
+            for i, vec in zip(batch, vectors):
+                embeddings[i] = vec
+
+        elapsed = time.time() - start
+        with self._stats_lock:
+            self.total_texts += len(texts)
+            self.total_batches += len(batches)
+            self.total_seconds += elapsed
+
+        logger.info(f"Embeddings: {len(texts)} textos en {len(batches)} batches ({len(texts) / max(elapsed, 1e-6):.1f} textos/s)")
+        return embeddings
+
+    def throughput(self) -> float:
+        """Textos/s acumulados desde el arranque."""
+        with self._stats_lock:
+            return self.total_texts / self.total_seconds if self.total_seconds else 0.0
+
+
+# Instancia global (lazy)
+_embedder: Optional[BatchEmbedder] = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> BatchEmbedder:
+    """Obtiene el embedder global según EMBEDDINGS_BACKEND ('openai' | 'fake')."""
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                backend = FakeEmbedder() if EMBEDDINGS_BACKEND == "fake" else OpenAIEmbedder()
+                _embedder = BatchEmbedder(backend)
+                logger.info(f"Embedder inicializado: {backend.model} (concurrencia={EMBEDDING_MAX_CONCURRENCY})")
+    return _embedder
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+Caché persistente de embeddings direccionada por contenido.
+Clave: (modelo, sha256(texto)). Valor: vector float32.
+Evita re-embeber queries repetidas y chunks que no han cambiado entre ingestas.
+"""
+
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import CACHE_PATH, EMBEDDING_CACHE_MAX_MB
+from src.utils.disk_cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+
+def text_hash(text: str) -> str:
+    """Hash de contenido estable para un texto."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Caché de embeddings en disco, un namespace por modelo."""
+
+    def __init__(self, path: Path = None, max_mb: int = EMBEDDING_CACHE_MAX_MB):
+        path = path or (Path(CACHE_PATH) / "embeddings.sqlite")
+        self._store = DiskCache(path, max_bytes=max_mb * 1024 * 1024)
+
+    def get_many(self, model: str, texts: List[str]) -> Dict[str, List[float]]:
+        """
+        Busca embeddings ya calculados.
+
+        Returns:
+            Dict {texto: embedding} solo con los textos en caché.
+        """
+        hashes = {text_hash(t): t for t in texts}
+        found = self._store.get_many(model, hashes.keys())
+        return {
+            hashes[h]: np.frombuffer(blob, dtype=np.float32).tolist()
+            for h, blob in found.items()
+        }
+
+    def set_many(self, model: str, texts: List[str], embeddings: List[List[float]]) -> None:
+        """Guarda embeddings recién calculados."""
+        self._store.set_many(model, [
+            (text_hash(t), np.asarray(e, dtype=np.float32).tobytes())
+            for t, e in zip(texts, embeddings)
+        ])
+
+    def stats(self) -> Dict:
+        return self._store.stats()
+
+
+# Instancia global (lazy)
+_embedding_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Obtiene la caché de embeddings global (thread-safe)."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _cache_lock:
+            if _embedding_cache is None:
+                _embedding_cache = EmbeddingCache()
+                logger.info(f"Caché de embeddings lista ({_embedding_cache.stats()['entries']} entradas)")
+    return _embedding_cache
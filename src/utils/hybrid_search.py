@@ -3,27 +3,50 @@
 Búsqueda híbrida: BM25 + Vector Search con Reciprocal Rank Fusion.
 """
 
+import concurrent.futures
 import logging
-from typing import List, Dict
-from src.utils.vectorstore import search as vector_search
+import threading
+import time
+from functools import lru_cache
+from typing import List, Dict, Optional, Set, Tuple
+from src.config import HYBRID_VECTOR_TIMEOUT_S, HYBRID_BM25_TIMEOUT_S
+from src.utils.vectorstore import search as vector_search, search_many as vector_search_many
 from src.utils.bm25_index import BM25Index
+from src.utils.text_analysis import terms, is_norm_token
+from src.utils.chunk_identity import get_chunk_id
+from src.utils.observability import get_stage_metrics
 
 logger = logging.getLogger(__name__)
 
 # Instancia global del índice BM25
 _bm25_index = None
+_bm25_lock = threading.Lock()
+
+# Pool compartido para las ramas de búsqueda (vector / BM25)
+_LEG_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="hybrid-leg")
 
 
 def get_bm25_index() -> BM25Index:
-    """Obtiene el índice BM25 (lazy load con caché)."""
+    """
+    Obtiene el índice BM25 (lazy load con caché, thread-safe).
+    Si una ingesta ha activado una generación nueva (CURRENT), se recarga: las
+    cachés de retrieval y rerank ya pasan a la nueva versión del corpus y sus
+    fallos no deben rellenarse con el corpus léxico anterior.
+    """
     global _bm25_index
     
-    if _bm25_index is None:
-        _bm25_index = BM25Index()
-        _bm25_index.load()
-        logger.info("Índice BM25 cargado en memoria")
+    index = _bm25_index
+    if index is None or index.is_stale():
+        with _bm25_lock:
+            if _bm25_index is None or _bm25_index.is_stale():
+                previous = _bm25_index
+                index = BM25Index(index_path=str(previous.index_path)) if previous else BM25Index()
+                index.load()
+                _bm25_index = index
+                logger.info(f"Índice BM25 cargado en memoria ({index.generation})")
+            index = _bm25_index
     
-    return _bm25_index
+    return index
 
 
 def reciprocal_rank_fusion(results_list: List[List[Dict]], k: int = 60) -> List[Dict]:
@@ -37,24 +60,24 @@ def reciprocal_rank_fusion(results_list: List[List[Dict]], k: int = 60) -> List[
     Returns:
         Lista fusionada y re-rankeada
     """
-    # Mapear documentos por ID único
+    # Mapear documentos por ID estable de chunk (asignado en la ingesta)
     doc_scores = {}
     
     for results in results_list:
         for rank, doc in enumerate(results, 1):
-            # Crear ID único del documento (primeros 100 chars del contenido)
-            doc_id = doc['contenido'][:100]
+            doc_id = get_chunk_id(doc)
             
-            if doc_id not in doc_scores:
-                doc_scores[doc_id] = {
+            entry = doc_scores.get(doc_id)
+            if entry is None:
+                entry = doc_scores[doc_id] = {
                     'doc': doc,
                     'rrf_score': 0.0,
                     'ranks': []
                 }
             
             # Calcular RRF score: 1 / (k + rank)
-            doc_scores[doc_id]['rrf_score'] += 1.0 / (k + rank)
-            doc_scores[doc_id]['ranks'].append(rank)
+            entry['rrf_score'] += 1.0 / (k + rank)
+            entry['ranks'].append(rank)
     
     # Ordenar por RRF score descendente
     fused = sorted(
@@ -64,11 +87,15 @@ def reciprocal_rank_fusion(results_list: List[List[Dict]], k: int = 60) -> List[
     )
     
     # Retornar solo los documentos con metadata de RRF
+    # (metadata copiada: no contaminar los dicts compartidos del índice BM25)
     results = []
     for item in fused:
         doc = item['doc'].copy()
-        doc['metadata']['rrf_score'] = item['rrf_score']
-        doc['metadata']['rrf_ranks'] = item['ranks']
+        doc['metadata'] = {
+            **item['doc']['metadata'],
+            'rrf_score': item['rrf_score'],
+            'rrf_ranks': item['ranks']
+        }
         results.append(doc)
     
     return results
@@ -88,18 +115,22 @@ BLACKLIST_PHRASES = [
     "El orden jurisdiccional contencioso-administrativo será el competente"
 ]
 
-# Patrones de normativas técnicas críticas (Fix INF_05)
-LEGISLATIVE_PATTERNS = [
-    r'STANAG\s+\d{4}',
-    r'ISO\s+\d+',
-    r'MIL-STD-\d+',
-    r'PECAL\s+\d+',
-    r'AQAP\s+\d+',
-    r'DEF-STAN'
-]
+# Términos de intención legislativa (Fix INF_05), ya analizados
+LEGISLATIVE_TERMS = terms("normativa normativas estándar estándares standard regulación stanag iso std pecal aqap")
+
+@lru_cache(maxsize=4096)
+def _value_terms(value: str) -> frozenset:
+    """Términos de un valor de metadata (se repiten en todos los chunks del documento)."""
+    return frozenset(terms(value))
 
-def calculate_final_score(doc: Dict, query: str) -> float:
-    """Calcula score final aplicando penalizaciones y boosts."""
+
+def calculate_final_score(doc: Dict, query: str, query_terms: Optional[Set[str]] = None,
+                          content_terms: Optional[Set[str]] = None) -> float:
+    """
+    Calcula score final aplicando penalizaciones y boosts.
+    query_terms / content_terms: términos ya analizados (los del contenido salen del
+    índice BM25); si no se pasan, se analizan aquí.
+    """
     content = doc.get("contenido", "")
     meta = doc.get("metadata", {})
     score = doc.get("metadata", {}).get("rrf_score", 0.0)
@@ -117,58 +148,152 @@ def calculate_final_score(doc: Dict, query: str) -> float:
     
     score *= penalty_multiplier
     
-    # IMPORTANTE: Importar re aquí si no está arriba, o usar el del módulo
-    import re
-
     # 2. BOOSTING DE METADATOS
-    # Campos a verificar: num_contrato, empresa, titulo (si existe), archivo
+    # Campos a verificar: num_contrato, empresa, archivo
+    # Query, metadata y contenido pasan por el mismo analizador (acentos, plurales, IDs)
     boost = 0.0
-    query_lower = query.lower()
-    
-    # Extraer keywords clave de la query (limpiando puntuación)
-    # Solo letras y números, minúsculas
-    clean_query = re.sub(r'[^\w\s]', '', query_lower)
-    keywords = [k for k in clean_query.split() if len(k) > 3]
+    if query_terms is None:
+        query_terms = terms(query)
     
-    # Verificar coincidencias en metadata
     meta_values = [
-        str(meta.get("num_contrato", "")).lower(),
-        str(meta.get("empresa", "")).lower(),
-        str(meta.get("archivo", "")).lower()
+        str(meta.get("num_contrato", "")),
+        str(meta.get("empresa", "")),
+        str(meta.get("archivo", ""))
     ]
     
-    for kw in keywords:
+    for val in meta_values:
         # Boost por Metadata (Documento correcto)
-        for val in meta_values:
-            if kw in val:
-                boost += 1.0
-                logger.info(f"🚀 Metadata Boost: '{kw}' encontrado en '{val}' (+1.0)")
-        
-        # Boost por Contenido (Chunk correcto dentro del documento)
-        # Si la keyword (ej: "aval") aparece en el texto, sube este chunk
-        if kw in content.lower():
-            boost += 0.2
-            # logger.info(f"  -> Content Boost: '{kw}' en contenido (+0.2)")
+        for kw in query_terms & _value_terms(val):
+            boost += 1.0
+            logger.info(f"🚀 Metadata Boost: '{kw}' encontrado en '{val}' (+1.0)")
+    
+    # Boost por Contenido (Chunk correcto dentro del documento)
+    # Si la keyword (ej: "aval") aparece en el texto, sube este chunk
+    if content_terms is None:
+        content_terms = terms(content)
+    boost += 0.2 * len(query_terms & content_terms)
 
     # 3. BOOSTING LEGISLATIVO (Fix INF_05)
     # Si la query pregunta por normativas, priorizar chunks que citan estándares
-    # Detectar intención legislativa
-    legislative_keywords = ["normativa", "estándar", "standard", "regulación", "stanag", "iso", "mil-std", "pecal", "aqap"]
-    is_legislative_query = any(k in query_lower for k in legislative_keywords)
+    is_legislative_query = any(t in LEGISLATIVE_TERMS or is_norm_token(t) for t in query_terms)
     
     if is_legislative_query:
-        for pattern in LEGISLATIVE_PATTERNS:
-            if re.search(pattern, content, re.IGNORECASE):
-                # Boost significativo para asegurar que sobreviva al re-ranking
-                boost += 1.5
-                logger.info(f"📜 Legislative Boost: Patrón '{pattern}' encontrado en chunk (+1.5)")
-                break # Basta con un match para boostear
+        cited = next((t for t in content_terms if is_norm_token(t)), None)
+        if cited:
+            # Boost significativo para asegurar que sobreviva al re-ranking
+            boost += 1.5
+            logger.info(f"📜 Legislative Boost: Normativa '{cited}' encontrada en chunk (+1.5)")
 
     return score + boost
 
+def _vector_leg(query: str, filter_metadata: Dict = None) -> List[Dict]:
+    """Rama semántica: embedding de la query + ChromaDB."""
+    return vector_search(query, k=50, where=filter_metadata)
+
+
+def _bm25_leg(query: str, filter_metadata: Dict = None) -> List[Dict]:
+    """Rama léxica: BM25 + filtro de metadata en memoria."""
+    bm25_results = get_bm25_index().search(query, top_k=50)
+    
+    # Aplicar filtro de metadata a resultados BM25 si se especifica
+    if filter_metadata:
+        bm25_results = [
+            result for result in bm25_results
+            if all(result.get("metadata", {}).get(k) == v for k, v in filter_metadata.items())
+        ]
+    return bm25_results
+
+
+def _vector_leg_many(queries: List[str], filter_metadata: Dict = None) -> List[List[Dict]]:
+    """Rama semántica en lote: un request de embeddings + una consulta multi-vector."""
+    return vector_search_many(queries, k=50, where=filter_metadata)
+
+
+def _bm25_leg_many(queries: List[str], filter_metadata: Dict = None) -> List[List[Dict]]:
+    """Rama léxica en lote: una pasada vectorizada de BM25 para todas las queries."""
+    all_results = get_bm25_index().search_many(queries, top_k=50)
+    if filter_metadata:
+        all_results = [
+            [
+                result for result in bm25_results
+                if all(result.get("metadata", {}).get(k) == v for k, v in filter_metadata.items())
+            ]
+            for bm25_results in all_results
+        ]
+    return all_results
+
+
+def _timed(fn, *args) -> Tuple[List[Dict], float]:
+    """Ejecuta una rama midiendo su latencia propia (sin espera en cola)."""
+    start = time.time()
+    results = fn(*args)
+    return results, time.time() - start
+
+
+def _collect_leg(name: str, future: concurrent.futures.Future, start: float, timeout_s: float) -> Tuple[List[Dict], Optional[BaseException]]:
+    """
+    Espera el resultado de una rama hasta start + timeout_s.
+    Nunca lanza: devuelve (resultados, error) para poder degradar a la otra rama.
+    """
+    metrics = get_stage_metrics()
+    try:
+        results, latency = future.result(timeout=max(0.0, start + timeout_s - time.time()))
+        metrics.record(f"hybrid.{name}", latency, "ok")
+        return results, None
+    except concurrent.futures.TimeoutError:
+        # La rama sigue en el pool hasta terminar; su resultado se descarta
+        metrics.record(f"hybrid.{name}", time.time() - start, "timeout")
+        logger.warning(f"⏱️ Rama {name} excedió su timeout ({timeout_s}s). Continuando sin ella.")
+        return [], TimeoutError(f"Rama {name} excedió su timeout ({timeout_s}s)")
+    except Exception as e:
+        metrics.record(f"hybrid.{name}", time.time() - start, "error")
+        logger.error(f"❌ Rama {name} falló: {e}. Continuando sin ella.")
+        return [], e
+
+
+def _fuse_and_rank(query: str, vector_results: List[Dict], bm25_results: List[Dict], top_k: int) -> List[Dict]:
+    """RRF de las dos ramas + metadata boosting; devuelve el top_k final."""
+    metrics = get_stage_metrics()
+    
+    # Fusión con RRF
+    start_rrf = time.time()
+    fused_results = reciprocal_rank_fusion([vector_results, bm25_results])
+    metrics.record("hybrid.rrf", time.time() - start_rrf)
+    
+    # Metadata Boosting & Anti-Boilerplate
+    # Términos de la query una vez; los de cada chunk, del índice directo de BM25
+    start_boost = time.time()
+    query_terms = terms(query)
+    index = _bm25_index
+    for doc in fused_results:
+        content_terms = index.chunk_terms(get_chunk_id(doc)) if index is not None else None
+        doc['metadata']['final_score'] = calculate_final_score(doc, query, query_terms, content_terms)
+    
+    # Re-ordenar por final_score
+    fused_results.sort(key=lambda x: x['metadata']['final_score'], reverse=True)
+    metrics.record("hybrid.boost", time.time() - start_boost)
+    
+    # Top K final
+    return fused_results[:top_k]
+
+
 def hybrid_search(query: str, top_k: int = 5, vector_weight: float = 0.7, filter_metadata: Dict = None) -> List[Dict]:
     """
     Búsqueda híbrida: combina BM25 (léxico) + Vector (semántico).
+    Ver hybrid_search_with_mode (mismos resultados, sin el modo).
+    """
+    return hybrid_search_with_mode(query, top_k=top_k, vector_weight=vector_weight,
+                                   filter_metadata=filter_metadata)[0]
+
+
+def hybrid_search_with_mode(query: str, top_k: int = 5, vector_weight: float = 0.7,
+                            filter_metadata: Dict = None) -> Tuple[List[Dict], str]:
+    """
+    Búsqueda híbrida: combina BM25 (léxico) + Vector (semántico).
+    
+    Ambas ramas se ejecutan en paralelo con timeout propio. Si una falla o
+    excede su timeout se devuelve el resultado de la otra (degradación a
+    BM25-only si cae ChromaDB/OpenAI). Solo lanza si fallan las dos.
     
     Args:
         query: Query del usuario
@@ -177,57 +302,74 @@ def hybrid_search(query: str, top_k: int = 5, vector_weight: float = 0.7, filter
         filter_metadata: Filtro opcional para metadata (ej: {"num_contrato": "CON_2024_012"})
     
     Returns:
-        Lista de chunks rankeados con RRF + boosts
+        (lista de chunks rankeados con RRF + boosts, modo: ok | bm25_only | vector_only)
     """
-    import time
+    metrics = get_stage_metrics()
     start = time.time()
     logger.info(f"Hybrid search para: '{query[:60]}...'")
     
-    # PASO 1: Vector Search (ChromaDB)
-    print(f"  → Vector search (top 50)...")
-    vector_results = vector_search(query, k=50, where=filter_metadata)
-    vector_time = time.time() - start
-    print(f"    Vector search DONE in {vector_time:.2f}s")
+    # PASO 1-2: Vector Search (ChromaDB) y BM25 Search (Lexical) en paralelo
+    vector_future = _LEG_EXECUTOR.submit(_timed, _vector_leg, query, filter_metadata)
+    bm25_future = _LEG_EXECUTOR.submit(_timed, _bm25_leg, query, filter_metadata)
     
-    # PASO 2: BM25 Search (Lexical)
-    start_bm25 = time.time()
-    print(f"  → BM25 search (top 50)...")
-    bm25_index = get_bm25_index()
-    bm25_results = bm25_index.search(query, top_k=50)
+    bm25_results, bm25_error = _collect_leg("bm25", bm25_future, start, HYBRID_BM25_TIMEOUT_S)
+    vector_results, vector_error = _collect_leg("vector", vector_future, start, HYBRID_VECTOR_TIMEOUT_S)
     
-    # Aplicar filtro de metadata a resultados BM25 si se especifica
-    if filter_metadata:
-        filtered_bm25 = []
-        for result in bm25_results:
-            meta = result.get("metadata", {})
-            # Verificar que todos los filtros coincidan
-            if all(meta.get(k) == v for k, v in filter_metadata.items()):
-                filtered_bm25.append(result)
-        bm25_results = filtered_bm25
-    
-    bm25_time = time.time() - start_bm25
-    print(f"    BM25 search DONE in {bm25_time:.2f}s")
-    
-    # PASO 3: Fusión con RRF
-    start_rrf = time.time()
-    print(f"  → Fusionando con RRF...")
-    fused_results = reciprocal_rank_fusion([vector_results, bm25_results])
-    rrf_time = time.time() - start_rrf
-    print(f"    RRF fusion DONE in {rrf_time:.2f}s")
+    if vector_error and bm25_error:
+        metrics.record("hybrid.total", time.time() - start, "error")
+        raise vector_error
     
-    # PASO 4: Metadata Boosting & Anti-Boilerplate
-    start_boost = time.time()
-    print(f"  → Aplicando Metadata Boosting & Anti-Boilerplate...")
-    for doc in fused_results:
-        doc['metadata']['final_score'] = calculate_final_score(doc, query)
+    # PASO 3-4: Fusión con RRF + boosting
+    final_results = _fuse_and_rank(query, vector_results, bm25_results, top_k)
     
-    # Re-ordenar por final_score
-    fused_results.sort(key=lambda x: x['metadata']['final_score'], reverse=True)
+    total_time = time.time() - start
+    mode = "bm25_only" if vector_error else "vector_only" if bm25_error else "ok"
+    metrics.record("hybrid.total", total_time, mode)
+    logger.info(
+        f"Hybrid search: {len(final_results)} resultados en {total_time:.2f}s "
+        f"(vector={len(vector_results)}, bm25={len(bm25_results)}, modo={mode})"
+    )
     
-    # Top K final
-    final_results = fused_results[:top_k]
+    return final_results, mode
+
+
+def hybrid_search_many(queries: List[str], top_k: int = 5, filter_metadata: Dict = None) -> List[List[Dict]]:
+    """
+    Búsqueda híbrida de varias queries con el coste aproximado de una:
+    un request de embeddings, una consulta multi-vector a ChromaDB y una
+    pasada vectorizada de BM25. La fusión RRF y los boosts son por query.
+    
+    Misma política de degradación que hybrid_search (ramas en paralelo con timeout).
+    
+    Returns:
+        Lista de resultados (como hybrid_search) por query, en el mismo orden
+    """
+    if not queries:
+        return []
+    
+    metrics = get_stage_metrics()
+    start = time.time()
+    logger.info(f"Hybrid search en lote para {len(queries)} queries")
+    
+    vector_future = _LEG_EXECUTOR.submit(_timed, _vector_leg_many, queries, filter_metadata)
+    bm25_future = _LEG_EXECUTOR.submit(_timed, _bm25_leg_many, queries, filter_metadata)
+    
+    bm25_all, bm25_error = _collect_leg("bm25", bm25_future, start, HYBRID_BM25_TIMEOUT_S)
+    vector_all, vector_error = _collect_leg("vector", vector_future, start, HYBRID_VECTOR_TIMEOUT_S)
+    
+    if vector_error and bm25_error:
+        metrics.record("hybrid.total", time.time() - start, "error")
+        raise vector_error
+    
+    empty = [[] for _ in queries]
+    final_results = [
+        _fuse_and_rank(query, vector_results, bm25_results, top_k)
+        for query, vector_results, bm25_results in zip(queries, vector_all or empty, bm25_all or empty)
+    ]
     
     total_time = time.time() - start
-    print(f"  ✅ Hybrid search completado: {len(final_results)} resultados. Total time: {total_time:.2f}s")
+    mode = "bm25_only" if vector_error else "vector_only" if bm25_error else "ok"
+    metrics.record("hybrid.total", total_time, mode)
+    logger.info(f"Hybrid search en lote: {len(queries)} queries en {total_time:.2f}s (modo={mode})")
     
     return final_results
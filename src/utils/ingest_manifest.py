@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Manifiesto de ingestión incremental.
+Guarda, por archivo ingerido, el hash de su contenido, los IDs de sus chunks
+y su metadata representativa. Permite calcular qué archivos son nuevos,
+cuáles cambiaron y cuáles se eliminaron desde la última ingesta.
+"""
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import INGEST_MANIFEST_PATH
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+# Memo de current_corpus_version(): (ruta, mtime_ns) -> versión
+_version_memo: Dict[tuple, int] = {}
+
+
+def file_sha256(path: Path) -> str:
+    """Hash SHA-256 del contenido de un archivo."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class IngestManifest:
+    """Estado persistente de la última ingestión (un registro por archivo)."""
+
+    def __init__(self, path: Path = INGEST_MANIFEST_PATH):
+        self.path = Path(path)
+        self.files: Dict[str, Dict] = {}
+        self.corpus_version = 0
+
+    @classmethod
+    def load(cls, path: Path = INGEST_MANIFEST_PATH) -> "IngestManifest":
+        """Carga el manifiesto (vacío si no existe o es de otra versión)."""
+        manifest = cls(path)
+        if manifest.path.exists():
+            try:
+                data = json.loads(manifest.path.read_text(encoding="utf-8"))
+                if data.get("version") == MANIFEST_VERSION:
+                    manifest.files = data.get("files", {})
+                    manifest.corpus_version = data.get("corpus_version", 0)
+                else:
+                    logger.warning("⚠️ Manifiesto de ingestión con versión distinta. Se ignora.")
+            except (json.JSONDecodeError, OSError) as e:
+                logger.warning(f"⚠️ Manifiesto de ingestión ilegible ({e}). Se ignora.")
+        return manifest
+
+    def save(self) -> None:
+        """Guarda el manifiesto de forma atómica."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({
+            "version": MANIFEST_VERSION,
+            "corpus_version": self.corpus_version,
+            "files": self.files
+        }, ensure_ascii=False, indent=1, default=str), encoding="utf-8")
+        tmp.replace(self.path)
+        logger.info(f"Manifiesto de ingestión guardado ({len(self.files)} archivos, versión {self.corpus_version})")
+
+    def diff(self, paths: List[Path]) -> Dict[str, List]:
+        """
+        Compara los archivos actuales con el manifiesto.
+
+        Returns:
+            Dict con 'new' y 'changed' (List[Path]), 'unchanged' y 'removed' (List[str]),
+            y 'hashes' {nombre: sha256} de los archivos actuales.
+        """
+        result = {"new": [], "changed": [], "unchanged": [], "removed": [], "hashes": {}}
+        current = set()
+
+        for path in paths:
+            digest = file_sha256(path)
+            result["hashes"][path.name] = digest
+            current.add(path.name)
+
+            entry = self.files.get(path.name)
+            if entry is None:
+                result["new"].append(path)
+            elif entry.get("sha256") != digest:
+                result["changed"].append(path)
+            else:
+                result["unchanged"].append(path.name)
+
+        result["removed"] = sorted(set(self.files) - current)
+        return result
+
+    def record(self, name: str, sha256: str, chunk_ids: List[str], metadata: Dict) -> None:
+        """Registra (o reemplaza) el estado ingerido de un archivo."""
+        self.files[name] = {
+            "sha256": sha256,
+            "chunk_ids": chunk_ids,
+            "metadata": metadata
+        }
+
+    def remove(self, name: str) -> Optional[Dict]:
+        """Elimina un archivo del manifiesto y devuelve su registro."""
+        return self.files.pop(name, None)
+
+    def chunk_ids(self, name: str) -> List[str]:
+        return self.files.get(name, {}).get("chunk_ids", [])
+
+    def representative_metadatas(self) -> List[Dict]:
+        """Una metadata por contrato (para el caché de contexto)."""
+        unique = {}
+        for name, entry in self.files.items():
+            meta = entry.get("metadata", {})
+            unique[meta.get("num_contrato") or name] = meta
+        return list(unique.values())
+
+    def bump_version(self) -> int:
+        """Incrementa la versión del corpus (invalida cachés dependientes)."""
+        self.corpus_version += 1
+        return self.corpus_version
+
+
+def current_corpus_version(path: Path = INGEST_MANIFEST_PATH) -> int:
+    """
+    Versión actual del corpus ingerido (0 si no hay manifiesto).
+    Solo relee el manifiesto cuando cambia su mtime: apta para el hot path de consultas.
+    """
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return 0
+
+    memo_key = (str(path), mtime)
+    if memo_key not in _version_memo:
+        _version_memo.clear()
+        _version_memo[memo_key] = IngestManifest.load(path).corpus_version
+    return _version_memo[memo_key]
@@ -1,38 +1,31 @@
 # -*- coding: utf-8 -*-
 """
 Configuración LLM - OpenAI only.
+Todas las llamadas pasan por el gateway compartido (pool HTTP + limitador global).
 """
 
 import logging
 from pathlib import Path
-from typing import Optional, Iterator
+from typing import Iterator
 
 from openai import OpenAI
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
 from src.config import OPENAI_API_KEY, MODEL_CHATBOT
+from src.utils.llm_gateway import get_llm_gateway
 
 logger = logging.getLogger(__name__)
 
-# Cliente OpenAI global (cache)
-_openai_client: Optional[OpenAI] = None
-
 
 def get_openai_client() -> OpenAI:
     """
-    Obtiene cliente OpenAI (lazy load con caché).
+    Obtiene el cliente OpenAI compartido del gateway.
     
     Returns:
         OpenAI: Cliente configurado
     """
-    global _openai_client
-    
-    if _openai_client is None:
-        _openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        logger.info("Cliente OpenAI inicializado")
-    
-    return _openai_client
+    return get_llm_gateway().client
 
 
 def generate_response(
@@ -55,13 +48,31 @@ def generate_response(
         str: Respuesta generada
     """
     # try-except eliminado para permitir manejo por Tenacity en BaseAgent
-    client = get_openai_client()
+    response = get_llm_gateway().chat(
+        [{"role": "user", "content": prompt}],
+        model=model,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
     
-    response = client.chat.completions.create(
+    return response.choices[0].message.content.strip()
+
+
+async def agenerate_response(
+    prompt: str,
+    max_tokens: int = 4096,
+    temperature: float = 0.0,
+    model: str = MODEL_CHATBOT
+) -> str:
+    """
+    Versión async de generate_response (para sub-queries en paralelo en un event loop).
+    
+    Returns:
+        str: Respuesta generada
+    """
+    response = await get_llm_gateway().achat(
+        [{"role": "user", "content": prompt}],
         model=model,
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
         temperature=temperature,
         max_tokens=max_tokens
     )
@@ -88,21 +99,12 @@ def generate_response_stream(
     Yields:
         str: Chunks de texto a medida que se generan
     """
-    client = get_openai_client()
-    
-    stream = client.chat.completions.create(
+    yield from get_llm_gateway().chat_stream(  # 🚀 ENABLE STREAMING
+        [{"role": "user", "content": prompt}],
         model=model,
-        messages=[
-            {"role": "user", "content": prompt}
-        ],
         temperature=temperature,
-        max_tokens=max_tokens,
-        stream=True  # 🚀 ENABLE STREAMING
+        max_tokens=max_tokens
     )
-    
-    for chunk in stream:
-        if chunk.choices[0].delta.content is not None:
-            yield chunk.choices[0].delta.content
 
 
 def is_model_available() -> bool:
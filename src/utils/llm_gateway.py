@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+Gateway LLM/embeddings compartido por todo el proceso.
+- Un único cliente OpenAI (sync) y uno async por event loop, sobre un pool HTTP keep-alive.
+- Limitador global token bucket (RPM + TPM) para chat y otro para embeddings:
+  las peticiones esperan su turno en vez de provocar 429 y dormir en backoff.
+- Retry con backoff solo como red de seguridad (429 del servidor, cortes de red).
+- Caché persistente de respuestas para llamadas deterministas (temperature=0).
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, RateLimitError, APIConnectionError, APITimeoutError
+from tenacity import (
+    retry,
+    stop_after_attempt,
+    wait_exponential,
+    retry_if_exception_type,
+    before_sleep_log
+)
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import (
+    OPENAI_API_KEY, MODEL_CHATBOT, MODEL_EMBEDDINGS,
+    LLM_RPM_LIMIT, LLM_TPM_LIMIT, EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT,
+    LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_KEEPALIVE, LLM_TIMEOUT_S, RESPONSE_CACHE_ENABLED
+)
+from src.utils.response_cache import ResponseCache, get_response_cache, make_response_key
+
+logger = logging.getLogger(__name__)
+
+# Reserva de tokens de salida cuando la llamada no fija max_tokens
+DEFAULT_COMPLETION_RESERVE = 1024
+
+_RETRYABLE = (RateLimitError, APIConnectionError, APITimeoutError)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación barata de tokens (~4 caracteres/token); se corrige con el usage real."""
+    return len(text) // 4 + 1
+
+
+def _messages_tokens(messages: List[Dict]) -> int:
+    return sum(estimate_tokens(str(m.get("content") or "")) + 4 for m in messages)
+
+
+class TokenBucketLimiter:
+    """
+    Token bucket doble (peticiones y tokens por minuto), thread-safe.
+    Sirve tanto a hilos (acquire) como a corrutinas (acquire_async) del mismo proceso.
+    Un límite <= 0 desactiva ese cubo.
+    """
+
+    def __init__(self, rpm: int, tpm: int, clock=time.monotonic):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last = clock()
+        # Métricas
+        self.waits = 0
+        self.total_wait_s = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm > 0:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm > 0:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def _reserve(self, tokens: int) -> float:
+        """Intenta reservar; devuelve 0 si lo consigue o los segundos a esperar."""
+        with self._lock:
+            self._refill(self._clock())
+            # Una petición mayor que el cubo entero se limita a su capacidad (si no, no pasaría nunca)
+            tokens = min(tokens, self.tpm) if self.tpm > 0 else 0
+            wait = 0.0
+            if self.rpm > 0 and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+            if self.tpm > 0 and self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60.0 / self.tpm)
+            if wait > 0:
+                return wait
+            if self.rpm > 0:
+                self._requests -= 1
+            self._tokens -= tokens
+            return 0.0
+
+    def _record_wait(self, waited: float):
+        if waited > 0:
+            with self._lock:
+                self.waits += 1
+                self.total_wait_s += waited
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Bloquea el hilo hasta tener cupo. Devuelve los segundos esperados."""
+        waited = 0.0
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0:
+                self._record_wait(waited)
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, tokens: int = 0) -> float:
+        """Igual que acquire() pero cediendo el event loop mientras espera."""
+        waited = 0.0
+        while True:
+            wait = self._reserve(tokens)
+            if wait == 0:
+                self._record_wait(waited)
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def reconcile(self, estimated: int, actual: Optional[int]):
+        """Ajusta el cubo de tokens con el consumo real devuelto por la API."""
+        if actual is None or self.tpm <= 0:
+            return
+        with self._lock:
+            self._tokens = min(self.tpm, self._tokens + min(estimated, self.tpm) - actual)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "waits": self.waits,
+                "total_wait_s": round(self.total_wait_s, 3),
+            }
+
+
+def _usage_tokens(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return getattr(usage, "total_tokens", None) if usage else None
+
+
+class LLMGateway:
+    """
+    Punto único de acceso a OpenAI (chat + embeddings), sync y async.
+    Todas las llamadas pasan por el limitador y comparten el pool de conexiones.
+    """
+
+    def __init__(self, api_key: str = OPENAI_API_KEY,
+                 chat_limiter: Optional[TokenBucketLimiter] = None,
+                 embedding_limiter: Optional[TokenBucketLimiter] = None,
+                 response_cache: Optional[ResponseCache] = None):
+        self.api_key = api_key
+        self._response_cache = response_cache
+        self.chat_limiter = chat_limiter or TokenBucketLimiter(LLM_RPM_LIMIT, LLM_TPM_LIMIT)
+        self.embedding_limiter = embedding_limiter or TokenBucketLimiter(EMBEDDING_RPM_LIMIT, EMBEDDING_TPM_LIMIT)
+        self._limits = httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_KEEPALIVE
+        )
+        # Los reintentos los gestiona tenacity (max_retries=0 evita reintentos duplicados)
+        self.client = OpenAI(
+            api_key=api_key,
+            http_client=httpx.Client(limits=self._limits, timeout=LLM_TIMEOUT_S),
+            max_retries=0
+        )
+        # httpx.AsyncClient queda ligado al loop que lo usa: un cliente por event loop
+        self._async_clients: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
+
+    def async_client(self) -> AsyncOpenAI:
+        """Cliente async del event loop actual (pool keep-alive propio del loop)."""
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    http_client=httpx.AsyncClient(limits=self._limits, timeout=LLM_TIMEOUT_S),
+                    max_retries=0
+                )
+                self._async_clients[loop] = client
+        return client
+
+    def _cache_key(self, cache: bool, model, messages, temperature, max_tokens, kwargs) -> Optional[str]:
+        """Clave de caché si la llamada es determinista y cacheable, o None."""
+        if not cache or temperature != 0 or kwargs.get("n", 1) != 1 or self.response_cache is None:
+            return None
+        return make_response_key(model, messages, max_tokens=max_tokens, **kwargs)
+
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        if self._response_cache is None and RESPONSE_CACHE_ENABLED:
+            self._response_cache = get_response_cache()
+        return self._response_cache
+
+    @staticmethod
+    def _chat_params(model, messages, temperature, max_tokens, kwargs) -> Dict:
+        params = {"model": model, "messages": messages, "temperature": temperature, **kwargs}
+        if max_tokens is not None:
+            params["max_tokens"] = max_tokens
+        return params
+
+    @staticmethod
+    def _chat_estimate(messages: List[Dict], max_tokens: Optional[int]) -> int:
+        return _messages_tokens(messages) + (max_tokens or DEFAULT_COMPLETION_RESERVE)
+
+    # ---------- Chat ----------
+
+    # Chat: pocos reintentos cortos (es interactivo; el limitador ya evita la mayoría de 429)
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        retry=retry_if_exception_type(_RETRYABLE),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+    def chat(self, messages: List[Dict], model: str = MODEL_CHATBOT, temperature: float = 0.0,
+             max_tokens: Optional[int] = None, cache: bool = True, **kwargs):
+        """
+        chat.completions.create limitado. Devuelve la respuesta completa de la API.
+        Con temperature=0 (y cache=True) se sirve/guarda en la caché de respuestas.
+        """
+        key = self._cache_key(cache, model, messages, temperature, max_tokens, kwargs)
+        if key:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        estimated = self._chat_estimate(messages, max_tokens)
+        self.chat_limiter.acquire(estimated)
+        response = self.client.chat.completions.create(
+            **self._chat_params(model, messages, temperature, max_tokens, kwargs)
+        )
+        self.chat_limiter.reconcile(estimated, _usage_tokens(response))
+
+        if key:
+            self.response_cache.set(key, response)
+        return response
+
+    @retry(
+        stop=stop_after_attempt(3),
+        wait=wait_exponential(multiplier=1, min=1, max=10),
+        retry=retry_if_exception_type(_RETRYABLE),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+    async def achat(self, messages: List[Dict], model: str = MODEL_CHATBOT, temperature: float = 0.0,
+                    max_tokens: Optional[int] = None, cache: bool = True, **kwargs):
+        """Versión async de chat() (misma caché de respuestas)."""
+        key = self._cache_key(cache, model, messages, temperature, max_tokens, kwargs)
+        if key:
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        estimated = self._chat_estimate(messages, max_tokens)
+        await self.chat_limiter.acquire_async(estimated)
+        response = await self.async_client().chat.completions.create(
+            **self._chat_params(model, messages, temperature, max_tokens, kwargs)
+        )
+        self.chat_limiter.reconcile(estimated, _usage_tokens(response))
+
+        if key:
+            self.response_cache.set(key, response)
+        return response
+
+    def chat_stream(self, messages: List[Dict], model: str = MODEL_CHATBOT, temperature: float = 0.0,
+                    max_tokens: Optional[int] = None, **kwargs) -> Iterator[str]:
+        """Streaming de texto (deltas) pasando por el limitador."""
+        estimated = self._chat_estimate(messages, max_tokens)
+        self.chat_limiter.acquire(estimated)
+        stream = self.client.chat.completions.create(
+            **self._chat_params(model, messages, temperature, max_tokens, kwargs), stream=True
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content is not None:
+                yield chunk.choices[0].delta.content
+
+    # ---------- Embeddings ----------
+
+    @retry(
+        stop=stop_after_attempt(6),
+        wait=wait_exponential(multiplier=1, min=1, max=30),
+        retry=retry_if_exception_type(_RETRYABLE),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+    def embed(self, texts: List[str], model: str = MODEL_EMBEDDINGS) -> List[List[float]]:
+        """Embeddings de un batch (una petición) limitados por RPM/TPM de embeddings."""
+        estimated = sum(estimate_tokens(t) for t in texts)
+        self.embedding_limiter.acquire(estimated)
+        response = self.client.embeddings.create(input=texts, model=model)
+        self.embedding_limiter.reconcile(estimated, _usage_tokens(response))
+        return [d.embedding for d in response.data]
+
+    @retry(
+        stop=stop_after_attempt(6),
+        wait=wait_exponential(multiplier=1, min=1, max=30),
+        retry=retry_if_exception_type(_RETRYABLE),
+        before_sleep=before_sleep_log(logger, logging.WARNING),
+        reraise=True
+    )
+    async def aembed(self, texts: List[str], model: str = MODEL_EMBEDDINGS) -> List[List[float]]:
+        """Versión async de embed()."""
+        estimated = sum(estimate_tokens(t) for t in texts)
+        await self.embedding_limiter.acquire_async(estimated)
+        response = await self.async_client().embeddings.create(input=texts, model=model)
+        self.embedding_limiter.reconcile(estimated, _usage_tokens(response))
+        return [d.embedding for d in response.data]
+
+    def stats(self) -> Dict:
+        stats = {"chat": self.chat_limiter.stats(), "embeddings": self.embedding_limiter.stats()}
+        if self.response_cache is not None:
+            stats["response_cache"] = self.response_cache.stats()
+        return stats
+
+
+# Instancia global (lazy)
+_gateway: Optional[LLMGateway] = None
+_gateway_lock = threading.Lock()
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Obtiene el gateway LLM global del proceso."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+                logger.info(
+                    f"🌐 Gateway LLM inicializado (pool={LLM_HTTP_MAX_CONNECTIONS}, "
+                    f"chat {LLM_RPM_LIMIT} RPM/{LLM_TPM_LIMIT} TPM)"
+                )
+    return _gateway
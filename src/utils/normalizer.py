@@ -7,9 +7,8 @@ Utiliza GPT-4o para convertir PDFs desestructurados en Markdown estandarizado.
 import logging
 from typing import Dict, Optional, Tuple
 from pathlib import Path
-from openai import OpenAI
-
 from src.config import OPENAI_API_KEY, MODEL_NORMALIZER, SECTION_DELIMITER
+from src.utils.llm_gateway import get_llm_gateway
 
 logger = logging.getLogger(__name__)
 
@@ -225,7 +224,7 @@ TEXTO DEL DOCUMENTO A PROCESAR:
 
 class DocumentNormalizer:
     def __init__(self):
-        self.client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+        self.client = get_llm_gateway() if OPENAI_API_KEY else None
         
     def normalize(self, raw_text: str) -> Optional[str]:
         """
@@ -238,12 +237,12 @@ class DocumentNormalizer:
         try:
             logger.info(f"Normalizando documento con {MODEL_NORMALIZER}...")
             
-            response = self.client.chat.completions.create(
-                model=MODEL_NORMALIZER,
-                messages=[
+            response = self.client.chat(
+                [
                     {"role": "system", "content": NORMALIZER_PROMPT},
                     {"role": "user", "content": raw_text}
                 ],
+                model=MODEL_NORMALIZER,
                 temperature=0
             )
             
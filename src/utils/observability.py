@@ -4,6 +4,8 @@ Sistema de observabilidad para monitorear el RAG
 
 import json
 import logging
+import threading
+from collections import defaultdict, deque
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Any, List
@@ -68,7 +70,8 @@ class RAGObserver:
                 "p95_latency": float,
                 "total_cost": float,
                 "avg_confidence": float,
-                "validation_pass_rate": float
+                "validation_pass_rate": float,
+                "retrieval_cache_hit_rate": float
             }
         """
         if not self.log_file.exists():
@@ -88,6 +91,7 @@ class RAGObserver:
         costs = [log.get("cost_usd", 0) for log in recent_logs]
         confidences = [log.get("confidence", 0) for log in recent_logs]
         validations = [log.get("validation_passed", False) for log in recent_logs]
+        cache_flags = [log["retrieval_cache_hit"] for log in recent_logs if "retrieval_cache_hit" in log]
         
         latencies.sort()
         
@@ -100,7 +104,8 @@ class RAGObserver:
             "total_cost": sum(costs),
             "avg_cost_per_query": sum(costs) / len(costs),
             "avg_confidence": sum(confidences) / len(confidences) if confidences else 0,
-            "validation_pass_rate": sum(validations) / len(validations) * 100 if validations else 0
+            "validation_pass_rate": sum(validations) / len(validations) * 100 if validations else 0,
+            "retrieval_cache_hit_rate": sum(cache_flags) / len(cache_flags) * 100 if cache_flags else 0
         }
 
 
@@ -113,3 +118,62 @@ def get_observer() -> RAGObserver:
     if _observer is None:
         _observer = RAGObserver()
     return _observer
+
+
+class StageMetrics:
+    """
+    Métricas de latencia por etapa en memoria (p.ej. 'hybrid.vector', 'hybrid.bm25').
+    Guarda las últimas N muestras por etapa y contadores de estado (ok/timeout/error).
+    """
+    
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, deque] = defaultdict(lambda: deque(maxlen=self.window))
+        self._status: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    
+    def record(self, stage: str, latency_s: float, status: str = "ok"):
+        """Registra una ejecución de la etapa."""
+        with self._lock:
+            self._latencies[stage].append(latency_s)
+            self._status[stage][status] += 1
+    
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns:
+            {etapa: {"count", "p50", "p95", "max", "status": {estado: n}}}
+        """
+        with self._lock:
+            snapshot = {stage: sorted(values) for stage, values in self._latencies.items()}
+            status = {stage: dict(counts) for stage, counts in self._status.items()}
+        
+        result = {}
+        for stage, values in snapshot.items():
+            if not values:
+                continue
+            result[stage] = {
+                "count": len(values),
+                "p50": values[len(values) // 2],
+                "p95": values[min(int(len(values) * 0.95), len(values) - 1)],
+                "max": values[-1],
+                "status": status.get(stage, {})
+            }
+        return result
+    
+    def reset(self):
+        with self._lock:
+            self._latencies.clear()
+            self._status.clear()
+
+
+_stage_metrics = None
+_stage_metrics_lock = threading.Lock()
+
+def get_stage_metrics() -> StageMetrics:
+    """Obtiene el registro global de métricas por etapa"""
+    global _stage_metrics
+    if _stage_metrics is None:
+        with _stage_metrics_lock:
+            if _stage_metrics is None:
+                _stage_metrics = StageMetrics()
+    return _stage_metrics
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+Cross-encoder optimizado para CPU (onnxruntime).
+
+Sustituye a CrossEncoder.predict en servidores sin GPU para poder usar
+bge-reranker-v2-m3 (multilingüe) en lugar de ms-marco-MiniLM-L-6-v2:
+- Grafo ONNX exportado una vez (scripts/export_reranker_onnx.py), opcionalmente
+  cuantizado a int8 dinámico
+- Truncado por tokens (query + chunk) ajustado al tamaño de nuestros chunks
+- Lotes por longitud: los pares se ordenan por nº de tokens y se agrupan con un
+  presupuesto de pares x longitud, así el padding es mínimo
+- Hilos intra-op configurables
+
+Solo necesita onnxruntime y tokenizers (sin torch ni transformers en runtime).
+"""
+
+import logging
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import (
+    RERANKER_ONNX_DIR, RERANKER_ONNX_QUANTIZED, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE,
+    RERANKER_BATCH_MAX_TOKENS, RERANKER_INTRA_OP_THREADS
+)
+
+try:
+    import onnxruntime as ort
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+
+def onnx_model_path(model_dir: Path = RERANKER_ONNX_DIR, quantized: bool = RERANKER_ONNX_QUANTIZED) -> Path:
+    """Ruta del grafo exportado (int8 si se pide y existe)."""
+    model_dir = Path(model_dir)
+    if quantized and (model_dir / QUANTIZED_MODEL_FILE).exists():
+        return model_dir / QUANTIZED_MODEL_FILE
+    return model_dir / MODEL_FILE
+
+
+def is_onnx_model_exported(model_dir: Path = RERANKER_ONNX_DIR) -> bool:
+    model_dir = Path(model_dir)
+    return (model_dir / TOKENIZER_FILE).exists() and onnx_model_path(model_dir).exists()
+
+
+def plan_batches(lengths: Sequence[int], batch_size: int, max_tokens: int) -> List[List[int]]:
+    """
+    Agrupa índices de pares por longitud: orden ascendente de tokens y lotes de
+    como mucho `batch_size` pares cuyo tamaño con padding (pares x longitud
+    máxima) no supere `max_tokens`. Un par más largo que el presupuesto va solo.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches, current = [], []
+    for i in order:
+        # En orden ascendente, la longitud con padding del lote es la del último par
+        if current and (len(current) >= batch_size or (len(current) + 1) * lengths[i] > max_tokens):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class OnnxCrossEncoder:
+    """
+    Cross-encoder sobre onnxruntime con la misma interfaz que CrossEncoder.predict
+    (lista de pares [query, documento] -> scores en [0, 1]).
+    """
+
+    def __init__(self, session, tokenizer, max_length: int = RERANKER_MAX_LENGTH,
+                 batch_size: int = RERANKER_BATCH_SIZE, batch_max_tokens: int = RERANKER_BATCH_MAX_TOKENS,
+                 model_name: str = "onnx"):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.tokenizer.enable_truncation(max_length=max_length, strategy="longest_first")
+        self.tokenizer.no_padding()
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.batch_max_tokens = max(batch_max_tokens, max_length)
+        self.model_name = model_name
+        self._input_names = {inp.name for inp in session.get_inputs()}
+
+    @classmethod
+    def from_dir(cls, model_dir: Path = RERANKER_ONNX_DIR, quantized: bool = RERANKER_ONNX_QUANTIZED,
+                 intra_op_threads: int = RERANKER_INTRA_OP_THREADS, **kwargs) -> "OnnxCrossEncoder":
+        """Carga el grafo exportado y su tokenizer (tokenizer.json) desde `model_dir`."""
+        if not ONNX_AVAILABLE:
+            raise ImportError("onnxruntime y tokenizers son necesarios para el re-ranker ONNX")
+        model_dir = Path(model_dir)
+        path = onnx_model_path(model_dir, quantized)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        session = ort.InferenceSession(str(path), sess_options=options, providers=["CPUExecutionProvider"])
+        tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+
+        logger.info(f"🚀 Re-ranker ONNX cargado: {path.name} ({model_dir.name}), "
+                    f"max_length={kwargs.get('max_length', RERANKER_MAX_LENGTH)}, "
+                    f"hilos={intra_op_threads or 'auto'}")
+        return cls(session, tokenizer, model_name=model_dir.name, **kwargs)
+
+    def _encode(self, pairs: Sequence[Sequence[str]]):
+        return self.tokenizer.encode_batch([(str(query), str(doc)) for query, doc in pairs])
+
+    def _run_batch(self, encodings) -> np.ndarray:
+        width = max(len(enc.ids) for enc in encodings)
+        input_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        attention = np.zeros((len(encodings), width), dtype=np.int64)
+        type_ids = np.zeros((len(encodings), width), dtype=np.int64)
+        pad_id = self.tokenizer.token_to_id("<pad>")
+        if pad_id is None:
+            pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        input_ids.fill(pad_id)
+        for row, enc in enumerate(encodings):
+            n = len(enc.ids)
+            input_ids[row, :n] = enc.ids
+            attention[row, :n] = enc.attention_mask
+            type_ids[row, :n] = enc.type_ids
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention, "token_type_ids": type_ids}
+        logits = self.session.run(None, {name: feeds[name] for name in self._input_names})[0]
+        logits = np.asarray(logits, dtype=np.float32).reshape(len(encodings), -1)[:, 0]
+        return 1.0 / (1.0 + np.exp(-logits))  # Misma activación que CrossEncoder con 1 etiqueta
+
+    def predict(self, pairs: Sequence[Sequence[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        """
+        Scores de relevancia por par, en el orden de entrada.
+        """
+        if not len(pairs):
+            return np.zeros(0, dtype=np.float32)
+        encodings = self._encode(pairs)
+        scores = np.zeros(len(pairs), dtype=np.float32)
+        batches = plan_batches([len(enc.ids) for enc in encodings],
+                               batch_size or self.batch_size, self.batch_max_tokens)
+        for batch in batches:
+            scores[batch] = self._run_batch([encodings[i] for i in batch])
+        return scores
+
+
+def load_onnx_cross_encoder(model_dir: Path = RERANKER_ONNX_DIR) -> Tuple[Optional[OnnxCrossEncoder], str]:
+    """
+    Re-ranker ONNX si está disponible y exportado.
+
+    Returns:
+        (modelo o None, motivo si no se pudo cargar)
+    """
+    if not ONNX_AVAILABLE:
+        return None, "onnxruntime/tokenizers no instalados"
+    if not is_onnx_model_exported(model_dir):
+        return None, f"modelo no exportado en {model_dir} (python scripts/export_reranker_onnx.py)"
+    try:
+        return OnnxCrossEncoder.from_dir(model_dir), ""
+    except Exception as e:
+        return None, f"error cargando ONNX: {e}"
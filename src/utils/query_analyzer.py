@@ -6,8 +6,17 @@ Query Analyzer - Mapea queries a filtros de metadata inteligentes
 import logging
 from typing import Dict, Optional
 
+from src.utils.text_analysis import terms, CONTRACT_ID_RE, normalize_contract_id
+
 logger = logging.getLogger(__name__)
 
+# Vocabulario de intención (analizado: sin acentos, singular/plural unificados)
+AVAL_TERMS = terms("aval avales garantía garantías avalista")
+CLASIFICACION_TERMS = terms("secreto confidencial clasificación clasificado")
+PENALIZACION_TERMS = terms("penalización penalizaciones retraso retrasos")
+SUBCONTRATACION_TERMS = terms("subcontratación subcontratar subcontratista")
+TEMPORAL_TERMS = terms("fecha fechas plazo plazos vencimiento vence cuando")
+
 
 def analyze_query_for_filters(query: str) -> Optional[Dict]:
     """
@@ -20,59 +29,51 @@ def analyze_query_for_filters(query: str) -> Optional[Dict]:
         Dict con filtros de ChromaDB o None si no aplica filtro
     """
     
-    import re
-    
     filters = {}
-    query_lower = query.lower()
+    query_terms = terms(query)
     
     # 0. Detección de ID de Contrato (PRIORIDAD MÁXIMA)
-    # Patrón: XXX_202X_XXX o similar
-    contract_pattern = r'([A-Z]{3,4}[_ -]?202\d[_ -]?\d{3})'
-    match = re.search(contract_pattern, query, re.IGNORECASE)
+    # Patrón compartido con el analizador: CON_2024_012, CON-2024-012, con 2024 012...
+    match = CONTRACT_ID_RE.search(query)
     
     if match:
-        contract_id = match.group(1).upper().replace("-", "_").replace(" ", "_")
-        # Normalizar formato XXX_YEAR_NUM
-        if not "_" in contract_id and len(contract_id) > 10:
-             # Caso borde, asumir que el usuario escribió algo como CON2024001
-             pass
-        else:
-            filters['num_contrato'] = contract_id
-            logger.info(f"🎯 Query específica sobre contrato {contract_id} - filtrando num_contrato")
-            
-            # CRÍTICO: Si filtramos por contrato, NO filtramos por sección para no perder info
-            # (Ej: Base Imponible puede estar en 'General' o 'Economica')
-            return filters
+        contract_id = normalize_contract_id(match.group(0))
+        filters['num_contrato'] = contract_id
+        logger.info(f"🎯 Query específica sobre contrato {contract_id} - filtrando num_contrato")
+        
+        # CRÍTICO: Si filtramos por contrato, NO filtramos por sección para no perder info
+        # (Ej: Base Imponible puede estar en 'General' o 'Economica')
+        return filters
 
     # Detección de tipo de información solicitada (Solo si no es filtro por contrato específico)
     
     # 1. Queries sobre avales/garantías
-    if any(keyword in query_lower for keyword in ['aval', 'garantía', 'garantia', 'avalista']):
+    if query_terms & AVAL_TERMS:
         filters['contiene_aval'] = True
         logger.info("🎯 Query sobre avales - filtrando chunks con contiene_aval=True")
     
     # 2. Queries sobre clasificación de seguridad
-    elif any(keyword in query_lower for keyword in ['secreto', 'confidencial', 'clasificación', 'clasificacion']):
+    elif query_terms & CLASIFICACION_TERMS:
         filters['contiene_clasificacion'] = True
         logger.info("🎯 Query sobre clasificación - filtrando chunks con contiene_clasificacion=True")
     
     # 3. Queries sobre códigos NSN
-    elif any(keyword in query_lower for keyword in ['nsn', 'código nsn', 'codigo nsn']):
+    elif any(t == 'nsn' or t.startswith('nsn-') for t in query_terms):
         filters['contiene_nsn'] = True
         logger.info("🎯 Query sobre NSN - filtrando chunks con contiene_nsn=True")
     
     # 4. Queries sobre normativas STANAG
-    elif 'stanag' in query_lower:
+    elif any(t == 'stanag' or t.startswith('stanag_') for t in query_terms):
         filters['contiene_stanag'] = True
         logger.info("🎯 Query sobre STANAG - filtrando chunks con contiene_stanag=True")
     
     # 5. Queries sobre penalizaciones
-    elif any(keyword in query_lower for keyword in ['penalización', 'penalizacion', 'retraso']):
+    elif query_terms & PENALIZACION_TERMS:
         filters['contiene_penalizacion'] = True
         logger.info("🎯 Query sobre penalizaciones - filtrando chunks con contiene_penalizacion=True")
     
     # 6. Queries sobre subcontratación
-    elif any(keyword in query_lower for keyword in ['subcontratación', 'subcontratacion', 'subcontratar']):
+    elif query_terms & SUBCONTRATACION_TERMS:
         filters['contiene_subcontratacion'] = True
         logger.info("🎯 Query sobre subcontratación - filtrando chunks con contiene_subcontratacion=True")
     
@@ -84,7 +85,7 @@ def analyze_query_for_filters(query: str) -> Optional[Dict]:
     #    logger.info("🎯 Query sobre importes - filtrando tipo_seccion=economicas")
     
     # 8. Queries sobre fechas/plazos
-    elif any(keyword in query_lower for keyword in ['fecha', 'plazo', 'vencimiento', 'cuando', 'cuándo']) and not filters.get('num_contrato'):
+    elif query_terms & TEMPORAL_TERMS and not filters.get('num_contrato'):
         filters['tipo_seccion'] = 'temporales'
         logger.info("🎯 Query sobre fechas/plazos - filtrando tipo_seccion=temporales")
     
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-batching del re-ranker entre peticiones concurrentes.
+
+Con varias sesiones de Streamlit o sub-queries en paralelo, cada llamada a
+rerank ejecutaba su propio predict: muchos lotes pequeños seguidos sobre el
+mismo modelo. Aquí un único hilo worker atiende una cola de peticiones y junta
+los pares de todos los llamantes en un solo forward pass:
+- Espera como mucho `max_wait_ms` desde la primera petición a que lleguen más
+- Corta al llegar a `max_batch_size` pares (una petición mayor va sola)
+- Pares (query, documento) idénticos de distintos llamantes se puntúan una vez
+- Cada llamante recibe un Future con los scores de sus pares, en su orden
+
+Mientras el worker está ocupado con un lote, las peticiones nuevas se acumulan
+en la cola y salen juntas en el siguiente, así que bajo carga el coalescing no
+depende de la ventana de espera. Al ser el único hilo que llama al modelo,
+tampoco hay forwards concurrentes sobre la misma sesión.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import RERANK_MICROBATCH_WAIT_MS, RERANK_MICROBATCH_MAX_PAIRS
+
+logger = logging.getLogger(__name__)
+
+
+class RerankBatcher:
+    """Cola de peticiones de scoring servida por un worker que agrupa pares."""
+
+    def __init__(self, predict_fn: Callable[[List[List[str]]], Sequence[float]],
+                 max_wait_ms: float = RERANK_MICROBATCH_WAIT_MS,
+                 max_batch_size: int = RERANK_MICROBATCH_MAX_PAIRS):
+        self._predict_fn = predict_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._carry = None  # Petición que no cupo en el lote anterior
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"requests": 0, "pairs": 0, "unique_pairs": 0, "batches": 0}
+
+    def submit(self, pairs: Sequence[Sequence[str]]) -> Future:
+        """
+        Encola pares [query, documento] para puntuar.
+
+        Returns:
+            Future cuyo resultado es la lista de scores (float) en el orden de `pairs`
+        """
+        future: Future = Future()
+        pairs = [[str(query), str(doc)] for query, doc in pairs]
+        if not pairs:
+            future.set_result([])
+            return future
+        self._ensure_worker()
+        self._queue.put((pairs, future))
+        return future
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                    self._worker.start()
+
+    def _next_request(self, timeout: float = None):
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        if timeout is None:
+            return self._queue.get()
+        return self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+
+    def _collect(self) -> List:
+        """Bloquea hasta la primera petición y añade las que lleguen dentro de la ventana."""
+        batch = [self._next_request()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_batch_size:
+            try:
+                request = self._next_request(timeout=deadline - time.monotonic())
+            except queue.Empty:
+                break
+            if size + len(request[0]) > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            size += len(request[0])
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                self._score(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _score(self, batch: List) -> None:
+        # Pares únicos del lote: la misma query sobre el mismo chunk solo se puntúa una vez
+        index: Dict[tuple, int] = {}
+        unique: List[List[str]] = []
+        for pairs, _ in batch:
+            for query, doc in pairs:
+                if (query, doc) not in index:
+                    index[(query, doc)] = len(unique)
+                    unique.append([query, doc])
+
+        scores = [float(score) for score in self._predict_fn(unique)]
+        for pairs, future in batch:
+            future.set_result([scores[index[(query, doc)]] for query, doc in pairs])
+
+        n_pairs = sum(len(pairs) for pairs, _ in batch)
+        with self._stats_lock:
+            self._stats["requests"] += len(batch)
+            self._stats["pairs"] += n_pairs
+            self._stats["unique_pairs"] += len(unique)
+            self._stats["batches"] += 1
+        if len(batch) > 1:
+            logger.debug(f"🧺 Lote de re-ranking: {len(batch)} peticiones, {len(unique)} pares únicos")
+
+    def stats(self) -> Dict:
+        """Peticiones, pares y lotes servidos en este proceso."""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["requests_per_batch"] = stats["requests"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
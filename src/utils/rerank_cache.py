@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de scores del re-ranker (cross-encoder).
+
+El mismo par (query, chunk) se puntúa varias veces: en las iteraciones del loop
+correctivo, entre sub-queries que comparten chunks y en preguntas repetidas.
+Aquí se guarda cada score por (modelo, query normalizada, chunk_id) en un LRU
+acotado en memoria, de modo que al modelo solo llegan los pares nuevos.
+Namespace: versión del corpus (un chunk_id estable puede cambiar de contenido
+al re-ingerir su archivo), igual que la caché de retrieval.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import RERANK_CACHE_MAX_ENTRIES
+from src.utils.ingest_manifest import current_corpus_version
+from src.utils.retrieval_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+
+class RerankScoreCache:
+    """LRU thread-safe de scores de re-ranking, invalidado al cambiar el corpus."""
+
+    def __init__(self, max_entries: int = RERANK_CACHE_MAX_ENTRIES, manifest_path: Path = None):
+        self.max_entries = max_entries
+        self._manifest_path = manifest_path
+        self._scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self) -> None:
+        """Vacía la caché si cambió la versión del corpus. Requiere lock tomado."""
+        version = current_corpus_version(self._manifest_path) if self._manifest_path else current_corpus_version()
+        if self._version is not None and version != self._version and self._scores:
+            self._scores.clear()
+            logger.info(f"♻️ Caché de re-ranking invalidada (corpus v{self._version} -> v{version})")
+        self._version = version
+
+    def get_many(self, model: str, query: str, chunk_ids: Sequence[str]) -> List[Optional[float]]:
+        """Score cacheado por chunk_id (None si no está), en el mismo orden."""
+        q = normalize_query(query)
+        with self._lock:
+            self._check_version()
+            scores = []
+            for chunk_id in chunk_ids:
+                key = (model, q, chunk_id)
+                score = self._scores.get(key)
+                if score is not None:
+                    self._scores.move_to_end(key)
+                scores.append(score)
+            found = sum(score is not None for score in scores)
+            self.hits += found
+            self.misses += len(scores) - found
+        return scores
+
+    def set_many(self, model: str, query: str, scores: Dict[str, float]) -> None:
+        """Guarda los scores de los pares recién puntuados (chunk_id -> score)."""
+        q = normalize_query(query)
+        with self._lock:
+            for chunk_id, score in scores.items():
+                key = (model, q, chunk_id)
+                self._scores[key] = float(score)
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scores.clear()
+
+    def stats(self) -> Dict:
+        """Estadísticas de uso en este proceso (por par query-chunk)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._scores),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+
+# Instancia global (lazy)
+_rerank_cache: Optional[RerankScoreCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_rerank_cache() -> RerankScoreCache:
+    """Obtiene la caché de scores de re-ranking global (thread-safe)."""
+    global _rerank_cache
+    if _rerank_cache is None:
+        with _cache_lock:
+            if _rerank_cache is None:
+                _rerank_cache = RerankScoreCache()
+    return _rerank_cache
@@ -1,13 +1,30 @@
 # -*- coding: utf-8 -*-
 """
-Re-ranking local usando BAAI/bge-reranker-v2-m3 (Sentence Transformers).
+Re-ranking local usando BAAI/bge-reranker-v2-m3 (Sentence Transformers en GPU,
+ONNX int8 en CPU si está exportado; si no, ms-marco-MiniLM-L-6-v2).
 Elimina coste de OpenAI y reduce latencia tras carga inicial.
 """
 
 import logging
-import torch
+import threading
+from concurrent.futures import Future
 from typing import List, Dict
 
+from src.config import (
+    RERANKER_CPU_BACKEND, RERANKER_MAX_LENGTH, RERANKER_BATCH_SIZE, RERANK_CACHE_ENABLED,
+    RERANK_MICROBATCH_ENABLED
+)
+from src.utils.chunk_identity import dedup_chunks, get_chunk_id
+from src.utils.onnx_reranker import load_onnx_cross_encoder
+from src.utils.rerank_cache import get_rerank_cache
+from src.utils.rerank_batcher import RerankBatcher
+
+# torch es opcional: en CPU el backend ONNX no lo necesita
+try:
+    import torch
+except ImportError:
+    torch = None
+
 # Intentar importar sentence_transformers
 try:
     from sentence_transformers import CrossEncoder
@@ -20,47 +37,102 @@ logger = logging.getLogger(__name__)
 class LocalReranker:
     """
     Clase Singleton para manejo del modelo de re-ranking.
-    Carga el modelo solo una vez en memoria.
+    Carga el modelo solo una vez en memoria (aunque lo pidan varios hilos a la vez)
+    y, con micro-batching, lo usa desde un único worker que agrupa las llamadas.
     """
     _instance = None
     _model = None
     _model_name = "BAAI/bge-reranker-v2-m3"
+    _model_lock = threading.Lock()
+    _load_attempted = False
+    _batcher = None
+    _batcher_lock = threading.Lock()
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(LocalReranker, cls).__new__(cls)
         return cls._instance
 
+    @staticmethod
+    def _device() -> str:
+        if torch is not None and torch.cuda.is_available():
+            return "cuda"
+        if torch is not None and torch.backends.mps.is_available():
+            return "mps"
+        return "cpu"
+
     def _get_model(self):
-        """Lazy loading del modelo."""
-        if self._model is None:
-            if not SENTENCE_TRANSFORMERS_AVAILABLE:
-                logger.error("sentence-transformers no está instalado. Usando fallback.")
-                return None
-            
-            try:
-                if torch.cuda.is_available():
-                    device = "cuda"
-                    self._model_name = "BAAI/bge-reranker-v2-m3" # Heavy but accurate for GPU
-                elif torch.backends.mps.is_available():
-                    device = "mps"
-                    self._model_name = "BAAI/bge-reranker-v2-m3"
-                else:
-                    device = "cpu"
-                    # En CPU usamos modelo ultra-ligero (10x más rápido)
-                    self._model_name = "cross-encoder/ms-marco-MiniLM-L-6-v2"
-                
-                logger.info(f"🚀 Iniciando High-Performance Re-ranker ({self._model_name}) en DEVICE: [{device.upper()}]")
-                logger.info(f"   (Optimization: {'ENABLED' if device != 'cpu' else 'DISABLED'})")
-                
-                self._model = CrossEncoder(self._model_name, device=device)
-                logger.info("Modelo de re-ranking cargado exitosamente.")
-            except Exception as e:
-                logger.error(f"Error cargando modelo de re-ranking: {e}")
-                return None
+        """Lazy loading del modelo (thread-safe: un solo intento de carga por proceso)."""
+        if self._model is None and not self._load_attempted:
+            with self._model_lock:
+                if self._model is None and not self._load_attempted:
+                    self._model = self._load_model()
+                    self._load_attempted = True
         return self._model
 
-    def rerank(self, query: str, chunks: List[Dict], top_k: int = 10) -> List[Dict]:
+    def _load_model(self):
+        """Carga el modelo según dispositivo y backend (None si no hay ninguno)."""
+        device = self._device()
+        
+        # En CPU: bge-reranker-v2-m3 exportado a ONNX (int8, lotes por longitud)
+        if device == "cpu" and RERANKER_CPU_BACKEND in ("auto", "onnx"):
+            model, reason = load_onnx_cross_encoder()
+            if model is not None:
+                self._model_name = model.model_name
+                return model
+            log = logger.warning if RERANKER_CPU_BACKEND == "onnx" else logger.info
+            log(f"Re-ranker ONNX no disponible ({reason}). Usando CrossEncoder.")
+        
+        if not SENTENCE_TRANSFORMERS_AVAILABLE:
+            logger.error("sentence-transformers no está instalado. Usando fallback.")
+            return None
+        
+        try:
+            if device == "cpu":
+                # En CPU usamos modelo ultra-ligero (10x más rápido)
+                self._model_name = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+            else:
+                self._model_name = "BAAI/bge-reranker-v2-m3" # Heavy but accurate for GPU
+            
+            logger.info(f"🚀 Iniciando High-Performance Re-ranker ({self._model_name}) en DEVICE: [{device.upper()}]")
+            logger.info(f"   (Optimization: {'ENABLED' if device != 'cpu' else 'DISABLED'})")
+            
+            model = CrossEncoder(self._model_name, device=device, max_length=RERANKER_MAX_LENGTH)
+            logger.info("Modelo de re-ranking cargado exitosamente.")
+            return model
+        except Exception as e:
+            logger.error(f"Error cargando modelo de re-ranking: {e}")
+            return None
+
+    def _predict(self, pairs: List[List[str]]) -> List[float]:
+        """Forward pass del modelo cargado sobre una lista de pares [query, documento]."""
+        return self._get_model().predict(pairs, batch_size=RERANKER_BATCH_SIZE)
+
+    def get_batcher(self) -> RerankBatcher:
+        """Worker de micro-batching compartido por todas las llamadas (lazy)."""
+        if self._batcher is None:
+            with self._batcher_lock:
+                if self._batcher is None:
+                    self._batcher = RerankBatcher(self._predict)
+        return self._batcher
+
+    def score_async(self, pairs: List[List[str]]) -> Future:
+        """
+        Puntúa pares [query, documento] sin bloquear.
+
+        Returns:
+            Future con la lista de scores, en el orden de `pairs`
+        """
+        if RERANK_MICROBATCH_ENABLED:
+            return self.get_batcher().submit(pairs)
+        future: Future = Future()
+        try:
+            future.set_result([float(score) for score in self._predict(pairs)])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def rerank(self, query: str, chunks: List[Dict], top_k: int = 10, strict: bool = False) -> List[Dict]:
         """
         Re-rankea chunks usando CrossEncoder.
         
@@ -68,45 +140,64 @@ class LocalReranker:
             query: Query del usuario
             chunks: Lista de chunks candidatos
             top_k: Top K a retornar
+            strict: Si True, lanza RuntimeError en vez de devolver el orden original
+                cuando no hay modelo o falla la predicción
             
         Returns:
             Lista de chunks ordenados por relevancia
         """
         if not chunks:
             return []
+        
+        # Un mismo chunk puede llegar por varias rutas: puntuar cada chunk_id una sola vez
+        chunks = dedup_chunks(chunks)
             
         model = self._get_model()
         if not model:
+            if strict:
+                raise RuntimeError("Modelo de re-ranking no disponible")
             # Fallback: devolver orden original (o por score vectorial si existe)
             return chunks[:top_k]
         
-        # Preparar pares [Query, Documento]
-        # Usamos 'contenido' del chunk
-        pairs = [[query, chunk.get("contenido", "")] for chunk in chunks]
+        # Scores ya calculados para (modelo, query, chunk_id): solo los pares nuevos van al modelo
+        chunk_ids = [get_chunk_id(chunk) for chunk in chunks]
+        cache = get_rerank_cache() if RERANK_CACHE_ENABLED else None
+        scores = cache.get_many(self._model_name, query, chunk_ids) if cache else [None] * len(chunks)
+        missing = [i for i, score in enumerate(scores) if score is None]
         
         try:
-            # Predecir scores
-            scores = model.predict(pairs)
+            if missing:
+                # Preparar pares [Query, Documento] (usamos 'contenido' del chunk); con
+                # micro-batching comparten forward pass con otras llamadas concurrentes
+                pairs = [[query, chunks[i].get("contenido", "")] for i in missing]
+                predicted = self.score_async(pairs).result()
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                if cache:
+                    cache.set_many(self._model_name, query, {chunk_ids[i]: scores[i] for i in missing})
             
             # Asignar scores
-            for i, chunk in enumerate(chunks):
-                chunk["metadata"]["rerank_score"] = float(scores[i])
+            for chunk, score in zip(chunks, scores):
+                chunk["metadata"]["rerank_score"] = score
             
             # Ordenar (Mayor score = más relevante)
             sorted_chunks = sorted(chunks, key=lambda x: x["metadata"]["rerank_score"], reverse=True)
             
-            logger.info(f"Reranked {len(chunks)} -> top {top_k}. Top score: {sorted_chunks[0]['metadata']['rerank_score']:.4f}")
+            logger.info(f"Reranked {len(chunks)} -> top {top_k} ({len(chunks) - len(missing)} scores de caché). "
+                        f"Top score: {sorted_chunks[0]['metadata']['rerank_score']:.4f}")
             return sorted_chunks[:top_k]
             
         except Exception as e:
             logger.error(f"Fallo durante predicción de re-ranking: {e}")
+            if strict:
+                raise RuntimeError(f"Fallo durante predicción de re-ranking: {e}") from e
             return chunks[:top_k]
 
 # Instancia global (lazy)
 _reranker_instance = LocalReranker()
 
-def rerank_chunks(query: str, chunks: List[Dict], top_k: int = 10) -> List[Dict]:
+def rerank_chunks(query: str, chunks: List[Dict], top_k: int = 10, strict: bool = False) -> List[Dict]:
     """
     Función helper pública para re-rankear.
     """
-    return _reranker_instance.rerank(query, chunks, top_k)
+    return _reranker_instance.rerank(query, chunks, top_k, strict=strict)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de respuestas LLM deterministas (temperature=0).
+Clave: modelo + hash de la lista completa de mensajes + parámetros de generación
+(max_tokens, response_format...). Así sirve tanto para generate_response como para
+las llamadas estructuradas JSON.
+Namespace: versión del corpus (como la caché de retrieval). Expulsión por TTL + LRU.
+"""
+
+import hashlib
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import CACHE_PATH, RESPONSE_CACHE_TTL_S, RESPONSE_CACHE_MAX_MB
+from src.utils.disk_cache import DiskCache
+from src.utils.ingest_manifest import current_corpus_version
+
+logger = logging.getLogger(__name__)
+
+
+def make_response_key(model: str, messages: List[Dict], **params) -> str:
+    """Clave determinista de una llamada de chat (parámetros None se ignoran)."""
+    payload = json.dumps({
+        "model": model,
+        "messages": hashlib.sha256(
+            json.dumps(messages, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+        ).hexdigest(),
+        "params": {k: v for k, v in params.items() if v is not None}
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Caché de ChatCompletion completas, particionada por versión del corpus."""
+
+    def __init__(self, path: Path = None, ttl_seconds: float = RESPONSE_CACHE_TTL_S, max_mb: int = RESPONSE_CACHE_MAX_MB,
+                 manifest_path: Path = None):
+        path = path or (Path(CACHE_PATH) / "llm_responses.sqlite")
+        self._store = DiskCache(path, max_bytes=max_mb * 1024 * 1024, ttl_seconds=ttl_seconds)
+        self._manifest_path = manifest_path
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _namespace(self) -> str:
+        version = current_corpus_version(self._manifest_path) if self._manifest_path else current_corpus_version()
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._store.delete_namespace(f"corpus-v{self._version}")
+                logger.info(f"♻️ Caché de respuestas LLM invalidada (corpus v{self._version} -> v{version})")
+            self._version = version
+        return f"corpus-v{version}"
+
+    def get(self, key: str) -> Optional[ChatCompletion]:
+        """Respuesta cacheada para la clave, o None."""
+        blob = self._store.get(self._namespace(), key)
+        if blob is None:
+            return None
+        return ChatCompletion.model_validate_json(blob)
+
+    def set(self, key: str, response: ChatCompletion) -> None:
+        """Guarda una respuesta completa de la API."""
+        self._store.set(self._namespace(), key, response.model_dump_json().encode("utf-8"))
+
+    def invalidate(self) -> None:
+        """Vacía la caché completa."""
+        self._store.clear()
+
+    def stats(self) -> Dict:
+        return self._store.stats()
+
+
+# Instancia global (lazy)
+_response_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Obtiene la caché de respuestas LLM global (thread-safe)."""
+    global _response_cache
+    if _response_cache is None:
+        with _cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+                logger.info(f"Caché de respuestas LLM lista ({_response_cache.stats()['entries']} entradas)")
+    return _response_cache
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Caché de resultados de retrieval (hybrid_search + rerank).
+Clave: query normalizada + filtro + top_k + parámetros de la etapa.
+Namespace: versión del corpus (ingest_manifest), así una ingesta que cambia
+el corpus invalida automáticamente todas las entradas anteriores.
+Expulsión por TTL + LRU (DiskCache), compartida entre procesos.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import CACHE_PATH, RETRIEVAL_CACHE_TTL_S, RETRIEVAL_CACHE_MAX_MB
+from src.utils.disk_cache import DiskCache
+from src.utils.ingest_manifest import current_corpus_version
+from src.utils.text_analysis import fold
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Normaliza la query para la clave: minúsculas, sin acentos, sin ¿?¡! y espacios colapsados."""
+    return " ".join(re.sub(r'[¿?¡!]', ' ', fold(query)).split())
+
+
+def make_retrieval_key(query: str, filter_metadata: Optional[Dict], top_k: int, **params) -> str:
+    """Clave determinista de una ejecución de retrieval."""
+    payload = json.dumps({
+        "q": normalize_query(query),
+        "filter": filter_metadata or {},
+        "top_k": top_k,
+        "params": params
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _json_default(value):
+    # numpy float32 (scores del reranker) y similares
+    return float(value) if hasattr(value, "__float__") else str(value)
+
+
+class RetrievalCache:
+    """Caché de listas de chunks rankeados, particionada por versión del corpus."""
+
+    def __init__(self, path: Path = None, ttl_seconds: float = RETRIEVAL_CACHE_TTL_S, max_mb: int = RETRIEVAL_CACHE_MAX_MB,
+                 manifest_path: Path = None):
+        path = path or (Path(CACHE_PATH) / "retrieval.sqlite")
+        self._store = DiskCache(path, max_bytes=max_mb * 1024 * 1024, ttl_seconds=ttl_seconds)
+        self._manifest_path = manifest_path
+        self._version = None
+        self._lock = threading.Lock()
+
+    def _namespace(self) -> str:
+        version = current_corpus_version(self._manifest_path) if self._manifest_path else current_corpus_version()
+        with self._lock:
+            if self._version is not None and version != self._version:
+                # El corpus cambió: las entradas de la versión anterior ya no sirven
+                self._store.delete_namespace(f"corpus-v{self._version}")
+                logger.info(f"♻️ Caché de retrieval invalidada (corpus v{self._version} -> v{version})")
+            self._version = version
+        return f"corpus-v{version}"
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Chunks cacheados para la clave, o None."""
+        blob = self._store.get(self._namespace(), key)
+        if blob is None:
+            return None
+        return json.loads(blob)
+
+    def set(self, key: str, chunks: List[Dict]) -> None:
+        """Guarda el resultado de una ejecución de retrieval."""
+        self._store.set(self._namespace(), key, json.dumps(chunks, ensure_ascii=False, default=_json_default).encode("utf-8"))
+
+    def invalidate(self) -> None:
+        """Vacía la caché completa (la ingesta la llama al cambiar el corpus)."""
+        self._store.clear()
+
+    def stats(self) -> Dict:
+        return self._store.stats()
+
+
+# Instancia global (lazy)
+_retrieval_cache: Optional[RetrievalCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_retrieval_cache() -> RetrievalCache:
+    """Obtiene la caché de retrieval global (thread-safe)."""
+    global _retrieval_cache
+    if _retrieval_cache is None:
+        with _cache_lock:
+            if _retrieval_cache is None:
+                _retrieval_cache = RetrievalCache()
+                logger.info(f"Caché de retrieval lista ({_retrieval_cache.stats()['entries']} entradas)")
+    return _retrieval_cache
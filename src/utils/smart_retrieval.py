@@ -3,20 +3,102 @@
 Smart Hierarchical Retrieval - Con filtrado inteligente por metadata
 """
 
+import json
 import logging
-from typing import List, Dict, Optional
+from typing import Collection, List, Dict, Optional
 from collections import defaultdict
 
-from src.utils.vectorstore import search
+from src.utils.vectorstore import search, search_many
 from src.utils.query_analyzer import analyze_query_for_filters
+from src.utils.chunk_identity import get_chunk_id
 
 logger = logging.getLogger(__name__)
 
 
+def _exclude_seen(chunks: List[Dict], exclude_ids: Optional[Collection[str]]) -> List[Dict]:
+    """Quita los chunks ya recuperados (antes de la selección, para que el cupo lo ocupen chunks nuevos)."""
+    if not exclude_ids:
+        return chunks
+    return [chunk for chunk in chunks if get_chunk_id(chunk) not in exclude_ids]
+
+
+def _diversify(initial_chunks: List[Dict], top_docs: int, chunks_per_doc: int) -> List[Dict]:
+    """Agrupa los chunks por documento y selecciona en Round Robin (top_docs * chunks_per_doc)."""
+    # Agrupación por documento
+    docs_dict = defaultdict(list)
+    
+    for chunk in initial_chunks:
+        # Intentar varias fuentes para el ID del documento
+        meta = chunk.get('metadata', {})
+        archivo = meta.get('archivo', '')
+        
+        # ID Robusto: Archivo base sin _normalized
+        if archivo:
+            # Normalizar nombre archivo (quitar .pdf, _normalized, etc para agrupar variantes)
+            # Ejemplo simplificado
+            clean_name = archivo.replace("_normalized.md", "").replace(".pdf", "")
+            # Usar expediente si existe podría ser mejor, pero archivo es más seguro como ID único físico
+            doc_id = clean_name
+        else:
+            doc_id = "unknown_doc"
+            
+        docs_dict[doc_id].append(chunk)
+    
+    logger.info(f"Agrupados en {len(docs_dict)} documentos únicos")
+    
+    # DIVERSITY SELECTOR (Round Robin)
+    # Seleccionamos chunks iterando por documento para garantizar variedad
+    final_chunks = []
+    
+    # Ordenar chunks dentro de cada documento por relevancia (score de vector/bm25)
+    # Asumimos que initial_chunks ya viene ordenado globalmente, pero re-ordenamos localmente por si acaso
+    for doc_id in docs_dict:
+        # Ordenamos por distancia (menor es mejor) o score (mayor es mejor)
+        # BM25 devuelve score, Vector devuelve distancia.
+        # Asumimos que el sistema de búsqueda unificado maneja esto, pero aqui
+        # solo iteraremos en el orden en que llegaron (que suele ser por score)
+        pass 
+
+    # Round Robin
+    # Creamos iteradores para cada lista de documentos
+    doc_iterators = [iter(chunks) for chunks in docs_dict.values()]
+    
+    # Límite total de chunks a retornar (para no saturar el contexto ni el reranker)
+    # top_docs * chunks_per_doc  aprox, o un fijo
+    total_limit = top_docs * chunks_per_doc
+    
+    active_iterators = doc_iterators[:]
+    
+    while len(final_chunks) < total_limit and active_iterators:
+        full_round_chunks = []
+        next_iterators = []
+        
+        for it in active_iterators:
+            try:
+                chunk = next(it)
+                final_chunks.append(chunk)
+                full_round_chunks.append(chunk)
+                next_iterators.append(it)
+                
+                if len(final_chunks) >= total_limit:
+                    break
+            except StopIteration:
+                pass
+        
+        active_iterators = next_iterators
+        if not full_round_chunks:
+            break
+            
+    logger.info(f"Retrieval diverso completado: {len(final_chunks)} chunks seleccionados (Round Robin)")
+    
+    return final_chunks
+
+
 def smart_hierarchical_retrieval(query: str, 
                                  top_docs: int = 15, 
                                  chunks_per_doc: int = 3,
-                                 initial_k: int = 50) -> List[Dict]:
+                                 initial_k: int = 50,
+                                 exclude_ids: Optional[Collection[str]] = None) -> List[Dict]:
     """
     Retrieval jerárquico CON filtrado inteligente por metadata.
     
@@ -31,6 +113,7 @@ def smart_hierarchical_retrieval(query: str,
         top_docs: Documentos únicos a recuperar
         chunks_per_doc: Chunks por documento
         initial_k: Chunks iniciales máximos
+        exclude_ids: chunk_ids ya vistos (loop correctivo) que no se vuelven a devolver
     
     Returns:
         Lista de chunks enriquecidos y filtrados
@@ -74,75 +157,82 @@ def smart_hierarchical_retrieval(query: str,
             initial_chunks = search(query, k=initial_k)
             logger.info(f"Búsqueda vectorial (fallback) recuperó {len(initial_chunks)} chunks")
     
+    initial_chunks = _exclude_seen(initial_chunks, exclude_ids)
     if not initial_chunks:
         logger.warning("No se encontraron chunks")
         return []
     
-    # PASO 3: Agrupación por documento
-    docs_dict = defaultdict(list)
-    
-    for chunk in initial_chunks:
-        # Intentar varias fuentes para el ID del documento
-        meta = chunk.get('metadata', {})
-        archivo = meta.get('archivo', '')
-        
-        # ID Robusto: Archivo base sin _normalized
-        if archivo:
-            # Normalizar nombre archivo (quitar .pdf, _normalized, etc para agrupar variantes)
-            # Ejemplo simplificado
-            clean_name = archivo.replace("_normalized.md", "").replace(".pdf", "")
-            # Usar expediente si existe podría ser mejor, pero archivo es más seguro como ID único físico
-            doc_id = clean_name
-        else:
-            doc_id = "unknown_doc"
-            
-        docs_dict[doc_id].append(chunk)
-    
-    logger.info(f"Agrupados en {len(docs_dict)} documentos únicos")
-    
-    # PASO 4: DIVERSITY SELECTOR (Round Robin)
-    # Seleccionamos chunks iterando por documento para garantizar variedad
-    final_chunks = []
-    
-    # Ordenar chunks dentro de cada documento por relevancia (score de vector/bm25)
-    # Asumimos que initial_chunks ya viene ordenado globalmente, pero re-ordenamos localmente por si acaso
-    for doc_id in docs_dict:
-        # Ordenamos por distancia (menor es mejor) o score (mayor es mejor)
-        # BM25 devuelve score, Vector devuelve distancia.
-        # Asumimos que el sistema de búsqueda unificado maneja esto, pero aqui
-        # solo iteraremos en el orden en que llegaron (que suele ser por score)
-        pass 
+    # PASO 3-4: Agrupación por documento + selección diversa
+    return _diversify(initial_chunks, top_docs, chunks_per_doc)
 
-    # Round Robin
-    # Creamos iteradores para cada lista de documentos
-    doc_iterators = [iter(chunks) for chunks in docs_dict.values()]
+
+def smart_hierarchical_retrieval_batch(queries: List[str],
+                                       top_docs: int = 15,
+                                       chunks_per_doc: int = 3,
+                                       initial_k: int = 50,
+                                       exclude_ids: Optional[Collection[str]] = None) -> List[List[Dict]]:
+    """
+    Versión en lote de smart_hierarchical_retrieval para las sub-queries de un plan.
     
-    # Límite total de chunks a retornar (para no saturar el contexto ni el reranker)
-    # top_docs * chunks_per_doc  aprox, o un fijo
-    total_limit = top_docs * chunks_per_doc
+    En lugar de N búsquedas independientes (N requests de embeddings, N consultas
+    a ChromaDB y N pasadas de BM25):
+    1. Las queries con el mismo filtro de metadata comparten UNA consulta multi-vector
+    2. Las queries abiertas (o cuyo filtro no devuelve nada) van juntas a hybrid_search_many
+    3. Agrupación por documento y selección diversa por query
     
-    active_iterators = doc_iterators[:]
+    exclude_ids: chunk_ids ya vistos (loop correctivo) que no se vuelven a devolver.
     
-    while len(final_chunks) < total_limit and active_iterators:
-        full_round_chunks = []
-        next_iterators = []
-        
-        for it in active_iterators:
-            try:
-                chunk = next(it)
-                final_chunks.append(chunk)
-                full_round_chunks.append(chunk)
-                next_iterators.append(it)
-                
-                if len(final_chunks) >= total_limit:
-                    break
-            except StopIteration:
-                pass
-        
-        active_iterators = next_iterators
-        if not full_round_chunks:
-            break
-            
-    logger.info(f"Retrieval diverso completado: {len(final_chunks)} chunks seleccionados (Round Robin)")
+    Returns:
+        Lista de chunks por query, en el mismo orden que queries
+    """
+    if not queries:
+        return []
     
-    return final_chunks
+    logger.info(f"Smart retrieval en lote: {len(queries)} queries")
+    initial_chunks: List[Optional[List[Dict]]] = [None] * len(queries)
+    
+    # PASO 1: Agrupar por filtro de metadata
+    filter_groups: Dict[str, List[int]] = defaultdict(list)
+    filters_by_key: Dict[str, Dict] = {}
+    open_idx: List[int] = []
+    for i, query in enumerate(queries):
+        metadata_filters = analyze_query_for_filters(query)
+        if metadata_filters:
+            key = json.dumps(metadata_filters, sort_keys=True)
+            filter_groups[key].append(i)
+            filters_by_key[key] = metadata_filters
+        else:
+            open_idx.append(i)
+    
+    # PASO 2a: Búsqueda vectorial filtrada, una consulta por grupo
+    for key, idx in filter_groups.items():
+        try:
+            results = search_many([queries[i] for i in idx], k=initial_k, where=filters_by_key[key])
+        except Exception as e:
+            logger.warning(f"Error en búsqueda filtrada en lote: {e}")
+            results = [[] for _ in idx]
+        for i, chunks in zip(idx, results):
+            if chunks:
+                initial_chunks[i] = chunks
+            else:
+                # FALLBACK: Válvula de Seguridad (igual que la versión individual)
+                logger.warning(f"⚠️ FILTRO DEMASIADO ESTRICTO (0 resultados) para '{queries[i][:50]}'. FALLBACK a búsqueda abierta.")
+                open_idx.append(i)
+    
+    # PASO 2b: Búsqueda abierta -> HYBRID SEARCH en lote
+    if open_idx:
+        open_queries = [queries[i] for i in open_idx]
+        try:
+            from src.utils.hybrid_search import hybrid_search_many
+            results = hybrid_search_many(open_queries, top_k=initial_k)
+        except Exception as e:
+            logger.error(f"Hybrid search en lote failed: {e}. Falling back to vector only.")
+            results = search_many(open_queries, k=initial_k)
+        for i, chunks in zip(open_idx, results):
+            initial_chunks[i] = chunks
+    
+    # PASO 3-4: Agrupación por documento + selección diversa, por query
+    return [
+        _diversify(_exclude_seen(chunks or [], exclude_ids), top_docs, chunks_per_doc)
+        for chunks in initial_chunks
+    ]
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Retrieval especulativo.
+
+El grafo ejecuta rewriter -> orchestrator -> planner -> retrieval en serie, pero en la
+mayoría de preguntas de primer turno la query original ya recupera los chunks correctos.
+Se lanza smart_hierarchical_retrieval sobre la query cruda en cuanto llega la petición,
+en paralelo con la reescritura y la planificación:
+- Las sub-queries que coinciden con la query especulada (o están subsumidas por ella)
+  reutilizan su resultado en lugar de volver a buscar.
+- Si ninguna sub-query la aprovecha, la especulación se cancela.
+"""
+
+import concurrent.futures
+import logging
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.config import SPECULATIVE_MIN_COVERAGE
+from src.utils.retrieval_cache import normalize_query
+from src.utils.smart_retrieval import smart_hierarchical_retrieval
+from src.utils.text_analysis import terms
+
+logger = logging.getLogger(__name__)
+
+# Mismos parámetros que RetrievalAgent por sub-query (el resultado debe ser intercambiable)
+SPECULATIVE_TOP_DOCS = 10
+SPECULATIVE_CHUNKS_PER_DOC = 3
+
+_SPEC_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+
+
+class _Speculation:
+    __slots__ = ("query", "normalized", "future", "hits")
+
+    def __init__(self, query: str, future: concurrent.futures.Future):
+        self.query = query
+        self.normalized = normalize_query(query)
+        self.future = future
+        self.hits = 0
+
+
+_speculations: Dict[str, _Speculation] = {}
+_spec_lock = threading.Lock()
+
+
+def covers(speculated_query: str, sub_query: str, min_coverage: float = SPECULATIVE_MIN_COVERAGE) -> bool:
+    """
+    True si la sub-query puede reutilizar el retrieval de la query especulada:
+    misma query normalizada, o sus términos están contenidos en los de la especulada
+    y cubren al menos min_coverage de ellos (no es una pregunta mucho más estrecha).
+    """
+    if normalize_query(speculated_query) == normalize_query(sub_query):
+        return True
+    spec_terms, sub_terms = terms(speculated_query), terms(sub_query)
+    if not spec_terms or not sub_terms or not sub_terms <= spec_terms:
+        return False
+    return len(sub_terms) / len(spec_terms) >= min_coverage
+
+
+def start_speculation(query: str) -> str:
+    """Lanza el retrieval especulativo de la query cruda. Devuelve su ID."""
+    spec_id = uuid.uuid4().hex
+    future = _SPEC_EXECUTOR.submit(
+        smart_hierarchical_retrieval,
+        query=query,
+        top_docs=SPECULATIVE_TOP_DOCS,
+        chunks_per_doc=SPECULATIVE_CHUNKS_PER_DOC
+    )
+    with _spec_lock:
+        _speculations[spec_id] = _Speculation(query, future)
+    logger.info(f"🔮 Retrieval especulativo lanzado: '{query[:60]}'")
+    return spec_id
+
+
+def take_speculative(spec_id: Optional[str], sub_query: str) -> Optional[List[Dict]]:
+    """
+    Chunks especulados para la sub-query si la especulación la cubre (espera a que termine),
+    o None si hay que ejecutar el retrieval normal.
+    """
+    if not spec_id:
+        return None
+    with _spec_lock:
+        spec = _speculations.get(spec_id)
+    if spec is None or spec.future.cancelled() or not covers(spec.query, sub_query):
+        return None
+
+    try:
+        chunks = spec.future.result()
+    except Exception as e:
+        logger.warning(f"Retrieval especulativo falló, se ejecuta el normal: {e}")
+        return None
+
+    with _spec_lock:
+        spec.hits += 1
+    logger.info(f"🔮 Sub-query servida por el retrieval especulativo: '{sub_query[:60]}'")
+    # Copia superficial por chunk: los consumidores pueden anotar metadata
+    return [{**c, "metadata": dict(c.get("metadata", {}))} for c in chunks]
+
+
+def cancel_if_unused(spec_id: Optional[str], sub_queries: List[str]) -> bool:
+    """Cancela la especulación si ninguna de las sub-queries planificadas la aprovecha."""
+    if not spec_id:
+        return False
+    with _spec_lock:
+        spec = _speculations.get(spec_id)
+    if spec is None or any(covers(spec.query, q) for q in sub_queries):
+        return False
+    cancelled = spec.future.cancel()
+    logger.info(f"🔮 Especulación no aprovechable ({'cancelada' if cancelled else 'ya en curso, se descarta'})")
+    return True
+
+
+def finish_speculation(spec_id: Optional[str]) -> None:
+    """Libera la especulación al terminar la petición (cancela si no llegó a arrancar)."""
+    if not spec_id:
+        return
+    with _spec_lock:
+        spec = _speculations.pop(spec_id, None)
+    if spec is not None and not spec.hits:
+        spec.future.cancel()
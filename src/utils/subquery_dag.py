@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+Scheduler de sub-queries con dependencias (DAG).
+
+El planner puede emitir sub-queries con "dependency" (ids de pasos previos).
+En lugar de lanzarlas todas a la vez (los saltos dependientes salían antes de
+tener el dato y forzaban un loop correctivo), se ejecutan por niveles topológicos:
+- Cada nivel va en UNA llamada de retrieval en lote (máximo paralelismo).
+- Las entidades resueltas por los pasos terminados (IDs de contrato, contratistas)
+  se inyectan en la query de los pasos que dependen de ellos. Solo se inyecta UN
+  ID de contrato (el mejor rankeado): analyze_query_for_filters filtra por el
+  primer ID de la query, así que añadir más descartaría en silencio el resto.
+- Al terminar cada nivel se notifica el resultado parcial (callback on_level).
+
+Así una pregunta multi-hop termina en el tiempo de su camino crítico.
+"""
+
+import logging
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.graph.state import SubQuery
+from src.utils.text_analysis import CONTRACT_ID_RE, normalize_contract_id
+
+logger = logging.getLogger(__name__)
+
+# Entidades que se registran como máximo por paso (las de los chunks mejor rankeados)
+MAX_BOUND_ENTITIES = 3
+
+# Marcadores explícitos en la query dependiente: "{1}", "{SQ1}"
+_PLACEHOLDER_RE = re.compile(r'\{(?:SQ)?(\d+)\}', re.IGNORECASE)
+
+
+def topological_levels(sub_queries: List[SubQuery]) -> List[List[SubQuery]]:
+    """
+    Agrupa las sub-queries en niveles: cada una va en el primer nivel posterior
+    a todas sus dependencias. Dependencias desconocidas se ignoran; si hay ciclos,
+    los pasos implicados se ejecutan juntos en un último nivel.
+    """
+    by_id = {sq["id"]: sq for sq in sub_queries}
+    pending = {
+        sq["id"]: {d for d in (sq.get("dependency") or []) if d in by_id and d != sq["id"]}
+        for sq in sub_queries
+    }
+    levels = []
+    while pending:
+        ready = [sq_id for sq_id, deps in pending.items() if not deps]
+        if not ready:
+            logger.warning(f"⚠️ Dependencias cíclicas entre sub-queries {sorted(pending)}; se ejecutan juntas")
+            ready = list(pending)
+        levels.append([by_id[sq_id] for sq_id in ready])
+        for sq_id in ready:
+            del pending[sq_id]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return levels
+
+
+def resolve_entities(chunks: List[Dict], limit: int = MAX_BOUND_ENTITIES) -> Dict[str, List[str]]:
+    """Entidades resueltas por un paso: IDs de contrato y contratistas, por orden de ranking."""
+    contract_ids, contractors = [], []
+    for chunk in chunks:
+        meta = chunk.get("metadata", {})
+        contract_id = normalize_contract_id(meta.get("num_contrato") or "")
+        if not contract_id:
+            match = CONTRACT_ID_RE.search(chunk.get("contenido", ""))
+            contract_id = normalize_contract_id(match.group(0)) if match else None
+        if contract_id and contract_id not in contract_ids and len(contract_ids) < limit:
+            contract_ids.append(contract_id)
+        contractor = (meta.get("contratista") or "").strip()
+        if contractor and contractor not in contractors and len(contractors) < limit:
+            contractors.append(contractor)
+    return {"contract_ids": contract_ids, "contratistas": contractors}
+
+
+def _top_entities(entities: Dict[str, List[str]], with_id: bool = True) -> List[str]:
+    """ID de contrato mejor rankeado (el filtro admite uno solo) y contratista principal."""
+    ids = entities.get("contract_ids", [])[:1] if with_id else []
+    return ids + entities.get("contratistas", [])[:1]
+
+
+def bind_dependencies(sub_query: SubQuery, resolved: Dict[int, Dict[str, List[str]]]) -> str:
+    """
+    Query del paso con las entidades de sus dependencias:
+    sustituye los marcadores {N} / {SQN} o, si no hay, las añade al final.
+    Se añade como mucho un ID de contrato, y ninguno si la query ya nombra uno.
+    """
+    query = sub_query["query"]
+    deps = [d for d in (sub_query.get("dependency") or []) if d in resolved]
+    if not deps:
+        return query
+
+    if _PLACEHOLDER_RE.search(query):
+        return _PLACEHOLDER_RE.sub(lambda m: ", ".join(_top_entities(resolved.get(int(m.group(1)), {}))), query)
+
+    # Solo se añaden las entidades que la query no menciona ya
+    has_id = bool(CONTRACT_ID_RE.search(query))
+    extra = []
+    for dep in deps:
+        values = _top_entities(resolved[dep], with_id=not has_id)
+        has_id = has_id or bool(resolved[dep].get("contract_ids"))
+        for value in values:
+            if value.lower() not in query.lower() and value not in extra:
+                extra.append(value)
+    return f"{query} ({', '.join(extra)})" if extra else query
+
+
+def run_subquery_dag(sub_queries: List[SubQuery],
+                     retrieve_batch: Callable[[List[str]], List[Union[List[Dict], Exception]]],
+                     on_level: Optional[Callable[[int, List[Dict]], None]] = None) -> List[Dict]:
+    """
+    Ejecuta el DAG de sub-queries nivel a nivel.
+
+    Args:
+        sub_queries: Sub-queries del plan (con dependency)
+        retrieve_batch: Retrieval en lote (lista de queries -> chunks por query; una
+            excepción en la posición de una query marca como fallido solo ese paso)
+        on_level: Callback opcional con (nivel, resultados del nivel) al terminar cada nivel
+
+    Returns:
+        Un resultado por sub-query (orden de ejecución) con sub_query, query (resuelta),
+        level, chunks, entities y error (None si fue bien).
+    """
+    resolved: Dict[int, Dict[str, List[str]]] = {}
+    results = []
+    levels = topological_levels(sub_queries)
+    if len(levels) > 1:
+        logger.info(f"🔗 Sub-queries con dependencias: {len(levels)} niveles {[len(l) for l in levels]}")
+
+    for level_idx, level in enumerate(levels):
+        queries = [bind_dependencies(sq, resolved) for sq in level]
+        try:
+            batch = retrieve_batch(queries)
+        except Exception as e:
+            logger.error(f"Error en retrieval del nivel {level_idx}: {e}")
+            batch = [e] * len(level)
+        errors = [str(item) if isinstance(item, Exception) else None for item in batch]
+        level_chunks = [[] if isinstance(item, Exception) else item for item in batch]
+
+        level_results = []
+        for sq, query, chunks, error in zip(level, queries, level_chunks, errors):
+            entities = resolve_entities(chunks)
+            resolved[sq["id"]] = entities
+            level_results.append({
+                "sub_query": sq,
+                "query": query,
+                "level": level_idx,
+                "chunks": chunks,
+                "entities": entities,
+                "error": error,
+            })
+        results.extend(level_results)
+
+        if on_level is not None:
+            try:
+                on_level(level_idx, level_results)
+            except Exception as e:
+                logger.warning(f"Callback de nivel falló: {e}")
+
+    return results
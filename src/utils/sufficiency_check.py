@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Pre-chequeo determinista de suficiencia (antes del auditor LLM).
+
+Para cada sub-query se comprueba con regex (deterministic_extractor) si los chunks
+recuperados contienen la entidad pedida (ID de contrato o CIF) y un valor del campo
+solicitado (importe, fecha, CIF, penalización, normativa):
+- Todas las sub-queries ancladas y cubiertas -> SUFFICIENT sin LLM.
+- Ninguna entidad pedida aparece en los chunks -> INSUFFICIENT sin LLM.
+- Cualquier otro caso (listados, preguntas abiertas, cobertura mixta) -> None:
+  decide el auditor LLM.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
+from src.utils.deterministic_extractor import (
+    extract_amounts, extract_cifs, extract_contract_ids, extract_dates,
+    extract_normativas, extract_penalties
+)
+from src.utils.text_analysis import fold, normalize_contract_id
+from src.utils.contract_facts import resolve_field_lookup
+
+# Campo pedido -> (palabras que lo piden, plegadas) y extractor que lo valida en el chunk
+FIELD_RULES: Dict[str, tuple] = {
+    "importe": (frozenset("importe importes coste costes precio presupuesto valor cuantia aval avales garantia".split()),
+                extract_amounts),
+    "fecha": (frozenset("fecha fechas plazo plazos vencimiento vence cuando inicio fin finalizacion vigencia".split()),
+              extract_dates),
+    "cif": (frozenset("cif nif".split()),
+            extract_cifs),
+    "penalizacion": (frozenset("penalizacion penalizaciones penalidad penalidades sancion sanciones".split()),
+                     extract_penalties),
+    "normativa": (frozenset("normativa normativas norma normas iso stanag certificacion".split()),
+                  extract_normativas),
+}
+
+# Metadata de ingesta que responde exactamente a un campo puntual -> campo de FIELD_RULES.
+# La metadata global del contrato se copia en todos sus chunks: solo cuenta si la query
+# pide justo ese dato (p.ej. el importe total), nunca como "el chunk tiene un importe".
+_METADATA_FIELDS = {"importe": "importe", "aval_importe": "importe",
+                    "fecha_inicio": "fecha", "fecha_fin": "fecha", "aval_vencimiento": "fecha"}
+
+
+def requested_fields(query: str) -> List[str]:
+    """Campos concretos que pide la query (según su vocabulario)."""
+    words = set(re.findall(r'[^\W_]+', fold(query)))
+    return [field for field, (vocabulary, _) in FIELD_RULES.items() if words & vocabulary]
+
+
+def _mentions(chunk: Dict, contract_ids: List[str], cifs: List[str]) -> bool:
+    meta = chunk.get("metadata", {})
+    text = chunk.get("contenido", "")
+    if contract_ids:
+        chunk_ids = set(extract_contract_ids(text))
+        if meta.get("num_contrato"):
+            chunk_ids.add(normalize_contract_id(meta["num_contrato"]))
+        if not chunk_ids & set(contract_ids):
+            return False
+    if cifs and not set(extract_cifs(text)) & set(cifs):
+        return False
+    return True
+
+
+def _has_field(chunk: Dict, field: str, metadata_key: Optional[str] = None) -> bool:
+    """El chunk contiene un valor del campo (en su texto, o en `metadata_key` si la query lo pide exactamente)."""
+    if metadata_key and _METADATA_FIELDS.get(metadata_key) == field and chunk.get("metadata", {}).get(metadata_key):
+        return True
+    extractor = FIELD_RULES[field][1]
+    return bool(extractor(chunk.get("contenido", "")))
+
+
+def check_sub_query(query: str, chunks: List[Dict]) -> Dict:
+    """
+    Cobertura de una sub-query:
+    status = covered (entidad + todos los campos), missing (la entidad no aparece)
+    o ambiguous (sin entidad anclada, sin campo reconocible o cobertura parcial).
+    """
+    contract_ids = extract_contract_ids(query)
+    cifs = extract_cifs(query)
+    fields = requested_fields(query)
+    result = {"query": query, "contract_ids": contract_ids, "fields": fields, "fields_found": []}
+
+    if not (contract_ids or cifs):
+        return {**result, "status": "ambiguous"}
+
+    matching = [chunk for chunk in chunks if _mentions(chunk, contract_ids, cifs)]
+    if not matching:
+        return {**result, "status": "missing"}
+
+    # Pregunta por exactamente un dato de ingesta ("importe de X"): su metadata vale como prueba
+    exact = resolve_field_lookup(query)
+    metadata_key = exact[1] if exact else None
+    found = [field for field in fields if any(_has_field(chunk, field, metadata_key) for chunk in matching)]
+    result["fields_found"] = found
+    if fields and len(found) == len(fields):
+        return {**result, "status": "covered"}
+    return {**result, "status": "ambiguous"}
+
+
+def precheck_sufficiency(sub_queries: List[Dict], chunks: List[Dict]) -> Tuple[Optional[Dict], List[Dict]]:
+    """
+    Returns:
+        (veredicto determinista con formato EvaluationReport o None si hay que consultar
+        al LLM, chequeo por sub-query)
+    """
+    checks = [check_sub_query(sq["query"], chunks) for sq in sub_queries]
+    if not checks:
+        return None, checks
+
+    statuses = {check["status"] for check in checks}
+    if statuses == {"covered"}:
+        return {
+            "status": "SUFFICIENT",
+            "reasoning": "Pre-chequeo determinista: cada sub-query tiene su entidad y el dato pedido en los chunks.",
+            "missing_info": [],
+            "score": 90.0,
+        }, checks
+    if statuses == {"missing"}:
+        return {
+            "status": "INSUFFICIENT",
+            "reasoning": "Pre-chequeo determinista: ninguna de las entidades pedidas aparece en los chunks recuperados.",
+            "missing_info": [check["query"] for check in checks],
+            "score": 0.0,
+        }, checks
+    return None, checks
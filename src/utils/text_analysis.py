@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Analizador léxico para español (compartido por BM25, boosting y extractores).
+
+Pipeline de una sola pasada de regex sobre el texto normalizado:
+1. Minúsculas + plegado de acentos (garantía -> garantia; se conserva la ñ).
+2. Tokens protegidos que NO se parten ni se stemmizan:
+   IDs de contrato (CON-2024-012 -> con_2024_012), CIFs (A-87654321 -> a-87654321),
+   normativas (STANAG 4172 -> stanag_4172, MIL-STD-810H -> mil-std-810h),
+   NSN, fechas DD/MM/AAAA e importes (28.500.000,00 -> 28500000).
+3. Resto de palabras: stop-words fuera y stemming ligero (Savoy) para plural/género.
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterable, List, Optional, Set
+
+ANALYZER_VERSION = "es-light-1"
+
+# ============================================
+# PATRONES COMPARTIDOS (texto original, IGNORECASE)
+# ============================================
+CONTRACT_ID_PATTERN = r'(CON|SER|SUM|LIC|EXP)[_\- ]?(\d{4})[_\- ]?(\d{3})'
+CIF_PATTERN = r'([A-Z])-?(\d{8})'
+
+CONTRACT_ID_RE = re.compile(rf'(?<![A-Za-z0-9]){CONTRACT_ID_PATTERN}(?!\d)', re.IGNORECASE)
+
+# Prefijos de los tokens de normativa generados por el analizador
+NORM_TOKEN_PREFIXES = ("stanag_", "iso_", "aqap_", "pecal_", "mil-", "def-stan_")
+
+_FOLD_TABLE = str.maketrans("áéíóúüàèìòùâêîôûäëïöç", "aeiouuaeiouaeiouaeioc")
+
+_TOKEN_RE = re.compile(
+    r'(?<![a-z0-9])(?:'
+    rf'(?P<contract>{CONTRACT_ID_PATTERN.lower()})(?!\d)'
+    r'|(?P<nsn>nsn[\s\-]?\d{4}-?\d{2}-?\d{3}-?\d{4})(?!\d)'
+    r'|(?P<norm>(?:stanag|iso|aqap|pecal)[\s\-]?\d+|mil-[a-z]{1,4}-\d+[a-z]?(?:-\d+)?|def[\s\-]?stan[\s\-]?\d+(?:-\d+)?)'
+    rf'|(?P<cif>{CIF_PATTERN.lower()})(?!\d)'
+    r'|(?P<date>\d{1,2}/\d{1,2}/\d{4})'
+    r'|(?P<amount>\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+,\d+)(?!\d)'
+    r')'
+    r'|(?P<word>[^\W_]+)'
+)
+
+SPANISH_STOPWORDS = frozenset("""
+a al algo algunas algunos ante antes como con contra de del desde durante e el ella ellas ellos en entre era
+eran es esa esas ese eso esos esta estaba estado estan estar este esto estos fue fueron ha habia han hasta hay
+la las le les lo los mas me mi mis muy ni no nos o os otra otras otro otros para pero poco por porque que se
+ser si sin sobre son su sus tambien tanto te tiene tienen todo todos tu tus un una unas uno unos y ya yo
+""".split())
+# Se conservan interrogativos (cuando, donde, cual, cuanto...): marcan la intención de la query
+
+
+def fold(text: str) -> str:
+    """Minúsculas + plegado de acentos (la ñ se conserva)."""
+    return text.lower().translate(_FOLD_TABLE)
+
+
+@lru_cache(maxsize=65536)
+def light_stem(word: str) -> str:
+    """Stemmer ligero para español (plurales y género, estilo Savoy)."""
+    n = len(word)
+    if n < 5 or not word.isalpha():
+        return word
+    last = word[-1]
+    if last in "oae":
+        return word[:-1]
+    if last == "s":
+        if word.endswith("eses"):
+            return word[:-2]
+        if word.endswith("ces"):
+            return word[:-3] + "z"
+        if word[-2] in "oae":
+            return word[:-2]
+    return word
+
+
+def normalize_contract_id(raw: str) -> Optional[str]:
+    """CON-2024-012 / con 2024 012 -> CON_2024_012."""
+    match = re.fullmatch(CONTRACT_ID_PATTERN, raw.strip(), re.IGNORECASE)
+    if not match:
+        return None
+    return f"{match.group(1).upper()}_{match.group(2)}_{match.group(3)}"
+
+
+def _normalize_amount(raw: str) -> str:
+    integer, _, decimals = raw.replace(".", "").partition(",")
+    decimals = decimals.rstrip("0")
+    return f"{integer}.{decimals}" if decimals else integer
+
+
+def _emit(match: "re.Match") -> Optional[str]:
+    kind = match.lastgroup
+    value = match.group(kind)
+
+    if kind == "word":
+        if value in SPANISH_STOPWORDS or (len(value) == 1 and value.isalpha()):
+            return None
+        return light_stem(value)
+    if kind == "contract":
+        return re.sub(r'[\s\-]', '_', value)
+    if kind in ("norm", "nsn"):
+        if value.startswith("mil-") or value.startswith("nsn-"):
+            return re.sub(r'\s', '', value)
+        return re.sub(r'[\s\-]+(?=\d)', '_', value).replace("def stan", "def-stan").replace("defstan", "def-stan")
+    if kind == "cif":
+        return f"{value[0]}-{value[-8:]}"
+    if kind == "amount":
+        return _normalize_amount(value)
+    return value  # date
+
+
+def analyze(text: str) -> List[str]:
+    """Tokens normalizados de un texto (para indexar o consultar)."""
+    tokens = []
+    for match in _TOKEN_RE.finditer(fold(text)):
+        token = _emit(match)
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def analyze_batch(texts: Iterable[str]) -> List[List[str]]:
+    """Analiza un lote de textos (pasada única sobre el corpus en la ingesta)."""
+    return [analyze(t) for t in texts]
+
+
+def terms(text: str) -> Set[str]:
+    """Conjunto de términos de un texto (para matching de keywords)."""
+    return set(analyze(text))
+
+
+def is_norm_token(token: str) -> bool:
+    """True si el token es un código de normativa (stanag_4172, iso_9001, mil-std-810h...)."""
+    return token.startswith(NORM_TOKEN_PREFIXES)
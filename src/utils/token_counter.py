@@ -1,74 +1,71 @@
 # -*- coding: utf-8 -*-
 """
 Token Counter Utility.
-Maneja el conteo de tokens y el recorte de contexto para Token Budgeting.
+Conteo de tokens (encoder cacheado) para Token Budgeting.
+
+El nº de tokens de cada chunk se calcula una vez en la ingesta y se guarda en su
+metadata (`n_tokens`); en consulta solo se cuentan los chunks de índices antiguos,
+y el resultado se memoriza en la propia metadata.
 """
 
 import logging
+from functools import lru_cache
 from typing import List, Dict
-import tiktoken
+
+from src.config import CONTEXT_MAX_TOKENS
 
 logger = logging.getLogger(__name__)
 
 # Configuración
 MODEL_ENCODING = "o200k_base" # Encoding para GPT-4o
-MAX_CONTEXT_TOKENS = 20000
+MAX_CONTEXT_TOKENS = CONTEXT_MAX_TOKENS
 
+@lru_cache(maxsize=1)
 def get_encoder():
-    """Retorna el encoder de tiktoken para GPT-4o."""
+    """Retorna el encoder de tiktoken para GPT-4o (cargado una vez; None si no hay ninguno)."""
+    import tiktoken
     try:
         return tiktoken.get_encoding(MODEL_ENCODING)
     except Exception as e:
         logger.warning(f"No se pudo cargar encoding {MODEL_ENCODING}, usando cl100k_base. Error: {e}")
+    try:
         return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # Sin red para descargar el BPE: estimación conservadora por caracteres
+        logger.warning(f"Sin encoding de tiktoken, conteo aproximado. Error: {e}")
+        return None
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Cuenta los tokens de cada texto (encode en lote, multihilo en tiktoken)."""
+    encoder = get_encoder()
+    if encoder is None:
+        return [len(t) // 3 + 1 for t in texts]
+    return [len(tokens) for tokens in encoder.encode_ordinary_batch(texts)]
 
 def count_tokens(text: str) -> int:
     """Cuenta los tokens de un texto."""
-    encoder = get_encoder()
-    return len(encoder.encode(text))
+    return count_tokens_batch([text])[0]
+
+def chunk_text(chunk: Dict) -> str:
+    """Texto de un chunk ('contenido' en retrieval, 'text' en el Citation Engine)."""
+    return chunk.get("contenido") or chunk.get("text") or ""
+
+def chunk_tokens(chunk: Dict) -> int:
+    """
+    Tokens del contenido de un chunk: `n_tokens` de la ingesta si existe; si no,
+    se cuenta y se memoriza en su metadata.
+    """
+    metadata = chunk.setdefault("metadata", {})
+    n_tokens = metadata.get("n_tokens")
+    if n_tokens is None:
+        n_tokens = count_tokens(chunk_text(chunk))
+        metadata["n_tokens"] = n_tokens
+    return int(n_tokens)
 
 def trim_context(chunks: List[Dict], max_tokens: int = MAX_CONTEXT_TOKENS) -> List[Dict]:
     """
     Recorta la lista de chunks para ajustarse al presupuesto de tokens.
-    Prioriza los chunks con mayor 'score' (similitud).
-    
-    Args:
-        chunks: Lista de diccionarios con keys 'contenido', 'metadata', 'score'
-        max_tokens: Límite de tokens
-        
-    Returns:
-        List[Dict]: Lista recortada de chunks
+    Compatibilidad: delega en context_packer.pack_context.
     """
-    if not chunks:
-        return []
-
-    # 1. Ordenar por score descendente (priorizar los más relevantes)
-    # Asumimos que si no hay score, es 0.0
-    sorted_chunks = sorted(chunks, key=lambda x: x.get("score", 0.0), reverse=True)
-    
-    selected_chunks = []
-    current_tokens = 0
-    encoder = get_encoder()
-    
-    logger.info(f"Iniciando Token Budgeting. Input: {len(chunks)} chunks. Max Tokens: {max_tokens}")
-    
-    for chunk in sorted_chunks:
-        content = chunk.get("contenido", "")
-        # Estimamos tokens del chunk (contenido + metadata básica)
-        meta_str = str(chunk.get("metadata", {}))
-        chunk_text = f"{content}\n{meta_str}"
-        
-        chunk_tokens = len(encoder.encode(chunk_text))
-        
-        if current_tokens + chunk_tokens <= max_tokens:
-            selected_chunks.append(chunk)
-            current_tokens += chunk_tokens
-        else:
-            logger.debug(f"Chunk descartado por límite de tokens (Size: {chunk_tokens})")
-            
-    logger.info(f"Token Budgeting completado. Output: {len(selected_chunks)} chunks. Tokens est: {current_tokens}")
-    
-    # Restaurar orden original o devolver por relevancia?
-    # Para síntesis, el orden de relevancia es bueno, pero a veces el orden lógico importa.
-    # Dado que es RAG, el orden de relevancia es seguro.
-    return selected_chunks
+    from src.utils.context_packer import pack_context
+    return pack_context(chunks, max_tokens=max_tokens)
@@ -14,7 +14,7 @@ from openai import OpenAI
 
 import sys
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent))
-from src.config import VECTORSTORE_PATH, OPENAI_API_KEY, MODEL_EMBEDDINGS
+from src.config import VECTORSTORE_PATH, EMBEDDING_CACHE_ENABLED
 
 import threading
 
@@ -22,7 +22,6 @@ logger = logging.getLogger(__name__)
 
 
 # Variables globales para cache
-_openai_client: Optional[OpenAI] = None
 _chroma_client: Optional[chromadb.PersistentClient] = None
 _collection: Optional[chromadb.Collection] = None
 _client_lock = threading.RLock()  # RLock para permitir llamadas anidadas (get_collection -> get_chroma_client)
@@ -32,21 +31,43 @@ COLLECTION_NAME = "contratos_defensa"
 
 def get_openai_client() -> OpenAI:
     """
-    Obtiene cliente OpenAI (con caché).
+    Obtiene el cliente OpenAI compartido (gateway LLM).
     """
-    global _openai_client
-    if _openai_client is None:
-        _openai_client = OpenAI(api_key=OPENAI_API_KEY)
-        logger.info("Cliente OpenAI inicializado para embeddings")
-    return _openai_client
+    from src.utils.llm_gateway import get_llm_gateway
+    return get_llm_gateway().client
 
 
 def get_embeddings(texts: List[str], show_progress: bool = True) -> List[List[float]]:
-    """Genera embeddings usand OpenAI."""
-    client = get_openai_client()
-    # Simplified call for re-insertion
-    resp = client.embeddings.create(input=texts, model=MODEL_EMBEDDINGS)
-    return [d.embedding for d in resp.data]
+    """
+    Genera embeddings usando OpenAI, pasando antes por la caché en disco.
+    Solo los textos no vistos (por modelo + hash de contenido) llegan a la API.
+    """
+    if not EMBEDDING_CACHE_ENABLED:
+        return _embed_remote(texts)
+
+    from src.utils.embedding_cache import get_embedding_cache
+    from src.utils.embedder import get_embedder
+    cache = get_embedding_cache()
+    model = get_embedder().model  # Namespace por modelo (el backend 'fake' no contamina la caché real)
+
+    cached = cache.get_many(model, texts)
+    missing = [t for t in dict.fromkeys(texts) if t not in cached]
+
+    if missing:
+        fresh = _embed_remote(missing)
+        cache.set_many(model, missing, fresh)
+        cached.update(zip(missing, fresh))
+
+    if show_progress and len(texts) > 1:
+        logger.info(f"Embeddings: {len(texts) - len(missing)}/{len(texts)} desde caché, {len(missing)} generados")
+
+    return [cached[t] for t in texts]
+
+
+def _embed_remote(texts: List[str]) -> List[List[float]]:
+    """Embeddings sin caché: batches por tokens enviados en paralelo (ver utils/embedder.py)."""
+    from src.utils.embedder import get_embedder
+    return get_embedder().embed(texts)
 
 
 # ... get_embeddings ok ...
@@ -134,7 +155,8 @@ def add_documents(chunks: List[Dict]) -> int:
     metadatas = []
     
     for i, chunk in enumerate(chunks):
-        chunk_id = f"chunk_{i}_{chunk['metadata'].get('archivo', 'unknown')}"
+        # ID estable asignado en chunking (fallback al esquema antiguo por posición)
+        chunk_id = chunk["metadata"].get("chunk_id") or f"chunk_{i}_{chunk['metadata'].get('archivo', 'unknown')}"
         ids.append(chunk_id)
         documents.append(chunk["contenido"])
         
@@ -152,16 +174,19 @@ def add_documents(chunks: List[Dict]) -> int:
                     clean_metadata[key] = str(value)
         metadatas.append(clean_metadata)
     
-    # Generar embeddings en batches con tracking
+    # Generar embeddings (caché + batches por tokens en paralelo)
     print(f"\n📊 Generando embeddings para {len(documents)} chunks...")
-    print(f"   Modelo: {MODEL_EMBEDDINGS} (3072 dimensiones)")
-    print(f"   Tiempo estimado: ~{len(documents) // 100 * 2} segundos\n")
+    from src.utils.embedder import get_embedder
+    print(f"   Modelo: {get_embedder().model}")
     
+    embed_start = time.time()
     embeddings = get_embeddings(documents, show_progress=True)
+    embed_time = time.time() - embed_start
+    print(f"   Embeddings listos en {embed_time:.1f}s ({len(documents) / max(embed_time, 1e-6):.1f} chunks/s)\n")
     
-    # Añadir a ChromaDB
+    # Añadir a ChromaDB (upsert: re-ingestar un archivo reemplaza sus chunks in situ)
     print(f"\n💾 Guardando en ChromaDB...")
-    collection.add(
+    collection.upsert(
         ids=ids,
         documents=documents,
         metadatas=metadatas,
@@ -214,6 +239,77 @@ def search(query: str, k: int = 5, where: Optional[Dict] = None) -> List[Dict]:
     return chunks
 
 
+def search_many(queries: List[str], k: int = 5, where: Optional[Dict] = None) -> List[List[Dict]]:
+    """
+    Búsqueda de varias queries a la vez: un único request de embeddings
+    y una única consulta multi-vector a ChromaDB.
+    
+    Returns:
+        List[List[Dict]]: Resultados (como search()) por query, en el mismo orden.
+    """
+    if not queries:
+        return []
+    
+    collection = get_collection()
+    query_embeddings = get_embeddings(list(queries))
+    
+    results = collection.query(
+        query_embeddings=query_embeddings,
+        n_results=k,
+        where=where,
+        include=["documents", "metadatas", "distances"]
+    )
+    
+    all_chunks = []
+    for q_idx in range(len(queries)):
+        all_chunks.append([
+            {
+                "contenido": doc,
+                "metadata": meta,
+                "distancia": dist
+            }
+            for doc, meta, dist in zip(results["documents"][q_idx], results["metadatas"][q_idx], results["distances"][q_idx])
+        ])
+    
+    logger.info(f"Búsqueda múltiple completada: {len(queries)} queries en una consulta")
+    return all_chunks
+
+
+def get_documents_by_ids(ids: List[str]) -> List[Dict]:
+    """
+    Recupera chunks por su chunk_id (sin embedding ni búsqueda vectorial).
+    Los IDs inexistentes se ignoran; el orden sigue al de `ids`.
+    """
+    if not ids:
+        return []
+    
+    results = get_collection().get(ids=list(ids), include=["documents", "metadatas"])
+    by_id = {
+        chunk_id: {"contenido": doc, "metadata": meta}
+        for chunk_id, doc, meta in zip(results["ids"], results["documents"], results["metadatas"])
+    }
+    return [by_id[chunk_id] for chunk_id in ids if chunk_id in by_id]
+
+
+def delete_documents(ids: List[str]) -> int:
+    """
+    Elimina chunks por ID (ingesta incremental).
+    
+    Args:
+        ids: IDs de chunks a eliminar (los inexistentes se ignoran).
+    
+    Returns:
+        int: Número de IDs solicitados.
+    """
+    if not ids:
+        return 0
+    
+    collection = get_collection()
+    collection.delete(ids=list(ids))
+    logger.info(f"🗑️ Eliminados {len(ids)} chunks de ChromaDB")
+    return len(ids)
+
+
 def clear_collection() -> bool:
     """
     Elimina todos los documentos de la colección.
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del re-ranker en CPU: latencia y concordancia de ranking.
+
+Candidatos reales: chunks de data/normalized, top-30 BM25 por query (sin API).
+Modelos comparados:
+- current: ms-marco-MiniLM-L-6-v2 con CrossEncoder.predict por defecto (lo que
+  usa hoy LocalReranker en CPU)
+- reference (--reference): bge-reranker-v2-m3 fp32 con CrossEncoder
+- onnx-fp32 / onnx-int8: bge-reranker-v2-m3 exportado (scripts/export_reranker_onnx.py)
+
+Concordancia contra cada modelo de referencia: tau de Kendall, top-1 y solape top-5.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.config import NORMALIZED_PATH, RERANKER_ONNX_DIR
+from src.utils.bm25_index import BM25Index
+from src.utils.chunking import create_chunks_from_pdf
+from src.utils.onnx_reranker import OnnxCrossEncoder, is_onnx_model_exported
+
+QUERIES = [
+    "¿Cuál es el importe total del contrato de Retamares?",
+    "¿Qué normativa ISO específica se exige en CON_2024_010?",
+    "Compara los importes de Ciberseguridad vs Visión Nocturna",
+    "¿Qué contratos incluyen penalización de 50.000 EUR diarios?",
+    "¿Qué entidad avala el contrato de vehículos blindados?",
+    "¿Cuál es el CIF del contratista de mantenimiento de armamento?",
+    "¿Qué nivel de clasificación de seguridad exige el contrato de ciberseguridad?",
+    "¿Cuándo vence la garantía definitiva del suministro sanitario?",
+]
+CANDIDATES = 30
+
+
+def kendall_tau(a: np.ndarray, b: np.ndarray) -> float:
+    """Tau de Kendall entre dos vectores de scores (1 = mismo orden)."""
+    n = len(a)
+    concordant = discordant = 0
+    for i in range(n):
+        for j in range(i + 1, n):
+            s = np.sign(a[i] - a[j]) * np.sign(b[i] - b[j])
+            concordant += s > 0
+            discordant += s < 0
+    pairs = n * (n - 1) / 2
+    return float((concordant - discordant) / pairs) if pairs else 1.0
+
+
+def topk_overlap(a: np.ndarray, b: np.ndarray, k: int = 5) -> float:
+    return len(set(np.argsort(-a)[:k]) & set(np.argsort(-b)[:k])) / k
+
+
+def load_candidates():
+    chunks = []
+    for path in sorted(Path(NORMALIZED_PATH).glob("*.md")):
+        chunks.extend(create_chunks_from_pdf(path))
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=tmp)
+        index.build(chunks)
+        return [[c["contenido"] for c in index.search(q, top_k=CANDIDATES)] for q in QUERIES]
+
+
+def run_model(name, predict, candidates, runs):
+    predict([[QUERIES[0], candidates[0][0]]])  # warm-up
+    latencies, scores = [], []
+    for query, docs in zip(QUERIES, candidates):
+        pairs = [[query, doc] for doc in docs]
+        best = float("inf")
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = np.asarray(predict(pairs), dtype=np.float32)
+            best = min(best, time.perf_counter() - start)
+        latencies.append(best)
+        scores.append(result)
+    lat = np.array(latencies) * 1000
+    n_pairs = sum(len(d) for d in candidates)
+    print(f"{name:<12} p50={np.percentile(lat, 50):7.1f} ms  p95={np.percentile(lat, 95):7.1f} ms  "
+          f"{n_pairs / lat.sum() * 1000:7.1f} pares/s")
+    return scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del re-ranker en CPU")
+    parser.add_argument("--reference", action="store_true", help="Incluir bge-reranker-v2-m3 fp32 (lento)")
+    parser.add_argument("--runs", type=int, default=3, help="Repeticiones por query (se toma la mejor)")
+    parser.add_argument("--threads", type=int, default=0, help="Hilos intra-op de onnxruntime (0 = auto)")
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"⏱️  BENCHMARK RE-RANKER CPU ({len(QUERIES)} queries x {CANDIDATES} candidatos)")
+    print("=" * 70)
+    candidates = load_candidates()
+
+    results = {}
+    try:
+        from sentence_transformers import CrossEncoder
+        current = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2", device="cpu")
+        results["current"] = run_model("current", current.predict, candidates, args.runs)
+        if args.reference:
+            reference = CrossEncoder("BAAI/bge-reranker-v2-m3", device="cpu")
+            results["reference"] = run_model("reference", reference.predict, candidates, args.runs)
+    except ImportError:
+        print("⚠️  sentence-transformers no instalado: sin modelo actual ni referencia fp32")
+
+    if is_onnx_model_exported(RERANKER_ONNX_DIR):
+        for quantized, name in ((False, "onnx-fp32"), (True, "onnx-int8")):
+            model = OnnxCrossEncoder.from_dir(RERANKER_ONNX_DIR, quantized=quantized, intra_op_threads=args.threads)
+            results[name] = run_model(name, model.predict, candidates, args.runs)
+    else:
+        print(f"⚠️  Sin modelo ONNX en {RERANKER_ONNX_DIR}: python scripts/export_reranker_onnx.py")
+
+    print("\n📊 CONCORDANCIA DE RANKING (media por query)")
+    names = list(results)
+    for base in ("reference", "onnx-fp32", "current"):
+        if base not in results:
+            continue
+        for other in names:
+            if other == base:
+                continue
+            taus = [kendall_tau(a, b) for a, b in zip(results[base], results[other])]
+            top1 = [int(np.argmax(a) == np.argmax(b)) for a, b in zip(results[base], results[other])]
+            top5 = [topk_overlap(a, b) for a, b in zip(results[base], results[other])]
+            print(f"{other:<12} vs {base:<10} tau={np.mean(taus):.3f}  top1={np.mean(top1):.2f}  "
+                  f"solape@5={np.mean(top5):.2f}")
+
+
+if __name__ == "__main__":
+    main()
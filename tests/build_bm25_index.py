@@ -40,7 +40,7 @@ def build_bm25_index():
     print("\n" + "=" * 60)
     print("✅ Índice BM25 construido exitosamente")
     print(f"   Documentos indexados: {len(chunks)}")
-    print(f"   Ubicación: data/bm25_index.pkl")
+    print(f"   Ubicación: data/bm25_index/")
     print("=" * 60 + "\n")
 
 if __name__ == "__main__":
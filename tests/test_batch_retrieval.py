@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del retrieval en lote de sub-queries: BM25 multi-query vectorizado,
+hybrid_search_many y agrupación por filtro en smart_hierarchical_retrieval_batch.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.hybrid_search as hybrid_module
+import src.utils.smart_retrieval as smart_module
+from src.utils.bm25_index import BM25Index
+
+CORPUS = [
+    {"contenido": "aval bancario santander del contrato", "metadata": {"archivo": "A.md", "num_contrato": "CON_2024_001"}},
+    {"contenido": "suministro de combustible para vehiculos", "metadata": {"archivo": "B.md", "num_contrato": "CON_2024_002"}},
+    {"contenido": "aval aval de ejecucion y combustible", "metadata": {"archivo": "C.md", "num_contrato": "CON_2024_003"}},
+    {"contenido": "mantenimiento de hangares", "metadata": {"archivo": "D.md", "num_contrato": "CON_2024_004"}},
+]
+
+
+def test_bm25_search_many_matches_search():
+    """Test: Una pasada multi-query da exactamente lo mismo que N búsquedas"""
+    print("\nTest 1: BM25 search_many...")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=str(Path(tmp) / "bm25_index"))
+        index.build(CORPUS)
+
+        queries = ["aval bancario", "combustible", "inexistente", "aval combustible hangares"]
+        batched = index.search_many(queries, top_k=2)
+        assert batched == [index.search(q, top_k=2) for q in queries]
+        assert batched[2] == []
+        assert index.search_many([]) == []
+    print("✅ Test bm25 search_many PASS")
+
+
+def test_hybrid_search_many_single_call_per_leg():
+    """Test: Las N queries comparten una llamada por rama y se fusionan por separado"""
+    print("\nTest 2: hybrid_search_many...")
+    calls = []
+
+    def fake_vector_many(queries, filter_metadata=None):
+        calls.append(list(queries))
+        return [[{"contenido": f"vector {q}", "metadata": {"archivo": "V.md", "chunk_id": f"V::{i}"}}]
+                for i, q in enumerate(queries)]
+
+    original_leg, original_index = hybrid_module._vector_leg_many, hybrid_module._bm25_index
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=str(Path(tmp) / "bm25_index"))
+        index.build(CORPUS)
+        hybrid_module._bm25_index = index
+        hybrid_module._vector_leg_many = fake_vector_many
+        try:
+            results = hybrid_module.hybrid_search_many(["aval bancario", "hangares"], top_k=5)
+        finally:
+            hybrid_module._vector_leg_many, hybrid_module._bm25_index = original_leg, original_index
+
+    assert len(calls) == 1 and len(results) == 2
+    first = [r["metadata"]["archivo"] for r in results[0]]
+    second = [r["metadata"]["archivo"] for r in results[1]]
+    assert "A.md" in first and "D.md" not in first
+    assert "D.md" in second and "A.md" not in second
+    print("✅ Test hybrid_search_many PASS")
+
+
+def test_batch_groups_by_filter_and_falls_back():
+    """Test: Una consulta por grupo de filtro; los filtros vacíos pasan al lote abierto"""
+    print("\nTest 3: Agrupación por filtro...")
+    filtered_calls, open_calls = [], []
+
+    def fake_filters(query):
+        return {"num_contrato": query.split()[-1]} if "CON_" in query else None
+
+    def fake_search_many(queries, k=5, where=None):
+        filtered_calls.append((list(queries), where))
+        if where["num_contrato"] == "CON_2024_999":
+            return [[] for _ in queries]
+        return [[{"contenido": q, "metadata": {"archivo": f"{q}-{j}.md"}} for j in range(4)] for q in queries]
+
+    def fake_hybrid_many(queries, top_k=5, filter_metadata=None):
+        open_calls.append(list(queries))
+        return [[{"contenido": q, "metadata": {"archivo": "H.md"}}] for q in queries]
+
+    originals = (smart_module.analyze_query_for_filters, smart_module.search_many, hybrid_module.hybrid_search_many)
+    smart_module.analyze_query_for_filters = fake_filters
+    smart_module.search_many = fake_search_many
+    hybrid_module.hybrid_search_many = fake_hybrid_many
+    try:
+        queries = ["importe CON_2024_001", "aval CON_2024_001", "plazo CON_2024_999", "avales Santander"]
+        results = smart_module.smart_hierarchical_retrieval_batch(queries, top_docs=2, chunks_per_doc=1)
+    finally:
+        smart_module.analyze_query_for_filters, smart_module.search_many, hybrid_module.hybrid_search_many = originals
+
+    assert len(filtered_calls) == 2
+    assert filtered_calls[0] == (["importe CON_2024_001", "aval CON_2024_001"], {"num_contrato": "CON_2024_001"})
+    assert open_calls == [["avales Santander", "plazo CON_2024_999"]]
+    assert [len(r) for r in results] == [2, 2, 1, 1]  # round robin limitado a top_docs * chunks_per_doc
+    assert results[2][0]["contenido"] == "plazo CON_2024_999"
+    print("✅ Test agrupación PASS")
+
+
+if __name__ == "__main__":
+    test_bm25_search_many_matches_search()
+    test_hybrid_search_many_single_call_per_leg()
+    test_batch_groups_by_filter_and_falls_back()
+    print("\n🎉 Todos los tests pasaron")
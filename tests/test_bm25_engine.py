@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del motor BM25 nativo (CSR): ranking, persistencia mmap y migración.
+"""
+
+import sys
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.hybrid_search as hybrid_module
+from src.utils.bm25_index import BM25Index
+from src.utils.chunk_identity import get_chunk_id
+from src.utils.text_analysis import terms
+
+CORPUS = [
+    {"contenido": "aval bancario santander por importe de garantia", "metadata": {"archivo": "A.md"}},
+    {"contenido": "suministro de combustible para vehiculos", "metadata": {"archivo": "B.md"}},
+    {"contenido": "aval aval aval de ejecucion", "metadata": {"archivo": "C.md"}},
+    {"contenido": "mantenimiento de hangares", "metadata": {"archivo": "D.md"}},
+]
+
+
+def test_ranking_and_top_k():
+    """Test: Solo devuelve documentos con términos de la query, ordenados por score"""
+    print("\nTest 1: Ranking BM25...")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=str(Path(tmp) / "bm25_index"))
+        index.build(CORPUS)
+
+        results = index.search("aval bancario", top_k=10)
+        assert [r["metadata"]["archivo"] for r in results] == ["A.md", "C.md"]
+        assert results[0]["score_bm25"] > results[1]["score_bm25"] > 0
+
+        assert len(index.search("aval", top_k=1)) == 1
+        assert index.search("inexistente") == []
+    print("✅ Test ranking PASS")
+
+
+def test_save_load_roundtrip():
+    """Test: El índice recargado (mmap) da los mismos resultados"""
+    print("\nTest 2: Persistencia...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bm25_index")
+        built = BM25Index(index_path=path)
+        built.build(CORPUS)
+        built.build(CORPUS[:3])  # Nueva generación; la antigua se retira
+
+        loaded = BM25Index(index_path=path)
+        assert loaded.is_built()
+        loaded.load()
+
+        assert loaded.search("combustible") == built.search("combustible")
+        assert len(loaded.metadatas) == 3
+        assert len(list(Path(path).glob("gen-*"))) == 1
+    print("✅ Test persistencia PASS")
+
+
+def test_migrates_legacy_pickle():
+    """Test: Un índice .pkl heredado se convierte al formato nativo al cargar"""
+    print("\nTest 3: Migración de pickle...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bm25_index"
+        with open(path.with_suffix(".pkl"), "wb") as f:
+            pickle.dump({
+                "bm25": None,
+                "documents": [c["contenido"] for c in CORPUS],
+                "metadatas": [c["metadata"] for c in CORPUS]
+            }, f)
+
+        index = BM25Index(index_path=str(path))
+        assert index.is_built()
+        index.load()
+
+        assert index.search("hangares")[0]["metadata"]["archivo"] == "D.md"
+        assert (path / "CURRENT").exists()
+    print("✅ Test migración PASS")
+
+
+def test_reloads_new_generation():
+    """Test: Tras una ingesta (nueva generación en CURRENT) el índice global se recarga"""
+    print("\nTest 4: Recarga de generación...")
+    original = hybrid_module._bm25_index
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bm25_index")
+        BM25Index(index_path=path).build(CORPUS[:2])
+        loaded = BM25Index(index_path=path)
+        loaded.load()
+        hybrid_module._bm25_index = loaded
+        try:
+            assert hybrid_module.get_bm25_index() is loaded and not loaded.is_stale()
+            assert hybrid_module.get_bm25_index().search("hangares") == []
+
+            # Ingesta en otra instancia (otro proceso): activa gen-000002
+            ingest = BM25Index(index_path=path)
+            ingest.load()
+            ingest.update(CORPUS[2:])
+            assert loaded.is_stale()
+
+            reloaded = hybrid_module.get_bm25_index()
+            assert reloaded is not loaded and reloaded.generation == ingest.generation
+            assert reloaded.search("hangares")[0]["metadata"]["archivo"] == "D.md"
+            assert hybrid_module.get_bm25_index() is reloaded
+        finally:
+            hybrid_module._bm25_index = original
+    print("✅ Test recarga PASS")
+
+
+def test_chunk_terms_from_forward_index():
+    """Test: Los términos de cada chunk salen del índice (construido y recargado) sin re-analizar"""
+    print("\nTest 5: Índice directo de términos...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bm25_index")
+        built = BM25Index(index_path=path)
+        built.build(CORPUS)
+        loaded = BM25Index(index_path=path)
+        loaded.load()
+        for chunk in CORPUS:
+            expected = terms(chunk["contenido"])
+            assert built.chunk_terms(get_chunk_id(chunk)) == expected
+            assert loaded.chunk_terms(get_chunk_id(chunk)) == expected
+        assert loaded.chunk_terms("OTRO.md::0000") is None
+
+        # El boost con términos del índice es idéntico al que analiza el contenido
+        doc = {**CORPUS[0], "metadata": {**CORPUS[0]["metadata"], "rrf_score": 0.03}}
+        query = "aval del banco santander"
+        assert hybrid_module.calculate_final_score(doc, query, terms(query), loaded.chunk_terms(get_chunk_id(doc))) == \
+            hybrid_module.calculate_final_score(doc, query)
+    print("✅ Test índice directo PASS")
+
+
+if __name__ == "__main__":
+    test_ranking_and_top_k()
+    test_save_load_roundtrip()
+    test_migrates_legacy_pickle()
+    test_reloads_new_generation()
+    test_chunk_terms_from_forward_index()
+    print("\n🎉 Todos los tests pasaron")
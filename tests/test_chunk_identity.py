@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la identidad estable de chunks (RRF, dedup y vecinos).
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.chunk_identity import get_chunk_id, neighbour_chunk_ids, dedup_chunks, make_chunk_id
+from src.utils.hybrid_search import reciprocal_rank_fusion
+
+BOILERPLATE = "La Administración ostenta las siguientes prerrogativas " * 3
+
+
+def _chunk(archivo: str, seq: int, text: str) -> dict:
+    return {
+        "contenido": text,
+        "metadata": {"archivo": archivo, "chunk_seq": seq, "chunk_id": make_chunk_id(archivo, seq)}
+    }
+
+
+def test_rrf_keys_on_chunk_id():
+    """Test: Chunks con el mismo prefijo de boilerplate ya no colisionan en RRF"""
+    print("\nTest 1: RRF por chunk_id...")
+    a = _chunk("A.md", 3, BOILERPLATE + "importe 1.000 EUR")
+    b = _chunk("B.md", 7, BOILERPLATE + "importe 2.000 EUR")
+
+    fused = reciprocal_rank_fusion([[a, b], [b]])
+
+    assert [get_chunk_id(d) for d in fused] == ["B::0007", "A::0003"]
+    assert fused[0]["metadata"]["rrf_ranks"] == [2, 1]
+    assert "rrf_score" not in b["metadata"], "RRF no debe mutar la metadata original"
+    print("✅ Test RRF PASS")
+
+
+def test_dedup_and_neighbours():
+    """Test: Dedup por ID y derivación de vecinos; fallback por hash para chunks antiguos"""
+    print("\nTest 2: Dedup y vecinos...")
+    a = _chunk("A.md", 0, "texto")
+    legacy = {"contenido": "chunk sin id", "metadata": {"archivo": "OLD.pdf"}}
+
+    assert len(dedup_chunks([a, dict(a), legacy, {"contenido": "chunk sin id", "metadata": {}}])) == 2
+    assert get_chunk_id(legacy).startswith("legacy::")
+    assert neighbour_chunk_ids(a) == ["A::0001"]
+    assert neighbour_chunk_ids(_chunk("A.md", 5, "x")) == ["A::0004", "A::0006"]
+    print("✅ Test dedup PASS")
+
+
+if __name__ == "__main__":
+    test_rrf_keys_on_chunk_id()
+    test_dedup_and_neighbours()
+    print("\n🎉 Todos los tests pasaron")
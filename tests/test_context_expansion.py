@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la expansión de contexto: una sola lectura por ID y ventanas contiguas.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.context_expansion as expansion_module
+from src.utils.chunk_identity import make_chunk_id
+
+
+def _chunk(archivo: str, seq: int, text: str) -> dict:
+    return {
+        "contenido": text,
+        "metadata": {"archivo": archivo, "chunk_seq": seq, "chunk_id": make_chunk_id(archivo, seq)}
+    }
+
+
+STORE = {
+    c["metadata"]["chunk_id"]: c for c in [
+        _chunk("A.md", 1, "Cláusula 7. El adjudicatario constituirá en el plazo de 15 días"),
+        _chunk("A.md", 2, "constituirá en el plazo de 15 días una garantía definitiva del 5%"),
+        _chunk("A.md", 3, "una garantía definitiva del 5%, por importe de 570.000,00 EUR."),
+        _chunk("B.md", 0, "Objeto del contrato: combustible."),
+        _chunk("B.md", 1, "Plazo de entrega: 30 días."),
+    ]
+}
+
+
+def test_single_fetch_and_windows():
+    """Test: Todos los vecinos en una llamada; A::0001-0003 se fusionan sin duplicar solape"""
+    print("\nTest 1: Ventanas contiguas...")
+    calls = []
+
+    def fake_get(ids):
+        calls.append(list(ids))
+        return [STORE[i] for i in ids if i in STORE]
+
+    original = expansion_module.get_documents_by_ids
+    expansion_module.get_documents_by_ids = fake_get
+    try:
+        retrieved = [STORE["B::0001"], STORE["A::0002"]]
+        expanded = expansion_module.expand_context(retrieved)
+    finally:
+        expansion_module.get_documents_by_ids = original
+
+    assert len(calls) == 1, f"Se esperaba 1 lectura por ID, hubo {len(calls)}"
+    assert [w["metadata"]["chunk_id"] for w in expanded] == ["B::0001", "A::0002"]
+
+    window_a = expanded[1]
+    assert window_a["metadata"]["window_chunk_ids"] == ["A::0001", "A::0002", "A::0003"]
+    assert window_a["contenido"] == (
+        "Cláusula 7. El adjudicatario constituirá en el plazo de 15 días "
+        "una garantía definitiva del 5%, por importe de 570.000,00 EUR."
+    )
+    assert expanded[0]["metadata"]["window_seq_range"] == [0, 1]
+    print("✅ Test ventanas PASS")
+
+
+if __name__ == "__main__":
+    test_single_fetch_and_windows()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del empaquetado de contexto: presupuesto de tokens por relevancia/token,
+tope por documento, orden preservado y tokens precalculados en la ingesta.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.chunk_identity import make_chunk_id
+from src.utils.chunking import create_chunks_from_pdf
+from src.utils.citation_engine import CitationEngine
+from src.utils.context_expansion import _build_window
+from src.utils.context_packer import pack_context, CHUNK_OVERHEAD_TOKENS
+from src.utils.token_counter import chunk_tokens
+
+
+def _chunk(name, n_tokens, archivo="A.md", score=None):
+    metadata = {"archivo": archivo, "n_tokens": n_tokens, "chunk_id": name}
+    if score is not None:
+        metadata["rerank_score"] = score
+    return {"contenido": name, "metadata": metadata}
+
+
+def _names(chunks):
+    return [c["contenido"] for c in chunks]
+
+
+def test_budget_and_relevance_per_token():
+    """Test: Todo entra si cabe; si no, relevancia/token con el más relevante siempre dentro"""
+    print("\nTest 1: Presupuesto y relevancia por token...")
+    chunks = [_chunk("top", 500, score=0.9), _chunk("grande", 600, score=0.8),
+              _chunk("p1", 100, score=0.5), _chunk("p2", 100, score=0.4)]
+    assert _names(pack_context(chunks, max_tokens=10000)) == ["top", "grande", "p1", "p2"]
+
+    packed = pack_context(chunks, max_tokens=800 + 3 * CHUNK_OVERHEAD_TOKENS)
+    assert _names(packed) == ["top", "p1", "p2"]  # Orden original, sin el chunk grande
+
+    # Sin rerank_score: relevancia por posición
+    tiny = [_chunk("x", 1000), _chunk("y", 10), _chunk("z", 10)]
+    assert _names(pack_context(tiny, max_tokens=1100)) == ["x", "y"]
+    assert pack_context([], max_tokens=10) == []
+    print("✅ Test presupuesto PASS")
+
+
+def test_per_document_cap():
+    """Test: Con varios documentos ninguno supera su fracción; con uno solo no hay tope"""
+    print("\nTest 2: Tope por documento...")
+    chunks = [_chunk(f"a{i}", 200, "A.md") for i in range(5)] + [_chunk("b0", 200, "B.md")]
+    packed = pack_context(chunks, max_tokens=1200, max_doc_share=0.5)
+    assert _names(packed) == ["a0", "a1", "b0"]
+
+    single = [_chunk(f"a{i}", 200, "A.md") for i in range(5)]
+    assert len(pack_context(single, max_tokens=1100, max_doc_share=0.5)) == 4
+    print("✅ Test tope por documento PASS")
+
+
+def test_token_counts_from_ingest():
+    """Test: n_tokens en la ingesta, memorizado en consulta y sumado en ventanas"""
+    print("\nTest 3: Tokens precalculados...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "CON_2024_001_Prueba.md"
+        path.write_text("**Expediente:** CON_2024_001\n\n" + "Cláusula de garantía definitiva. " * 80,
+                        encoding="utf-8")
+        chunks = create_chunks_from_pdf(path)
+    assert chunks and all(c["metadata"]["n_tokens"] > 0 for c in chunks)
+
+    legacy = {"contenido": "texto sin conteo previo", "metadata": {}}
+    n = chunk_tokens(legacy)
+    assert n > 0 and legacy["metadata"]["n_tokens"] == n
+
+    members = [{"contenido": f"parte {i}", "metadata": {"archivo": "A.md", "chunk_seq": i, "n_tokens": 10,
+                                                       "chunk_id": make_chunk_id("A.md", i)}} for i in range(3)]
+    assert _build_window(members, members[1])["metadata"]["n_tokens"] == 30
+    print("✅ Test tokens PASS")
+
+
+def test_citation_prompt_budget():
+    """Test: El prompt del Citation Engine respeta el presupuesto de contexto"""
+    print("\nTest 4: Presupuesto en el Citation Engine...")
+    chunks = [{"text": f"contenido {i}", "metadata": {"archivo": f"D{i}.md", "n_tokens": 5000}} for i in range(5)]
+    prompt = CitationEngine()._build_citation_prompt("¿Importe?", chunks)
+    assert "[CHUNK_1]" in prompt and "[CHUNK_2]" in prompt and "[CHUNK_3]" not in prompt
+    print("✅ Test Citation Engine PASS")
+
+
+if __name__ == "__main__":
+    test_budget_and_relevance_per_token()
+    test_per_document_cap()
+    test_token_counts_from_ingest()
+    test_citation_prompt_budget()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la tabla de hechos por contrato: parseo tipado, construcción en SQLite
+y resolución exacta de preguntas de orden, suma, conteo y vencimientos.
+"""
+
+import sys
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.contract_facts import (
+    ContractFactsStore, answer_fact_query, format_amount, parse_amount, parse_date
+)
+
+METADATAS = [
+    {"num_contrato": "CON_2024_001", "archivo": "CON_2024_001.md", "contratista": "DefenseTech Solutions S.L.",
+     "importe": "2.450.000,00 EUR", "fecha_fin": "29/01/2026", "aval_importe": "50.000,00 EUR",
+     "aval_entidad": "Banco Santander", "aval_vencimiento": "19/02/2026"},
+    {"num_contrato": "SER_2024_015", "archivo": "SER_2024_015.md", "contratista": "Airbus Defence and Space S.A.",
+     "importe": "18.200.000,00 EUR", "fecha_fin": "15/05/2027"},
+    {"num_contrato": "SUM_2024_014", "archivo": "SUM_2024_014.md", "contratista": "Medline Industries Spain S.L.",
+     "importe": "425.000,00 EUR", "fecha_fin": "20/05/2026", "aval_importe": "8.500,00 EUR",
+     "aval_entidad": "BBVA", "aval_vencimiento": "19/06/2026"},
+    {"num_contrato": "CON_2024_002", "archivo": "CON_2024_002.md", "importe": None, "fecha_fin": "08/08/2026",
+     "aval_importe": "37.500,00 EUR", "aval_entidad": "CaixaBank", "aval_vencimiento": "28/01/2026"},
+]
+
+TODAY = date(2026, 1, 15)
+
+
+def _with_store(test):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ContractFactsStore(db_path=Path(tmp) / "facts.sqlite")
+        assert not store.is_built()
+        assert store.rebuild(METADATAS) == 4
+        assert store.is_built()
+        test(store)
+
+
+def test_parsing():
+    """Test: Importes y fechas en formato español a tipos exactos"""
+    print("\nTest 1: Parseo tipado...")
+    assert parse_amount("2.450.000,00 EUR") == Decimal("2450000.00")
+    assert parse_amount("1.250.000 €") == Decimal("1250000")
+    assert parse_amount("N/A") is None and parse_amount(None) is None
+    assert parse_date("29/01/2026") == date(2026, 1, 29)
+    assert parse_date("31/02/2026") is None
+    assert format_amount(Decimal("20675000.5")) == "20.675.000,50 EUR"
+    print("✅ Test parseo PASS")
+
+
+def test_sort_sum_count():
+    """Test: Mayor importe, suma exacta de avales y conteo sin pasar por chunks"""
+    print("\nTest 2: Orden, suma y conteo...")
+
+    def run(store):
+        top = answer_fact_query("¿Cuál es el contrato de mayor importe?", today=TODAY, store=store)
+        assert top["intent"] == "top" and [r["num_contrato"] for r in top["rows"]] == ["SER_2024_015"]
+        assert "18.200.000,00 EUR" in top["text"]
+
+        bottom = answer_fact_query("Los 2 contratos de menor importe", today=TODAY, store=store)
+        assert [r["num_contrato"] for r in bottom["rows"]] == ["SUM_2024_014", "CON_2024_001"]
+
+        avales = answer_fact_query("Suma de avales", today=TODAY, store=store)
+        assert avales["intent"] == "sum" and avales["value"] == Decimal("96000.00")
+        assert "96.000,00 EUR" in avales["text"] and len(avales["rows"]) == 3
+
+        total = answer_fact_query("¿Cuál es el importe total de todos los contratos?", today=TODAY, store=store)
+        assert total["value"] == Decimal("21075000.00")
+
+        count = answer_fact_query("¿Cuántos contratos hay?", today=TODAY, store=store)
+        assert count["intent"] == "count" and count["value"] == 4
+
+    _with_store(run)
+    print("✅ Test orden/suma/conteo PASS")
+
+
+def test_expiring_and_fallthrough():
+    """Test: Vencimientos por periodo; preguntas de un contrato o cualitativas siguen por retrieval"""
+    print("\nTest 3: Vencimientos y fallthrough...")
+
+    def run(store):
+        month = answer_fact_query("¿Qué contratos vencen este mes?", today=TODAY, store=store)
+        assert month["intent"] == "expiring" and [r["num_contrato"] for r in month["rows"]] == ["CON_2024_001"]
+
+        avales = answer_fact_query("¿Qué avales vencen en los próximos 30 días?", today=TODAY, store=store)
+        assert avales["field"] == "aval_vencimiento"
+        assert [r["num_contrato"] for r in avales["rows"]] == ["CON_2024_002"]
+
+        count = answer_fact_query("¿Cuántos contratos finalizan en 2026?", today=TODAY, store=store)
+        assert count["value"] == 3
+
+        assert answer_fact_query("¿Cuál es el importe del contrato CON_2024_001?", today=TODAY, store=store) is None
+        assert answer_fact_query("¿Qué penalizaciones tiene el contrato de blindados?", today=TODAY, store=store) is None
+
+    _with_store(run)
+    print("✅ Test vencimientos PASS")
+
+
+def test_qualifiers():
+    """Test: Filtro por contratista; calificadores no aplicables (tipo, ámbito) siguen por retrieval"""
+    print("\nTest 4: Calificadores...")
+
+    def run(store):
+        for query in ["¿Cuál es el contrato de suministro de mayor importe?",
+                      "¿Cuántos contratos de servicios hay?",
+                      "Suma de los importes de los contratos de Indra",
+                      "Importe total de los contratos de servicios",
+                      "¿Cuántos contratos tiene Navantia?",
+                      "¿Qué contratos de ciberseguridad vencen este mes?"]:
+            assert answer_fact_query(query, today=TODAY, store=store) is None, query
+
+        airbus = answer_fact_query("¿Cuántos contratos tiene Airbus?", today=TODAY, store=store)
+        assert airbus["value"] == 1 and airbus["contractors"] == ["Airbus Defence and Space S.A."]
+        assert "CONTRATISTA: Airbus Defence and Space S.A." in airbus["text"]
+
+        medline = answer_fact_query("Suma de los importes de los contratos de Medline", today=TODAY, store=store)
+        assert medline["intent"] == "sum" and medline["value"] == Decimal("425000.00")
+
+    _with_store(run)
+    print("✅ Test calificadores PASS")
+
+
+def test_periods_apply_to_every_intent():
+    """Test: El periodo filtra conteo, suma y orden; fechas no reconocidas siguen por retrieval"""
+    print("\nTest 5: Periodos en todas las intenciones...")
+    metadatas = [
+        {"num_contrato": "CON_2024_001", "archivo": "CON_2024_001.md", "importe": "1.000.000,00 EUR",
+         "fecha_inicio": "10/03/2024", "fecha_fin": "10/03/2026"},
+        {"num_contrato": "CON_2025_002", "archivo": "CON_2025_002.md", "importe": "2.000.000,00 EUR",
+         "fecha_inicio": "05/02/2025", "fecha_fin": "05/02/2027"},
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ContractFactsStore(db_path=Path(tmp) / "facts.sqlite")
+        store.rebuild(metadatas)
+
+        count = answer_fact_query("¿Cuántos contratos hay en 2025?", today=TODAY, store=store)
+        assert count["value"] == 1 and count["period"] == "2025" and count["field"] == "fecha_inicio"
+
+        total = answer_fact_query("Suma de los importes de los contratos de 2025", today=TODAY, store=store)
+        assert total["value"] == Decimal("2000000.00") and "PERIODO: 2025" in total["text"]
+
+        top = answer_fact_query("¿Cuál es el contrato de mayor importe en 2024?", today=TODAY, store=store)
+        assert [r["num_contrato"] for r in top["rows"]] == ["CON_2024_001"]
+
+        ending = answer_fact_query("¿Cuántos contratos finalizan en 2027?", today=TODAY, store=store)
+        assert ending["value"] == 1 and ending["field"] == "fecha_fin"
+
+        for query in ["¿Cuántos contratos hay desde 2024 hasta 2025?",
+                      "Suma de importes de los contratos firmados el 10/03/2024",
+                      "¿Cuál es el contrato de mayor importe entre 2024 y 2025?"]:
+            assert answer_fact_query(query, today=TODAY, store=store) is None, query
+    print("✅ Test periodos PASS")
+
+
+if __name__ == "__main__":
+    test_parsing()
+    test_sort_sum_count()
+    test_expiring_and_fallthrough()
+    test_qualifiers()
+    test_periods_apply_to_every_intent()
+    print("\n🎉 Todos los tests pasaron")
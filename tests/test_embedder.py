@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del embedder por batches: límites de batch, orden y determinismo.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.embedder import BatchEmbedder, FakeEmbedder, make_batches, count_embedding_tokens
+
+
+def test_make_batches_respects_limits():
+    """Test: Ningún batch excede tokens ni nº de textos, y se preserva el orden"""
+    print("\nTest 1: Límites de batch...")
+    texts = [f"clausula {i} " * (i % 7 + 1) for i in range(50)]
+    tokens = count_embedding_tokens(texts)
+
+    batches = make_batches(texts, max_tokens=40, max_items=8)
+
+    assert [i for batch in batches for i in batch] == list(range(len(texts)))
+    for batch in batches:
+        assert len(batch) <= 8
+        assert len(batch) == 1 or sum(tokens[i] for i in batch) <= 40
+    print(f"✅ Test make_batches PASS ({len(batches)} batches)")
+
+
+def test_batch_embedder_preserves_order():
+    """Test: El resultado concurrente coincide con el embedding texto a texto"""
+    print("\nTest 2: Orden con pool concurrente...")
+    backend = FakeEmbedder(dimensions=16)
+    embedder = BatchEmbedder(backend, max_concurrency=4)
+    texts = [f"contrato CON_2024_{i:03d}" for i in range(300)]
+
+    vectors = embedder.embed(texts)
+
+    assert len(vectors) == len(texts)
+    assert vectors[17] == backend.embed_batch([texts[17]])[0]
+    assert vectors[299] == backend.embed_batch([texts[299]])[0]
+    assert embedder.total_batches > 1
+    print("✅ Test orden PASS")
+
+
+if __name__ == "__main__":
+    test_make_batches_respects_limits()
+    test_batch_embedder_preserves_order()
+    print("\n🎉 Todos los tests pasaron")
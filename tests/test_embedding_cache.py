@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché persistente de embeddings (sin llamadas a la API).
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.disk_cache import DiskCache
+from src.utils.embedding_cache import EmbeddingCache
+import src.utils.embedding_cache as embedding_cache_module
+import src.utils.vectorstore as vectorstore
+
+
+def test_disk_cache_lru_eviction():
+    """Test: Expulsa las entradas menos usadas al superar el límite de bytes"""
+    print("\nTest 1: Expulsión LRU...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = DiskCache(Path(tmp) / "c.sqlite", max_bytes=1000)
+        cache.set("ns", "a", b"x" * 400)
+        cache.set("ns", "b", b"x" * 400)
+        cache.get("ns", "a")  # 'a' pasa a ser la más reciente
+        cache.set("ns", "c", b"x" * 400)
+
+        assert cache.get("ns", "b") is None, "'b' debería haber sido expulsada"
+        assert cache.get("ns", "a") is not None
+        assert cache.get("ns", "c") is not None
+        assert cache.total_bytes() <= 1000
+    print("✅ Test lru_eviction PASS")
+
+
+def test_embeddings_served_from_cache():
+    """Test: Un texto ya visto no vuelve a la API"""
+    print("\nTest 2: get_embeddings con caché...")
+    calls = []
+
+    def fake_remote(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0, 2.0] for t in texts]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        original_cache = embedding_cache_module._embedding_cache
+        original_remote = vectorstore._embed_remote
+        embedding_cache_module._embedding_cache = EmbeddingCache(path=Path(tmp) / "emb.sqlite")
+        vectorstore._embed_remote = fake_remote
+        try:
+            first = vectorstore.get_embeddings(["hola", "aval bancario", "hola"])
+            second = vectorstore.get_embeddings(["aval bancario", "nuevo texto"])
+        finally:
+            embedding_cache_module._embedding_cache = original_cache
+            vectorstore._embed_remote = original_remote
+
+    assert calls == [["hola", "aval bancario"], ["nuevo texto"]], f"Llamadas inesperadas: {calls}"
+    assert first[0] == first[2] == [4.0, 1.0, 2.0]
+    assert second[0] == first[1]
+    print("✅ Test embeddings_served_from_cache PASS")
+
+
+if __name__ == "__main__":
+    test_disk_cache_lru_eviction()
+    test_embeddings_served_from_cache()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del lookup directo de un campo de un contrato: procedencia del valor en
+ingesta, resolución de la query y respuesta con cita sin LLM.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.contract_facts import (
+    ContractFactsStore, answer_field_lookup, contract_record, resolve_field_lookup
+)
+
+GLOBAL_META = {
+    "num_contrato": "CON_2024_002", "archivo": "CON_2024_002.md",
+    "contratista": "Sistemas Integrados de Defensa S.A.", "importe": "1.875.000,00 EUR",
+    "fecha_inicio": "01/03/2024", "fecha_fin": "08/08/2026", "aval_importe": "37.500,00 EUR",
+    "aval_entidad": "CaixaBank", "aval_vencimiento": "28/01/2026",
+}
+
+CHUNKS = [
+    {"contenido": "- **Expediente:** CON_2024_002\n- **Contratista:** Sistemas Integrados de Defensa S.A.\n"
+                  "- **CIF/NIF Contratista:** A-87654321\n- **Importe Total:** 1.875.000,00 EUR",
+     "metadata": {**GLOBAL_META, "chunk_id": "CON_2024_002.md::0000", "pagina": 1, "seccion": "Cuerpo_Principal"}},
+    {"contenido": "Plazo de ejecución del 01/03/2024 al 08/08/2026. Órgano de contratación CIF S-2800000A.",
+     "metadata": {**GLOBAL_META, "chunk_id": "CON_2024_002.md::0001", "pagina": 2, "seccion": "Cuerpo_Principal"}},
+    {"contenido": "Garantía definitiva: aval de CaixaBank por 37.500,00 EUR con vencimiento 28/01/2026.",
+     "metadata": {**GLOBAL_META, "chunk_id": "CON_2024_002.md::0002", "pagina": 3, "seccion": "ANEXO II"}},
+]
+
+
+def test_contract_record_provenance():
+    """Test: Cada campo apunta al primer chunk que contiene su valor; el CIF sale de su etiqueta"""
+    print("\nTest 1: Procedencia de campos...")
+    record = contract_record(CHUNKS)
+    assert record["cif"] == "A-87654321"
+    sources = {field: src["chunk_id"] for field, src in record["field_sources"].items()}
+    assert sources["cif"] == sources["importe"] == sources["contratista"] == "CON_2024_002.md::0000"
+    assert sources["fecha_fin"] == "CON_2024_002.md::0001"
+    assert sources["aval_importe"] == sources["aval_entidad"] == "CON_2024_002.md::0002"
+    assert record["field_sources"]["aval_vencimiento"]["seccion"] == "ANEXO II"
+    print("✅ Test procedencia PASS")
+
+
+def test_resolve_field_lookup():
+    """Test: Solo un contrato y un campo; el resto sigue por el pipeline completo"""
+    print("\nTest 2: Resolución de la query...")
+    assert resolve_field_lookup("¿Cuál es el CIF del contratista del contrato CON-2024-002?") == ("CON_2024_002", "cif")
+    assert resolve_field_lookup("Importe de CON_2024_002") == ("CON_2024_002", "importe")
+    assert resolve_field_lookup("¿Cuándo vence el contrato CON_2024_002?") == ("CON_2024_002", "fecha_fin")
+    assert resolve_field_lookup("¿Qué entidad avalista tiene CON_2024_002?") == ("CON_2024_002", "aval_entidad")
+    assert resolve_field_lookup("¿Cuándo vence el aval del contrato CON_2024_002?") == ("CON_2024_002", "aval_vencimiento")
+
+    assert resolve_field_lookup("¿Cuál es el importe del contrato de mayor importe?") is None
+    assert resolve_field_lookup("Importe de CON_2024_002 y SER_2024_015") is None
+    assert resolve_field_lookup("Fecha de inicio y fin de CON_2024_002") is None
+    assert resolve_field_lookup("¿Qué penalizaciones tiene CON_2024_002?") is None
+    # Sub-campos: no son el valor total del contrato
+    for query in ["Importe del lote 2 de CON_2024_001", "Precio unitario de CON_2024_001",
+                  "Importe mensual de CON_2024_001", "¿Cuál es la anualidad de 2025 de CON_2024_001?",
+                  "Importe por hito de CON_2024_001", "Importe sin IVA de CON_2024_001",
+                  "¿Cuándo finaliza la segunda fase de CON_2024_001?", "Fecha de fin del plazo de entrega de CON_2024_001"]:
+        assert resolve_field_lookup(query) is None, query
+    print("✅ Test resolución PASS")
+
+
+def test_answer_field_lookup():
+    """Test: Respuesta con cita al chunk fuente; campo sin valor -> None (fallback)"""
+    print("\nTest 3: Respuesta directa...")
+    record = contract_record(CHUNKS)
+    record["aval_entidad"] = None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ContractFactsStore(db_path=Path(tmp) / "facts.sqlite")
+        assert answer_field_lookup("CIF de CON_2024_002", store=store) is None  # tabla sin construir
+        store.rebuild([record])
+
+        hit = answer_field_lookup("¿Cuál es el CIF de CON_2024_002?", store=store)
+        assert hit["value"] == "A-87654321" and hit["chunk_id"] == "CON_2024_002.md::0000"
+        assert "**A-87654321**" in hit["text"]
+        assert "[Fuente: CON_2024_002.md, Pág: 1, Sección: Cuerpo_Principal]" in hit["text"]
+
+        hit = answer_field_lookup("fecha fin del aval de con 2024 002", store=store)
+        assert hit["value"] == "28/01/2026" and hit["pagina"] == 3
+
+        assert answer_field_lookup("¿Qué banco emite el aval de CON_2024_002?", store=store) is None
+        assert answer_field_lookup("Importe de SER_2024_015", store=store) is None
+    print("✅ Test respuesta directa PASS")
+
+
+if __name__ == "__main__":
+    test_contract_record_provenance()
+    test_resolve_field_lookup()
+    test_answer_field_lookup()
+    print("\n🎉 Todos los tests pasaron")
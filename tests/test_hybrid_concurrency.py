@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la búsqueda híbrida concurrente: paralelismo, timeouts y degradación a BM25.
+"""
+
+import sys
+import os
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.hybrid_search as hybrid_module
+from src.utils.bm25_index import BM25Index
+from src.utils.observability import get_stage_metrics
+
+CORPUS = [
+    {"contenido": "aval bancario del contrato", "metadata": {"archivo": "A.md", "num_contrato": "CON_2024_001"}},
+    {"contenido": "suministro de combustible", "metadata": {"archivo": "B.md", "num_contrato": "CON_2024_002"}},
+    {"contenido": "mantenimiento de hangares", "metadata": {"archivo": "C.md", "num_contrato": "CON_2024_003"}},
+]
+
+
+def _with_fake_legs(vector_leg, test):
+    original_leg, original_index = hybrid_module._vector_leg, hybrid_module._bm25_index
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=str(Path(tmp) / "bm25_index"))
+        index.build(CORPUS)
+        hybrid_module._bm25_index = index
+        hybrid_module._vector_leg = vector_leg
+        try:
+            test()
+        finally:
+            hybrid_module._vector_leg, hybrid_module._bm25_index = original_leg, original_index
+
+
+def test_vector_failure_degrades_to_bm25():
+    """Test: Si la rama vectorial falla, se devuelve el resultado BM25"""
+    print("\nTest 1: Degradación a BM25...")
+
+    def broken_vector_leg(query, filter_metadata=None):
+        raise ConnectionError("ChromaDB caído")
+
+    def run():
+        get_stage_metrics().reset()
+        results = hybrid_module.hybrid_search("aval bancario", top_k=3)
+        assert results and results[0]["metadata"]["archivo"] == "A.md"
+        summary = get_stage_metrics().summary()
+        assert summary["hybrid.vector"]["status"] == {"error": 1}
+        assert summary["hybrid.total"]["status"] == {"bm25_only": 1}
+
+    _with_fake_legs(broken_vector_leg, run)
+    print("✅ Test degradación PASS")
+
+
+def test_vector_timeout_and_parallel_legs():
+    """Test: Las ramas corren en paralelo y la vectorial respeta su timeout"""
+    print("\nTest 2: Timeout de rama vectorial...")
+
+    def slow_vector_leg(query, filter_metadata=None):
+        time.sleep(0.5)
+        return []
+
+    def run():
+        original_timeout = hybrid_module.HYBRID_VECTOR_TIMEOUT_S
+        hybrid_module.HYBRID_VECTOR_TIMEOUT_S = 0.2
+        try:
+            start = time.time()
+            results = hybrid_module.hybrid_search("combustible", top_k=3)
+            elapsed = time.time() - start
+        finally:
+            hybrid_module.HYBRID_VECTOR_TIMEOUT_S = original_timeout
+
+        assert results[0]["metadata"]["archivo"] == "B.md"
+        assert elapsed < 0.45, f"La búsqueda esperó a la rama lenta ({elapsed:.2f}s)"
+
+    _with_fake_legs(slow_vector_leg, run)
+    print("✅ Test timeout PASS")
+
+
+if __name__ == "__main__":
+    test_vector_failure_degrades_to_bm25()
+    test_vector_timeout_and_parallel_legs()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del loop correctivo incremental: los reintentos excluyen chunks ya vistos,
+acumulan evidencia y el auditor solo re-evalúa el delta.
+"""
+
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.agents.retrieval as retrieval_module
+import src.utils.speculative_retrieval as spec_module
+from src.agents.retrieval import RetrievalAgent
+from src.agents.evaluator import EvaluationAgent
+
+POOL = [
+    {"contenido": f"contenido del chunk {i}", "metadata": {"archivo": f"DOC_{i % 3}.md", "chunk_id": f"DOC::{i:04d}"}}
+    for i in range(6)
+]
+
+
+def _fake_batch(calls):
+    def batch(queries, top_docs=10, chunks_per_doc=3, exclude_ids=None):
+        calls.append(set(exclude_ids or ()))
+        fresh = [dict(c) for c in POOL if c["metadata"]["chunk_id"] not in (exclude_ids or ())]
+        return [fresh[:4] for _ in queries]
+    return batch
+
+
+def test_retrieval_accumulates_only_new_chunks():
+    """Test: El reintento excluye lo ya visto y añade solo el delta"""
+    print("\nTest 1: Retrieval incremental...")
+    calls = []
+    original = retrieval_module.smart_hierarchical_retrieval_batch
+    retrieval_module.smart_hierarchical_retrieval_batch = _fake_batch(calls)
+    try:
+        agent = RetrievalAgent()
+        state = {"query": "avales", "sub_queries": [{"id": 1, "query": "avales", "rationale": "", "dependency": []}]}
+        state = agent.run(state)
+        assert len(state["retrieved_chunks"]) == 4 and len(state["new_chunks"]) == 4
+        assert calls[0] == set()
+
+        state["sub_queries"] = [{"id": 100, "query": "garantías bancarias", "rationale": "", "dependency": []}]
+        state = agent.run(state)
+        assert calls[1] == {f"DOC::{i:04d}" for i in range(4)}
+        assert [c["metadata"]["chunk_id"] for c in state["new_chunks"]] == ["DOC::0004", "DOC::0005"]
+        assert len(state["retrieved_chunks"]) == 6
+        assert len(state["seen_chunk_ids"]) == 6
+        assert state["retrieval_metadata"]["total_chunks"] == 6
+    finally:
+        retrieval_module.smart_hierarchical_retrieval_batch = original
+    print("✅ Test retrieval incremental PASS")
+
+
+def test_retry_skips_speculation():
+    """Test: En los reintentos no se sirve la especulación (sus chunks ya están vistos)"""
+    print("\nTest 2: Especulación solo en la primera pasada...")
+    calls = []
+    original_batch = retrieval_module.smart_hierarchical_retrieval_batch
+    original_spec = spec_module.smart_hierarchical_retrieval
+    retrieval_module.smart_hierarchical_retrieval_batch = _fake_batch(calls)
+    spec_module.smart_hierarchical_retrieval = lambda query, top_docs, chunks_per_doc: [dict(c) for c in POOL[:4]]
+    spec_id = spec_module.start_speculation("avales")
+    try:
+        agent = RetrievalAgent()
+        state = {"query": "avales", "speculation_id": spec_id,
+                 "sub_queries": [{"id": 1, "query": "avales", "rationale": "", "dependency": []}]}
+        state = agent.run(state)
+        assert calls == [] and len(state["new_chunks"]) == 4  # Primera pasada: especulación
+
+        state["sub_queries"] = [{"id": 100, "query": "avales", "rationale": "refinada", "dependency": []}]
+        state = agent.run(state)
+        assert calls == [{f"DOC::{i:04d}" for i in range(4)}]
+        assert [c["metadata"]["chunk_id"] for c in state["new_chunks"]] == ["DOC::0004", "DOC::0005"]
+    finally:
+        spec_module.finish_speculation(spec_id)
+        retrieval_module.smart_hierarchical_retrieval_batch = original_batch
+        spec_module.smart_hierarchical_retrieval = original_spec
+    print("✅ Test especulación en reintentos PASS")
+
+
+def test_evaluator_reads_only_delta():
+    """Test: En el reintento el auditor recibe su veredicto previo y solo los chunks nuevos"""
+    print("\nTest 3: Evaluación incremental...")
+    prompts = []
+    agent = EvaluationAgent()
+
+    def fake_llm(prompt, **kwargs):
+        prompts.append(prompt)
+        return json.dumps({"status": "SUFFICIENT", "reasoning": "cubierto", "missing_info": [], "score": 90})
+
+    agent.call_llm = fake_llm
+    previous = {"status": "PARTIAL", "reasoning": "falta el aval de DOC_2", "missing_info": ["aval DOC_2"], "score": 40.0}
+    state = {
+        "query": "avales",
+        "sub_queries": [{"id": 100, "query": "aval DOC_2", "rationale": "refinada", "dependency": []}],
+        "retrieved_chunks": POOL,
+        "new_chunks": POOL[4:],
+        "evaluation_report": previous,
+        "corrective_iteration": 1,
+    }
+    state = agent.run(state)
+    assert state["evaluation_report"]["status"] == "SUFFICIENT" and state["is_sufficient"]
+    assert "falta el aval de DOC_2" in prompts[0]
+    assert "chunk 4" in prompts[0] and "chunk 5" in prompts[0] and "chunk 0" not in prompts[0]
+    assert "[5] DOC_1.md" in prompts[0]  # la numeración continúa la del contexto previo
+
+    # Reintento sin evidencia nueva: se mantiene el veredicto sin llamar al LLM
+    state.update(evaluation_report=previous, new_chunks=[], corrective_iteration=2)
+    state = agent.run(state)
+    assert len(prompts) == 1
+    assert state["evaluation_report"] == previous and not state["is_sufficient"]
+    print("✅ Test evaluación incremental PASS")
+
+
+if __name__ == "__main__":
+    test_retrieval_accumulates_only_new_chunks()
+    test_retry_skips_speculation()
+    test_evaluator_reads_only_delta()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la ingesta incremental: diff de manifiesto, IDs estables y update de BM25.
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.ingest_manifest import IngestManifest, file_sha256
+from src.utils.chunking import make_chunk_id
+from src.utils.bm25_index import BM25Index
+
+
+def _chunk(archivo: str, seq: int, text: str) -> dict:
+    return {
+        "contenido": text,
+        "metadata": {"archivo": archivo, "chunk_seq": seq, "chunk_id": make_chunk_id(archivo, seq)}
+    }
+
+
+def test_manifest_diff():
+    """Test: Clasifica archivos en nuevos / modificados / sin cambios / eliminados"""
+    print("\nTest 1: Diff de manifiesto...")
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        a, b, c = tmp / "A.md", tmp / "B.md", tmp / "C.md"
+        a.write_text("contrato A")
+        b.write_text("contrato B")
+
+        manifest = IngestManifest(tmp / "manifest.json")
+        manifest.record("A.md", file_sha256(a), ["A::0000"], {"num_contrato": "CON_2024_001"})
+        manifest.record("B.md", file_sha256(b), ["B::0000"], {"num_contrato": "CON_2024_002"})
+        manifest.record("OLD.md", "deadbeef", ["OLD::0000"], {"num_contrato": "CON_2024_003"})
+        manifest.bump_version()
+        manifest.save()
+
+        b.write_text("contrato B modificado")
+        c.write_text("contrato C")
+
+        reloaded = IngestManifest.load(tmp / "manifest.json")
+        diff = reloaded.diff([a, b, c])
+
+        assert reloaded.corpus_version == 1
+        assert [p.name for p in diff["new"]] == ["C.md"]
+        assert [p.name for p in diff["changed"]] == ["B.md"]
+        assert diff["unchanged"] == ["A.md"]
+        assert diff["removed"] == ["OLD.md"]
+    print("✅ Test manifest_diff PASS")
+
+
+def test_chunk_id_is_stable():
+    """Test: El ID depende solo del archivo y la posición"""
+    assert make_chunk_id("CON_2024_001_normalized.md", 3) == "CON_2024_001_normalized::0003"
+    assert make_chunk_id("CON_2024_001_normalized.md", 3) == make_chunk_id("CON_2024_001_normalized.md", 3)
+
+
+def test_bm25_update_replaces_file_chunks():
+    """Test: update() retira chunks de archivos eliminados/re-ingeridos y añade los nuevos"""
+    print("\nTest 2: Update incremental de BM25...")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=str(Path(tmp) / "bm25_index"))
+        index.build([
+            _chunk("A.md", 0, "aval bancario santander"),
+            _chunk("B.md", 0, "suministro de combustible"),
+            _chunk("C.md", 0, "vision nocturna"),
+            _chunk("D.md", 0, "hangares de mantenimiento"),
+            _chunk("E.md", 0, "uniformidad del ejercito"),
+        ])
+
+        index.update([_chunk("B.md", 0, "suministro de municion")], removed_files=["C.md"])
+
+        archivos = sorted(m["archivo"] for m in index.metadatas)
+        assert archivos == ["A.md", "B.md", "D.md", "E.md"], archivos
+        assert index.search("combustible") == []
+        assert index.search("municion")[0]["metadata"]["archivo"] == "B.md"
+    print("✅ Test bm25_update PASS")
+
+
+if __name__ == "__main__":
+    test_manifest_diff()
+    test_chunk_id_is_stable()
+    test_bm25_update_replaces_file_chunks()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del gateway LLM: limitador token bucket (sync/async), ajuste con el usage real,
+caché de respuestas deterministas y reintentos que propagan la excepción original.
+"""
+
+import sys
+import os
+import time
+import asyncio
+import tempfile
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+from openai import APIConnectionError
+from openai.types.chat import ChatCompletion
+from tenacity import wait_none
+
+from src.utils.llm_gateway import LLMGateway, TokenBucketLimiter
+from src.utils.response_cache import ResponseCache
+
+
+class _FakeCompletions:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+        self.calls = []
+
+    def create(self, **params):
+        self.calls.append(params)
+        return ChatCompletion.model_validate({
+            "id": f"chatcmpl-{len(self.calls)}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": params["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f" ok {len(self.calls)} "}}],
+            "usage": {"prompt_tokens": 40, "completion_tokens": self.total_tokens - 40, "total_tokens": self.total_tokens}
+        })
+
+
+def _gateway(tmp: str, limiter: TokenBucketLimiter = None):
+    gateway = LLMGateway(
+        api_key="sk-test",
+        chat_limiter=limiter,
+        response_cache=ResponseCache(Path(tmp) / "responses.sqlite", manifest_path=Path(tmp) / "manifest.json")
+    )
+    completions = _FakeCompletions(total_tokens=50)
+    gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return gateway, completions
+
+
+def test_token_bucket_blocks_threads():
+    """Test: Con el cubo de tokens vacío, los hilos esperan su turno (sin 429)"""
+    print("\nTest 1: Token bucket multihilo...")
+    limiter = TokenBucketLimiter(rpm=0, tpm=600)  # 10 tokens/s
+    assert limiter.acquire(600) == 0  # vacía el cubo
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.acquire, args=(2,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+
+    # 8 tokens a 10 tokens/s -> ~0.8s
+    assert elapsed >= 0.7, elapsed
+    assert limiter.stats()["waits"] == 4
+    print(f"✅ Test token_bucket_threads PASS ({elapsed:.2f}s)")
+
+
+def test_token_bucket_async_and_rpm():
+    """Test: acquire_async cede el loop y el cubo de peticiones limita RPM"""
+    print("\nTest 2: Token bucket async...")
+    limiter = TokenBucketLimiter(rpm=600, tpm=0)  # 10 req/s, capacidad 600
+    limiter._requests = 0
+
+    async def run():
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(3)))
+        return time.monotonic() - start
+
+    elapsed = asyncio.run(run())
+    assert 0.25 <= elapsed < 1.5, elapsed
+    print(f"✅ Test token_bucket_async PASS ({elapsed:.2f}s)")
+
+
+def test_gateway_reconciles_usage():
+    """Test: El gateway reserva la estimación y la corrige con los tokens reales"""
+    print("\nTest 3: Reconciliación de usage...")
+    limiter = TokenBucketLimiter(rpm=100, tpm=10000)
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway, completions = _gateway(tmp, limiter)
+
+        response = gateway.chat([{"role": "user", "content": "hola " * 100}], model="gpt-4o-mini",
+                                max_tokens=500, cache=False)
+
+        assert response.choices[0].message.content.strip() == "ok 1"
+        assert completions.calls[0]["max_tokens"] == 500
+        assert completions.calls[0]["model"] == "gpt-4o-mini"
+        # Solo se descuentan los 50 tokens reales, no la estimación (~630)
+        assert 9940 <= limiter._tokens <= 9960, limiter._tokens
+
+        gateway.chat([{"role": "user", "content": "hola"}], cache=False)
+        assert "max_tokens" not in completions.calls[1]
+    print("✅ Test gateway_reconcile PASS")
+
+
+def test_response_cache_temperature_zero():
+    """Test: temperature=0 se sirve de caché (incluido JSON estructurado); temperature>0 nunca"""
+    print("\nTest 4: Caché de respuestas deterministas...")
+    messages = [{"role": "system", "content": "JSON puro."}, {"role": "user", "content": "¿Importe de CON_2024_001?"}]
+    json_format = {"type": "json_object"}
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway, completions = _gateway(tmp)
+
+        first = gateway.chat(messages, model="gpt-4o-mini", response_format=json_format)
+        second = gateway.chat(messages, model="gpt-4o-mini", response_format=json_format)
+        assert len(completions.calls) == 1
+        assert second.choices[0].message.content == first.choices[0].message.content
+        assert second.usage.total_tokens == 50
+
+        # Cualquier parámetro distinto es otra clave
+        gateway.chat(messages, model="gpt-4o-mini")
+        gateway.chat(messages, model="gpt-4o")
+        assert len(completions.calls) == 3
+
+        # Async comparte la caché
+        third = asyncio.run(gateway.achat(messages, model="gpt-4o-mini", response_format=json_format))
+        assert third.choices[0].message.content == first.choices[0].message.content
+        assert len(completions.calls) == 3
+
+        gateway.chat(messages, model="gpt-4o-mini", temperature=0.7)
+        gateway.chat(messages, model="gpt-4o-mini", temperature=0.7)
+        assert len(completions.calls) == 5
+        assert gateway.response_cache.stats()["hits"] == 2
+    print("✅ Test response_cache PASS")
+
+
+def test_retries_reraise_original_error():
+    """Test: Agotados los reintentos se propaga el error de OpenAI, no tenacity.RetryError"""
+    print("\nTest 5: Reintentos con la excepción original...")
+    with tempfile.TemporaryDirectory() as tmp:
+        gateway, _ = _gateway(tmp)
+        attempts = []
+
+        def failing_create(**params):
+            attempts.append(params)
+            raise APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+        gateway.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=failing_create)))
+        chat = LLMGateway.chat.retry_with(wait=wait_none())
+        try:
+            chat(gateway, [{"role": "user", "content": "hola"}], cache=False)
+            assert False, "Debió propagar APIConnectionError"
+        except APIConnectionError:
+            pass
+        assert len(attempts) == 3
+    print("✅ Test reintentos PASS")
+
+
+if __name__ == "__main__":
+    test_token_bucket_blocks_threads()
+    test_token_bucket_async_and_rpm()
+    test_gateway_reconciles_usage()
+    test_response_cache_temperature_zero()
+    test_retries_reraise_original_error()
+    print("\n🎉 Todos los tests pasaron")
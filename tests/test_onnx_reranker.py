@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del cross-encoder ONNX para CPU: lotes por longitud con presupuesto de
+tokens, truncado y scores devueltos en el orden de entrada.
+"""
+
+import sys
+import os
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tokenizers import Tokenizer, models, pre_tokenizers, processors
+
+from src.utils.onnx_reranker import OnnxCrossEncoder, plan_batches
+
+WORDS = "[PAD] [UNK] [CLS] [SEP] importe aval contrato fecha fin banco del el de la".split()
+
+
+def _tokenizer():
+    tokenizer = Tokenizer(models.WordLevel({w: i for i, w in enumerate(WORDS)}, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)])
+    return tokenizer
+
+
+class _Input:
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeSession:
+    """Sesión onnxruntime mínima: logit = nº de tokens 'importe' en el segmento del documento."""
+
+    def __init__(self):
+        self.batches = []
+
+    def get_inputs(self):
+        return [_Input("input_ids"), _Input("attention_mask")]
+
+    def run(self, outputs, feeds):
+        ids, mask = feeds["input_ids"], feeds["attention_mask"]
+        self.batches.append(ids.shape)
+        assert ids.dtype == np.int64 and (ids[mask == 0] == 0).all()
+        return [(ids == WORDS.index("importe")).sum(axis=1, keepdims=True).astype(np.float32)]
+
+
+def test_plan_batches():
+    """Test: Lotes ordenados por longitud, con tope de pares y de pares x longitud"""
+    print("\nTest 1: Planificación de lotes...")
+    assert plan_batches([10, 3, 7, 3], batch_size=2, max_tokens=100) == [[1, 3], [2, 0]]
+    assert plan_batches([50, 10, 10, 10, 40], batch_size=8, max_tokens=60) == [[1, 2, 3], [4], [0]]
+    assert plan_batches([500], batch_size=4, max_tokens=64) == [[0]]
+    assert plan_batches([], batch_size=4, max_tokens=64) == []
+    print("✅ Test lotes PASS")
+
+
+def test_predict_order_and_truncation():
+    """Test: Scores en el orden de entrada, activación sigmoide y truncado a max_length"""
+    print("\nTest 2: Predicción por lotes...")
+    session = _FakeSession()
+    model = OnnxCrossEncoder(session, _tokenizer(), max_length=8, batch_size=2, batch_max_tokens=16)
+    pairs = [
+        ["importe", "el importe del contrato"],
+        ["importe", "banco"],
+        ["importe", "importe importe importe importe importe importe importe"],
+        ["importe", "fecha fin del aval de la importe"],
+    ]
+    scores = model.predict(pairs)
+
+    assert len(scores) == 4
+    assert scores[1] < scores[0] < scores[2]
+    assert np.isclose(scores[1], 1 / (1 + np.exp(-1)))  # solo el 'importe' de la query
+    assert max(shape[1] for shape in session.batches) <= 8
+    assert all(shape[0] * shape[1] <= 16 for shape in session.batches)
+    assert len(model.predict([])) == 0
+    print("✅ Test predicción PASS")
+
+
+if __name__ == "__main__":
+    test_plan_batches()
+    test_predict_order_and_truncation()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la etapa única de Query Understanding: reglas deterministas,
+una sola llamada LLM para queries ambiguas y memoización por query normalizada.
+"""
+
+import sys
+import os
+import json
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.llm_gateway as gateway_module
+import src.agents.query_understanding as qu
+
+
+class _FakeGateway:
+    def __init__(self, payload: dict):
+        self.payload = payload
+        self.calls = 0
+
+    def chat(self, messages, **params):
+        self.calls += 1
+        assert params["response_format"] == {"type": "json_object"}
+        message = SimpleNamespace(content=json.dumps(self.payload))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def test_rules_without_llm():
+    """Test: IDs de contrato y listados se resuelven sin LLM"""
+    print("\nTest 1: Clasificador determinista...")
+    plan = qu.classify_deterministic("¿Cuál es el importe del contrato CON-2024-001?")
+    assert plan["complexity"] == "simple"
+    assert plan["filters"]["contract_id"] == "CON_2024_001"
+    assert len(plan["sub_queries"]) == 1
+
+    plan = qu.classify_deterministic("Suma los importes de CON_2024_001, CON_2024_002 y SER_2024_015.")
+    assert plan["complexity"] == "aggregation"
+    assert plan["top_k"] == qu.EXHAUSTIVE_TOP_K
+    assert plan["filters"]["contract_id"] is None
+    assert [sq["query"] for sq in plan["sub_queries"]] == [
+        "Suma los importes de CON_2024_001",
+        "Suma los importes de CON_2024_002",
+        "Suma los importes de SER_2024_015",
+    ]
+
+    plan = qu.classify_deterministic("Lista todos los contratos con aval de Santander")
+    assert plan["query_type"] == "LIST" and plan["search_strategy"] == "EXHAUSTIVE_SCAN"
+
+    assert qu.classify_deterministic("¿Qué empresa tiene más penalizaciones y cuál es su relación con la ciberseguridad?") is None
+    print("✅ Test rules PASS")
+
+
+def test_single_llm_call_memoized():
+    """Test: Query ambigua -> una sola llamada LLM con todo el plan, memoizada"""
+    print("\nTest 2: LLM único + memoización...")
+    fake = _FakeGateway({
+        "query_type": "COMPARISON",
+        "intent": "compare_by_topic",
+        "complexity": "aggregation",
+        "search_strategy": "MULTI_DOC",
+        "entities": {"contract_ids": ["con-2024-004"], "conceptos_clave": ["ciberseguridad"]},
+        "filters": {"contract_id": "CON_2024_004"},
+        "sub_queries": [
+            {"id": 1, "query": "penalizaciones contrato ciberseguridad", "rationale": "a"},
+            {"id": 2, "query": "penalizaciones contrato visión nocturna", "rationale": "b", "dependency": [1]},
+        ]
+    })
+    original = gateway_module.get_llm_gateway
+    gateway_module.get_llm_gateway = lambda: fake
+    qu._plan_cache.clear()
+    try:
+        query = "¿Cómo se relacionan las penalizaciones de ciberseguridad con las de visión nocturna?"
+        plan = qu.understand_query(query)
+        again = qu.understand_query("  ¿como se relacionan las penalizaciones de ciberseguridad con las de vision nocturna ")
+
+        assert fake.calls == 1
+        assert plan["source"] == "llm"
+        assert plan["entities"]["contract_ids"] == ["CON_2024_004"]
+        assert plan["filters"]["contract_id"] is None  # comparación: sin filtro único
+        assert [sq["dependency"] for sq in plan["sub_queries"]] == [[], [1]]
+        assert again == plan
+
+        # La copia devuelta no contamina la memoización
+        again["sub_queries"].clear()
+        assert len(qu.understand_query(query)["sub_queries"]) == 2
+    finally:
+        gateway_module.get_llm_gateway = original
+        qu._plan_cache.clear()
+    print("✅ Test llm_memoized PASS")
+
+
+if __name__ == "__main__":
+    test_rules_without_llm()
+    test_single_llm_call_memoized()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del flujo completo de respuesta (retrieval + generación + validación) de
+rag_agent, con retrieval y LLM simulados: retrieve_and_generate y su variante
+streaming deben llegar hasta la respuesta final sin errores.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.agents.rag_agent as rag_agent
+import src.utils.llm_config as llm_config
+from src.utils.answer_validator import AnswerValidator
+
+CHUNKS = [
+    {"contenido": "El importe total del contrato es de 1.234.567,89 EUR.",
+     "metadata": {"archivo": "CON_2024_001.md", "num_contrato": "CON_2024_001", "seccion": "Presupuesto",
+                  "pagina": 2, "chunk_id": "CON_2024_001.md::0003", "n_tokens": 20}},
+]
+ANSWER = "El importe total es 1.234.567,89 EUR [Fuente: CON_2024_001.md, Pág: 2, Sección: Presupuesto]."
+PLAN = {"router_complexity": "SIMPLE", "source": "rules", "top_k": 5,
+        "entities": {"contract_ids": ["CON_2024_001"]}, "filters": {}}
+
+
+class _Observer:
+    def __init__(self):
+        self.logged = []
+
+    def log_query(self, query, answer, metadata):
+        self.logged.append(metadata)
+
+
+def _patched(fn):
+    """Ejecuta `fn` con retrieval, LLM y observabilidad simulados."""
+    observer = _Observer()
+    patches = [
+        (rag_agent, "_answer_without_retrieval", lambda query, history, result: False),
+        (rag_agent, "understand_query", lambda query: PLAN),
+        (rag_agent, "retrieve_ranked_chunks", lambda *args, **kwargs: ([dict(c) for c in CHUNKS], False)),
+        (rag_agent, "expand_context", lambda chunks, expand_top_n=None: chunks),
+        (rag_agent, "get_observer", lambda: observer),
+        (llm_config, "generate_response", lambda prompt, **kwargs: ANSWER),
+        (llm_config, "generate_response_stream", lambda prompt, **kwargs: iter([ANSWER[:20], ANSWER[20:]])),
+        (AnswerValidator, "validate_logical_coherence",
+         lambda self, answer, query, chunks: {"valid": True, "reasoning": "VÁLIDO", "confidence": 0.9}),
+    ]
+    originals = [(target, name, getattr(target, name)) for target, name, _ in patches]
+    for target, name, value in patches:
+        setattr(target, name, value)
+    try:
+        return fn(), observer
+    finally:
+        for target, name, value in originals:
+            setattr(target, name, value)
+
+
+def test_retrieve_and_generate():
+    """Test: retrieve_and_generate llega a la respuesta citada y registra métricas"""
+    print("\nTest 1: retrieve_and_generate...")
+    result, observer = _patched(lambda: rag_agent.retrieve_and_generate("¿Importe de CON_2024_001?"))
+    assert result["success"], result["response"]
+    assert "1.234.567,89 EUR" in result["response"]
+    assert result["sources"] and result["validation"]["numerical"]["valid"]
+    assert observer.logged and observer.logged[0]["latency_retrieval"] >= 0
+    print("✅ Test retrieve_and_generate PASS")
+
+
+def test_retrieve_and_generate_stream():
+    """Test: La variante streaming emite sources, tokens y final con éxito"""
+    print("\nTest 2: retrieve_and_generate_stream...")
+    events, _ = _patched(lambda: list(rag_agent.retrieve_and_generate_stream("¿Importe de CON_2024_001?")))
+    types = [event["type"] for event in events]
+    assert types[0] == "sources" and "token" in types and types[-1] == "final"
+    final = events[-1]["result"]
+    assert final["success"], final["response"]
+    assert "".join(e["text"] for e in events if e["type"] == "token") == ANSWER
+    print("✅ Test streaming PASS")
+
+
+if __name__ == "__main__":
+    test_retrieve_and_generate()
+    test_retrieve_and_generate_stream()
+    print("\n🎉 Todos los tests pasaron")
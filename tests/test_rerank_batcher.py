@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del micro-batching del re-ranker: llamadas concurrentes comparten forward
+pass, cada llamante recibe sus scores en orden y el modelo se carga una vez.
+"""
+
+import sys
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.rerank_batcher import RerankBatcher
+from src.utils.reranker import LocalReranker
+
+
+class _SlowModel:
+    """predict lento (simula el forward pass): score = longitud del documento."""
+
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.batches = []
+
+    def __call__(self, pairs):
+        self.batches.append(len(pairs))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("fallo del modelo")
+        return [len(doc) for _, doc in pairs]
+
+
+def test_concurrent_callers_coalesce():
+    """Test: 8 llamantes concurrentes salen en pocos lotes, cada uno con sus scores"""
+    print("\nTest 1: Coalescing de llamadas concurrentes...")
+    model = _SlowModel()
+    batcher = RerankBatcher(model, max_wait_ms=20, max_batch_size=64)
+
+    def call(i):
+        return batcher.submit([["q", "x" * i], ["q", "y" * (i + 10)]]).result(timeout=5)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(call, range(8)))
+
+    assert results == [[float(i), float(i + 10)] for i in range(8)]
+    assert sum(model.batches) <= 16 and len(model.batches) < 8
+    stats = batcher.stats()
+    assert stats["requests"] == 8 and stats["pairs"] == 16 and stats["requests_per_batch"] > 1
+    print("✅ Test coalescing PASS")
+
+
+def test_batch_limit_dedup_and_errors():
+    """Test: Tope de pares por lote, pares repetidos puntuados una vez y errores por Future"""
+    print("\nTest 2: Tope, duplicados y errores...")
+    model = _SlowModel(delay=0)
+    batcher = RerankBatcher(model, max_wait_ms=50, max_batch_size=4)
+    futures = [batcher.submit([["q", "aa"], ["q", "bbb"], ["q", "aa"]]) for _ in range(3)]
+    assert all(f.result(timeout=5) == [2.0, 3.0, 2.0] for f in futures)
+    assert max(model.batches) <= 2  # 3 pares por petición no caben dos veces en 4
+    assert batcher.submit([]).result() == []
+
+    failing = RerankBatcher(_SlowModel(delay=0, fail=True), max_wait_ms=0)
+    try:
+        failing.submit([["q", "a"]]).result(timeout=5)
+        assert False, "Debió propagar la excepción"
+    except RuntimeError:
+        pass
+    print("✅ Test tope y errores PASS")
+
+
+def test_model_loaded_once():
+    """Test: Varios hilos pidiendo el modelo a la vez provocan una única carga"""
+    print("\nTest 3: Carga única del modelo...")
+    reranker = LocalReranker()
+    loads = []
+
+    def slow_load():
+        loads.append(threading.get_ident())
+        time.sleep(0.05)
+        return _SlowModel(delay=0)
+
+    reranker._model, reranker._load_attempted = None, False
+    reranker._load_model = slow_load
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            models = list(pool.map(lambda _: reranker._get_model(), range(8)))
+        assert len(loads) == 1 and all(m is models[0] for m in models)
+    finally:
+        for attr in ("_model", "_load_attempted", "_load_model"):
+            reranker.__dict__.pop(attr, None)
+    print("✅ Test carga única PASS")
+
+
+if __name__ == "__main__":
+    test_concurrent_callers_coalesce()
+    test_batch_limit_dedup_and_errors()
+    test_model_loaded_once()
+    print("\n🎉 Todos los tests pasaron")
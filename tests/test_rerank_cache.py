@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché de scores del re-ranker: LRU acotado, invalidación por versión
+de corpus y que al modelo solo lleguen los pares (query, chunk) no cacheados.
+"""
+
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.rerank_cache as rerank_cache
+from src.utils.ingest_manifest import IngestManifest
+from src.utils.rerank_cache import RerankScoreCache
+from src.utils.reranker import LocalReranker
+
+
+class _FakeModel:
+    """Cross-encoder mínimo: score = nº de apariciones de 'aval' en el chunk."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, pairs, batch_size=None):
+        self.calls.append(len(pairs))
+        return [doc.count("aval") for _, doc in pairs]
+
+
+def _chunk(chunk_id, contenido):
+    return {"contenido": contenido, "metadata": {"chunk_id": chunk_id}}
+
+
+def test_lru_and_stats():
+    """Test: Query normalizada en la clave, tope de entradas y estadísticas de hits"""
+    print("\nTest 1: LRU y estadísticas...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RerankScoreCache(max_entries=2, manifest_path=Path(tmp) / "missing.json")
+        cache.set_many("m", "¿Qué aval tiene?", {"a": 0.9, "b": 0.1})
+        assert cache.get_many("m", "que aval tiene", ["a", "b", "c"]) == [0.9, 0.1, None]
+        assert cache.get_many("otro", "que aval tiene", ["a"]) == [None]
+
+        cache.get_many("m", "que aval tiene", ["a"])  # 'a' pasa a ser la más reciente
+        cache.set_many("m", "que aval tiene", {"c": 0.5})
+        assert cache.get_many("m", "que aval tiene", ["a", "b", "c"]) == [0.9, None, 0.5]
+
+        stats = cache.stats()
+        assert stats["entries"] == 2 and stats["hits"] == 5 and stats["misses"] == 3
+        assert abs(stats["hit_rate"] - 5 / 8) < 1e-9
+    print("✅ Test LRU PASS")
+
+
+def test_corpus_invalidation():
+    """Test: Una nueva versión de corpus vacía la caché"""
+    print("\nTest 2: Invalidación por versión de corpus...")
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = IngestManifest(Path(tmp) / "manifest.json")
+        manifest.bump_version()
+        manifest.save()
+
+        cache = RerankScoreCache(manifest_path=manifest.path)
+        cache.get_many("m", "aval", ["a"])
+        cache.set_many("m", "aval", {"a": 0.7})
+        assert cache.get_many("m", "aval", ["a"]) == [0.7]
+
+        time.sleep(0.01)  # mtime distinto
+        manifest.bump_version()
+        manifest.save()
+        assert cache.get_many("m", "aval", ["a"]) == [None]
+        assert cache.stats()["entries"] == 0
+    print("✅ Test invalidación PASS")
+
+
+def test_rerank_scores_only_misses():
+    """Test: LocalReranker.rerank solo puntúa pares nuevos, en un único lote"""
+    print("\nTest 3: Re-ranking con caché...")
+    with tempfile.TemporaryDirectory() as tmp:
+        original_cache = rerank_cache._rerank_cache
+        rerank_cache._rerank_cache = RerankScoreCache(manifest_path=Path(tmp) / "missing.json")
+        reranker = LocalReranker()
+        fake = _FakeModel()
+        original_model = reranker._model
+        reranker._model = fake
+        try:
+            first = [_chunk("c1", "aval"), _chunk("c2", "aval aval"), _chunk("c3", "importe")]
+            ranked = reranker.rerank("¿Qué aval?", first, top_k=3)
+            assert [c["metadata"]["chunk_id"] for c in ranked] == ["c2", "c1", "c3"]
+            assert fake.calls == [3]
+
+            second = [_chunk("c2", "aval aval"), _chunk("c4", "aval aval aval"), _chunk("c1", "aval")]
+            ranked = reranker.rerank("que aval", second, top_k=2)
+            assert [c["metadata"]["chunk_id"] for c in ranked] == ["c4", "c2"]
+            assert fake.calls == [3, 1]
+
+            reranker.rerank("que aval", second, top_k=2)
+            assert fake.calls == [3, 1]
+            assert rerank_cache._rerank_cache.stats()["hits"] == 5
+        finally:
+            reranker._model = original_model
+            rerank_cache._rerank_cache = original_cache
+    print("✅ Test re-ranking PASS")
+
+
+if __name__ == "__main__":
+    test_lru_and_stats()
+    test_corpus_invalidation()
+    test_rerank_scores_only_misses()
+    print("\n🎉 Todos los tests pasaron")
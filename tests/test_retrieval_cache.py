@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Tests de la caché de retrieval: normalización de clave, TTL e invalidación por versión de corpus.
+"""
+
+import sys
+import os
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.retrieval_cache import RetrievalCache, make_retrieval_key
+from src.utils.ingest_manifest import IngestManifest
+
+CHUNKS = [{"contenido": "aval de 570.000,00 EUR", "metadata": {"chunk_id": "CON_2024_012::0003", "rerank_score": 0.93}}]
+
+
+def test_key_normalization():
+    """Test: Variantes triviales de la query comparten clave; filtro y top_k no"""
+    print("\nTest 1: Claves...")
+    base = make_retrieval_key("¿Qué contratos vencen pronto?", None, 15, use_reranker=True)
+    assert base == make_retrieval_key("que contratos  VENCEN pronto", None, 15, use_reranker=True)
+    assert base != make_retrieval_key("que contratos vencen pronto", None, 50, use_reranker=True)
+    assert base != make_retrieval_key("que contratos vencen pronto", {"num_contrato": "CON_2024_001"}, 15, use_reranker=True)
+    print("✅ Test claves PASS")
+
+
+def test_hit_miss_and_corpus_invalidation():
+    """Test: Hit tras set; una nueva versión de corpus invalida las entradas"""
+    print("\nTest 2: Invalidación por versión de corpus...")
+    with tempfile.TemporaryDirectory() as tmp:
+        manifest = IngestManifest(Path(tmp) / "manifest.json")
+        manifest.bump_version()
+        manifest.save()
+
+        cache = RetrievalCache(path=Path(tmp) / "retrieval.sqlite", manifest_path=manifest.path)
+        key = make_retrieval_key("avales", None, 5)
+
+        assert cache.get(key) is None
+        cache.set(key, CHUNKS)
+        assert cache.get(key) == CHUNKS
+
+        time.sleep(0.01)  # mtime distinto
+        manifest.bump_version()
+        manifest.save()
+
+        assert cache.get(key) is None
+        stats = cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2 and stats["entries"] == 0
+    print("✅ Test invalidación PASS")
+
+
+def test_ttl_expiry():
+    """Test: Las entradas caducan tras el TTL"""
+    print("\nTest 3: TTL...")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RetrievalCache(path=Path(tmp) / "retrieval.sqlite", ttl_seconds=0.05,
+                               manifest_path=Path(tmp) / "missing.json")
+        cache.set("k", CHUNKS)
+        assert cache.get("k") == CHUNKS
+        time.sleep(0.1)
+        assert cache.get("k") is None
+    print("✅ Test TTL PASS")
+
+
+def test_degraded_retrieval_not_cached():
+    """Test: Rama híbrida caída o re-ranking fallido no se guardan en caché"""
+    print("\nTest 4: Retrieval degradado...")
+    import src.agents.rag_agent as rag_agent
+
+    def failing_rerank(query, chunks, top_k=10, strict=False):
+        raise RuntimeError("sin modelo")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = RetrievalCache(path=Path(tmp) / "retrieval.sqlite", manifest_path=Path(tmp) / "missing.json")
+        mode = {"value": "bm25_only"}
+        originals = (rag_agent.hybrid_search_with_mode, rag_agent.rerank_chunks,
+                     rag_agent.get_retrieval_cache, rag_agent.RETRIEVAL_CACHE_ENABLED)
+        rag_agent.hybrid_search_with_mode = lambda query, top_k, filter_metadata=None: ([dict(c) for c in CHUNKS], mode["value"])
+        rag_agent.rerank_chunks = failing_rerank
+        rag_agent.get_retrieval_cache = lambda: cache
+        rag_agent.RETRIEVAL_CACHE_ENABLED = True
+        try:
+            chunks, hit = rag_agent.retrieve_ranked_chunks("avales", 5, use_reranker=False)
+            assert chunks and not hit and cache.stats()["entries"] == 0
+
+            mode["value"] = "ok"
+            chunks, hit = rag_agent.retrieve_ranked_chunks("avales", 5, use_reranker=True)
+            assert chunks and not hit and cache.stats()["entries"] == 0
+
+            chunks, hit = rag_agent.retrieve_ranked_chunks("avales", 5, use_reranker=False)
+            assert cache.stats()["entries"] == 1
+            assert rag_agent.retrieve_ranked_chunks("avales", 5, use_reranker=False)[1] is True
+        finally:
+            (rag_agent.hybrid_search_with_mode, rag_agent.rerank_chunks,
+             rag_agent.get_retrieval_cache, rag_agent.RETRIEVAL_CACHE_ENABLED) = originals
+    print("✅ Test retrieval degradado PASS")
+
+
+if __name__ == "__main__":
+    test_key_normalization()
+    test_hit_miss_and_corpus_invalidation()
+    test_ttl_expiry()
+    test_degraded_retrieval_not_cached()
+    print("\n🎉 Todos los tests pasaron")
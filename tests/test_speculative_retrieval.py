@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del retrieval especulativo: reutilización por sub-queries equivalentes
+o subsumidas y cancelación del trabajo que no se aprovecha.
+"""
+
+import sys
+import os
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.speculative_retrieval as spec_module
+
+
+def _fake_retrieval(calls, release=None, delay=0.0):
+    def retrieval(query, top_docs, chunks_per_doc):
+        calls.append(query)
+        if release is not None:
+            release.wait(5)
+        time.sleep(delay)
+        return [{"contenido": f"chunk de {query}", "metadata": {"chunk_id": "A::0000"}}]
+    return retrieval
+
+
+def test_covers():
+    """Test: Coincidencia por query normalizada y subsunción por términos"""
+    print("\nTest 1: Reglas de cobertura...")
+    assert spec_module.covers("¿Cuál es el importe del contrato CON_2024_001?", "cual es el importe del contrato con_2024_001")
+    assert spec_module.covers("importe total del contrato CON_2024_001 con Thales", "importe total contrato CON_2024_001 Thales")
+    # Sub-query mucho más estrecha o con términos nuevos: no se reutiliza
+    assert not spec_module.covers("importe total del contrato CON_2024_001 con Thales y aval", "aval Thales")
+    assert not spec_module.covers("importe del contrato CON_2024_001", "importe del contrato CON_2024_002")
+    print("✅ Test covers PASS")
+
+
+def test_speculation_reused_by_matching_subquery():
+    """Test: La sub-query equivalente reutiliza la búsqueda lanzada al llegar la petición"""
+    print("\nTest 2: Reutilización del resultado especulativo...")
+    calls = []
+    original = spec_module.smart_hierarchical_retrieval
+    spec_module.smart_hierarchical_retrieval = _fake_retrieval(calls, delay=0.1)
+    try:
+        spec_id = spec_module.start_speculation("¿Cuál es el importe del contrato CON_2024_001?")
+        assert not spec_module.cancel_if_unused(spec_id, ["Cuál es el importe del contrato CON_2024_001"])
+
+        chunks = spec_module.take_speculative(spec_id, "Cuál es el importe del contrato CON_2024_001")
+        assert chunks and chunks[0]["contenido"].startswith("chunk de")
+        chunks[0]["metadata"]["anotado"] = True  # no debe contaminar el resultado compartido
+        again = spec_module.take_speculative(spec_id, "cuál es el importe del contrato con-2024-001")
+        assert "anotado" not in again[0]["metadata"]
+
+        assert spec_module.take_speculative(spec_id, "avales de Santander") is None
+        assert len(calls) == 1
+        spec_module.finish_speculation(spec_id)
+        assert spec_module.take_speculative(spec_id, "Cuál es el importe del contrato CON_2024_001") is None
+    finally:
+        spec_module.smart_hierarchical_retrieval = original
+    print("✅ Test reuse PASS")
+
+
+def test_unused_speculation_is_cancelled():
+    """Test: Si el plan no la aprovecha, la especulación en cola se cancela"""
+    print("\nTest 3: Cancelación de especulación no aprovechable...")
+    calls = []
+    release = threading.Event()
+    original = spec_module.smart_hierarchical_retrieval
+    spec_module.smart_hierarchical_retrieval = _fake_retrieval(calls, release=release)
+    try:
+        # Ocupar todos los workers para que la última quede en cola
+        busy = [spec_module.start_speculation(f"consulta ocupada {i}") for i in range(4)]
+        spec_id = spec_module.start_speculation("Suma los importes de CON_2024_001 y CON_2024_002")
+
+        assert spec_module.cancel_if_unused(spec_id, ["importe contrato CON_2024_001", "importe contrato CON_2024_002"])
+        assert spec_module._speculations[spec_id].future.cancelled()
+        assert spec_module.take_speculative(spec_id, "Suma los importes de CON_2024_001 y CON_2024_002") is None
+
+        release.set()
+        for other in busy + [spec_id]:
+            spec_module.finish_speculation(other)
+        assert "Suma los importes de CON_2024_001 y CON_2024_002" not in calls
+    finally:
+        release.set()
+        spec_module.smart_hierarchical_retrieval = original
+    print("✅ Test cancel PASS")
+
+
+if __name__ == "__main__":
+    test_covers()
+    test_speculation_reused_by_matching_subquery()
+    test_unused_speculation_is_cancelled()
+    print("\n🎉 Todos los tests pasaron")
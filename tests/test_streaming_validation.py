@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del streaming con validación incremental: cifras inventadas detectadas
+frase a frase, resultado final idéntico a validate_answer y citas del stream
+resueltas con el mismo post-proceso que la generación no-streaming.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.utils.llm_config as llm_config
+from src.utils.answer_validator import AnswerValidator, StreamingValidator
+from src.utils.citation_engine import CitationEngine, CITATION_RE
+
+CHUNKS = [
+    {"contenido": "El importe total del contrato es de 1.234.567,89 EUR. Fecha de fin 29/01/2026.",
+     "metadata": {"archivo": "CON_2024_001.md", "num_contrato": "CON_2024_001", "chunk_id": "CON_2024_001.md::0003"}},
+]
+
+ANSWER = ("El importe total es 1.234.567,89 EUR [Fuente: CON_2024_001.md, Pág: 2, Sección: Presupuesto]. "
+          "La penalización asciende a 55.000,00 EUR [Fuente: CON_2024_001.md, Pág: 3, Sección: Penalidades].\n"
+          "| Fin | 29/01/2026 |")
+
+
+def _no_llm_judge(validator):
+    validator.validate_logical_coherence = lambda answer, query, chunks: {
+        "valid": True, "reasoning": "VÁLIDO", "confidence": 0.9}
+    return validator
+
+
+def _deltas(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_incremental_numeric_checks():
+    """Test: La cifra inventada se detecta al cerrarse su frase, antes de terminar el stream"""
+    print("\nTest 1: Validación incremental...")
+    checker = StreamingValidator("importe", CHUNKS, validator=_no_llm_judge(AnswerValidator()))
+    flagged_at = None
+    for i, delta in enumerate(_deltas(ANSWER)):
+        for check in checker.feed(delta):
+            if check["violations"] and flagged_at is None:
+                flagged_at = i
+    assert flagged_at is not None and flagged_at < len(_deltas(ANSWER)) - 1
+    assert [check["segment"] for check in checker.flush()] == ["| Fin | 29/01/2026 |"]
+
+    validation = checker.finalize()
+    reference = _no_llm_judge(AnswerValidator()).validate_all(ANSWER, "importe", [CHUNKS[0]["contenido"]])
+    assert checker.text == ANSWER
+    assert validation["overall_valid"] is False and validation["recommendation"] == reference["recommendation"]
+    assert [v["number"] for v in validation["numerical"]["violations"]] == ["55.000,00"]
+    assert validation["numerical"]["numbers_checked"] == reference["numerical"]["numbers_checked"]
+    assert validation["citation"] == reference["citation"]
+    print("✅ Test validación incremental PASS")
+
+
+def test_stream_with_citations():
+    """Test: Mismo prompt/modelo en streaming; finalize y resolve_source sobre el texto emitido"""
+    print("\nTest 2: Citación en streaming...")
+    calls = []
+
+    def fake_stream(prompt, max_tokens=4096, temperature=0.0, model=None):
+        calls.append((prompt, model))
+        yield from _deltas(ANSWER)
+
+    original = llm_config.generate_response_stream
+    llm_config.generate_response_stream = fake_stream
+    try:
+        engine = CitationEngine()
+        chunks = [{"text": c["contenido"], "metadata": c["metadata"]} for c in CHUNKS]
+        text = "".join(engine.stream_with_citations("¿Importe de CON_2024_001?", chunks))
+    finally:
+        llm_config.generate_response_stream = original
+
+    assert text == ANSWER and calls[0][1] == "gpt-4o" and "[CHUNK_1]" in calls[0][0]
+    assert CITATION_RE.findall(text) == ["CON_2024_001.md", "CON_2024_001.md"]
+    source = engine.resolve_source("CON_2024_001.md", chunks)
+    assert source["num_contrato"] == "CON_2024_001" and source["chunk_ids"] == ["CON_2024_001.md::0003"]
+    assert engine.resolve_source("SER_2024_015.md", chunks) is None
+
+    final = engine.finalize(text, chunks)
+    assert final["answer"] == ANSWER and final["sources"] == [source]
+    print("✅ Test citación en streaming PASS")
+
+
+if __name__ == "__main__":
+    test_incremental_numeric_checks()
+    test_stream_with_citations()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del scheduler de sub-queries con dependencias: niveles topológicos,
+inyección de entidades resueltas y resultados parciales por nivel.
+"""
+
+import sys
+import os
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import src.agents.retrieval as retrieval_module
+from src.agents.retrieval import RetrievalAgent
+from src.utils.subquery_dag import topological_levels, bind_dependencies, run_subquery_dag
+
+
+def _sq(sq_id, query, dependency=None):
+    return {"id": sq_id, "query": query, "rationale": "", "dependency": dependency or []}
+
+
+def test_topological_levels():
+    """Test: Máximo paralelismo por nivel; dependencias desconocidas y ciclos no bloquean"""
+    print("\nTest 1: Niveles topológicos...")
+    plan = [_sq(1, "a"), _sq(2, "b"), _sq(3, "c", [1]), _sq(4, "d", [2, 3]), _sq(5, "e", [99])]
+    levels = [[sq["id"] for sq in level] for level in topological_levels(plan)]
+    assert levels == [[1, 2, 5], [3], [4]]
+
+    cyclic = [_sq(1, "a", [2]), _sq(2, "b", [1]), _sq(3, "c")]
+    levels = [[sq["id"] for sq in level] for level in topological_levels(cyclic)]
+    assert levels == [[3], [1, 2]]
+    print("✅ Test niveles PASS")
+
+
+def test_bind_dependencies():
+    """Test: Marcadores {N} sustituidos; sin marcador se añaden las entidades nuevas"""
+    print("\nTest 2: Inyección de entidades...")
+    resolved = {1: {"contract_ids": ["CON_2024_004"], "contratistas": ["Indra"]}}
+    assert bind_dependencies(_sq(2, "penalizaciones del contrato {1}", [1]), resolved) == \
+        "penalizaciones del contrato CON_2024_004, Indra"
+    assert bind_dependencies(_sq(2, "aval de Indra en ese contrato", [1]), resolved) == \
+        "aval de Indra en ese contrato (CON_2024_004)"
+    assert bind_dependencies(_sq(2, "aval del contrato", []), resolved) == "aval del contrato"
+
+    # Un único ID de contrato (el filtro solo usa el primero de la query)
+    resolved = {1: {"contract_ids": ["CON_2024_004", "CON_2024_007", "CON_2024_009"],
+                    "contratistas": ["Indra", "Airbus"]},
+                2: {"contract_ids": ["CON_2024_012"], "contratistas": ["Medline"]}}
+    assert bind_dependencies(_sq(3, "penalizaciones del contrato", [1, 2]), resolved) == \
+        "penalizaciones del contrato (CON_2024_004, Indra, Medline)"
+    assert bind_dependencies(_sq(3, "importe del contrato {1}", [1]), resolved) == \
+        "importe del contrato CON_2024_004, Indra"
+    assert bind_dependencies(_sq(3, "aval del CON_2024_001", [1]), resolved) == "aval del CON_2024_001 (Indra)"
+    print("✅ Test inyección PASS")
+
+
+def test_run_dag_levels_and_partial_results():
+    """Test: Una llamada en lote por nivel, con las entidades del paso previo"""
+    print("\nTest 3: Ejecución del DAG...")
+    batches, partial = [], []
+
+    def retrieve_batch(queries):
+        batches.append(list(queries))
+        return [[{"contenido": f"resultado {q}",
+                  "metadata": {"num_contrato": "CON_2024_004", "contratista": "Indra"}}]
+                if "mayor importe" in q else [] for q in queries]
+
+    plan = [
+        _sq(1, "contrato de mayor importe"),
+        _sq(2, "penalizaciones en ciberseguridad"),
+        _sq(3, "penalizaciones del contrato", [1]),
+    ]
+    results = run_subquery_dag(plan, retrieve_batch,
+                               on_level=lambda level, res: partial.append((level, [r["sub_query"]["id"] for r in res])))
+
+    assert batches == [
+        ["contrato de mayor importe", "penalizaciones en ciberseguridad"],
+        ["penalizaciones del contrato (CON_2024_004, Indra)"],
+    ]
+    assert partial == [(0, [1, 2]), (1, [3])]
+    assert results[0]["entities"] == {"contract_ids": ["CON_2024_004"], "contratistas": ["Indra"]}
+    assert results[2]["level"] == 1 and results[2]["error"] is None
+
+    # Un nivel que falla no detiene los siguientes
+    def failing_batch(queries):
+        raise ConnectionError("ChromaDB caído")
+    results = run_subquery_dag(plan, failing_batch)
+    assert [r["error"] for r in results] == ["ChromaDB caído"] * 3
+
+    # Un error en la posición de una query solo marca ese paso
+    results = run_subquery_dag(plan, lambda queries: [ValueError("filtro inválido") if "ciberseguridad" in q
+                                                      else retrieve_batch([q])[0] for q in queries])
+    assert [r["error"] for r in results] == [None, "filtro inválido", None]
+    assert results[0]["chunks"] and results[1]["chunks"] == []
+    print("✅ Test DAG PASS")
+
+
+def test_retrieval_agent_isolates_failed_subquery():
+    """Test: Si el lote falla se reintenta query a query y solo falla la sub-query culpable"""
+    print("\nTest 4: Errores aislados por sub-query...")
+    calls = []
+
+    def fake_batch(queries, top_docs=10, chunks_per_doc=3, exclude_ids=None):
+        calls.append(list(queries))
+        if any("rota" in q for q in queries):
+            raise RuntimeError("query rota")
+        return [[{"contenido": f"chunk de {q}", "metadata": {"archivo": "A.md", "chunk_id": f"A::{q}"}}]
+                for q in queries]
+
+    original = retrieval_module.smart_hierarchical_retrieval_batch
+    retrieval_module.smart_hierarchical_retrieval_batch = fake_batch
+    try:
+        state = {"query": "avales", "sub_queries": [_sq(1, "avales"), _sq(2, "query rota"), _sq(3, "seguros")]}
+        state = RetrievalAgent().run(state)
+    finally:
+        retrieval_module.smart_hierarchical_retrieval_batch = original
+
+    assert calls == [["avales", "query rota", "seguros"], ["avales"], ["query rota"], ["seguros"]]
+    reports = state["retrieval_metadata"]["finding_reports"]
+    assert reports[2]["status"] == "Error" and reports[2]["message"] == "query rota"
+    assert reports[1]["status"] == "Parcial" and reports[3]["status"] == "Parcial"
+    assert len(state["retrieved_chunks"]) == 2 and "error" not in state
+    print("✅ Test errores aislados PASS")
+
+
+if __name__ == "__main__":
+    test_topological_levels()
+    test_bind_dependencies()
+    test_run_dag_levels_and_partial_results()
+    test_retrieval_agent_isolates_failed_subquery()
+    print("\n🎉 Todos los tests pasaron")
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del pre-chequeo determinista de suficiencia: casos claros sin LLM,
+casos ambiguos al auditor y registro del camino de decisión.
+"""
+
+import sys
+import os
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.sufficiency_check import check_sub_query, precheck_sufficiency, requested_fields
+from src.agents.evaluator import EvaluationAgent
+
+CHUNKS = [
+    {"contenido": "El importe total del contrato asciende a 1.250.000,00 EUR IVA incluido.",
+     "metadata": {"archivo": "CON_2024_001.md", "num_contrato": "CON_2024_001"}},
+    {"contenido": "Adjudicatario: Indra Sistemas, CIF A-28599033. Fecha de inicio 01/03/2024.",
+     "metadata": {"archivo": "CON_2024_002.md", "num_contrato": "CON_2024_002"}},
+]
+
+
+def _sq(sq_id, query):
+    return {"id": sq_id, "query": query, "rationale": "", "dependency": []}
+
+
+def test_rules():
+    """Test: Cubierto, ausente y ambiguo por sub-query"""
+    print("\nTest 1: Reglas de cobertura...")
+    assert requested_fields("¿Cuál es el CIF y la fecha de inicio?") == ["fecha", "cif"]
+
+    assert check_sub_query("importe del contrato CON_2024_001", CHUNKS)["status"] == "covered"
+    assert check_sub_query("CIF y fecha de inicio de CON-2024-002", CHUNKS)["status"] == "covered"
+    assert check_sub_query("importe del contrato CON_2024_002", CHUNKS)["status"] == "ambiguous"
+    assert check_sub_query("importe del contrato CON_2024_009", CHUNKS)["status"] == "missing"
+    assert check_sub_query("contratos con aval de Santander", CHUNKS)["status"] == "ambiguous"
+
+    report, checks = precheck_sufficiency([_sq(1, "importe CON_2024_001"), _sq(2, "CIF de CON_2024_002")], CHUNKS)
+    assert report["status"] == "SUFFICIENT" and len(checks) == 2
+    report, _ = precheck_sufficiency([_sq(1, "importe CON_2024_008"), _sq(2, "plazo SER_2024_015")], CHUNKS)
+    assert report["status"] == "INSUFFICIENT" and report["missing_info"] == ["importe CON_2024_008", "plazo SER_2024_015"]
+    report, _ = precheck_sufficiency([_sq(1, "importe CON_2024_001"), _sq(2, "importe CON_2024_008")], CHUNKS)
+    assert report is None
+
+    # La metadata global del contrato está en todos sus chunks: no prueba que el texto tenga el dato
+    insurance = [{"contenido": "El contratista suscribirá un seguro de responsabilidad civil.",
+                  "metadata": {"archivo": "CON_2024_012.md", "num_contrato": "CON_2024_012",
+                               "importe": "1.234.567,89 EUR", "fecha_inicio": "01/02/2024",
+                               "fecha_fin": "29/01/2026", "aval_vencimiento": "19/02/2026"}}]
+    lot = "¿Cuándo se entrega el segundo lote de CON_2024_012?"
+    assert check_sub_query(lot, insurance)["status"] == "ambiguous"
+    report, _ = precheck_sufficiency([_sq(1, lot)], insurance)
+    assert report is None
+    assert check_sub_query("¿Cuál es el importe de las penalizaciones de CON_2024_012?", insurance)["status"] == "ambiguous"
+    # Pregunta exacta por el dato de ingesta: la metadata sí cuenta
+    assert check_sub_query("Importe de CON_2024_012", insurance)["status"] == "covered"
+    assert check_sub_query("¿Cuándo vence el contrato CON_2024_012?", insurance)["status"] == "covered"
+    print("✅ Test reglas PASS")
+
+
+def test_evaluator_skips_llm_and_records_path():
+    """Test: El auditor LLM solo se llama en casos ambiguos; el camino queda en retrieval_metadata"""
+    print("\nTest 2: Evaluador con pre-chequeo...")
+    prompts = []
+    agent = EvaluationAgent()
+
+    def fake_llm(prompt, **kwargs):
+        prompts.append(prompt)
+        return json.dumps({"status": "PARTIAL", "reasoning": "falta", "missing_info": ["x"], "score": 50})
+
+    agent.call_llm = fake_llm
+
+    state = agent.run({"query": "importe CON_2024_001", "sub_queries": [_sq(1, "importe CON_2024_001")],
+                       "retrieved_chunks": CHUNKS, "retrieval_metadata": {"finding_reports": {}}})
+    assert state["is_sufficient"] and not prompts
+    assert state["retrieval_metadata"]["sufficiency_check"]["decision"] == "rules_sufficient"
+    assert "finding_reports" in state["retrieval_metadata"]
+
+    state = agent.run({"query": "avales de Santander", "sub_queries": [_sq(1, "avales de Santander")],
+                       "retrieved_chunks": CHUNKS})
+    assert len(prompts) == 1 and state["evaluation_report"]["status"] == "PARTIAL"
+    assert state["retrieval_metadata"]["sufficiency_check"]["decision"] == "llm"
+    print("✅ Test evaluador PASS")
+
+
+if __name__ == "__main__":
+    test_rules()
+    test_evaluator_skips_llm_and_records_path()
+    print("\n🎉 Todos los tests pasaron")
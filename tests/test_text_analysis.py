@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del analizador léxico español (acentos, stemming, tokens protegidos).
+"""
+
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.utils.text_analysis import analyze, terms, normalize_contract_id
+from src.utils.bm25_index import BM25Index
+
+
+def test_accents_and_plurals():
+    """Test: 'garantía,' y 'garantias' producen el mismo término"""
+    print("\nTest 1: Acentos y plurales...")
+    assert terms("la garantía,") == terms("GARANTIAS") == {"garanti"}
+    assert terms("camiones blindados") == terms("camión blindado")
+    assert "de" not in analyze("importe de la garantía")
+    print("✅ Test acentos PASS")
+
+
+def test_protected_tokens():
+    """Test: IDs, CIFs, normativas e importes se mantienen como un solo token"""
+    print("\nTest 2: Tokens protegidos...")
+    tokens = analyze("(CON-2024-012): CIF A87654321, STANAG 4172** e ISO 9001:2015; 28.500.000,00 EUR el 26/03/2024")
+
+    assert "con_2024_012" in tokens
+    assert "a-87654321" in tokens
+    assert "stanag_4172" in tokens and "iso_9001" in tokens
+    assert "28500000" in tokens
+    assert "26/03/2024" in tokens
+    assert terms("CON_2024_012_Centro_Mando.md") >= {"con_2024_012", "centr", "mand"}
+    assert normalize_contract_id("ser 2024 015") == "SER_2024_015"
+    print("✅ Test tokens protegidos PASS")
+
+
+def test_bm25_matches_across_surface_forms():
+    """Test: BM25 encuentra el chunk aunque query y documento difieran en forma"""
+    print("\nTest 3: BM25 con analizador...")
+    with tempfile.TemporaryDirectory() as tmp:
+        index = BM25Index(index_path=str(Path(tmp) / "bm25_index"))
+        index.build([
+            {"contenido": "Garantía definitiva del contrato CON_2024_012.", "metadata": {"archivo": "A.md"}},
+            {"contenido": "Suministro de combustible JP-8.", "metadata": {"archivo": "B.md"}},
+            {"contenido": "Mantenimiento de hangares.", "metadata": {"archivo": "C.md"}},
+        ])
+
+        results = index.search("garantias con-2024-012")
+        assert results and results[0]["metadata"]["archivo"] == "A.md"
+    print("✅ Test BM25 analizador PASS")
+
+
+if __name__ == "__main__":
+    test_accents_and_plurals()
+    test_protected_tokens()
+    test_bm25_matches_across_surface_forms()
+    print("\n🎉 Todos los tests pasaron")
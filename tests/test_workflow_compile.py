@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Tests del workflow compilado una vez por proceso y del checkpointer persistente.
+"""
+
+import sys
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import TypedDict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langgraph.graph import StateGraph, END
+from langgraph.checkpoint.memory import MemorySaver
+
+import src.graph.workflow as workflow_module
+import src.graph.checkpointer as checkpointer_module
+
+
+class _CounterState(TypedDict, total=False):
+    query: str
+    turns: int
+
+
+def _tiny_workflow() -> StateGraph:
+    graph = StateGraph(_CounterState)
+    graph.add_node("count", lambda state: {"turns": state.get("turns", 0) + 1})
+    graph.set_entry_point("count")
+    graph.add_edge("count", END)
+    return graph
+
+
+def test_compiled_once_under_concurrency():
+    """Test: El grafo se construye una sola vez aunque lleguen peticiones concurrentes"""
+    print("\nTest 1: Compilación única con concurrencia...")
+    calls = []
+
+    def fake_create():
+        calls.append(1)
+        return _tiny_workflow()
+
+    original = (workflow_module.create_workflow, workflow_module.get_checkpointer)
+    workflow_module.create_workflow = fake_create
+    workflow_module.get_checkpointer = lambda: MemorySaver()
+    workflow_module._workflow_graph = None
+    workflow_module._compiled_apps.clear()
+    try:
+        apps = []
+        threads = [
+            threading.Thread(target=lambda i=i: apps.append(workflow_module.get_compiled_workflow(i % 2 == 0)))
+            for i in range(16)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1, calls
+        assert len({id(a) for a in apps}) == 2  # con memoria + stateless
+
+        stateful = workflow_module.get_compiled_workflow(True)
+        config = {"configurable": {"thread_id": "t1"}}
+        stateful.invoke({"query": "a"}, config=config)
+        assert stateful.invoke({"query": "b"}, config=config)["turns"] == 2
+        assert workflow_module.get_compiled_workflow(False).invoke({"query": "c"})["turns"] == 1
+    finally:
+        workflow_module.create_workflow, workflow_module.get_checkpointer = original
+        workflow_module._workflow_graph = None
+        workflow_module._compiled_apps.clear()
+    print("✅ Test compiled_once PASS")
+
+
+def test_checkpointer_backends():
+    """Test: memory -> MemorySaver; sqlite persiste entre instancias (o degrada a memoria si falta el paquete)"""
+    print("\nTest 2: Backends del checkpointer...")
+    assert isinstance(checkpointer_module.create_checkpointer("memory"), MemorySaver)
+
+    try:
+        checkpointer_module.create_checkpointer("redis")
+        assert False, "backend desconocido debe fallar"
+    except ValueError:
+        pass
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "checkpoints.sqlite"
+        saver = checkpointer_module.create_checkpointer("sqlite", db_path)
+        if isinstance(saver, MemorySaver):
+            print("   (langgraph-checkpoint-sqlite no instalado: fallback a memoria)")
+        else:
+            config = {"configurable": {"thread_id": "t1"}}
+            _tiny_workflow().compile(checkpointer=saver).invoke({"query": "a"}, config=config)
+            saver.conn.close()
+
+            # Nuevo "proceso": otra conexión sobre el mismo fichero recupera el hilo
+            reopened = checkpointer_module.create_checkpointer("sqlite", db_path)
+            result = _tiny_workflow().compile(checkpointer=reopened).invoke({"query": "b"}, config=config)
+            assert result["turns"] == 2
+            reopened.conn.close()
+    print("✅ Test checkpointer_backends PASS")
+
+
+if __name__ == "__main__":
+    test_compiled_once_under_concurrency()
+    test_checkpointer_backends()
+    print("\n🎉 Todos los tests pasaron")